@@ -0,0 +1,211 @@
+"""
+常驻异步运行时：一个后台线程 + 一个长期运行的事件循环，Web 端所有异步任务都提交到这里执行
+
+以前批量测试、单语音测试、TTS 生成、批量生成 Opus 每次请求都新建一个线程和一个事件循环，
+用完即关：每次单语音测试都要重新建立连接、重新鉴权、重新加载音频帧，事件循环上的对象
+（连接、缓存）也无法在请求之间复用。AsyncRuntime：
+    - 启动一个守护线程运行常驻事件循环（可选 uvloop），其他线程通过
+      asyncio.run_coroutine_threadsafe 提交协程，不阻塞 Flask 请求线程
+    - submit 返回 Job：id / 类型 / 状态（pending / running / done / failed / cancelled）/
+      起止时间 / 错误，登记在任务表中，可以查询和取消（取消即取消对应的 asyncio 任务）
+    - run 提交并等待结果，用于需要同步返回结果的请求
+    - 同一个事件循环上创建的连接、缓存可以被之后的任务继续使用
+    - 任务表只保留最近 max_jobs 个已结束的任务，未结束的任务始终保留
+
+本模块不依赖 Flask/config，事件循环实现由调用方选择。
+"""
+import asyncio
+import itertools
+import threading
+import time
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+import loop_runtime
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """提交到运行时的一个任务"""
+
+    def __init__(self, job_id: str, kind: str, name: str = ""):
+        self.id = job_id
+        self.kind = kind
+        self.name = name
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[concurrent.futures.Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def _finish(self, status: str, error: Optional[str] = None):
+        if not self.finished:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务信息（不含 result，结果由各任务自己通过事件或状态发布）"""
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_sec": round(end - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class AsyncRuntime:
+    """常驻事件循环线程 + 任务表"""
+
+    def __init__(self, use_uvloop: bool = False, name: str = "async-runtime", max_jobs: int = 100):
+        self.use_uvloop = use_uvloop
+        self.name = name
+        self.max_jobs = max_jobs
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._jobs_lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """启动运行时线程（重复调用无副作用），返回其事件循环"""
+        with self._start_lock:
+            if self._thread is None:
+                self.loop = loop_runtime.new_event_loop(self.use_uvloop)
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        self._ready.wait()
+        return self.loop
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            try:
+                pending = asyncio.all_tasks(self.loop)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            finally:
+                self.loop.close()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """停止事件循环（未结束的任务被取消）"""
+        if self.running:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+    def in_runtime(self) -> bool:
+        """当前是否在运行时线程中（此时不能用 run 同步等待，会死锁）"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro_factory: Callable[[], Coroutine], kind: str, name: str = "") -> Job:
+        """
+        提交任务，立即返回 Job
+
+        Args:
+            coro_factory: 返回协程的无参函数（协程在运行时线程中创建，避免在其他线程创建后未被等待）
+            kind: 任务类型（如 "batch_test"、"single_test"），用于查询和取消
+        """
+        self.start()
+        job = Job(f"{kind}-{next(self._ids)}", kind, name)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            self._trim()
+        job.future = asyncio.run_coroutine_threadsafe(self._execute(job, coro_factory), self.loop)
+        # 还没开始执行就被取消时，_execute 不会运行，在这里补记状态
+        job.future.add_done_callback(lambda f: f.cancelled() and job._finish(CANCELLED))
+        return job
+
+    async def _execute(self, job: Job, coro_factory: Callable[[], Coroutine]) -> Any:
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = await coro_factory()
+        except asyncio.CancelledError:
+            job._finish(CANCELLED)
+            raise
+        except Exception as e:
+            job._finish(FAILED, f"{type(e).__name__}: {e}")
+            raise
+        job._finish(DONE)
+        return job.result
+
+    def run(self, coro_factory: Callable[[], Coroutine], kind: str, name: str = "",
+            timeout: Optional[float] = None) -> Any:
+        """提交任务并阻塞等待结果（任务抛出的异常原样抛出，超时时取消任务）"""
+        if self.in_runtime():
+            raise RuntimeError("AsyncRuntime.run() cannot be called from the runtime thread")
+        job = self.submit(coro_factory, kind, name)
+        try:
+            return job.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            job.future.cancel()
+            raise
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, kind: Optional[str] = None) -> List[Job]:
+        """任务表（按提交顺序），kind 不为空时只返回该类型"""
+        with self._jobs_lock:
+            return [job for job in self._jobs.values() if kind is None or job.kind == kind]
+
+    def active(self, kind: Optional[str] = None) -> List[Job]:
+        """未结束的任务"""
+        return [job for job in self.jobs(kind) if not job.finished]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务，任务不存在或已结束时返回 False"""
+        job = self.get(job_id)
+        if job is None or job.finished or job.future is None:
+            return False
+        job.future.cancel()
+        return True
+
+    def cancel_all(self, kind: Optional[str] = None) -> int:
+        return sum(self.cancel(job.id) for job in self.active(kind))
+
+    def get_stats(self) -> Dict[str, Any]:
+        jobs = self.jobs()
+        stats: Dict[str, Any] = {"alive": self.running, "jobs": len(jobs)}
+        for status in (PENDING, RUNNING, DONE, FAILED, CANCELLED):
+            stats[status] = sum(1 for job in jobs if job.status == status)
+        if self.loop is not None:
+            stats["loop"] = loop_runtime.loop_implementation(self.loop)
+        return stats
@@ -8,9 +8,18 @@ import subprocess
 import tempfile
 import time
 import ctypes
-from typing import Optional, List
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Callable, Dict, Any, Tuple
 from logger import Logger
 from config import Config
+from opus_framing import (
+    OggDemuxError,
+    demux_ogg_opus,
+    is_length_prefixed_opus,
+    parse_length_prefixed_opus,
+    split_opus_packets_by_decoding,
+)
 
 # 在导入 opuslib 之前，尝试从项目目录加载 opus.dll
 def _load_opus_dll_from_project():
@@ -42,6 +51,115 @@ def _load_opus_dll_from_project():
 # 在导入 opuslib 之前尝试加载项目目录下的 DLL
 _load_opus_dll_from_project()
 
+class AudioFrameCache:
+    """
+    已解析 Opus 帧的 LRU 缓存（同一次测试运行内所有客户端共享）
+
+    缓存键：(文件绝对路径, 文件大小, 修改时间, 编码参数)
+    - 文件被覆盖或参数变化时自动失效，不会返回过期的帧
+    - 按帧数据总字节数限制内存占用，超出上限时淘汰最久未使用的条目
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.logger = Logger()
+        if max_bytes is None:
+            max_bytes = int(Config.AUDIO_FRAME_CACHE_MAX_MB * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[bytes, ...]]" = OrderedDict()
+        self._entry_sizes: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _encoder_settings() -> Tuple:
+        """影响帧解析结果的编码参数"""
+        return (
+            Config.AUDIO_SAMPLE_RATE,
+            Config.AUDIO_CHANNELS,
+            Config.OPUS_FRAME_DURATION_MS,
+            Config.OPUS_COMPLEXITY,
+            Config.SPLIT_OPUS_PACKETS,
+        )
+
+    def make_key(self, file_path: str) -> Optional[Tuple]:
+        """构建缓存键，文件不存在时返回None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, self._encoder_settings())
+
+    def get_or_load(self, file_path: str, loader: Callable[[str], Optional[List[bytes]]]) -> Optional[List[bytes]]:
+        """
+        从缓存获取帧列表，未命中时调用loader加载并写入缓存
+
+        加载失败（返回空）的结果不缓存，下次仍会重新尝试
+        """
+        key = self.make_key(file_path)
+        if key is None:
+            return loader(file_path)
+
+        with self._lock:
+            frames = self._entries.get(key)
+            if frames is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(frames)
+            self.misses += 1
+
+        loaded = loader(file_path)
+        if not loaded:
+            return loaded
+
+        self._put(key, tuple(loaded))
+        return list(loaded)
+
+    def _put(self, key: Tuple, frames: Tuple[bytes, ...]):
+        """写入缓存并按内存上限淘汰旧条目"""
+        size = sum(len(f) for f in frames)
+        if size > self.max_bytes:
+            # 单个文件超过上限，不缓存
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entry_sizes[key]
+            self._entries[key] = frames
+            self._entries.move_to_end(key)
+            self._entry_sizes[key] = size
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._entry_sizes.pop(old_key)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（保留统计计数）"""
+        with self._lock:
+            self._entries.clear()
+            self._entry_sizes.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息（用于测试报告）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups > 0 else 0.0
+            }
+
 class AudioEncoder:
     """音频编码器类（使用外部工具进行 TTS 和 Opus 编码）"""
     
@@ -116,9 +234,9 @@ class AudioEncoder:
             
             # 检查是否是 Ogg Opus 容器格式（以 OggS 开头）
             if opus_data[:4] == b'OggS':
-                # 这是 Ogg 容器格式，需要使用 ffmpeg 转换
-                self.logger.info("Detected Ogg Opus container, converting with ffmpeg...")
-                frames = self._convert_ogg_opus_to_frames(file_path)
+                # 这是 Ogg 容器格式，在进程内直接解析出原始 Opus 包
+                self.logger.info("Detected Ogg Opus container, demuxing packets...")
+                frames = self._convert_ogg_opus_to_frames(file_path, opus_data)
                 
                 # 关键：从Ogg容器提取的原始Opus包必须逐个发送，不能合并！
                 # 因为服务器端的 decoder.decode() 只能解码单个Opus包
@@ -140,6 +258,14 @@ class AudioEncoder:
                 
                 return frames
             
+            # 长度前缀格式：包边界已知，一次线性扫描即可分帧
+            if is_length_prefixed_opus(opus_data):
+                frames = parse_length_prefixed_opus(opus_data, Config.MAX_OPUS_PACKET_SIZE)
+                if frames:
+                    self.logger.info(f"Detected length-prefixed Opus packets: {len(frames)} packets, {len(opus_data)} bytes")
+                    return frames
+                self.logger.warning("Malformed length-prefixed Opus data, falling back to packet splitting")
+            
             # 否则，假设是裸 Opus 数据包
             # 讯飞TTS返回的 Opus 数据是连续的裸数据包
             self.logger.info(f"Detected raw Opus packets, size: {len(opus_data)} bytes")
@@ -149,82 +275,8 @@ class AudioEncoder:
             # 2. 服务器使用 @discordjs/opus 的 decoder.decode(binaryData) 解码
             # 3. decoder.decode() 只能解码单个Opus包，不能解码连续的多个包
             # 4. 设备每次 SendAudio() 对应一个WebSocket消息，每个消息是一个独立的Opus包
-            # 5. 所以需要将连续的Opus数据分割为多个独立的Opus包，每个包作为一个独立的WebSocket消息发送
-            
-            # 方案：使用Opus解码器智能分割连续的Opus数据为多个独立的包
-            try:
-                import opuslib
-                decoder = opuslib.Decoder(Config.AUDIO_SAMPLE_RATE, Config.AUDIO_CHANNELS)
-                frame_size = int(Config.AUDIO_SAMPLE_RATE * Config.OPUS_FRAME_DURATION_MS / 1000)
-                
-                frames = []
-                offset = 0
-                max_attempts = 500  # 增加尝试次数
-                attempt = 0
-                
-                self.logger.info(f"Attempting intelligent Opus packet splitting for {len(opus_data)} bytes...")
-                
-                while offset < len(opus_data) and attempt < max_attempts:
-                    attempt += 1
-                    found = False
-                    
-                    # 尝试从最小包大小（通常20字节）开始，逐步增加
-                    # Opus包大小范围：通常20-400字节
-                    for try_size in range(20, min(400, len(opus_data) - offset + 1), 1):
-                        if offset + try_size > len(opus_data):
-                            break
-                        
-                        try:
-                            packet = opus_data[offset:offset + try_size]
-                            # 尝试解码，验证这是否是一个有效的Opus包
-                            pcm = decoder.decode(packet, frame_size)
-                            
-                            # 验证解码结果：
-                            # 1. 必须有PCM数据输出
-                            # 2. PCM数据大小应该合理（至少大于0，通常应该是几百到几千字节）
-                            # 3. 对于有效的Opus包，解码后应该有一定量的PCM数据
-                            # 验证解码结果：只要解码成功且返回PCM数据，就认为是一个有效的Opus包
-                            # Opus包大小可变，解码后的PCM大小也取决于帧大小
-                            # 对于16kHz单声道：
-                            #   - 20ms帧 = 320 samples = 640 bytes PCM
-                            #   - 60ms帧 = 960 samples = 1920 bytes PCM
-                            # 我们接受任何有效的解码结果（至少应该有PCM数据）
-                            if len(pcm) > 0:
-                                # 找到有效的Opus包边界
-                                frames.append(packet)
-                                offset += try_size
-                                found = True
-                                break
-                        except Exception:
-                            # 解码失败，继续尝试更大的包大小
-                            continue
-                    
-                    if not found:
-                        # 如果找不到有效包，可能数据有问题，尝试跳过少量字节
-                        offset += 1
-                        if offset >= len(opus_data) or offset - (sum(len(f) for f in frames)) > 50:
-                            break
-                
-                if frames:
-                    total_split = sum(len(f) for f in frames)
-                    self.logger.info(
-                        f"Split audio into {len(frames)} independent Opus packets "
-                        f"(total {total_split}/{len(opus_data)} bytes, {total_split/len(opus_data)*100:.1f}% coverage)"
-                    )
-                    return frames
-                else:
-                    # 如果分割失败，回退到单帧方案（虽然可能不正确）
-                    self.logger.warning("Failed to split Opus packets, sending as single frame (may cause decode errors)")
-                    return [opus_data]
-                    
-            except ImportError:
-                # 如果没有opuslib，回退到单帧方案
-                self.logger.warning("opuslib not available, sending entire audio as single frame (may cause decode errors)")
-                return [opus_data]
-            except Exception as e:
-                # 任何错误都回退到单帧方案
-                self.logger.warning(f"Error during packet splitting: {e}, sending as single frame (may cause decode errors)")
-                return [opus_data]
+            # 5. 所以需要将连续的Opus数据分割为多个独立的包，每个包作为一个独立的WebSocket消息发送
+            return self._split_opus_packets(opus_data)
             
         except Exception as e:
             self.logger.error(f"Failed to load audio file: {e}")
@@ -232,59 +284,51 @@ class AudioEncoder:
             self.logger.info("Attempting to convert with ffmpeg...")
             return self._convert_with_ffmpeg(file_path)
     
-    def _convert_ogg_opus_to_frames(self, file_path: str) -> Optional[List[bytes]]:
+    def _convert_ogg_opus_to_frames(self, file_path: str, ogg_data: Optional[bytes] = None) -> Optional[List[bytes]]:
         """
         从 Ogg Opus 容器中提取原始 Opus 数据包（不重新编码）
         
-        由于Ogg格式解析复杂且容易出错，直接使用已验证的PCM重新编码方法
-        这样可以确保生成的Opus包格式正确，能被服务器端正确解码
+        使用进程内的 Ogg 解析器（校验 CRC、拼接跨页包、跳过 OpusHead/OpusTags），
+        不启动子进程、不写临时文件；只有容器损坏时才回退到 ffmpeg 重新编码
         
         注意：从Ogg容器提取的原始Opus包必须逐个发送，不能合并！
         因为服务器端的 decoder.decode() 只能解码单个Opus包
         """
-        # 直接使用已验证的PCM重新编码方法，确保生成的Opus包格式正确
-        # 虽然这不是"原始"包，但至少能保证可解码性
-        self.logger.info("Converting Ogg Opus to PCM and re-encoding to raw Opus packets...")
-        return self._convert_with_ffmpeg(file_path)
+        try:
+            if ogg_data is None:
+                with open(file_path, 'rb') as f:
+                    ogg_data = f.read()
+            frames = demux_ogg_opus(ogg_data)
+        except (OSError, OggDemuxError) as e:
+            self.logger.warning(f"Failed to demux Ogg Opus container ({e}), falling back to ffmpeg re-encoding")
+            return self._convert_with_ffmpeg(file_path)
+        
+        if not frames:
+            self.logger.warning(f"Ogg Opus container has no audio packets: {file_path}")
+            return None
+        
+        self.logger.info(f"Demuxed {len(frames)} Opus packets from Ogg container ({len(ogg_data)} bytes)")
+        return frames
     
     def _split_opus_packets(self, opus_data: bytes) -> Optional[List[bytes]]:
-        """使用 opuslib 智能分割连续的 Opus 数据为多个独立的包"""
+        """
+        分割连续的 Opus 数据为多个独立的包
+
+        优先使用长度前缀格式（一次线性扫描）；没有分帧信息时才回退到逐长度试解码
+        """
+        if is_length_prefixed_opus(opus_data):
+            frames = parse_length_prefixed_opus(opus_data, Config.MAX_OPUS_PACKET_SIZE)
+            if frames:
+                return frames
+        
         try:
-            import opuslib
-            decoder = opuslib.Decoder(Config.AUDIO_SAMPLE_RATE, Config.AUDIO_CHANNELS)
-            frame_size = int(Config.AUDIO_SAMPLE_RATE * Config.OPUS_FRAME_DURATION_MS / 1000)
-            
-            frames = []
-            offset = 0
-            max_attempts = 500
-            attempt = 0
-            
-            self.logger.info(f"Attempting intelligent Opus packet splitting for {len(opus_data)} bytes...")
-            
-            while offset < len(opus_data) and attempt < max_attempts:
-                attempt += 1
-                found = False
-                
-                for try_size in range(20, min(400, len(opus_data) - offset + 1), 1):
-                    if offset + try_size > len(opus_data):
-                        break
-                    
-                    try:
-                        packet = opus_data[offset:offset + try_size]
-                        pcm = decoder.decode(packet, frame_size)
-                        
-                        if len(pcm) > 0:
-                            frames.append(packet)
-                            offset += try_size
-                            found = True
-                            break
-                    except Exception:
-                        continue
-                
-                if not found:
-                    offset += 1
-                    if offset >= len(opus_data) or offset - (sum(len(f) for f in frames)) > 50:
-                        break
+            self.logger.info(f"No framing information, falling back to trial-decode splitting for {len(opus_data)} bytes...")
+            frames = split_opus_packets_by_decoding(
+                opus_data,
+                sample_rate=Config.AUDIO_SAMPLE_RATE,
+                channels=Config.AUDIO_CHANNELS,
+                frame_duration_ms=Config.OPUS_FRAME_DURATION_MS
+            )
             
             if frames:
                 total_split = sum(len(f) for f in frames)
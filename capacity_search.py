@@ -0,0 +1,483 @@
+"""
+容量搜索：在给定延迟/成功率 SLO 下，自动找出服务器能承受的最大并发数（或到达率）
+
+固定并发跑一次只能回答"这个并发下延迟是多少"，要找容量就得人工反复调并发。容量搜索
+把一次运行拆成若干个短阶段（stage），每个阶段在一个负载水平上跑 stage_duration_sec 秒：
+
+    1. 增长：从 start 开始按 growth 倍数递增，直到某个阶段不满足 SLO 或达到 max
+    2. 二分：在最后一个满足 SLO 的水平和第一个不满足的水平之间二分，直到间距 <= resolution
+
+负载维度（dimension）：
+    - concurrency:  同时进行对话的连接数（闭环，每个连接做完一轮立即做下一轮）
+    - arrival_rate: 开放模型的固定到达率（次/秒），连接池大小为 connections
+
+SLO 例如 "e2e_response_time 的 P95 < 4000ms 且成功率 >= 99%"。开放模型下延迟加上派发延迟
+（协调遗漏修正）。输出每个阶段的吞吐量-延迟曲线、满足 SLO 的最大水平（capacity），
+以及拐点（knee）：吞吐量/延迟（Kleinrock power）最大的水平，再往上加负载延迟增长快于吞吐量。
+
+用法：
+    python capacity_search.py --slo-ms 4000 --min-success-rate 99 --start 2 --max 64
+    python capacity_search.py --dimension arrival_rate --connections 50 --start 1 --max 20 --resolution 0.5
+"""
+import os
+import json
+import asyncio
+import argparse
+import itertools
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from arrival_scheduler import ConstantRate, OpenLoopDispatcher
+
+DIMENSIONS = ("concurrency", "arrival_rate")
+
+
+def _percentile(sorted_values, ratio: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * ratio), len(sorted_values) - 1)]
+
+
+class SLO:
+    """服务等级目标：metric 的 percentile 分位数 <= max_ms，且成功率 >= min_success_rate（百分比）"""
+
+    def __init__(self, max_ms: float = 4000.0, percentile: float = 95.0,
+                 min_success_rate: float = 99.0, metric: str = "e2e_response_time"):
+        if max_ms <= 0:
+            raise ValueError("slo max_ms must be positive")
+        if not 0 < percentile <= 100:
+            raise ValueError("slo percentile must be in (0, 100]")
+        if not 0 <= min_success_rate <= 100:
+            raise ValueError("slo min_success_rate must be in [0, 100]")
+        self.max_ms = float(max_ms)
+        self.percentile = float(percentile)
+        self.min_success_rate = float(min_success_rate)
+        self.metric = metric
+
+    @classmethod
+    def from_dict(cls, spec: Optional[Dict[str, Any]]) -> "SLO":
+        spec = spec or {}
+        try:
+            return cls(
+                max_ms=float(spec.get("max_ms", 4000)),
+                percentile=float(spec.get("percentile", 95)),
+                min_success_rate=float(spec.get("min_success_rate", 99)),
+                metric=str(spec.get("metric", "e2e_response_time")),
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"invalid slo: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "metric": self.metric,
+            "percentile": self.percentile,
+            "max_ms": self.max_ms,
+            "min_success_rate": self.min_success_rate,
+        }
+
+    def describe(self) -> str:
+        return (f"{self.metric} P{self.percentile:g} <= {self.max_ms:g}ms, "
+                f"success rate >= {self.min_success_rate:g}%")
+
+
+def summarize_stage(level: float, results: List[Dict[str, Any]], duration_sec: float,
+                    slo: SLO) -> Dict[str, Any]:
+    """一个阶段的统计：吞吐量（成功轮次/秒）、延迟分位数、成功率，以及是否满足 SLO"""
+    successful = sum(1 for r in results if r.get("success"))
+    latencies = []
+    for r in results:
+        value = r.get(slo.metric)
+        if value is None or value < 0:
+            continue
+        # 开放模型：从计划到达时刻算起（协调遗漏修正）
+        latencies.append(value + (r.get("dispatch_lag_ms") or 0))
+    latencies.sort()
+
+    stage: Dict[str, Any] = {
+        "level": level,
+        "turns": len(results),
+        "successful": successful,
+        "duration_sec": round(duration_sec, 3),
+        "throughput": round(successful / duration_sec, 3) if duration_sec > 0 else 0.0,
+        "success_rate": round(successful / len(results) * 100, 2) if results else 0.0,
+    }
+    if latencies:
+        stage.update({
+            "latency_p50_ms": round(_percentile(latencies, 0.50), 1),
+            "latency_p95_ms": round(_percentile(latencies, 0.95), 1),
+            "latency_p99_ms": round(_percentile(latencies, 0.99), 1),
+            "latency_slo_ms": round(_percentile(latencies, slo.percentile / 100), 1),
+        })
+
+    reasons = []
+    if not results:
+        reasons.append("no completed turns")
+    if stage["success_rate"] < slo.min_success_rate:
+        reasons.append(f"success rate {stage['success_rate']}% < {slo.min_success_rate:g}%")
+    if "latency_slo_ms" not in stage:
+        reasons.append(f"no {slo.metric} samples")
+    elif stage["latency_slo_ms"] > slo.max_ms:
+        reasons.append(f"P{slo.percentile:g} {stage['latency_slo_ms']}ms > {slo.max_ms:g}ms")
+    stage["passed"] = not reasons
+    if reasons:
+        stage["violations"] = reasons
+    return stage
+
+
+def find_knee(curve: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """拐点：吞吐量 / 延迟（Kleinrock power）最大的阶段，没有可用阶段时返回 None"""
+    best = None
+    best_power = 0.0
+    for stage in curve:
+        latency = stage.get("latency_slo_ms")
+        if not latency or not stage.get("throughput"):
+            continue
+        power = stage["throughput"] / (latency / 1000.0)
+        if power > best_power:
+            best, best_power = stage, power
+    if best is None:
+        return None
+    return dict(best, power=round(best_power, 3))
+
+
+class CapacitySearch:
+    """
+    容量搜索：几何增长找到第一个不满足 SLO 的水平，再在 [最后通过, 第一次失败] 之间二分
+
+    run_stage(level, stage_index) 在给定负载水平上运行一个阶段，返回 (results, duration_sec)。
+    integer=True 时水平取整数（并发数），否则保留小数（到达率）。
+    """
+
+    def __init__(self, run_stage: Callable[[float, int], Awaitable[Tuple[List[Dict[str, Any]], float]]],
+                 slo: SLO, start: float, max_level: float, growth: float = 2.0,
+                 resolution: float = 1.0, integer: bool = True, dimension: str = "concurrency",
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 on_stage: Optional[Callable[[Dict[str, Any]], None]] = None):
+        if start <= 0 or max_level < start:
+            raise ValueError("capacity search requires 0 < start <= max")
+        if growth <= 1:
+            raise ValueError("capacity search growth must be > 1")
+        if resolution <= 0:
+            raise ValueError("capacity search resolution must be positive")
+        self.run_stage = run_stage
+        self.slo = slo
+        self.start = start
+        self.max_level = max_level
+        self.growth = growth
+        self.resolution = max(resolution, 1) if integer else resolution
+        self.integer = integer
+        self.dimension = dimension
+        self.should_stop = should_stop or (lambda: False)
+        self.on_stage = on_stage
+        self.stages: List[Dict[str, Any]] = []
+        self.stopped = False
+
+    def _round(self, level: float) -> float:
+        return int(round(level)) if self.integer else round(level, 3)
+
+    async def _run(self, level: float) -> bool:
+        results, duration = await self.run_stage(level, len(self.stages))
+        stage = summarize_stage(level, results, duration, self.slo)
+        stage["stage"] = len(self.stages)
+        self.stages.append(stage)
+        if self.on_stage:
+            self.on_stage(stage)
+        return stage["passed"]
+
+    async def run(self) -> Dict[str, Any]:
+        passed_level: Optional[float] = None
+        failed_level: Optional[float] = None
+
+        # 1. 几何增长
+        level = self._round(self.start)
+        while not self.should_stop():
+            if await self._run(level):
+                passed_level = level
+                if level >= self.max_level:
+                    break
+                level = min(self._round(max(level * self.growth, level + self.resolution)), self.max_level)
+            else:
+                failed_level = level
+                break
+
+        # 2. 二分（起点就不满足时在 0 和起点之间找）
+        low = passed_level if passed_level is not None else 0
+        while failed_level is not None and failed_level - low > self.resolution and not self.should_stop():
+            mid = self._round((low + failed_level) / 2)
+            if mid <= low or mid >= failed_level:
+                break
+            if await self._run(mid):
+                low = passed_level = mid
+            else:
+                failed_level = mid
+
+        self.stopped = self.should_stop()
+        return self.get_result()
+
+    def get_result(self) -> Dict[str, Any]:
+        curve = sorted(self.stages, key=lambda s: s["level"])
+        passing = [s for s in curve if s["passed"]]
+        return {
+            "dimension": self.dimension,
+            "slo": self.slo.to_dict(),
+            "search": {
+                "start": self.start,
+                "max": self.max_level,
+                "growth": self.growth,
+                "resolution": self.resolution,
+            },
+            "stopped_early": self.stopped,
+            "stages": self.stages,
+            "curve": [{k: s.get(k) for k in ("level", "throughput", "latency_p50_ms", "latency_p95_ms",
+                                             "latency_p99_ms", "success_rate", "passed")}
+                      for s in curve],
+            "capacity": passing[-1] if passing else None,
+            "knee": find_knee(curve),
+        }
+
+
+def parse_search_settings(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并规范化容量搜索参数（/api/start 的 capacity 字段），参数无效时抛出 ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError("capacity must be an object")
+    dimension = spec.get("dimension", "concurrency")
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"capacity dimension must be one of {', '.join(DIMENSIONS)}")
+    integer = dimension == "concurrency"
+    try:
+        settings = {
+            "dimension": dimension,
+            "start": float(spec.get("start", 1)),
+            "max": float(spec.get("max", 64 if integer else 20)),
+            "growth": float(spec.get("growth", 2)),
+            "resolution": float(spec.get("resolution", 1 if integer else 0.5)),
+            "stage_duration_sec": float(spec.get("stage_duration_sec", 30)),
+            "cooldown_sec": float(spec.get("cooldown_sec", 2)),
+            "connections": int(spec.get("connections", 0)),
+            "poisson": bool(spec.get("poisson", False)),
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid capacity settings: {e}")
+    if settings["stage_duration_sec"] <= 0:
+        raise ValueError("capacity stage_duration_sec must be positive")
+    if settings["cooldown_sec"] < 0:
+        raise ValueError("capacity cooldown_sec must be >= 0")
+    if dimension == "arrival_rate" and settings["connections"] <= 0:
+        raise ValueError("capacity connections (connection pool size) is required for arrival_rate")
+    settings["slo"] = SLO.from_dict(spec.get("slo")).to_dict()
+    # 与 CapacitySearch 相同的范围检查，提前在请求阶段报错
+    CapacitySearch(None, SLO.from_dict(settings["slo"]), settings["start"], settings["max"],
+                   settings["growth"], settings["resolution"], integer)
+    return settings
+
+
+class InquiryStageRunner:
+    """
+    在给定负载水平上运行一个容量搜索阶段
+
+    每个阶段新建连接（连接和鉴权时间不计入阶段时长），阶段结束后关闭，阶段之间冷却 cooldown_sec 秒。
+    run_item(client, item) 执行一轮对话并返回结果字典；on_result(result) 在每轮完成后调用。
+    """
+
+    def __init__(self, run_item: Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 device_sns: List[str], items: List[Dict[str, Any]], dimension: str = "concurrency",
+                 stage_duration_sec: float = 30.0, connections: int = 0, cooldown_sec: float = 2.0,
+                 poisson: bool = False, late_tolerance_ms: float = 10.0,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None, logger=None, settings=None):
+        if not items:
+            raise ValueError("capacity search requires at least one test item")
+        self.run_item = run_item
+        self.device_sns = list(device_sns)
+        self.items = items
+        self.dimension = dimension
+        self.stage_duration = stage_duration_sec
+        self.connections = connections
+        self.cooldown = cooldown_sec
+        self.poisson = poisson
+        self.late_tolerance_ms = late_tolerance_ms
+        self.on_result = on_result
+        self.should_stop = should_stop or (lambda: False)
+        self.logger = logger
+        self.settings = settings  # 连接使用的 RunSettings（None 时取 Config 当前值）
+        self._items = itertools.cycle(items)
+        self._next_connection_id = 1
+
+    async def _connect(self, count: int) -> List[Any]:
+        from websocket_client import WebSocketClient
+
+        clients = []
+        for i in range(count):
+            clients.append(WebSocketClient(connection_id=self._next_connection_id,
+                                           device_sn=self.device_sns[i % len(self.device_sns)],
+                                           settings=self.settings))
+            self._next_connection_id += 1
+
+        async def connect_and_auth(client):
+            if not await client.connect():
+                return False
+            await client.wait_for_auth(timeout=3.0)
+            return not client.auth_failed
+
+        connected = await asyncio.gather(*(connect_and_auth(c) for c in clients))
+        active = [c for c, ok in zip(clients, connected) if ok]
+        for c, ok in zip(clients, connected):
+            if not ok and c.is_connected:
+                await c.close()
+        return active
+
+    async def _turn(self, client, item, stage_index: int, level: float,
+                    results: List[Dict[str, Any]], arrival=None):
+        try:
+            result = await self.run_item(client, item)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Capacity stage {stage_index} (Conn #{client.connection_id}) 处理任务时出错: {e}")
+            return
+        if arrival is not None:
+            arrival.annotate(result)
+        result["capacity_stage"] = stage_index
+        result["capacity_level"] = level
+        results.append(result)
+        if self.on_result:
+            self.on_result(result)
+
+    async def __call__(self, level: float, stage_index: int) -> Tuple[List[Dict[str, Any]], float]:
+        if stage_index > 0 and self.cooldown > 0:
+            await asyncio.sleep(self.cooldown)
+        pool_size = int(level) if self.dimension == "concurrency" else self.connections
+        clients = await self._connect(pool_size)
+        if self.logger:
+            self.logger.info(f"Capacity stage {stage_index}: {self.dimension}={level}, "
+                             f"{len(clients)}/{pool_size} connections ready")
+        results: List[Dict[str, Any]] = []
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            if not clients:
+                return results, self.stage_duration
+            if self.dimension == "concurrency":
+                deadline = start + self.stage_duration
+
+                async def client_loop(client):
+                    while loop.time() < deadline and client.is_connected and not self.should_stop():
+                        await self._turn(client, next(self._items), stage_index, level, results)
+
+                await asyncio.gather(*(client_loop(c) for c in clients))
+            else:
+                async def run_turn(client, arrival):
+                    await self._turn(client, arrival.item, stage_index, level, results, arrival)
+
+                profile = ConstantRate(level, self.stage_duration, poisson=self.poisson)
+                items = [next(self._items) for _ in range(len(self.items))]
+                await OpenLoopDispatcher(profile, clients, run_turn, items=items,
+                                         should_stop=self.should_stop,
+                                         late_tolerance_ms=self.late_tolerance_ms).run()
+        finally:
+            for c in clients:
+                if c.is_connected:
+                    await c.close()
+        # 阶段时长至少为计划时长：最后几轮的收尾时间不会抬高吞吐量
+        return results, max(loop.time() - start, self.stage_duration)
+
+
+def print_curve(result: Dict[str, Any], log=print):
+    """打印吞吐量-延迟曲线、容量和拐点"""
+    log(f"{'level':>10} {'turns/s':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'success%':>9}  SLO")
+    for point in result["curve"]:
+        def fmt(key):
+            value = point.get(key)
+            return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+        log(f"{point['level']:>10} {fmt('throughput')} {fmt('latency_p50_ms')} {fmt('latency_p95_ms')} "
+            f"{fmt('latency_p99_ms')} {fmt('success_rate')}  {'pass' if point['passed'] else 'FAIL'}")
+    capacity, knee = result.get("capacity"), result.get("knee")
+    log(f"capacity ({result['dimension']}): {capacity['level'] if capacity else 'none (SLO not met at any level)'}")
+    if knee:
+        log(f"knee: {result['dimension']}={knee['level']}, {knee['throughput']} turns/s, "
+            f"P{result['slo']['percentile']:g} {knee['latency_slo_ms']}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the max concurrency / arrival rate that meets a latency SLO")
+    parser.add_argument("--dimension", choices=DIMENSIONS, default="concurrency")
+    parser.add_argument("--start", type=float, default=1)
+    parser.add_argument("--max", type=float, default=64)
+    parser.add_argument("--growth", type=float, default=2)
+    parser.add_argument("--resolution", type=float, default=None, help="二分停止间距（默认并发 1，到达率 0.5）")
+    parser.add_argument("--stage-sec", type=float, default=30, help="每个阶段的时长（秒）")
+    parser.add_argument("--cooldown-sec", type=float, default=2, help="阶段之间的冷却时间（秒）")
+    parser.add_argument("--connections", type=int, default=0, help="arrival_rate 模式的连接池大小")
+    parser.add_argument("--poisson", action="store_true", help="arrival_rate 模式使用泊松到达")
+    parser.add_argument("--metric", default="e2e_response_time")
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--slo-ms", type=float, default=4000)
+    parser.add_argument("--min-success-rate", type=float, default=99)
+    parser.add_argument("--sn", action="append", default=None, help="设备SN（可多次指定，默认 Config.DEVICE_SN）")
+    parser.add_argument("-o", "--output", default=None, help="结果JSON文件（默认 results/capacity_search_<时间>.json）")
+    args = parser.parse_args()
+
+    from config import Config
+    import loop_runtime
+    from test_inquiries import InquiryTester
+
+    spec = {
+        "dimension": args.dimension, "start": args.start, "max": args.max, "growth": args.growth,
+        "stage_duration_sec": args.stage_sec, "cooldown_sec": args.cooldown_sec,
+        "connections": args.connections, "poisson": args.poisson,
+        "slo": {"metric": args.metric, "percentile": args.percentile, "max_ms": args.slo_ms,
+                "min_success_rate": args.min_success_rate},
+    }
+    if args.resolution is not None:
+        spec["resolution"] = args.resolution
+    try:
+        settings = parse_search_settings(spec)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tester = InquiryTester()
+    text_map = tester._load_text_map()
+    items = []
+    for index in sorted(tester.scan_audio_files()):
+        audio_file = tester.get_audio_file(index)
+        if audio_file:
+            items.append({"index": index, "inquiry_file": audio_file,
+                          "inquiry_text": text_map.get(os.path.basename(audio_file), f"测试 #{index}")})
+    if not items:
+        parser.error("no audio files found in audio/inquiries")
+
+    async def run_item(client, item):
+        return await tester.test_single_audio(client, item["inquiry_file"], item["inquiry_text"],
+                                              "inquiry", item["index"])
+
+    async def run_search():
+        stage_runner = InquiryStageRunner(
+            run_item, args.sn or [Config.DEVICE_SN], items, settings["dimension"],
+            settings["stage_duration_sec"], settings["connections"], settings["cooldown_sec"],
+            settings["poisson"], Config.ARRIVAL_LATE_TOLERANCE_MS,
+            on_result=tester.results.append, logger=tester.logger, settings=tester.settings
+        )
+        search = CapacitySearch(
+            stage_runner, SLO.from_dict(settings["slo"]), settings["start"], settings["max"],
+            settings["growth"], settings["resolution"], settings["dimension"] == "concurrency",
+            settings["dimension"],
+            on_stage=lambda s: tester.logger.info(
+                f"Stage {s['stage']}: {settings['dimension']}={s['level']} "
+                f"throughput={s['throughput']}/s P{settings['slo']['percentile']:g}="
+                f"{s.get('latency_slo_ms')}ms success={s['success_rate']}% -> "
+                f"{'pass' if s['passed'] else 'FAIL ' + '; '.join(s['violations'])}")
+        )
+        return await search.run()
+
+    tester.logger.info(f"Capacity search: {settings['dimension']} {settings['start']:g}..{settings['max']:g}, "
+                       f"SLO {SLO.from_dict(settings['slo']).describe()}")
+    result = loop_runtime.run(run_search(), Config.USE_UVLOOP)
+    print_curve(result, tester.logger.info)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"capacity_search_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"capacity_search": result, "results": tester.results}, f, indent=2, ensure_ascii=False)
+    tester.logger.info(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
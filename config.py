@@ -39,7 +39,27 @@ class Config:
     OPUS_FRAME_SIZE = AUDIO_SAMPLE_RATE * OPUS_FRAME_DURATION_MS // 1000  # 960 samples per frame
     OPUS_COMPLEXITY = 3  # Opus 编码复杂度（WiFi 板使用 3，ML307 使用 5）
     MAX_OPUS_PACKET_SIZE = 1000  # 最大 Opus 数据包大小（字节）
-    
+
+    # 下行 TTS 音频指标（见 downlink_audio.py）：模拟设备抖动缓冲的深度（毫秒），
+    # 以及是否在进程内解码下行 Opus 帧求时长（默认按 TOC 字节计算，不解码）
+    DOWNLINK_JITTER_BUFFER_MS = float(os.getenv("DOWNLINK_JITTER_BUFFER_MS", "180"))
+    DOWNLINK_OPUS_DECODE = os.getenv("DOWNLINK_OPUS_DECODE", "false").lower() == "true"
+    # 服务器在回复前发送的垫话句（"|" 分隔），LLM 流式节奏指标中的首个有效句延迟会跳过它们（见 llm_cadence.py）
+    LLM_FILLER_PHRASES = [p for p in os.getenv("LLM_FILLER_PHRASES", "好嘞，请稍等").split("|") if p.strip()]
+    # 协议轨迹：非空时把每个连接收发的帧写入该二进制文件（路径中的 {pid} 替换为进程号），
+    # 用 trace_replay.py 按原始节奏或加速重放上行（见 protocol_trace.py）
+    PROTOCOL_TRACE_PATH = os.getenv("PROTOCOL_TRACE_PATH", "")
+    # 轨迹中是否保存下行音频帧的数据（默认只记录大小）
+    PROTOCOL_TRACE_DOWNLINK_AUDIO = os.getenv("PROTOCOL_TRACE_DOWNLINK_AUDIO", "false").lower() == "true"
+
+    # 音频帧缓存（同一次测试运行内所有连接共享，避免每轮重复读取和解析Opus文件）
+    AUDIO_FRAME_CACHE_ENABLED = os.getenv("AUDIO_FRAME_CACHE_ENABLED", "true").lower() == "true"
+    AUDIO_FRAME_CACHE_MAX_MB = float(os.getenv("AUDIO_FRAME_CACHE_MAX_MB", "64"))  # 缓存内存上限（MB）
+
+    # 语料归档（audio/inquiries 编译为单个 mmap 文件，见 corpus_archive.py）
+    CORPUS_ARCHIVE_ENABLED = os.getenv("CORPUS_ARCHIVE_ENABLED", "true").lower() == "true"
+    CORPUS_ARCHIVE_AUTO_BUILD = os.getenv("CORPUS_ARCHIVE_AUTO_BUILD", "true").lower() == "true"  # 归档缺失或过期时自动重建
+
     # 音频发送模式
     # "continuous": 持续输入模式 - 按照实际时间间隔发送（模拟真实采集节奏）
     #   - 硬件编码：每30ms发送一个包
@@ -104,6 +124,32 @@ class Config:
     # "fast": 急速模式 - 只要大模型开始回复（has_llm + llm_text_buffer）就继续下一个问题
     TEST_MODE = os.getenv("TEST_MODE", "normal")  # 默认正常模式
     
+    # 同一连接上相邻两轮对话之间的间隔（毫秒）
+    # 服务器消息按轮次路由，上一轮的迟到消息只计数不写入下一轮，因此可以设为 0
+    INTER_TURN_GAP_MS = int(os.getenv("INTER_TURN_GAP_MS", "200"))
+    
+    # Web 批量测试的工作进程数：>1 时把连接分片到多个进程，每个进程独立事件循环（见 sharded_runner.py）
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+    # 每个工作进程承载的最大连接数（/api/start 的并发上限 = 该值 * 工作进程数）
+    MAX_CONNECTIONS_PER_WORKER = int(os.getenv("MAX_CONNECTIONS_PER_WORKER", "100"))
+    # 设备群模式（run_type=fleet，大量空闲连接 + 少量活跃连接，见 device_fleet.py）的最大连接数，不受上面的并发上限限制
+    FLEET_MAX_CONNECTIONS = int(os.getenv("FLEET_MAX_CONNECTIONS", "50000"))
+    
+    # 开放模型到达曲线（见 arrival_scheduler.py），为空时使用闭环模式（完成一轮立即开始下一轮）
+    # 格式: "曲线:参数=值,..."，例如 "poisson:rate=5,duration_sec=60"、"ramp:start_rate=1,end_rate=20,duration_sec=120"
+    ARRIVAL_PROFILE = os.getenv("ARRIVAL_PROFILE", "")
+    # 派发延迟超过该值（毫秒）计为一次迟到派发（没有空闲连接或压测端来不及）
+    ARRIVAL_LATE_TOLERANCE_MS = float(os.getenv("ARRIVAL_LATE_TOLERANCE_MS", "10"))
+    
+    # 事件循环：USE_UVLOOP=true 且已安装 uvloop 时使用 uvloop（不支持Windows，未安装时回退标准事件循环）
+    USE_UVLOOP = os.getenv("USE_UVLOOP", "false").lower() == "true"
+    # 事件循环调度延迟采样（见 loop_runtime.py）：采样间隔，以及判定"压测端饱和"的 P99 阈值
+    LOOP_LAG_SAMPLE_INTERVAL_MS = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL_MS", "10"))
+    LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "50"))
+    
+    # test_inquiries.py 的检查点：每轮结果追加一行，每追加 N 条 fsync 一次（0 表示不主动 fsync）
+    CHECKPOINT_FSYNC_BATCH = int(os.getenv("CHECKPOINT_FSYNC_BATCH", "10"))
+    
     # 极限性能测试模式：减少等待时间以测试服务器极限并发处理能力
     # true=极限性能模式（减少等待，快速完成），false=完整响应模式（等待完整响应）
     STRESS_TEST_MODE = os.getenv("STRESS_TEST_MODE", "true").lower() == "true"
@@ -131,11 +177,22 @@ class Config:
     LOGS_DIR = os.path.join(RESULTS_DIR, "logs")
     CSV_DIR = os.path.join(RESULTS_DIR, "csv")
     JSON_DIR = os.path.join(RESULTS_DIR, "json")
+    # Web 批量测试结果存储：每轮结果追加到 RUNS_DIR 下的 JSONL 文件（见 result_store.py），
+    # 内存中只保留最近 RESULT_WINDOW_SIZE 条用于看板显示
+    RUNS_DIR = os.path.join(RESULTS_DIR, "runs")
+    RESULT_WINDOW_SIZE = int(os.getenv("RESULT_WINDOW_SIZE", "200"))
+    # Web 运行登记表保留的已结束运行数（未结束的运行始终保留），可通过 /api/runs 和 run_id 参数查看
+    RUN_HISTORY_SIZE = int(os.getenv("RUN_HISTORY_SIZE", "20"))
+    # Web 看板事件发送频率（Hz）：批量测试的高频事件按该频率合并成批发送（见 event_stream.py），0 表示逐个立即发送
+    SOCKETIO_FLUSH_HZ = float(os.getenv("SOCKETIO_FLUSH_HZ", "10"))
     
     # 日志配置
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_TO_FILE = os.getenv("LOG_TO_FILE", "true").lower() == "true"
     LOG_TO_CONSOLE = os.getenv("LOG_TO_CONSOLE", "true").lower() == "true"
+    # 消息体日志采样率（0~1）：INFO级别下按轮次采样，只有被采样的轮次才输出完整JSON和横幅日志
+    # DEBUG级别始终输出；高并发压测时调低可显著降低客户端CPU占用
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
     
     @classmethod
     def calculate_sign(cls, device_sn: str) -> str:
@@ -150,9 +207,10 @@ class Config:
         return sign
     
     @classmethod
-    def get_websocket_url(cls, device_sn: Optional[str] = None) -> str:
-        """构建 WebSocket 连接 URL"""
-        host = cls.WSS_SERVER_HOST if cls.USE_SSL else cls.WS_SERVER_HOST
+    def get_websocket_url(cls, device_sn: Optional[str] = None, host: Optional[str] = None) -> str:
+        """构建 WebSocket 连接 URL（host 为空时按 USE_SSL 使用 WSS_SERVER_HOST 或 WS_SERVER_HOST）"""
+        if host is None:
+            host = cls.WSS_SERVER_HOST if cls.USE_SSL else cls.WS_SERVER_HOST
         
         # 如果提供了device_sn，使用它；否则使用默认值
         sn = device_sn if device_sn is not None else cls.DEVICE_SN
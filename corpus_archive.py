@@ -0,0 +1,347 @@
+"""
+语料归档：把 audio/inquiries 目录编译成一个打包文件，测试时 mmap 直接读取
+
+目录里是上百个 audio_XXX.opus 加一个 file_list.txt，以前每次测试都要扫描目录、
+正则解析 file_list.txt、逐个读取并分帧。归档文件在构建时一次性完成这些工作：
+
+    header   : magic "OPCA", 版本, 条目数, 各区偏移, 源文件签名 (总字节数, 摘要)
+    entries  : 定长条目记录（编号、类别、时长、帧区间、文件名/文本在字符串区的位置）
+    frames   : 定长帧索引（数据区偏移, 长度），同一条目的帧连续存放
+    strings  : UTF-8 文件名和文本
+    data     : 预先分好的 Opus 包
+
+运行时 mmap 整个文件，按位置读取条目记录，帧以 memoryview 切片交给 WebSocketClient，
+不拷贝数据；打开归档和取任意一条语料的帧都是 O(1)，与语料规模无关。
+
+源文件签名覆盖 file_list.txt 和目录中所有 .opus 文件的 (文件名, size, mtime_ns)：修改 file_list.txt、
+增删音频，或替换/重新编码某个 audio_XXX.opus（即使 file_list.txt 没变），归档都会被识别为过期。
+
+用法：
+    python corpus_archive.py [音频目录] [-o 输出文件]
+"""
+import os
+import re
+import mmap
+import hashlib
+import struct
+import argparse
+from typing import Dict, List, Optional, Tuple, NamedTuple
+
+from logger import Logger
+from audio_encoder import AudioEncoder
+from opus_framing import opus_packet_duration_ms
+
+ARCHIVE_MAGIC = b"OPCA"
+ARCHIVE_VERSION = 2
+ARCHIVE_FILENAME = "corpus.opca"
+FILE_LIST_NAME = "file_list.txt"
+
+# magic, version, reserved, entry_count, entries_offset, frames_offset, strings_offset, data_offset,
+# source_size, source_digest（源文件签名，见 _source_signature）
+_HEADER = struct.Struct("<4sHHIQQQQQq")
+# index, category, reserved, frame_start, frame_count, duration_ms, name_offset, name_length, text_offset, text_length
+_ENTRY = struct.Struct("<IBxHIIIIIII")
+# data offset, length
+_FRAME = struct.Struct("<QI")
+
+# file_list.txt 中的分组标题与类别
+CATEGORY_HEADERS = {
+    "Inquiry Files:": "inquiry",
+    "Compare Files:": "compare",
+    "Order Files:": "order",
+}
+CATEGORIES = ["inquiry", "compare", "order"]
+_FILE_LIST_LINE = re.compile(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s*(.*)')
+
+
+class CorpusEntry(NamedTuple):
+    """归档中的一条语料"""
+    position: int       # 在归档中的位置
+    index: int          # 文件编号（audio_001.opus -> 1）
+    filename: str
+    text: str
+    category: str
+    duration_ms: int
+    frame_count: int
+
+
+def parse_file_list(file_list_path: str) -> List[Tuple[str, str, str]]:
+    """
+    解析 file_list.txt，返回 [(category, filename, text), ...]（保持文件中的顺序）
+
+    格式：分组标题行 + "001: filename.opus - 文本内容"
+    """
+    entries = []
+    if not os.path.exists(file_list_path):
+        return entries
+
+    category = "inquiry"
+    with open(file_list_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line in CATEGORY_HEADERS:
+                category = CATEGORY_HEADERS[line]
+                continue
+            match = _FILE_LIST_LINE.match(line)
+            if match:
+                entries.append((category, match.group(2), match.group(3).strip()))
+    return entries
+
+
+def load_text_map(audio_dir: str) -> Dict[str, str]:
+    """从 file_list.txt 读取 {filename: text}（只包含非空文本）"""
+    return {
+        filename: text
+        for _, filename, text in parse_file_list(os.path.join(audio_dir, FILE_LIST_NAME))
+        if text
+    }
+
+
+def _file_index(filename: str) -> int:
+    """audio_001.opus -> 1，无法解析时返回 0"""
+    match = re.search(r'_(\d+)\.opus$', filename)
+    return int(match.group(1)) if match else 0
+
+
+def _source_signature(audio_dir: str) -> Tuple[int, int]:
+    """
+    源文件签名 (总字节数, 摘要)，用于判断归档是否过期
+
+    摘要为 file_list.txt 和所有 .opus 文件按文件名排序后的 (文件名, size, mtime_ns) 的 64 位哈希，
+    只需 stat，不读取文件内容
+    """
+    try:
+        with os.scandir(audio_dir) as it:
+            sources = sorted(
+                (entry.name, entry.stat()) for entry in it
+                if entry.is_file() and (entry.name == FILE_LIST_NAME or entry.name.endswith(".opus"))
+            )
+    except OSError:
+        return 0, 0
+    digest = hashlib.blake2b(digest_size=8)
+    total_size = 0
+    for name, stat in sources:
+        total_size += stat.st_size
+        digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return total_size, int.from_bytes(digest.digest(), "little", signed=True)
+
+
+def build_corpus_archive(audio_dir: str, output_path: Optional[str] = None) -> Optional[str]:
+    """
+    将音频目录编译为归档文件（先写临时文件再原子替换，运行中的测试不受影响）
+
+    条目来源：file_list.txt 中列出的文件，加上目录中未列出的 audio_*.opus
+    返回归档路径；没有可用音频时返回 None
+    """
+    logger = Logger()
+    encoder = AudioEncoder()
+    output_path = output_path or os.path.join(audio_dir, ARCHIVE_FILENAME)
+    source_size, source_digest = _source_signature(audio_dir)
+
+    listed = parse_file_list(os.path.join(audio_dir, FILE_LIST_NAME))
+    seen = {filename for _, filename, _ in listed}
+    if os.path.isdir(audio_dir):
+        for filename in sorted(os.listdir(audio_dir)):
+            if filename.startswith("audio_") and filename.endswith(".opus") and filename not in seen:
+                listed.append(("inquiry", filename, ""))
+                seen.add(filename)
+
+    entries = []
+    frame_records = []
+    strings = bytearray()
+    data = bytearray()
+    for category, filename, text in listed:
+        file_path = os.path.join(audio_dir, filename)
+        if not os.path.exists(file_path):
+            continue
+        frames = encoder._load_audio_file_as_frames(file_path)
+        if not frames:
+            logger.warning(f"Skipping {filename}: no Opus frames")
+            continue
+
+        frame_start = len(frame_records)
+        duration_ms = 0.0
+        for frame in frames:
+            frame_records.append((len(data), len(frame)))
+            data += frame
+            duration_ms += opus_packet_duration_ms(frame)
+
+        name_bytes = filename.encode('utf-8')
+        text_bytes = text.encode('utf-8')
+        name_offset = len(strings)
+        strings += name_bytes
+        text_offset = len(strings)
+        strings += text_bytes
+        entries.append((
+            _file_index(filename), CATEGORIES.index(category), 0, frame_start, len(frames),
+            int(round(duration_ms)), name_offset, len(name_bytes), text_offset, len(text_bytes)
+        ))
+
+    if not entries:
+        logger.warning(f"No audio files found in {audio_dir}, corpus archive not built")
+        return None
+
+    entries_offset = _HEADER.size
+    frames_offset = entries_offset + _ENTRY.size * len(entries)
+    strings_offset = frames_offset + _FRAME.size * len(frame_records)
+    data_offset = strings_offset + len(strings)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(
+            ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, len(entries), entries_offset, frames_offset,
+            strings_offset, data_offset, source_size, source_digest
+        ))
+        for entry in entries:
+            f.write(_ENTRY.pack(*entry))
+        for record in frame_records:
+            f.write(_FRAME.pack(*record))
+        f.write(strings)
+        f.write(data)
+    os.replace(tmp_path, output_path)
+
+    logger.info(
+        f"Built corpus archive: {output_path} "
+        f"({len(entries)} entries, {len(frame_records)} frames, {data_offset + len(data)} bytes)"
+    )
+    return output_path
+
+
+class CorpusArchive:
+    """
+    mmap 打开的语料归档（只读）
+
+    frames() 返回的 memoryview 引用 mmap 内存，归档对象需在测试运行期间保持打开
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap)
+        (magic, version, _, self.entry_count, self._entries_offset, self._frames_offset,
+         self._strings_offset, self._data_offset, source_size, source_digest) = _HEADER.unpack_from(self._view, 0)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            self.close()
+            raise ValueError(f"Not a corpus archive (version {ARCHIVE_VERSION}): {path}")
+        self.source_signature = (source_size, source_digest)
+        self._by_filename: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def open_for_dir(cls, audio_dir: str, build_if_stale: bool = True) -> Optional["CorpusArchive"]:
+        """
+        打开音频目录对应的归档
+
+        归档不存在或已过期时：build_if_stale=True 则重新构建，否则返回 None（调用方回退到逐文件加载）
+        """
+        logger = Logger()
+        path = os.path.join(audio_dir, ARCHIVE_FILENAME)
+        signature = _source_signature(audio_dir)
+
+        if os.path.exists(path):
+            try:
+                archive = cls(path)
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Failed to open corpus archive {path}: {e}")
+            else:
+                if archive.source_signature == signature:
+                    return archive
+                archive.close()
+                logger.info(f"Corpus archive is stale ({FILE_LIST_NAME} or .opus files changed): {path}")
+
+        if not build_if_stale:
+            return None
+        if build_corpus_archive(audio_dir, path) is None:
+            return None
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def _read_string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+        return bytes(self._view[start:start + length]).decode('utf-8')
+
+    def entry(self, position: int) -> CorpusEntry:
+        """按位置读取条目（O(1)）"""
+        if not 0 <= position < self.entry_count:
+            raise IndexError(position)
+        (index, category, _, frame_start, frame_count, duration_ms,
+         name_offset, name_length, text_offset, text_length) = _ENTRY.unpack_from(
+            self._view, self._entries_offset + position * _ENTRY.size)
+        return CorpusEntry(
+            position=position,
+            index=index,
+            filename=self._read_string(name_offset, name_length),
+            text=self._read_string(text_offset, text_length),
+            category=CATEGORIES[category],
+            duration_ms=duration_ms,
+            frame_count=frame_count,
+        )
+
+    def entries(self) -> List[CorpusEntry]:
+        return [self.entry(i) for i in range(self.entry_count)]
+
+    def find(self, filename: str) -> Optional[int]:
+        """按文件名查找条目位置（首次调用时建立索引）"""
+        if self._by_filename is None:
+            self._by_filename = {}
+            for position in range(self.entry_count):
+                _, _, _, _, _, _, name_offset, name_length, _, _ = _ENTRY.unpack_from(
+                    self._view, self._entries_offset + position * _ENTRY.size)
+                self._by_filename[self._read_string(name_offset, name_length)] = position
+        return self._by_filename.get(os.path.basename(filename))
+
+    def frames(self, position: int) -> List[memoryview]:
+        """返回条目的 Opus 帧（memoryview 切片，零拷贝）"""
+        if not 0 <= position < self.entry_count:
+            raise IndexError(position)
+        _, _, _, frame_start, frame_count, _, _, _, _, _ = _ENTRY.unpack_from(
+            self._view, self._entries_offset + position * _ENTRY.size)
+        view = self._view
+        base = self._data_offset
+        record_offset = self._frames_offset + frame_start * _FRAME.size
+        frames = []
+        for offset, length in _FRAME.iter_unpack(view[record_offset:record_offset + frame_count * _FRAME.size]):
+            start = base + offset
+            frames.append(view[start:start + length])
+        return frames
+
+    def text_map(self) -> Dict[str, str]:
+        """{filename: text}（只包含非空文本），与 load_text_map() 结果一致"""
+        return {e.filename: e.text for e in self.entries() if e.text}
+
+    def close(self):
+        """关闭归档；仍有帧 memoryview 被引用时保持映射，由垃圾回收释放"""
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            return
+        self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build packed corpus archive from an audio directory")
+    parser.add_argument("audio_dir", nargs="?", default=os.path.join(os.path.dirname(__file__), "audio", "inquiries"))
+    parser.add_argument("-o", "--output", default=None, help=f"输出文件（默认 <audio_dir>/{ARCHIVE_FILENAME}）")
+    args = parser.parse_args()
+
+    path = build_corpus_archive(args.audio_dir, args.output)
+    if path is None:
+        raise SystemExit(1)
+
+    archive = CorpusArchive(path)
+    total_ms = sum(e.duration_ms for e in archive.entries())
+    print(f"{path}: {len(archive)} entries, {total_ms / 1000:.1f}s of audio")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
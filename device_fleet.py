@@ -0,0 +1,452 @@
+"""
+设备群模式：保持上万个已鉴权的空闲连接，观察服务器在大量在线设备下的连接、鉴权、内存和断连情况
+
+真实设备大部分时间只是在线发心跳，服务器的内存和文件描述符上限往往先于对话吞吐被打满，
+而普通批量测试每个连接都在跑对话，连接数受 MAX_CONNECTIONS_PER_WORKER 限制。DeviceFleet：
+    - 按 ramp_rate（个/秒）错开建立 connections 个连接，同时进行握手的连接不超过 max_connecting，
+      每个连接建立后等待 auth，连接失败/鉴权失败/鉴权超时分别计数
+    - 所有在线连接的心跳由一个共享的 HeartbeatWheel 发送，不再每个连接一个定时任务
+    - 最先鉴权成功的 active 个连接循环进行对话（run_item，每轮之间间隔 think_time_sec），其余保持空闲
+    - 全部连接建立后保持 hold_sec 秒，然后关闭所有连接
+    - 每 sample_interval_sec 秒记录一个时间序列点：在线数、握手中的连接数、建连速率、
+      该区间内鉴权耗时 P50/P95、失败数、服务器主动断开数、心跳数、对话轮数、压测端 RSS 和打开的文件描述符数
+鉴权前被服务器关闭的连接记为 rejected（例如模拟服务器超出连接数上限时的 1013），鉴权后服务器主动断开
+（接收任务结束而压测端没有关闭连接）记为 server_disconnects，两者都按关闭码统计。
+
+用法：
+    python device_fleet.py --connections 10000 --ramp-rate 500 --hold-sec 300 --active 20
+    python device_fleet.py --connections 2000 --ramp-rate 200 --heartbeat-sec 30 --server ws://127.0.0.1:8765
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from heartbeat_wheel import HeartbeatWheel
+
+
+def _percentile(sorted_values, ratio: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * ratio), len(sorted_values) - 1)]
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB）；没有 /proc 时退回到峰值 RSS，都不可用时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def open_fd_count() -> Optional[int]:
+    """当前进程打开的文件描述符数（没有 /proc 或 /dev/fd 时返回 None）"""
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def raise_fd_limit() -> Optional[Dict[str, int]]:
+    """把文件描述符软上限提高到硬上限（每个连接占一个描述符），返回调整后的上限；不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return {"soft": soft, "hard": hard}
+
+
+def parse_fleet_settings(spec: Dict[str, Any], max_connections: Optional[int] = None) -> Dict[str, Any]:
+    """校验并规范化设备群参数（/api/start 的 fleet 字段），参数无效时抛出 ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError("fleet must be an object")
+    try:
+        settings = {
+            "connections": int(spec.get("connections", 1000)),
+            "ramp_rate": float(spec.get("ramp_rate", 200)),
+            "max_connecting": int(spec.get("max_connecting", 200)),
+            "auth_timeout_sec": float(spec.get("auth_timeout_sec", 5)),
+            "heartbeat_interval_sec": float(spec.get("heartbeat_interval_sec", 10)),
+            "heartbeat_tick_ms": float(spec.get("heartbeat_tick_ms", 100)),
+            "active": int(spec.get("active", 0)),
+            "think_time_sec": float(spec.get("think_time_sec", 1)),
+            "hold_sec": float(spec.get("hold_sec", 60)),
+            "sample_interval_sec": float(spec.get("sample_interval_sec", 1)),
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid fleet settings: {e}")
+    if settings["connections"] < 1:
+        raise ValueError("fleet connections must be >= 1")
+    if max_connections is not None and settings["connections"] > max_connections:
+        raise ValueError(f"fleet connections must be <= {max_connections}")
+    for key in ("ramp_rate", "max_connecting", "auth_timeout_sec", "heartbeat_interval_sec",
+                "heartbeat_tick_ms", "sample_interval_sec"):
+        if settings[key] <= 0:
+            raise ValueError(f"fleet {key} must be positive")
+    if not 0 <= settings["active"] <= settings["connections"]:
+        raise ValueError("fleet active must be between 0 and connections")
+    if settings["think_time_sec"] < 0 or settings["hold_sec"] < 0:
+        raise ValueError("fleet think_time_sec and hold_sec must be >= 0")
+    return settings
+
+
+class DeviceFleet:
+    """
+    设备群运行（见模块说明）
+
+    run_item(client, item) 执行一轮对话并返回结果字典，on_result(result) 在每轮完成后调用，
+    on_sample(point) 在每个时间序列点记录后调用。
+    """
+
+    def __init__(self, settings: Dict[str, Any], device_sns: List[str],
+                 run_item: Optional[Callable[[Any, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+                 items: Optional[List[Dict[str, Any]]] = None,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 on_sample: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None, logger=None, run_settings=None):
+        if not device_sns:
+            raise ValueError("fleet requires at least one device SN")
+        if settings["active"] and (run_item is None or not items):
+            raise ValueError("fleet active connections require run_item and at least one test item")
+        self.settings = settings
+        self.device_sns = list(device_sns)
+        self.run_item = run_item
+        self._items = itertools.cycle(items) if items else None
+        self.on_result = on_result
+        self.on_sample = on_sample
+        self.should_stop = should_stop or (lambda: False)
+        self.logger = logger
+        self.run_settings = run_settings  # 连接使用的 RunSettings（None 时取 Config 当前值）
+        self.wheel = HeartbeatWheel(settings["heartbeat_interval_sec"], lambda client: client.send_heartbeat(),
+                                    settings["heartbeat_tick_ms"] / 1000)
+        self._live: Dict[int, Any] = {}        # 在线连接（connection_id -> WebSocketClient）
+        self._active_tasks: List[asyncio.Task] = []
+        self._closing = False
+        self._connecting = 0
+        self.series: List[Dict[str, Any]] = []
+        # 累计计数
+        self.counts = Counter()
+        self.close_codes = Counter()
+        self.auth_ms: List[float] = []
+        self.connected_peak = 0
+        # 当前采样区间的计数（采样后清零）
+        self._interval = Counter()
+        self._interval_auth_ms: List[float] = []
+        self._sampled: Dict[str, Any] = {"t": 0.0, "heartbeats": 0, "heartbeat_failures": 0}
+
+    def _log(self, message: str):
+        if self.logger:
+            self.logger.info(message)
+
+    def _stopped(self) -> bool:
+        return self._closing or self.should_stop()
+
+    async def _open(self, connection_id: int, slots: asyncio.Semaphore):
+        from websocket_client import WebSocketClient
+
+        client = WebSocketClient(connection_id, self.device_sns[(connection_id - 1) % len(self.device_sns)],
+                                 settings=self.run_settings)
+        self._connecting += 1
+        try:
+            start = time.perf_counter()
+            if not await client.connect():
+                self._count("connect_failed")
+                return
+            authed = await client.wait_for_auth(self.settings["auth_timeout_sec"])
+            if not authed or client.auth_failed:
+                if client.auth_failed:
+                    self._count("auth_failed")
+                elif client.disconnect_event.is_set():
+                    # 鉴权前被服务器关闭（例如超出连接数上限时的 1013）
+                    self._count("rejected")
+                    self._record_close_code(client)
+                else:
+                    self._count("auth_timeout")
+                await client.close()
+                return
+            auth_ms = (time.perf_counter() - start) * 1000
+        finally:
+            self._connecting -= 1
+            slots.release()
+        if self._closing:
+            await client.close()
+            return
+        self._count("connected")
+        self.auth_ms.append(auth_ms)
+        self._interval_auth_ms.append(auth_ms)
+        self._live[connection_id] = client
+        self.connected_peak = max(self.connected_peak, len(self._live))
+        self.wheel.add(connection_id, client)
+        if len(self._active_tasks) < self.settings["active"]:
+            self._active_tasks.append(asyncio.create_task(self._active_loop(client)))
+
+    async def _active_loop(self, client):
+        """活跃连接：循环进行对话，直到断开或运行结束"""
+        while not self._stopped() and client.is_connected and not client.disconnect_event.is_set():
+            try:
+                result = await self.run_item(client, next(self._items))
+            except Exception as e:
+                self._count("turn_failed")
+                if self.logger:
+                    self.logger.error(f"Fleet (Conn #{client.connection_id}) 处理任务时出错: {e}")
+                result = None
+            if result is not None:
+                self._count("turns" if result.get("success") else "turn_failed")
+                result["fleet_active"] = True
+                if self.on_result:
+                    self.on_result(result)
+            if self.settings["think_time_sec"] > 0 and not self._stopped():
+                await asyncio.sleep(self.settings["think_time_sec"])
+
+    def _count(self, key: str, n: int = 1):
+        self.counts[key] += n
+        self._interval[key] += n
+
+    def _reap_disconnected(self):
+        """找出服务器主动断开的连接（接收任务已结束而压测端没有关闭），从在线表和定时轮中移除"""
+        gone = [cid for cid, client in self._live.items() if client.disconnect_event.is_set()]
+        for cid in gone:
+            client = self._live.pop(cid)
+            self.wheel.remove(cid)
+            self._record_close_code(client)
+            self._count("server_disconnects")
+
+    def _record_close_code(self, client):
+        code = getattr(client.websocket, "close_code", None) if client.websocket is not None else None
+        self.close_codes[str(code) if code is not None else "unknown"] += 1
+
+    def _sample(self, start: float):
+        self._reap_disconnected()
+        elapsed = time.perf_counter() - start
+        previous = self._sampled
+        span = max(1e-9, elapsed - previous["t"])
+        heartbeats = self.wheel.sent
+        heartbeat_failures = self.wheel.failed
+        auth = sorted(self._interval_auth_ms)
+        rss = current_rss_mb()
+        point = {
+            "t": round(elapsed, 3),
+            "connected": len(self._live),
+            "connecting": self._connecting,
+            "connects": self._interval["connected"],
+            "connect_rate": round(self._interval["connected"] / span, 2),
+            "auth_p50_ms": round(_percentile(auth, 0.5), 3) if auth else None,
+            "auth_p95_ms": round(_percentile(auth, 0.95), 3) if auth else None,
+            "failures": (self._interval["connect_failed"] + self._interval["rejected"]
+                         + self._interval["auth_failed"] + self._interval["auth_timeout"]),
+            "server_disconnects": self._interval["server_disconnects"],
+            "heartbeats": heartbeats - previous["heartbeats"],
+            "heartbeat_failures": heartbeat_failures - previous["heartbeat_failures"],
+            "turns": self._interval["turns"],
+            "turn_failures": self._interval["turn_failed"],
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "open_fds": open_fd_count(),
+        }
+        self._interval.clear()
+        self._interval_auth_ms = []
+        self._sampled = {"t": elapsed, "heartbeats": heartbeats, "heartbeat_failures": heartbeat_failures}
+        self.series.append(point)
+        if self.on_sample:
+            self.on_sample(point)
+
+    async def _sampler(self, start: float):
+        while True:
+            await asyncio.sleep(self.settings["sample_interval_sec"])
+            self._sample(start)
+
+    async def _ramp(self, start: float):
+        """按 ramp_rate 错开建立连接，同时握手的连接数不超过 max_connecting"""
+        slots = asyncio.Semaphore(self.settings["max_connecting"])
+        opening = set()
+        for i in range(self.settings["connections"]):
+            if self.should_stop():
+                break
+            delay = start + i / self.settings["ramp_rate"] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            task = asyncio.create_task(self._open(i + 1, slots))
+            opening.add(task)
+            task.add_done_callback(opening.discard)
+        if opening:
+            await asyncio.gather(*opening, return_exceptions=True)
+
+    async def _close_all(self, batch: int = 500):
+        self._closing = True
+        clients = list(self._live.values())
+        self._live.clear()
+        self.wheel.clear()
+        for i in range(0, len(clients), batch):
+            await asyncio.gather(*(c.close() for c in clients[i:i + batch]), return_exceptions=True)
+
+    async def run(self) -> Dict[str, Any]:
+        """运行设备群，返回设置、汇总和时间序列"""
+        settings = self.settings
+        fd_limit = raise_fd_limit()
+        if fd_limit and fd_limit["soft"] < settings["connections"] + 100:
+            self._log(f"文件描述符上限 {fd_limit['soft']} 小于连接数 {settings['connections']}，超出部分将连接失败")
+        baseline_rss = current_rss_mb()
+        start = time.perf_counter()
+        self.wheel.start()
+        sampler = asyncio.create_task(self._sampler(start))
+        self._log(f"设备群: {settings['connections']} 个连接, 建连速率 {settings['ramp_rate']:g}/s, "
+                  f"心跳周期 {settings['heartbeat_interval_sec']:g}s, 活跃连接 {settings['active']}")
+        ramp_sec = None
+        try:
+            await self._ramp(start)
+            ramp_sec = time.perf_counter() - start
+            self._log(f"设备群建连完成: {len(self._live)}/{settings['connections']} 在线, 用时 {ramp_sec:.1f}s")
+            hold_until = time.perf_counter() + settings["hold_sec"]
+            while not self.should_stop() and time.perf_counter() < hold_until:
+                await asyncio.sleep(min(0.2, max(0.0, hold_until - time.perf_counter())))
+        finally:
+            self._closing = True
+            for task in self._active_tasks:
+                task.cancel()
+            await asyncio.gather(*self._active_tasks, return_exceptions=True)
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+            self._sample(start)
+            await self.wheel.stop()
+            connected_final = len(self._live)
+            await self._close_all()
+        return {
+            "settings": settings,
+            "summary": self._summary(ramp_sec, time.perf_counter() - start, connected_final, baseline_rss, fd_limit),
+            "series": self.series,
+        }
+
+    def _summary(self, ramp_sec: Optional[float], wall_sec: float, connected_final: int,
+                 baseline_rss: Optional[float], fd_limit: Optional[Dict[str, int]]) -> Dict[str, Any]:
+        auth = sorted(self.auth_ms)
+        rss_values = [p["rss_mb"] for p in self.series if p["rss_mb"] is not None]
+        peak_rss = max(rss_values) if rss_values else None
+        per_connection_kb = None
+        if peak_rss is not None and baseline_rss is not None and self.connected_peak:
+            per_connection_kb = round((peak_rss - baseline_rss) * 1024 / self.connected_peak, 2)
+        return {
+            "target": self.settings["connections"],
+            "connected": self.counts["connected"],
+            "connected_peak": self.connected_peak,
+            "connected_final": connected_final,
+            "connect_failed": self.counts["connect_failed"],
+            "rejected": self.counts["rejected"],
+            "auth_failed": self.counts["auth_failed"],
+            "auth_timeout": self.counts["auth_timeout"],
+            "ramp_sec": round(ramp_sec, 3) if ramp_sec is not None else None,
+            "achieved_connect_rate": round(self.counts["connected"] / ramp_sec, 2) if ramp_sec else None,
+            "wall_sec": round(wall_sec, 3),
+            "auth_p50_ms": round(_percentile(auth, 0.5), 3) if auth else None,
+            "auth_p95_ms": round(_percentile(auth, 0.95), 3) if auth else None,
+            "auth_p99_ms": round(_percentile(auth, 0.99), 3) if auth else None,
+            "auth_max_ms": round(auth[-1], 3) if auth else None,
+            "server_disconnects": self.counts["server_disconnects"],
+            "close_codes": dict(self.close_codes.most_common()),
+            "heartbeat": self.wheel.get_stats(),
+            "active": self.settings["active"],
+            "turns": self.counts["turns"],
+            "turn_failed": self.counts["turn_failed"],
+            "baseline_rss_mb": round(baseline_rss, 1) if baseline_rss is not None else None,
+            "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+            "rss_per_connection_kb": per_connection_kb,
+            "fd_limit": fd_limit,
+        }
+
+
+def print_sample(point: Dict[str, Any], log=print):
+    log(f"[{point['t']:8.1f}s] online {point['connected']:>6} (+{point['connects']}, connecting {point['connecting']}) "
+        f"rate {point['connect_rate']}/s auth p50/p95 {point['auth_p50_ms']}/{point['auth_p95_ms']}ms "
+        f"fail {point['failures']} drop {point['server_disconnects']} hb {point['heartbeats']} "
+        f"turns {point['turns']} rss {point['rss_mb']}MB fds {point['open_fds']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hold a large fleet of mostly idle authenticated device connections")
+    parser.add_argument("--connections", type=int, default=1000, help="连接数")
+    parser.add_argument("--ramp-rate", type=float, default=200, help="建连速率（个/秒）")
+    parser.add_argument("--max-connecting", type=int, default=200, help="同时握手的最大连接数")
+    parser.add_argument("--auth-timeout", type=float, default=5, help="等待 auth 的超时（秒）")
+    parser.add_argument("--heartbeat-sec", type=float, default=10, help="心跳周期（秒）")
+    parser.add_argument("--heartbeat-tick-ms", type=float, default=100, help="心跳定时轮步进（毫秒）")
+    parser.add_argument("--active", type=int, default=0, help="循环进行对话的连接数")
+    parser.add_argument("--think-sec", type=float, default=1, help="活跃连接每轮之间的间隔（秒）")
+    parser.add_argument("--hold-sec", type=float, default=60, help="全部建连后的保持时间（秒）")
+    parser.add_argument("--sample-sec", type=float, default=1, help="时间序列采样间隔（秒）")
+    parser.add_argument("--server", default=None, help="WebSocket服务器地址（默认 Config 中的地址）")
+    parser.add_argument("--sn", action="append", default=None, help="设备SN（可多次指定，默认 Config.DEVICE_SN）")
+    parser.add_argument("-o", "--output", default=None, help="结果JSON文件（默认 results/device_fleet_<时间>.json）")
+    args = parser.parse_args()
+
+    from config import Config
+    import loop_runtime
+    from run_settings import RunSettings
+
+    try:
+        settings = parse_fleet_settings({
+            "connections": args.connections, "ramp_rate": args.ramp_rate, "max_connecting": args.max_connecting,
+            "auth_timeout_sec": args.auth_timeout, "heartbeat_interval_sec": args.heartbeat_sec,
+            "heartbeat_tick_ms": args.heartbeat_tick_ms, "active": args.active, "think_time_sec": args.think_sec,
+            "hold_sec": args.hold_sec, "sample_interval_sec": args.sample_sec,
+        })
+        run_settings = RunSettings.from_config()
+        if args.server:
+            run_settings = run_settings.with_ws_url(args.server)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tester = None
+    items: List[Dict[str, Any]] = []
+    run_item = None
+    if settings["active"]:
+        from test_inquiries import InquiryTester
+
+        tester = InquiryTester(settings=run_settings)
+        text_map = tester._load_text_map()
+        for index in sorted(tester.scan_audio_files()):
+            audio_file = tester.get_audio_file(index)
+            if audio_file:
+                items.append({"index": index, "inquiry_file": audio_file,
+                              "inquiry_text": text_map.get(os.path.basename(audio_file), f"测试 #{index}")})
+        if not items:
+            parser.error("--active requires audio files in audio/inquiries")
+
+        async def run_item(client, item):
+            return await tester.test_single_audio(client, item["inquiry_file"], item["inquiry_text"],
+                                                  "inquiry", item["index"])
+
+    results: List[Dict[str, Any]] = []
+    fleet = DeviceFleet(settings, args.sn or [Config.DEVICE_SN], run_item, items, on_result=results.append,
+                        on_sample=print_sample, run_settings=run_settings)
+    outcome = loop_runtime.run(fleet.run(), Config.USE_UVLOOP)
+    print(json.dumps(outcome["summary"], indent=2, ensure_ascii=False))
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"device_fleet_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"device_fleet": outcome, "results": results}, f, indent=2, ensure_ascii=False)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+前端事件合并限速发送：测试线程只把事件放入队列，由后台线程按固定频率合并后批量发送
+
+批量测试时每个 test_start / test_result / progress_update / 每句 LLM 文本（test_detail_update）
+都会立即广播一次。高并发下每秒上千个事件经 threading 模式的 SocketIO 发出，
+发送时的锁和网络 I/O 会反过来拖慢测试事件循环。EventStream：
+    - submit: 只做一次 deque.append（CPython 下原子操作，不加锁），测试线程不会阻塞在前端 I/O 上
+    - 后台线程每 1/rate_hz 秒取出队列中的全部事件并合并：
+        latest_only 中的事件只保留最后一个（例如进度，放在它最后一次出现的位置）
+        merge 中的事件按 key 合并为一个（例如同一轮对话的多句 LLM 增量，放在它第一次出现的位置）；
+        barriers 中的事件（例如该轮的开始/结果）按同样的 key 截断合并，之后的同 key 事件不再并入之前的位置
+      其余事件按原顺序保留
+    - 合并后只有一个事件时按原事件名发送，多个事件打包成一个 batch_event 帧 {"events": [[事件, 数据], ...]}
+    - urgent 中的事件（测试开始/结束/出错）立即唤醒后台线程，不等下一个周期
+    - paused() 期间后台线程不发送（基准测试计时时不与提交线程争用），手动 flush() 照常
+    - group(data) 给出事件所属的分组（例如 run_id）时，另外按分组统计提交/合并的事件数和包含该组事件的帧数，
+      同时进行的多个运行各自读取自己的统计，互不清零
+
+本模块不依赖 Flask/SocketIO，发送函数由调用方传入。
+"""
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# event -> (key_fn(data), merge_fn(previous, new) -> merged)
+MergeRule = Tuple[Callable[[Any], Any], Callable[[Any, Any], Any]]
+
+
+class EventStream:
+    """按 rate_hz 合并、批量发送事件"""
+
+    def __init__(self, emit: Callable[[str, Any], None], rate_hz: float = 10.0,
+                 batch_event: str = "batch_update", latest_only: Iterable[str] = (),
+                 merge: Optional[Dict[str, MergeRule]] = None, urgent: Iterable[str] = (),
+                 barriers: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                 group: Optional[Callable[[Any], Any]] = None):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be positive")
+        self.emit = emit
+        self.interval = 1.0 / rate_hz
+        self.batch_event = batch_event
+        self.latest_only = set(latest_only)
+        self.merge = merge or {}
+        self.urgent = set(urgent)
+        self.barriers = barriers or {}
+        self._queue: deque = deque()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._paused = False
+        # 统计：提交的事件数、合并掉的事件数、实际发送的帧数
+        self.submitted = 0
+        self.coalesced = 0
+        self.frames = 0
+        # 分组 -> [提交的事件数, 合并掉的事件数, 包含该组事件的帧数]
+        self.group = group
+        self._group_stats: Dict[Any, List[int]] = {}
+
+    def submit(self, event: str, data: Any):
+        """放入队列（任何线程均可调用，不阻塞）"""
+        if self._thread is None:
+            self._start()
+        self._queue.append((event, data))
+        self.submitted += 1
+        if self.group is not None:
+            key = self.group(data)
+            if key is not None:
+                self._group_stats.setdefault(key, [0, 0, 0])[0] += 1
+        if event in self.urgent:
+            self._wake.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush(periodic=True)
+            except Exception as e:
+                print(f"Event stream flush failed: {e}")
+
+    def _drain(self) -> List[Tuple[str, Any]]:
+        events = []
+        while True:
+            try:
+                events.append(self._queue.popleft())
+            except IndexError:
+                return events
+
+    def _coalesce(self, events: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+        last_index: Dict[str, int] = {}
+        for i, (event, _) in enumerate(events):
+            if event in self.latest_only:
+                last_index[event] = i
+        merged: List[Optional[List[Any]]] = []
+        positions: Dict[Tuple[str, Any], int] = {}
+        for i, (event, data) in enumerate(events):
+            if event in self.latest_only and last_index[event] != i:
+                self._count_group(data, 1)
+                continue
+            barrier = self.barriers.get(event)
+            if barrier is not None:
+                key = barrier(data)
+                for merge_event in self.merge:
+                    positions.pop((merge_event, key), None)
+            rule = self.merge.get(event)
+            if rule is not None:
+                key = (event, rule[0](data))
+                if key in positions:
+                    slot = merged[positions[key]]
+                    slot[1] = rule[1](slot[1], data)
+                    self._count_group(data, 1)
+                    continue
+                positions[key] = len(merged)
+            merged.append([event, data])
+        self.coalesced += len(events) - len(merged)
+        return [(event, data) for event, data in merged]
+
+    @contextmanager
+    def paused(self):
+        """暂停后台线程的周期发送（例如基准测试计时期间），退出时恢复；期间仍可手动 flush()"""
+        with self._flush_lock:
+            # 等正在进行的发送结束后再暂停
+            self._paused = True
+        try:
+            yield self
+        finally:
+            self._paused = False
+            self._wake.set()
+
+    def _count_group(self, data: Any, field: int):
+        if self.group is not None:
+            key = self.group(data)
+            if key is not None:
+                self._group_stats.setdefault(key, [0, 0, 0])[field] += 1
+
+    def flush(self, periodic: bool = False):
+        """立即发送队列中的全部事件（后台线程周期调用 periodic=True，暂停期间跳过；也可在需要时手动调用）"""
+        with self._flush_lock:
+            if periodic and self._paused:
+                return
+            events = self._drain()
+            if not events:
+                return
+            events = self._coalesce(events)
+            if len(events) == 1:
+                self.emit(*events[0])
+            else:
+                self.emit(self.batch_event, {"events": [[event, data] for event, data in events]})
+            self.frames += 1
+            if self.group is not None:
+                for key in {self.group(data) for _, data in events} - {None}:
+                    self._group_stats.setdefault(key, [0, 0, 0])[2] += 1
+
+    def reset_stats(self):
+        self.submitted = self.coalesced = self.frames = 0
+        self._group_stats.clear()
+
+    def discard_group(self, key: Any):
+        """丢弃一个分组的统计（例如运行从登记表中移除时）"""
+        self._group_stats.pop(key, None)
+
+    def get_stats(self, group: Any = None) -> Dict[str, Any]:
+        """整体统计；指定 group 时为该分组的统计（pending 始终是整个队列的）"""
+        if group is None:
+            submitted, coalesced, frames = self.submitted, self.coalesced, self.frames
+        else:
+            submitted, coalesced, frames = self._group_stats.get(group, (0, 0, 0))
+        return {
+            "rate_hz": round(1.0 / self.interval, 3),
+            "submitted": submitted,
+            "coalesced": coalesced,
+            "frames": frames,
+            "pending": len(self._queue),
+        }
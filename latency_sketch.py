@@ -0,0 +1,282 @@
+"""
+流式延迟分位数：每轮结果到达时写入对数分桶直方图，报告和实时进度直接读取分位数
+
+以前每次生成报告都要从全部结果里重新筛选十几个列表并排序，导出 PDF/CSV/JSON 各算一遍，
+结果越多越慢。LatencyHistogram 按相对精度分桶（DDSketch 式对数桶）：
+    - 桶 i 覆盖 (gamma^(i-1), gamma^i]，gamma = (1 + alpha) / (1 - alpha)
+    - 任意分位数的估计值与真实值的相对误差不超过 alpha（默认 1%）
+    - 0.01ms ~ 120s 范围内最多约 800 个桶，与结果数量无关；min/max/sum 精确记录
+    - 两个直方图按桶相加即可合并（多进程分片、多次运行）
+
+MetricSketches 按报告中的指标名维护一组直方图，取值和过滤规则与报告一致；
+SERIES_METRICS 中的指标每轮有多个样本（例如句间间隔），逐个写入。
+
+本模块只依赖标准库。
+"""
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 小于该值（毫秒）的样本记入零桶
+MIN_TRACKABLE_MS = 0.01
+
+
+class LatencyHistogram:
+    """相对误差不超过 alpha 的可合并分位数直方图"""
+
+    __slots__ = ("alpha", "_gamma_log", "_buckets", "_zero", "count", "total", "min", "max")
+
+    def __init__(self, alpha: float = 0.01):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be in (0, 1)")
+        self.alpha = alpha
+        self._gamma_log = math.log((1 + alpha) / (1 - alpha))
+        self._buckets: Dict[int, int] = {}
+        self._zero = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float):
+        if value < MIN_TRACKABLE_MS:
+            self._zero += 1
+        else:
+            index = math.ceil(math.log(value) / self._gamma_log)
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.alpha != self.alpha:
+            raise ValueError("cannot merge histograms with different alpha")
+        for index, n in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + n
+        self._zero += other._zero
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def _value(self, index: int) -> float:
+        # 桶的中点（相对误差意义下），并限制在精确的 [min, max] 内
+        value = 2 * math.exp(index * self._gamma_log) / (1 + math.exp(self._gamma_log))
+        return min(max(value, self.min), self.max)
+
+    def percentiles(self, ratios: Iterable[float]) -> List[Optional[float]]:
+        """
+        一次遍历计算多个分位数（ratios 为 0~1，需升序）
+
+        秩与报告中 sorted_values[int(n * ratio)] 的取法相同
+        """
+        ratios = list(ratios)
+        if not self.count:
+            return [None] * len(ratios)
+        ranks = [min(int(self.count * r), self.count - 1) for r in ratios]
+        values: List[Optional[float]] = []
+        seen = self._zero
+        pending = iter(zip(ranks, ratios))
+        rank, _ = next(pending)
+        # 落在零桶内的分位数
+        while rank < seen:
+            values.append(self.min)
+            nxt = next(pending, None)
+            if nxt is None:
+                return values
+            rank = nxt[0]
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            while rank < seen:
+                values.append(self._value(index))
+                nxt = next(pending, None)
+                if nxt is None:
+                    return values
+                rank = nxt[0]
+        values.extend([self.max] * (len(ratios) - len(values)))
+        return values
+
+    def percentile(self, ratio: float) -> Optional[float]:
+        return self.percentiles([ratio])[0]
+
+    def get_stats(self) -> Optional[Dict[str, Any]]:
+        """与报告 calc_stats 相同的字段，没有样本时返回 None"""
+        if not self.count:
+            return None
+        median, p95, p99 = self.percentiles((0.5, 0.95, 0.99))
+        return {
+            "min": self.min,
+            "max": self.max,
+            "avg": self.total / self.count,
+            "median": median,
+            "p95": p95,
+            "p99": p99,
+            "count": self.count,
+        }
+
+
+def _bounded(key: str, upper: float) -> Callable[[Dict[str, Any]], Optional[float]]:
+    def extract(r: Dict[str, Any]) -> Optional[float]:
+        value = r.get(key)
+        return value if value is not None and 0 <= value <= upper else None
+    return extract
+
+
+def _e2e(r: Dict[str, Any]) -> Optional[float]:
+    value = r.get("e2e_from_first_frame") or r.get("e2e_response_time")
+    return value if value is not None and 0 <= value <= 120000 else None
+
+
+def _stt_from_first(r: Dict[str, Any]) -> Optional[float]:
+    value = r.get("stt_latency_from_first_frame") or r.get("stt_latency")
+    return value if value is not None and 0 <= value <= 60000 else None
+
+
+def _stt(r: Dict[str, Any]) -> Optional[float]:
+    # 优先使用从最后一帧计算的延迟（纯STT处理时间）
+    value = _bounded("stt_latency_from_last_frame", 60000)(r)
+    return value if value is not None else _stt_from_first(r)
+
+
+def _e2e_corrected(r: Dict[str, Any]) -> Optional[float]:
+    # 开放模型：派发延迟 + 端到端时间（协调遗漏修正）
+    e2e = _e2e(r)
+    lag = r.get("dispatch_lag_ms")
+    return e2e + lag if e2e is not None and lag is not None else None
+
+
+def _dispatch_lag(r: Dict[str, Any]) -> Optional[float]:
+    return r.get("dispatch_lag_ms")
+
+
+def _downlink(key: str) -> Callable[[Dict[str, Any]], Optional[float]]:
+    # 只统计收到了 TTS 音频的轮次（与 downlink_audio.DownlinkTotals 一致）
+    def extract(r: Dict[str, Any]) -> Optional[float]:
+        downlink = r.get("downlink_audio")
+        return downlink.get(key) if downlink and downlink.get("frames") else None
+    return extract
+
+
+def _pacing_lag(r: Dict[str, Any]) -> Optional[float]:
+    # 每次发送的平均节拍延迟（与 audio_pacer.PacingTotals 一致，只统计有帧的发送）
+    pacing = r.get("pacing")
+    return pacing.get("lag_avg_ms") if pacing and pacing.get("frames") else None
+
+
+def _cadence(source: str, key: str) -> Callable[[Dict[str, Any]], Any]:
+    def extract(r: Dict[str, Any]) -> Any:
+        cadence = (r.get("llm_cadence") or {}).get(source)
+        return cadence.get(key) if cadence else None
+    return extract
+
+
+def _queue_delays(r: Dict[str, Any]) -> Optional[List[float]]:
+    return (r.get("llm_cadence") or {}).get("queue_ms")
+
+
+# 报告 performance_metrics 中的指标名 -> 从单轮结果取值（无效值返回 None）
+METRICS: Dict[str, Callable[[Dict[str, Any]], Optional[float]]] = {
+    "send_duration": _bounded("send_duration", 60000),
+    "stt_latency": _stt,
+    "stt_latency_from_first_frame": _stt_from_first,
+    "stt_latency_from_last_frame": _bounded("stt_latency_from_last_frame", 60000),
+    "llm_latency": _bounded("llm_latency", 60000),
+    "tts_latency": _bounded("tts_latency", 10000),
+    "tts_duration": _bounded("tts_duration", 120000),
+    "e2e_response_time": _e2e,
+    "e2e_from_last_frame": _bounded("e2e_from_last_frame", 120000),
+    "e2e_from_stt": _bounded("e2e_from_stt", 120000),
+    "e2e_from_llm": _bounded("e2e_from_llm", 120000),
+    "dispatch_lag": _dispatch_lag,
+    "e2e_response_time_corrected": _e2e_corrected,
+    "tts_first_audio_latency": _bounded("tts_first_audio_latency", 60000),
+    "downlink_jitter": _downlink("jitter_ms"),
+    "downlink_rtf": _downlink("rtf"),           # 实时率，不是毫秒
+    "downlink_stall": _downlink("stall_ms"),    # 每轮模拟播放的总卡顿时长
+    "first_content_sentence_latency": _bounded("first_content_sentence_latency", 60000),
+    "llm_chars_per_sec": _cadence("llm", "chars_per_sec"),   # 字/秒，不是毫秒
+    "tts_chars_per_sec": _cadence("tts", "chars_per_sec"),
+    "pacing_stream_lag": _pacing_lag,
+}
+
+# 每轮有多个样本的指标（每个样本单独写入直方图）：指标名 -> 从单轮结果取值列表
+SERIES_METRICS: Dict[str, Callable[[Dict[str, Any]], Optional[List[float]]]] = {
+    "llm_sentence_gap": _cadence("llm", "gaps_ms"),
+    "tts_sentence_gap": _cadence("tts", "gaps_ms"),
+    "tts_queue_delay": _queue_delays,
+}
+
+# 同一个直方图在报告中以多个名字出现
+ALIASES = {"e2e_from_first_frame": "e2e_response_time"}
+
+# progress_update 中推送的实时分位数
+LIVE_METRICS = ("e2e_response_time", "stt_latency", "llm_latency", "tts_latency")
+
+
+class MetricSketches:
+    """
+    按指标名维护的一组直方图
+
+    测试线程写入、Flask 请求线程读取，读写都在锁内完成（单次写入是 O(1) 的）。
+    """
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.histograms = {name: LatencyHistogram(self.alpha) for name in (*METRICS, *SERIES_METRICS)}
+
+    def record(self, result: Dict[str, Any]):
+        """写入一轮结果"""
+        with self._lock:
+            self.count += 1
+            for name, extract in METRICS.items():
+                value = extract(result)
+                if value is not None:
+                    self.histograms[name].record(value)
+            for name, extract in SERIES_METRICS.items():
+                histogram = self.histograms[name]
+                for value in extract(result) or ():
+                    histogram.record(value)
+
+    def merge(self, other: "MetricSketches"):
+        with self._lock:
+            self.count += other.count
+            for name, histogram in other.histograms.items():
+                self.histograms[name].merge(histogram)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]], alpha: float = 0.01) -> "MetricSketches":
+        sketches = cls(alpha)
+        for r in results:
+            sketches.record(r)
+        return sketches
+
+    def performance_metrics(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        """报告 performance_metrics：每个指标的 min/max/avg/median/p95/p99/count（没有样本时为 None）"""
+        with self._lock:
+            metrics = {name: h.get_stats() for name, h in self.histograms.items()}
+        for alias, name in ALIASES.items():
+            metrics[alias] = metrics[name]
+        return metrics
+
+    def live(self, names: Tuple[str, ...] = LIVE_METRICS) -> Dict[str, Dict[str, Any]]:
+        """实时分位数 {指标: {p50, p95, p99, count}}，只包含已有样本的指标"""
+        live = {}
+        with self._lock:
+            for name in names:
+                histogram = self.histograms[name]
+                if histogram.count:
+                    p50, p95, p99 = histogram.percentiles((0.5, 0.95, 0.99))
+                    live[name] = {"p50": round(p50, 1), "p95": round(p95, 1), "p99": round(p99, 1),
+                                  "count": histogram.count}
+        return live
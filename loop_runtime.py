@@ -0,0 +1,166 @@
+"""
+压测端事件循环：可选 uvloop，以及事件循环调度延迟（loop lag）采样
+
+高并发时尾延迟变大，可能是服务器慢，也可能是压测端自己的事件循环已经饱和：
+回调排队等待执行，收到的消息晚了很久才被打上时间戳。LoopLagMonitor 每隔固定间隔
+在事件循环上挂一个定时回调，记录它实际被执行的时间比计划晚了多少（调度延迟）。
+调度延迟的 P99 接近或超过被测延迟的量级时，说明压测端本身是瓶颈，报告中的延迟不可信。
+
+uvloop 是可选依赖（不支持 Windows），未安装时回退到标准 asyncio 事件循环。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import asyncio
+from array import array
+from typing import Any, Coroutine, Dict, List, Optional
+
+try:
+    import uvloop
+except ImportError:   # 可选依赖
+    uvloop = None
+
+
+def uvloop_available() -> bool:
+    return uvloop is not None
+
+
+def new_event_loop(use_uvloop: bool = False) -> asyncio.AbstractEventLoop:
+    """创建事件循环：use_uvloop 且已安装 uvloop 时使用 uvloop，否则使用标准事件循环"""
+    if use_uvloop and uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def loop_implementation(loop: Optional[asyncio.AbstractEventLoop] = None) -> str:
+    """事件循环实现名称（"uvloop" 或 "asyncio"），写入报告便于对比"""
+    loop = loop or asyncio.get_running_loop()
+    return "uvloop" if type(loop).__module__.startswith("uvloop") else "asyncio"
+
+
+def run(main: Coroutine, use_uvloop: bool = False) -> Any:
+    """与 asyncio.run 相同，但可以选择 uvloop"""
+    loop = new_event_loop(use_uvloop)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def _percentile(sorted_values, ratio: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * ratio), len(sorted_values) - 1)]
+
+
+class LoopLagMonitor:
+    """
+    事件循环调度延迟采样器
+
+    每 interval_ms 挂一个 call_at 回调，记录 实际执行时间 - 计划时间。
+    样本数超过 max_samples 时隔一取一并把采样步长加倍，内存有上限，长时间运行也保留整体分布。
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 interval_ms: float = 10.0, max_samples: int = 100_000):
+        self.loop = loop or asyncio.get_running_loop()
+        self.interval = interval_ms / 1000.0
+        self.max_samples = max_samples
+        self._samples = array("d")
+        self._stride = 1          # 每 _stride 个样本保留一个
+        self._tick_count = 0
+        self._count = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self._expected: Optional[float] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running(self) -> bool:
+        return self._handle is not None
+
+    def start(self):
+        if self._handle is None:
+            self._schedule(self.loop.time())
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self, now: float):
+        self._expected = now + self.interval
+        self._handle = self.loop.call_at(self._expected, self._tick)
+
+    def _tick(self):
+        now = self.loop.time()
+        lag_ms = max(0.0, (now - self._expected) * 1000)
+        self._count += 1
+        self._sum_ms += lag_ms
+        if lag_ms > self._max_ms:
+            self._max_ms = lag_ms
+        self._tick_count += 1
+        if self._tick_count >= self._stride:
+            self._tick_count = 0
+            self._samples.append(lag_ms)
+            if len(self._samples) >= self.max_samples:
+                self._samples = self._samples[::2]
+                self._stride *= 2
+        # 下一次从现在开始计时：一次长时间阻塞只记为一个大样本，不会补发一串样本
+        self._schedule(now)
+
+    def get_stats(self, warn_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        调度延迟统计（毫秒）
+
+        Args:
+            warn_ms: P99 超过该值时 harness_saturated=True（压测端可能是瓶颈）
+        """
+        stats: Dict[str, Any] = {
+            "loop": loop_implementation(self.loop),
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self._count,
+        }
+        if not self._count:
+            return stats
+        sorted_lags = sorted(self._samples)
+        stats.update({
+            "lag_avg_ms": round(self._sum_ms / self._count, 3),
+            "lag_p50_ms": round(_percentile(sorted_lags, 0.50), 3),
+            "lag_p95_ms": round(_percentile(sorted_lags, 0.95), 3),
+            "lag_p99_ms": round(_percentile(sorted_lags, 0.99), 3),
+            "lag_max_ms": round(self._max_ms, 3),
+        })
+        if warn_ms is not None:
+            stats["warn_ms"] = warn_ms
+            stats["harness_saturated"] = stats["lag_p99_ms"] >= warn_ms
+        return stats
+
+
+def summarize_loop_lag(lag_stats: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """汇总多个事件循环（多进程分片）的调度延迟：分位数取最差的一个循环，没有数据时返回 None"""
+    lag_stats = [s for s in lag_stats if s and s.get("samples")]
+    if not lag_stats:
+        return None
+    total = sum(s["samples"] for s in lag_stats)
+    summary = {
+        "loop": lag_stats[0]["loop"],
+        "loops": len(lag_stats),
+        "interval_ms": lag_stats[0]["interval_ms"],
+        "samples": total,
+        "lag_avg_ms": round(sum(s["lag_avg_ms"] * s["samples"] for s in lag_stats) / total, 3),
+    }
+    for key in ("lag_p50_ms", "lag_p95_ms", "lag_p99_ms", "lag_max_ms"):
+        summary[key] = max(s[key] for s in lag_stats)
+    if any("harness_saturated" in s for s in lag_stats):
+        summary["warn_ms"] = lag_stats[0].get("warn_ms")
+        summary["harness_saturated"] = any(s.get("harness_saturated") for s in lag_stats)
+    return summary
@@ -0,0 +1,478 @@
+"""
+本地模拟设备服务器：实现 WebSocketClient 使用的 auth / stt / llm / tts 协议，延迟、错误率和容量可配置
+
+压测端自身的性能工作（帧加载、消息处理、报告、并发调度）以前都必须连接真实的 ws_server，
+结果受服务器负载和网络影响，也无法离线回归。MockDeviceServer 按真实服务器的消息顺序应答：
+    - 连接建立后经过 auth 延迟下发 auth（code 0 + session_id），按 auth_fail_rate 返回 auth_failed
+    - start_listen 开始一轮并接收二进制 Opus 包；stop_listen 结束输入（realtime 模式下为静音 vad_silence_ms）
+    - 经过 stt 延迟下发 stt 和 llm（情绪），随后 tts start + 垫话句（"好嘞，请稍等"）并流式发送 TTS 音频帧，
+      同时计算 LLM 首句延迟，到时逐句下发 sentence_start / 音频帧 / sentence_end，最后 tts stop
+    - 新的 start_listen 打断上一轮还未发完的应答（与设备打断 TTS 一致）
+    - 延迟按分布描述（const / uniform / normal / lognormal / exp，见 parse_latency）；
+      每个连接使用由 seed 和连接序号确定的随机序列，同一 seed 下服务器行为可以复现
+    - 错误注入：stt_empty_rate（识别为空）、stall_rate（stt 后不再应答）、disconnect_rate（stt 后断开）
+    - 容量限制：max_connections（超出时以 1013 关闭新连接）、max_active_turns（超出的轮次排队，
+      排队超过 queue_timeout_ms 的轮次被丢弃，不再应答）
+
+用法：
+    python mock_server.py --port 8765 --stt-latency lognormal:400,0.3 --llm-latency lognormal:900,0.4
+    WS_SERVER_HOST=ws://127.0.0.1:8765 python test_inquiries.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import uuid
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from config import Config
+
+DISTRIBUTIONS = ("const", "uniform", "normal", "lognormal", "exp")
+
+
+class LatencyModel(NamedTuple):
+    """延迟分布（毫秒）：const(a)、uniform(a, b)、normal(均值 a, 标准差 b)、lognormal(中位数 a, sigma b)、exp(均值 a)"""
+
+    kind: str
+    a: float
+    b: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        """采样一次延迟（毫秒，不小于 0）"""
+        if self.kind == "const":
+            value = self.a
+        elif self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "normal":
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = self.a * math.exp(rng.gauss(0.0, self.b))
+        else:
+            value = rng.expovariate(1.0 / self.a) if self.a > 0 else 0.0
+        return max(value, 0.0)
+
+    def describe(self) -> str:
+        if self.kind in ("const", "exp"):
+            return f"{self.kind}:{self.a:g}"
+        return f"{self.kind}:{self.a:g},{self.b:g}"
+
+
+def parse_latency(spec: Any) -> LatencyModel:
+    """
+    "400" / "const:400"、"uniform:200,600"、"normal:400,50"、"lognormal:400,0.3"、"exp:400"
+
+    格式不正确时抛出 ValueError
+    """
+    if isinstance(spec, LatencyModel):
+        return spec
+    if isinstance(spec, (int, float)):
+        return LatencyModel("const", float(spec))
+    kind, _, params = str(spec).strip().partition(":")
+    if not params:
+        kind, params = "const", kind
+    if kind not in DISTRIBUTIONS:
+        raise ValueError(f"unknown latency distribution {kind!r}, expected one of {', '.join(DISTRIBUTIONS)}")
+    try:
+        values = [float(v) for v in params.split(",")]
+    except ValueError:
+        raise ValueError(f"invalid latency spec {spec!r}")
+    expected = 1 if kind in ("const", "exp") else 2
+    if len(values) != expected or any(v < 0 for v in values):
+        raise ValueError(f"latency spec {spec!r} needs {expected} non-negative value(s)")
+    if kind == "uniform" and values[1] < values[0]:
+        raise ValueError(f"latency spec {spec!r}: upper bound is below lower bound")
+    return LatencyModel(kind, *values)
+
+
+LATENCY_FIELDS = ("auth_latency", "stt_latency", "llm_latency", "sentence_gap", "tts_first_audio")
+RATE_FIELDS = ("auth_fail_rate", "stt_empty_rate", "stall_rate", "disconnect_rate")
+
+
+def tts_frame(frame_ms: int, size: int) -> bytes:
+    """
+    模拟的 TTS 音频帧：TOC 字节标明 frame_ms 的时长（SILK 宽带，客户端按 TOC 计算下行音频时长），
+    其余字节为填充，只模拟大小（不能解码）
+
+    frame_ms 为 10/20/40/60 时是单帧包，其余 10 的倍数（<=120）用 code 3 的多帧包
+    """
+    silk_wb = {10: 8, 20: 9, 40: 10, 60: 11}   # 帧长 -> SILK 宽带 config
+    if frame_ms in silk_wb:
+        header = bytes([silk_wb[frame_ms] << 3])
+    else:
+        unit = 20 if frame_ms % 20 == 0 else 10
+        header = bytes([silk_wb[unit] << 3 | 3, frame_ms // unit])
+    return header + bytes(max(size - len(header), 0))
+
+
+class MockServerSettings(NamedTuple):
+    """模拟服务器的行为设置（延迟单位为毫秒，比例为 0~1）"""
+
+    host: str = "127.0.0.1"
+    port: int = 8765
+    seed: int = 0
+    # 延迟分布
+    auth_latency: LatencyModel = LatencyModel("const", 20)
+    stt_latency: LatencyModel = LatencyModel("lognormal", 300, 0.3)      # stop_listen -> stt
+    llm_latency: LatencyModel = LatencyModel("lognormal", 800, 0.4)      # stt -> 第一句回复（垫话句之后）
+    sentence_gap: LatencyModel = LatencyModel("lognormal", 150, 0.5)     # 回复句子之间的生成间隔
+    tts_first_audio: LatencyModel = LatencyModel("const", 30)            # sentence_start -> 第一帧音频
+    # 应答内容
+    stt_text: str = "我想了解一下这个产品"
+    filler: str = "好嘞，请稍等"                                          # 垫话句，为空时不发送
+    reply: Tuple[str, ...] = ("您好，这款产品目前有货。", "价格是一百二十八元。", "需要我帮您下单吗？")
+    # TTS 音频：每帧 tts_frame_ms 毫秒、tts_frame_bytes 字节，每个字 tts_ms_per_char 毫秒；
+    # tts_speed 为发送速度相对实时的倍数，0 表示不限速
+    tts_frame_ms: int = 60
+    tts_frame_bytes: int = 120
+    tts_ms_per_char: float = 180.0
+    tts_speed: float = 1.0
+    # realtime 模式（服务端 VAD）下，最后一帧后静音多久视为说完
+    vad_silence_ms: float = 800.0
+    # 错误注入
+    auth_fail_rate: float = 0.0
+    stt_empty_rate: float = 0.0
+    stall_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    check_sign: bool = False          # 按 Config.calculate_sign 校验 URL 中的 sign
+    # 容量限制（0 表示不限制）
+    max_connections: int = 0
+    max_active_turns: int = 0
+    queue_timeout_ms: float = 0.0     # 轮次排队超时（超时的轮次不再应答），0 表示一直等待
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "MockServerSettings":
+        """从字典创建（延迟可以是 parse_latency 接受的字符串），未知字段或取值无效时抛出 ValueError"""
+        unknown = set(values) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"unknown mock server settings: {', '.join(sorted(unknown))}")
+        values = dict(values)
+        for name in LATENCY_FIELDS:
+            if name in values:
+                values[name] = parse_latency(values[name])
+        if "reply" in values:
+            values["reply"] = tuple(values["reply"])
+        settings = cls(**values)
+        for name in RATE_FIELDS:
+            if not 0.0 <= getattr(settings, name) <= 1.0:
+                raise ValueError(f"{name} must be between 0 and 1")
+        if settings.stall_rate + settings.disconnect_rate > 1.0:
+            raise ValueError("stall_rate + disconnect_rate must not exceed 1")
+        if settings.tts_frame_ms % 10 or not 10 <= settings.tts_frame_ms <= 120:
+            raise ValueError("tts_frame_ms must be a multiple of 10 between 10 and 120 (an Opus packet duration)")
+        if settings.tts_speed < 0:
+            raise ValueError("tts_speed must be non-negative")
+        return settings
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = self._asdict()
+        for name in LATENCY_FIELDS:
+            values[name] = values[name].describe()
+        values["reply"] = list(self.reply)
+        return values
+
+
+class MockDeviceServer:
+    """模拟设备服务器：每个连接一个 _MockSession，统计连接、轮次和错误"""
+
+    def __init__(self, settings: Optional[MockServerSettings] = None):
+        self.settings = settings or MockServerSettings()
+        self._server = None
+        self._conn_ids = itertools.count(1)
+        self._turn_slots: Optional[asyncio.Semaphore] = None
+        self.port = self.settings.port
+        self.active_connections = 0
+        self.active_turns = 0
+        self.stats = dict.fromkeys((
+            "connections", "peak_connections", "rejected", "auth_failed", "turns", "completed_turns",
+            "interrupted_turns", "stt_empty", "stalled", "disconnected", "busy", "audio_frames_in",
+            "audio_frames_out"), 0)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.settings.host}:{self.port}"
+
+    async def start(self) -> "MockDeviceServer":
+        """开始监听（port 为 0 时使用系统分配的端口，见 self.port）"""
+        if self.settings.max_active_turns > 0:
+            self._turn_slots = asyncio.Semaphore(self.settings.max_active_turns)
+        self._server = await websockets.serve(self._handle, self.settings.host, self.settings.port, max_size=None)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockDeviceServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, active_connections=self.active_connections, active_turns=self.active_turns)
+
+    async def _handle(self, websocket):
+        conn_id = next(self._conn_ids)
+        limit = self.settings.max_connections
+        if limit and self.active_connections >= limit:
+            self.stats["rejected"] += 1
+            await websocket.close(1013, "server busy")
+            return
+        self.active_connections += 1
+        self.stats["connections"] += 1
+        self.stats["peak_connections"] = max(self.stats["peak_connections"], self.active_connections)
+        # 随机序列只由 seed 和连接序号决定，同样的连接顺序得到同样的延迟和错误
+        session = _MockSession(self, websocket, random.Random(f"{self.settings.seed}:{conn_id}"))
+        try:
+            await session.run()
+        except ConnectionClosed:
+            pass
+        finally:
+            await session.cancel_response()
+            self.active_connections -= 1
+
+
+class _MockSession:
+    """一个设备连接：鉴权、接收音频、按轮次应答"""
+
+    def __init__(self, server: MockDeviceServer, websocket, rng: random.Random):
+        self.server = server
+        self.settings = server.settings
+        self.ws = websocket
+        self.rng = rng
+        self.session_id = uuid.uuid4().hex
+        self.listening = False
+        self.realtime = False
+        self.frames = 0
+        self.last_frame_at = 0.0
+        self._response: Optional[asyncio.Task] = None
+        self._vad: Optional[asyncio.Task] = None
+        self._tts_frame = tts_frame(self.settings.tts_frame_ms, self.settings.tts_frame_bytes)
+
+    def _query(self) -> Dict[str, str]:
+        request = getattr(self.ws, "request", None)
+        path = request.path if request is not None else getattr(self.ws, "path", "")
+        return {key: values[0] for key, values in parse_qs(urlparse(path).query).items()}
+
+    async def _send(self, message: Dict[str, Any]):
+        message["session_id"] = self.session_id
+        await self.ws.send(json.dumps(message, ensure_ascii=False))
+
+    async def _sleep(self, model: LatencyModel):
+        delay = model.sample(self.rng)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+    async def run(self):
+        await self._sleep(self.settings.auth_latency)
+        query = self._query()
+        sn = query.get("sn", "")
+        bad_sign = self.settings.check_sign and query.get("sign") != Config.calculate_sign(sn)
+        if bad_sign or self.rng.random() < self.settings.auth_fail_rate:
+            self.server.stats["auth_failed"] += 1
+            await self._send({"type": "auth", "code": -1, "msg": "auth_failed"})
+            await self.ws.close()
+            return
+        await self._send({"type": "auth", "code": 0, "msg": "auth_success"})
+
+        async for message in self.ws:
+            if isinstance(message, bytes):
+                if self.listening:
+                    self.frames += 1
+                    self.last_frame_at = asyncio.get_running_loop().time()
+                    self.server.stats["audio_frames_in"] += 1
+                    if self.realtime and self._vad is None:
+                        self._vad = asyncio.create_task(self._watch_silence())
+                continue
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            msg_type = data.get("type")
+            if msg_type == "start_listen":
+                await self._start_listen(data.get("data") or {})
+            elif msg_type == "stop_listen":
+                self._stop_listen()
+            elif msg_type == "cancel_listen":
+                self.listening = False
+                await self.cancel_response()
+            # heartbeat / enter_vad / change_role 等消息不需要应答
+
+    async def _start_listen(self, options: Dict[str, Any]):
+        # 新一轮开始：打断上一轮还未发完的应答
+        await self.cancel_response()
+        self.listening = True
+        self.realtime = options.get("mode") == "realtime"
+        self.frames = 0
+
+    def _stop_listen(self):
+        if not self.listening:
+            return
+        self.listening = False
+        if self._vad is not None:
+            self._vad.cancel()
+            self._vad = None
+        self._response = asyncio.create_task(self._respond())
+
+    async def _watch_silence(self):
+        """realtime 模式：最后一帧后静音 vad_silence_ms 视为说完"""
+        loop = asyncio.get_running_loop()
+        silence = self.settings.vad_silence_ms / 1000.0
+        while self.listening:
+            remaining = self.last_frame_at + silence - loop.time()
+            if remaining <= 0:
+                self._vad = None
+                self._stop_listen()
+                return
+            await asyncio.sleep(remaining)
+
+    async def cancel_response(self):
+        for task in (self._vad, self._response):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, ConnectionClosed):
+                    pass
+        self._vad = self._response = None
+
+    async def _respond(self):
+        stats = self.server.stats
+        stats["turns"] += 1
+        slots = self.server._turn_slots
+        if slots is not None:
+            timeout = self.settings.queue_timeout_ms / 1000.0 or None
+            try:
+                await asyncio.wait_for(slots.acquire(), timeout)
+            except asyncio.TimeoutError:
+                stats["busy"] += 1
+                return
+        self.server.active_turns += 1
+        try:
+            await self._respond_turn()
+        except asyncio.CancelledError:
+            stats["interrupted_turns"] += 1
+            raise
+        finally:
+            self.server.active_turns -= 1
+            if slots is not None:
+                slots.release()
+
+    async def _respond_turn(self):
+        settings, stats = self.settings, self.server.stats
+        loop = asyncio.get_running_loop()
+        await self._sleep(settings.stt_latency)
+        if self.rng.random() < settings.stt_empty_rate:
+            stats["stt_empty"] += 1
+            await self._send({"type": "stt", "text": ""})
+            await self._send({"type": "tts", "state": "stop"})
+            return
+        await self._send({"type": "stt", "text": settings.stt_text})
+
+        failure = self.rng.random()
+        if failure < settings.stall_rate:
+            stats["stalled"] += 1
+            return
+        if failure < settings.stall_rate + settings.disconnect_rate:
+            stats["disconnected"] += 1
+            await self.ws.close(1011, "mock disconnect")
+            return
+
+        # 第一句回复的延迟从 stt 开始计算，垫话句播放期间同时在"生成"
+        llm_ready_at = loop.time() + settings.llm_latency.sample(self.rng) / 1000.0
+        await self._send({"type": "llm", "text": "", "emotion": "neutral"})
+        await self._send({"type": "tts", "state": "start"})
+        if settings.filler:
+            await self._speak(settings.filler)
+        delay = llm_ready_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        for i, sentence in enumerate(settings.reply):
+            if i:
+                await self._sleep(settings.sentence_gap)
+            await self._speak(sentence)
+        await self._send({"type": "tts", "state": "stop"})
+        stats["completed_turns"] += 1
+
+    async def _speak(self, text: str):
+        """下发一句：sentence_start、按 tts_speed 节奏发送音频帧、sentence_end"""
+        settings = self.settings
+        await self._send({"type": "tts", "state": "sentence_start", "text": text})
+        await self._sleep(settings.tts_first_audio)
+        frame_count = max(1, math.ceil(len(text) * settings.tts_ms_per_char / settings.tts_frame_ms))
+        interval = settings.tts_frame_ms / 1000.0 / settings.tts_speed if settings.tts_speed > 0 else 0.0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i in range(frame_count):
+            # 按绝对截止时间发送，发送耗时不累积
+            delay = start + i * interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.ws.send(self._tts_frame)
+        self.server.stats["audio_frames_out"] += frame_count
+        await self._send({"type": "tts", "state": "sentence_end"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock device server speaking the auth/stt/llm/tts protocol")
+    defaults = MockServerSettings()
+    parser.add_argument("--host", default=None, help=f"监听地址（默认 {defaults.host}）")
+    parser.add_argument("--port", type=int, default=None, help=f"监听端口（默认 {defaults.port}，0 表示自动分配）")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--profile", default=None, help="JSON文件，字段同 MockServerSettings，命令行参数优先")
+    for name in LATENCY_FIELDS:
+        parser.add_argument("--" + name.replace("_", "-"), default=None,
+                            help=f"延迟分布（默认 {getattr(defaults, name).describe()}）")
+    for name in RATE_FIELDS:
+        parser.add_argument("--" + name.replace("_", "-"), type=float, default=None, help="比例 0~1（默认 0）")
+    parser.add_argument("--stt-text", default=None)
+    parser.add_argument("--filler", default=None, help="垫话句，传空字符串表示不发送")
+    parser.add_argument("--reply", action="append", default=None, help="回复句子（可多次指定）")
+    parser.add_argument("--tts-speed", type=float, default=None, help="TTS 发送速度相对实时的倍数，0 表示不限速")
+    parser.add_argument("--tts-ms-per-char", type=float, default=None)
+    parser.add_argument("--check-sign", action="store_true", default=None, help="校验 URL 中的 sign")
+    parser.add_argument("--max-connections", type=int, default=None)
+    parser.add_argument("--max-active-turns", type=int, default=None)
+    parser.add_argument("--queue-timeout-ms", type=float, default=None)
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="打印统计的间隔（秒），0 表示不打印")
+    args = parser.parse_args()
+
+    values: Dict[str, Any] = {}
+    if args.profile:
+        with open(args.profile, "r", encoding="utf-8") as f:
+            values.update(json.load(f))
+    for name in MockServerSettings._fields:
+        value = getattr(args, name, None)
+        if value is not None:
+            values[name] = value
+    try:
+        settings = MockServerSettings.from_dict(values)
+    except ValueError as e:
+        parser.error(str(e))
+
+    async def serve():
+        async with MockDeviceServer(settings) as server:
+            print(f"Mock device server listening on {server.url}")
+            print(json.dumps(settings.to_dict(), ensure_ascii=False))
+            while True:
+                await asyncio.sleep(args.stats_interval or 3600)
+                if args.stats_interval:
+                    print(json.dumps(server.get_stats()))
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
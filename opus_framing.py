@@ -0,0 +1,263 @@
+"""
+Opus 数据包分帧：在一次线性扫描内得到每个 Opus 包的边界
+
+裸 Opus 数据包首尾相接写入文件后，包边界信息就丢失了，只能靠反复试解码来猜。
+这里定义一个长度前缀格式（Length-Prefixed Opus）保存包边界：
+
+    magic "OPLP" (4 bytes)
+    重复：包长度 (2 bytes, big-endian) + Opus 包数据
+
+读取时只需按长度依次切分，不需要解码器。
+旧的试解码分割方法保留为 split_opus_packets_by_decoding()，仅作为无分帧信息时的回退方案。
+
+Ogg Opus 容器（以 OggS 开头）由 demux_ogg_opus() 在进程内直接解析出原始 Opus 包：
+校验每页 CRC，拼接跨页的续包，跳过 OpusHead/OpusTags 头部包，不启动子进程、不写临时文件。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import struct
+from typing import List, Optional
+
+# Ogg 页面头：capture_pattern, version, header_type, granule_pos, serial, sequence, crc, page_segments
+_OGG_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+_OGG_CONTINUED = 0x01
+_OGG_BOS = 0x02
+
+
+def _build_ogg_crc_table() -> List[int]:
+    """Ogg 使用的 CRC-32（多项式 0x04C11DB7，非反射，初值 0）查表"""
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC_TABLE = _build_ogg_crc_table()
+
+
+class OggDemuxError(ValueError):
+    """Ogg 容器格式错误（页面损坏、CRC 不匹配、不是 Opus 流等）"""
+
+
+# 长度前缀格式的文件头
+LENGTH_PREFIXED_MAGIC = b"OPLP"
+_LENGTH_STRUCT = struct.Struct(">H")
+MAX_LENGTH_PREFIXED_PACKET = 0xFFFF
+
+
+def is_length_prefixed_opus(data: bytes) -> bool:
+    """判断数据是否为长度前缀格式"""
+    return data[:4] == LENGTH_PREFIXED_MAGIC
+
+
+def pack_length_prefixed_opus(packets: List[bytes]) -> bytes:
+    """将 Opus 包列表打包为长度前缀格式"""
+    parts = [LENGTH_PREFIXED_MAGIC]
+    for packet in packets:
+        if not packet or len(packet) > MAX_LENGTH_PREFIXED_PACKET:
+            raise ValueError(f"Invalid Opus packet size: {len(packet)} bytes")
+        parts.append(_LENGTH_STRUCT.pack(len(packet)))
+        parts.append(bytes(packet))
+    return b"".join(parts)
+
+
+def parse_length_prefixed_opus(data: bytes, max_packet_size: Optional[int] = None) -> Optional[List[bytes]]:
+    """
+    解析长度前缀格式，返回 Opus 包列表
+
+    单次线性扫描；格式不合法（magic 不对、长度越界、末尾有残留字节）时返回 None
+    """
+    if not is_length_prefixed_opus(data):
+        return None
+
+    view = memoryview(data)
+    total = len(data)
+    offset = len(LENGTH_PREFIXED_MAGIC)
+    packets = []
+
+    while offset < total:
+        if offset + 2 > total:
+            return None
+        (size,) = _LENGTH_STRUCT.unpack_from(view, offset)
+        offset += 2
+        if size == 0 or offset + size > total:
+            return None
+        if max_packet_size is not None and size > max_packet_size:
+            return None
+        packets.append(bytes(view[offset:offset + size]))
+        offset += size
+
+    return packets
+
+
+def split_opus_packets_by_decoding(opus_data: bytes, sample_rate: int = 16000, channels: int = 1,
+                                   frame_duration_ms: int = 60, min_size: int = 20,
+                                   max_size: int = 400, max_attempts: int = 500) -> List[bytes]:
+    """
+    回退方案：逐个尝试包长度并用解码器验证，猜测裸 Opus 数据的包边界
+
+    每个包最多要尝试 (max_size - min_size) 次解码，只应在没有分帧信息时使用。
+    opuslib 不可用时抛出 ImportError，由调用方处理。
+    """
+    import opuslib
+    decoder = opuslib.Decoder(sample_rate, channels)
+    frame_size = int(sample_rate * frame_duration_ms / 1000)
+
+    frames = []
+    offset = 0
+    consumed = 0  # 已分割出的包的总字节数
+    attempt = 0
+    total = len(opus_data)
+
+    while offset < total and attempt < max_attempts:
+        attempt += 1
+        found = False
+
+        for try_size in range(min_size, min(max_size, total - offset + 1)):
+            packet = opus_data[offset:offset + try_size]
+            try:
+                pcm = decoder.decode(packet, frame_size)
+            except Exception:
+                # 解码失败，继续尝试更大的包大小
+                continue
+            if len(pcm) > 0:
+                frames.append(packet)
+                offset += try_size
+                consumed += try_size
+                found = True
+                break
+
+        if not found:
+            # 找不到有效包，跳过一个字节重新对齐；跳过太多则放弃
+            offset += 1
+            if offset >= total or offset - consumed > 50:
+                break
+
+    return frames
+
+
+def ogg_page_crc(page: bytes) -> int:
+    """计算 Ogg 页面 CRC（调用方需先把 checksum 字段清零）"""
+    crc = 0
+    table = _OGG_CRC_TABLE
+    for byte in page:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+
+def demux_ogg_opus(data: bytes, verify_crc: bool = True) -> List[bytes]:
+    """
+    从 Ogg Opus 容器中提取原始 Opus 音频包（不重新编码）
+
+    - 只解析第一个逻辑流（按第一个 BOS 页的 serial），其它流的页面忽略
+    - 段长度为 255 表示包在下一段继续，可能跨越页面；续页需带 continued 标志
+    - 前两个包必须是 OpusHead 和 OpusTags（OpusTags 可能跨页），不计入结果
+    格式不合法时抛出 OggDemuxError
+    """
+    view = memoryview(data)
+    total = len(data)
+    offset = 0
+    serial = None
+    expected_sequence = None
+    pending = []      # 未结束的包（跨页）的分段
+    packets = []
+    header_packets = 0
+
+    while offset < total:
+        if offset + _OGG_PAGE_HEADER.size > total:
+            raise OggDemuxError(f"Truncated Ogg page header at offset {offset}")
+        (capture, version, header_type, _granule, page_serial,
+         sequence, checksum, segment_count) = _OGG_PAGE_HEADER.unpack_from(view, offset)
+        if capture != b"OggS" or version != 0:
+            raise OggDemuxError(f"Invalid Ogg page at offset {offset}")
+
+        table_start = offset + _OGG_PAGE_HEADER.size
+        body_start = table_start + segment_count
+        if body_start > total:
+            raise OggDemuxError(f"Truncated segment table at offset {offset}")
+        segments = view[table_start:body_start]
+        page_end = body_start + sum(segments)
+        if page_end > total:
+            raise OggDemuxError(f"Truncated Ogg page body at offset {offset}")
+
+        if verify_crc:
+            page = bytearray(view[offset:page_end])
+            page[22:26] = b"\x00\x00\x00\x00"
+            if ogg_page_crc(page) != checksum:
+                raise OggDemuxError(f"Ogg page CRC mismatch at offset {offset} (sequence {sequence})")
+
+        if serial is None:
+            if not header_type & _OGG_BOS:
+                raise OggDemuxError("Ogg stream does not start with a BOS page")
+            serial = page_serial
+        if page_serial != serial:
+            # 复用流中的其它逻辑流
+            offset = page_end
+            continue
+
+        if expected_sequence is not None and sequence != expected_sequence:
+            raise OggDemuxError(f"Ogg page sequence gap: expected {expected_sequence}, got {sequence}")
+        expected_sequence = sequence + 1
+
+        continued = bool(header_type & _OGG_CONTINUED)
+        if pending and not continued:
+            raise OggDemuxError(f"Ogg page {sequence} missing continued flag for an unfinished packet")
+        if continued and not pending:
+            raise OggDemuxError(f"Ogg page {sequence} continues a packet that was never started")
+
+        pos = body_start
+        for size in segments:
+            pending.append(view[pos:pos + size])
+            pos += size
+            if size < 255:
+                packet = b"".join(pending)
+                pending = []
+                if header_packets == 0:
+                    if packet[:8] != b"OpusHead":
+                        raise OggDemuxError("First Ogg packet is not OpusHead")
+                    header_packets += 1
+                elif header_packets == 1:
+                    if packet[:8] != b"OpusTags":
+                        raise OggDemuxError("Second Ogg packet is not OpusTags")
+                    header_packets += 1
+                elif packet:
+                    packets.append(packet)
+
+        offset = page_end
+
+    if pending:
+        raise OggDemuxError("Ogg stream ends in the middle of a packet")
+    if header_packets < 2:
+        raise OggDemuxError("Ogg stream is missing OpusHead/OpusTags headers")
+    return packets
+
+
+def opus_packet_duration_ms(packet: bytes) -> float:
+    """
+    根据 TOC 字节计算 Opus 包的音频时长（毫秒，RFC 6716 3.1 节）
+
+    包为空或格式不完整时返回 0
+    """
+    if not packet:
+        return 0.0
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame_ms = (10, 20, 40, 60)[config & 3]     # SILK-only
+    elif config < 16:
+        frame_ms = (10, 20)[config & 1]             # Hybrid
+    else:
+        frame_ms = (2.5, 5, 10, 20)[config & 3]     # CELT-only
+    code = toc & 3
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        if len(packet) < 2:
+            return 0.0
+        frames = packet[1] & 0x3F
+    return frame_ms * frames
@@ -0,0 +1,397 @@
+"""
+开放模型到达调度：按目标到达率（而不是"上一轮结束就发下一轮"）派发对话
+
+闭环模式下每个连接做完一轮立刻做下一轮，服务器越慢发起的请求越少，
+测出来的 QPS 取决于服务器延迟本身。开放模型按预先生成的到达时间表派发：
+    - constant: 固定速率 rate（次/秒）
+    - poisson:  平均速率 rate 的泊松到达（指数分布间隔）
+    - ramp:     从 start_rate 线性增加到 end_rate
+    - step:     从 start_rate 开始，每 step_sec 秒增加 step_rate（阶梯）
+    - spike:    基础速率 rate，在 [spike_start_sec, spike_start_sec + spike_sec) 内为 spike_rate
+所有曲线都有 duration_sec（持续时间），并可用 poisson=true 把确定性到达换成同速率曲线下的泊松到达。
+
+到达时刻到了就把这一轮派给一个空闲（已鉴权、当前没有对话）的连接；没有空闲连接时等待，
+等待的时间记为派发延迟（dispatch lag）。派发延迟会加回到该轮的延迟上（协调遗漏修正，
+coordinated omission）：用户在计划时刻就"说话"了，压测端晚发出去的那段时间也算在响应时间里。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import asyncio
+import math
+import random
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from audio_pacer import get_pacer
+
+PROFILES = ("constant", "poisson", "ramp", "step", "spike")
+
+
+def _percentile(sorted_values, ratio: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * ratio), len(sorted_values) - 1)]
+
+
+class ArrivalProfile:
+    """到达率曲线：rate_at(t) 给出第 t 秒的目标到达率（次/秒）"""
+
+    name = "constant"
+
+    def __init__(self, duration_sec: float, poisson: bool = False):
+        if duration_sec <= 0:
+            raise ValueError("duration_sec must be positive")
+        self.duration = float(duration_sec)
+        self.poisson = poisson
+
+    def rate_at(self, t: float) -> float:
+        raise NotImplementedError
+
+    def max_rate(self) -> float:
+        raise NotImplementedError
+
+    def expected_count(self) -> int:
+        """整个曲线的期望到达次数（按 0.1 秒步长数值积分）"""
+        step = 0.1
+        steps = int(math.ceil(self.duration / step))
+        total = sum(self.rate_at(min(i * step + step / 2, self.duration)) * step for i in range(steps))
+        return int(round(total))
+
+    def arrivals(self, rng: Optional[random.Random] = None) -> Iterator[float]:
+        """依次生成到达时刻（相对开始的秒数）"""
+        if self.poisson:
+            yield from self._poisson_arrivals(rng or random.Random())
+        else:
+            yield from self._uniform_arrivals()
+
+    def _uniform_arrivals(self) -> Iterator[float]:
+        # 累积到达率每跨过一个整数生成一次到达（第一次在速率大于 0 的起点），
+        # 按 10ms 分段积分，段内速率视为不变，曲线变化时间隔随之变化
+        step = 0.01
+        t = 0.0
+        accumulated = 0.0
+        k = 0
+        while t < self.duration:
+            seg = min(step, self.duration - t)
+            rate = self.rate_at(t + seg / 2)
+            end_accumulated = accumulated + rate * seg
+            while k < end_accumulated:
+                offset = t + (k - accumulated) / rate
+                if offset >= self.duration - 1e-9:   # 浮点累积误差，不在结束时刻多生成一次
+                    return
+                yield offset
+                k += 1
+            accumulated = end_accumulated
+            t += seg
+
+    def _poisson_arrivals(self, rng: random.Random) -> Iterator[float]:
+        # 非齐次泊松过程：按最大速率生成候选点，再以 rate(t)/max_rate 的概率保留（thinning）
+        max_rate = self.max_rate()
+        if max_rate <= 0:
+            return
+        t = 0.0
+        while True:
+            t += rng.expovariate(max_rate)
+            if t >= self.duration:
+                return
+            if rng.random() * max_rate <= self.rate_at(t):
+                yield t
+
+    def describe(self) -> Dict[str, Any]:
+        return {"profile": self.name, "duration_sec": self.duration, "poisson": self.poisson,
+                "expected_arrivals": self.expected_count()}
+
+
+class ConstantRate(ArrivalProfile):
+    name = "constant"
+
+    def __init__(self, rate: float, duration_sec: float, poisson: bool = False):
+        super().__init__(duration_sec, poisson)
+        self.rate = float(rate)
+
+    def rate_at(self, t: float) -> float:
+        return self.rate
+
+    def max_rate(self) -> float:
+        return self.rate
+
+    def expected_count(self) -> int:
+        return int(round(self.rate * self.duration))
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(super().describe(), profile="poisson" if self.poisson else "constant", rate=self.rate)
+
+
+class LinearRamp(ArrivalProfile):
+    name = "ramp"
+
+    def __init__(self, start_rate: float, end_rate: float, duration_sec: float, poisson: bool = False):
+        super().__init__(duration_sec, poisson)
+        self.start_rate = float(start_rate)
+        self.end_rate = float(end_rate)
+
+    def rate_at(self, t: float) -> float:
+        return self.start_rate + (self.end_rate - self.start_rate) * min(t / self.duration, 1.0)
+
+    def max_rate(self) -> float:
+        return max(self.start_rate, self.end_rate)
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(super().describe(), start_rate=self.start_rate, end_rate=self.end_rate)
+
+
+class StepStairs(ArrivalProfile):
+    name = "step"
+
+    def __init__(self, start_rate: float, step_rate: float, step_sec: float, duration_sec: float,
+                 poisson: bool = False):
+        super().__init__(duration_sec, poisson)
+        if step_sec <= 0:
+            raise ValueError("step_sec must be positive")
+        self.start_rate = float(start_rate)
+        self.step_rate = float(step_rate)
+        self.step_sec = float(step_sec)
+
+    def rate_at(self, t: float) -> float:
+        return max(0.0, self.start_rate + self.step_rate * int(t // self.step_sec))
+
+    def max_rate(self) -> float:
+        return max(self.rate_at(0.0), self.rate_at(self.duration - 1e-9))
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(super().describe(), start_rate=self.start_rate, step_rate=self.step_rate,
+                    step_sec=self.step_sec)
+
+
+class Spike(ArrivalProfile):
+    name = "spike"
+
+    def __init__(self, rate: float, spike_rate: float, spike_start_sec: float, spike_sec: float,
+                 duration_sec: float, poisson: bool = False):
+        super().__init__(duration_sec, poisson)
+        self.rate = float(rate)
+        self.spike_rate = float(spike_rate)
+        self.spike_start = float(spike_start_sec)
+        self.spike_end = self.spike_start + float(spike_sec)
+
+    def rate_at(self, t: float) -> float:
+        return self.spike_rate if self.spike_start <= t < self.spike_end else self.rate
+
+    def max_rate(self) -> float:
+        return max(self.rate, self.spike_rate)
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(super().describe(), rate=self.rate, spike_rate=self.spike_rate,
+                    spike_start_sec=self.spike_start, spike_sec=self.spike_end - self.spike_start)
+
+
+def _truthy(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def build_profile(spec: Dict[str, Any], scale: float = 1.0) -> ArrivalProfile:
+    """
+    由设置字典创建到达曲线，例如 {"profile": "ramp", "start_rate": 1, "end_rate": 20, "duration_sec": 60}
+
+    Args:
+        scale: 所有速率乘以该系数（多进程分片时每个分片承担 1/N 的到达率）
+
+    Raises:
+        ValueError: 曲线名称未知或参数缺失/非法
+    """
+    name = str(spec.get("profile", "constant")).lower()
+
+    def number(key: str, default: Optional[float] = None) -> float:
+        value = spec.get(key, default)
+        if value is None:
+            raise ValueError(f"arrival profile '{name}' requires '{key}'")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"arrival profile parameter '{key}' must be a number")
+        if value < 0:
+            raise ValueError(f"arrival profile parameter '{key}' must not be negative")
+        return value
+
+    duration = number("duration_sec")
+    poisson = _truthy(spec.get("poisson", False))
+    if name == "constant":
+        return ConstantRate(number("rate") * scale, duration, poisson)
+    if name == "poisson":
+        return ConstantRate(number("rate") * scale, duration, poisson=True)
+    if name == "ramp":
+        return LinearRamp(number("start_rate", 0) * scale, number("end_rate") * scale, duration, poisson)
+    if name == "step":
+        return StepStairs(number("start_rate") * scale, number("step_rate") * scale, number("step_sec"),
+                          duration, poisson)
+    if name == "spike":
+        return Spike(number("rate") * scale, number("spike_rate") * scale, number("spike_start_sec"),
+                     number("spike_sec"), duration, poisson)
+    raise ValueError(f"unknown arrival profile '{name}', expected one of: {', '.join(PROFILES)}")
+
+
+def parse_profile_spec(text: str) -> Optional[Dict[str, Any]]:
+    """
+    解析环境变量形式的曲线设置："ramp:start_rate=1,end_rate=20,duration_sec=60"
+
+    空字符串返回 None（使用闭环模式）
+    """
+    text = (text or "").strip()
+    if not text:
+        return None
+    name, _, params = text.partition(":")
+    spec: Dict[str, Any] = {"profile": name.strip().lower()}
+    for part in params.split(","):
+        if not part.strip():
+            continue
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"invalid arrival profile parameter '{part}' (expected key=value)")
+        spec[key.strip()] = value.strip()
+    return spec
+
+
+class Arrival:
+    """一次计划到达：seq 从 0 开始，offset 为计划时刻（相对开始的秒数）"""
+
+    __slots__ = ("seq", "offset", "scheduled", "dispatched", "item")
+
+    def __init__(self, seq: int, offset: float, scheduled: float, item: Any = None):
+        self.seq = seq
+        self.offset = offset
+        self.scheduled = scheduled      # loop.time() 时间
+        self.dispatched: Optional[float] = None
+        self.item = item
+
+    @property
+    def lag_ms(self) -> float:
+        """派发延迟：实际派发时间 - 计划时间（毫秒）"""
+        if self.dispatched is None:
+            return 0.0
+        return max(0.0, (self.dispatched - self.scheduled) * 1000)
+
+    def annotate(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """把计划时刻和派发延迟写入结果（报告据此做协调遗漏修正）"""
+        result["arrival_seq"] = self.seq
+        result["scheduled_offset_ms"] = round(self.offset * 1000, 3)
+        result["dispatch_lag_ms"] = round(self.lag_ms, 3)
+        return result
+
+
+class OpenLoopDispatcher:
+    """
+    按到达曲线把对话派发给空闲连接
+
+    run_turn(client, arrival) 执行一轮对话；完成后连接回到空闲池（已断开的连接不再使用）。
+    没有空闲连接时等待，等待时间计入该次到达的派发延迟。
+    """
+
+    def __init__(self, profile: ArrivalProfile, clients: List[Any],
+                 run_turn: Callable[[Any, Arrival], Awaitable[Any]],
+                 items: Optional[List[Any]] = None, max_arrivals: Optional[int] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 late_tolerance_ms: float = 10.0, seed: Optional[int] = None):
+        self.profile = profile
+        self.clients = list(clients)
+        self.run_turn = run_turn
+        self.items = items or []
+        self.max_arrivals = max_arrivals
+        self.should_stop = should_stop or (lambda: False)
+        self.late_tolerance_ms = late_tolerance_ms
+        self.rng = random.Random(seed)
+        self.arrivals: List[Arrival] = []
+        self.stopped = False  # 测试停止或所有连接断开，提前结束
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+
+    async def run(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        pacer = get_pacer()
+        idle: asyncio.Queue = asyncio.Queue()
+        for client in self.clients:
+            idle.put_nowait(client)
+        alive = len(self.clients)
+        in_flight = set()
+
+        async def turn(client, arrival: Arrival):
+            nonlocal alive
+            try:
+                await self.run_turn(client, arrival)
+            finally:
+                if getattr(client, "is_connected", True):
+                    idle.put_nowait(client)
+                else:
+                    alive -= 1
+                    if alive == 0:
+                        idle.put_nowait(None)   # 唤醒等待空闲连接的派发循环
+
+        self.start_time = loop.time()
+        for seq, offset in enumerate(self.profile.arrivals(self.rng)):
+            if self.max_arrivals is not None and seq >= self.max_arrivals:
+                break
+            scheduled = self.start_time + offset
+            if scheduled > loop.time():
+                await pacer.wait_until(scheduled)
+            client = await idle.get() if alive > 0 else None
+            if client is None or self.should_stop():
+                # 测试停止或所有连接都已断开：剩余的计划到达不再派发
+                if client is not None:
+                    idle.put_nowait(client)
+                self.stopped = True
+                break
+            item = self.items[seq % len(self.items)] if self.items else None
+            arrival = Arrival(seq, offset, scheduled, item)
+            arrival.dispatched = loop.time()
+            self.arrivals.append(arrival)
+            task = asyncio.ensure_future(turn(client, arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        self.end_time = loop.time()
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """派发统计：计划/实际到达数、达成速率、派发延迟分布"""
+        stats: Dict[str, Any] = dict(self.profile.describe())
+        stats.update({
+            "connections": len(self.clients),
+            "dispatched": len(self.arrivals),
+            "stopped_early": self.stopped,
+            "late_tolerance_ms": self.late_tolerance_ms,
+        })
+        if self.start_time is not None and self.arrivals:
+            span = max(self.arrivals[-1].dispatched - self.start_time, self.profile.duration)
+            stats["achieved_rate"] = round(len(self.arrivals) / span, 3)
+            lags = sorted(a.lag_ms for a in self.arrivals)
+            stats.update({
+                "late": sum(1 for lag in lags if lag > self.late_tolerance_ms),
+                "lag_avg_ms": round(sum(lags) / len(lags), 3),
+                "lag_p50_ms": round(_percentile(lags, 0.50), 3),
+                "lag_p95_ms": round(_percentile(lags, 0.95), 3),
+                "lag_p99_ms": round(_percentile(lags, 0.99), 3),
+                "lag_max_ms": round(lags[-1], 3),
+            })
+        return stats
+
+
+def merge_dispatch_stats(stats_list: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """合并多个分片的派发统计（分位数取最差分片），没有数据时返回 None"""
+    stats_list = [s for s in stats_list if s]
+    if not stats_list:
+        return None
+    merged = dict(stats_list[0])
+    for key in ("connections", "dispatched", "late", "expected_arrivals", "achieved_rate"):
+        merged[key] = sum(s.get(key, 0) for s in stats_list)
+    merged["stopped_early"] = any(s.get("stopped_early") for s in stats_list)
+    for key in ("rate", "start_rate", "end_rate", "step_rate", "spike_rate"):
+        if key in merged:
+            merged[key] = round(sum(s.get(key, 0) for s in stats_list), 3)
+    dispatched = merged["dispatched"]
+    if dispatched:
+        merged["lag_avg_ms"] = round(sum(s.get("lag_avg_ms", 0) * s.get("dispatched", 0)
+                                         for s in stats_list) / dispatched, 3)
+        for key in ("lag_p50_ms", "lag_p95_ms", "lag_p99_ms", "lag_max_ms"):
+            merged[key] = max(s.get(key, 0) for s in stats_list)
+    merged["achieved_rate"] = round(merged["achieved_rate"], 3)
+    return merged
@@ -8,6 +8,13 @@ import time
 from typing import Optional, List
 from logger import Logger
 from config import Config
+from opus_framing import (
+    OggDemuxError,
+    demux_ogg_opus,
+    is_length_prefixed_opus,
+    parse_length_prefixed_opus,
+    split_opus_packets_by_decoding,
+)
 
 class AudioEncoder:
     """音频编码器类（使用外部工具进行 TTS 和 Opus 编码）"""
@@ -83,9 +90,9 @@ class AudioEncoder:
             
             # 检查是否是 Ogg Opus 容器格式（以 OggS 开头）
             if opus_data[:4] == b'OggS':
-                # 这是 Ogg 容器格式，需要使用 ffmpeg 转换
-                self.logger.info("Detected Ogg Opus container, converting with ffmpeg...")
-                frames = self._convert_ogg_opus_to_frames(file_path)
+                # 这是 Ogg 容器格式，在进程内直接解析出原始 Opus 包
+                self.logger.info("Detected Ogg Opus container, demuxing packets...")
+                frames = self._convert_ogg_opus_to_frames(file_path, opus_data)
                 
                 # 关键：从Ogg容器提取的原始Opus包必须逐个发送，不能合并！
                 # 因为服务器端的 decoder.decode() 只能解码单个Opus包
@@ -107,6 +114,14 @@ class AudioEncoder:
                 
                 return frames
             
+            # 长度前缀格式：包边界已知，一次线性扫描即可分帧
+            if is_length_prefixed_opus(opus_data):
+                frames = parse_length_prefixed_opus(opus_data, Config.MAX_OPUS_PACKET_SIZE)
+                if frames:
+                    self.logger.info(f"Detected length-prefixed Opus packets: {len(frames)} packets, {len(opus_data)} bytes")
+                    return frames
+                self.logger.warning("Malformed length-prefixed Opus data, falling back to packet splitting")
+            
             # 否则，假设是裸 Opus 数据包
             # 讯飞TTS返回的 Opus 数据是连续的裸数据包
             self.logger.info(f"Detected raw Opus packets, size: {len(opus_data)} bytes")
@@ -116,82 +131,8 @@ class AudioEncoder:
             # 2. 服务器使用 @discordjs/opus 的 decoder.decode(binaryData) 解码
             # 3. decoder.decode() 只能解码单个Opus包，不能解码连续的多个包
             # 4. 设备每次 SendAudio() 对应一个WebSocket消息，每个消息是一个独立的Opus包
-            # 5. 所以需要将连续的Opus数据分割为多个独立的Opus包，每个包作为一个独立的WebSocket消息发送
-            
-            # 方案：使用Opus解码器智能分割连续的Opus数据为多个独立的包
-            try:
-                import opuslib
-                decoder = opuslib.Decoder(Config.AUDIO_SAMPLE_RATE, Config.AUDIO_CHANNELS)
-                frame_size = int(Config.AUDIO_SAMPLE_RATE * Config.OPUS_FRAME_DURATION_MS / 1000)
-                
-                frames = []
-                offset = 0
-                max_attempts = 500  # 增加尝试次数
-                attempt = 0
-                
-                self.logger.info(f"Attempting intelligent Opus packet splitting for {len(opus_data)} bytes...")
-                
-                while offset < len(opus_data) and attempt < max_attempts:
-                    attempt += 1
-                    found = False
-                    
-                    # 尝试从最小包大小（通常20字节）开始，逐步增加
-                    # Opus包大小范围：通常20-400字节
-                    for try_size in range(20, min(400, len(opus_data) - offset + 1), 1):
-                        if offset + try_size > len(opus_data):
-                            break
-                        
-                        try:
-                            packet = opus_data[offset:offset + try_size]
-                            # 尝试解码，验证这是否是一个有效的Opus包
-                            pcm = decoder.decode(packet, frame_size)
-                            
-                            # 验证解码结果：
-                            # 1. 必须有PCM数据输出
-                            # 2. PCM数据大小应该合理（至少大于0，通常应该是几百到几千字节）
-                            # 3. 对于有效的Opus包，解码后应该有一定量的PCM数据
-                            # 验证解码结果：只要解码成功且返回PCM数据，就认为是一个有效的Opus包
-                            # Opus包大小可变，解码后的PCM大小也取决于帧大小
-                            # 对于16kHz单声道：
-                            #   - 20ms帧 = 320 samples = 640 bytes PCM
-                            #   - 60ms帧 = 960 samples = 1920 bytes PCM
-                            # 我们接受任何有效的解码结果（至少应该有PCM数据）
-                            if len(pcm) > 0:
-                                # 找到有效的Opus包边界
-                                frames.append(packet)
-                                offset += try_size
-                                found = True
-                                break
-                        except Exception:
-                            # 解码失败，继续尝试更大的包大小
-                            continue
-                    
-                    if not found:
-                        # 如果找不到有效包，可能数据有问题，尝试跳过少量字节
-                        offset += 1
-                        if offset >= len(opus_data) or offset - (sum(len(f) for f in frames)) > 50:
-                            break
-                
-                if frames:
-                    total_split = sum(len(f) for f in frames)
-                    self.logger.info(
-                        f"Split audio into {len(frames)} independent Opus packets "
-                        f"(total {total_split}/{len(opus_data)} bytes, {total_split/len(opus_data)*100:.1f}% coverage)"
-                    )
-                    return frames
-                else:
-                    # 如果分割失败，回退到单帧方案（虽然可能不正确）
-                    self.logger.warning("Failed to split Opus packets, sending as single frame (may cause decode errors)")
-                    return [opus_data]
-                    
-            except ImportError:
-                # 如果没有opuslib，回退到单帧方案
-                self.logger.warning("opuslib not available, sending entire audio as single frame (may cause decode errors)")
-                return [opus_data]
-            except Exception as e:
-                # 任何错误都回退到单帧方案
-                self.logger.warning(f"Error during packet splitting: {e}, sending as single frame (may cause decode errors)")
-                return [opus_data]
+            # 5. 所以需要将连续的Opus数据分割为多个独立的包，每个包作为一个独立的WebSocket消息发送
+            return self._split_opus_packets(opus_data)
             
         except Exception as e:
             self.logger.error(f"Failed to load audio file: {e}")
@@ -199,59 +140,51 @@ class AudioEncoder:
             self.logger.info("Attempting to convert with ffmpeg...")
             return self._convert_with_ffmpeg(file_path)
     
-    def _convert_ogg_opus_to_frames(self, file_path: str) -> Optional[List[bytes]]:
+    def _convert_ogg_opus_to_frames(self, file_path: str, ogg_data: Optional[bytes] = None) -> Optional[List[bytes]]:
         """
         从 Ogg Opus 容器中提取原始 Opus 数据包（不重新编码）
         
-        由于Ogg格式解析复杂且容易出错，直接使用已验证的PCM重新编码方法
-        这样可以确保生成的Opus包格式正确，能被服务器端正确解码
+        使用进程内的 Ogg 解析器（校验 CRC、拼接跨页包、跳过 OpusHead/OpusTags），
+        不启动子进程、不写临时文件；只有容器损坏时才回退到 ffmpeg 重新编码
         
         注意：从Ogg容器提取的原始Opus包必须逐个发送，不能合并！
         因为服务器端的 decoder.decode() 只能解码单个Opus包
         """
-        # 直接使用已验证的PCM重新编码方法，确保生成的Opus包格式正确
-        # 虽然这不是"原始"包，但至少能保证可解码性
-        self.logger.info("Converting Ogg Opus to PCM and re-encoding to raw Opus packets...")
-        return self._convert_with_ffmpeg(file_path)
+        try:
+            if ogg_data is None:
+                with open(file_path, 'rb') as f:
+                    ogg_data = f.read()
+            frames = demux_ogg_opus(ogg_data)
+        except (OSError, OggDemuxError) as e:
+            self.logger.warning(f"Failed to demux Ogg Opus container ({e}), falling back to ffmpeg re-encoding")
+            return self._convert_with_ffmpeg(file_path)
+        
+        if not frames:
+            self.logger.warning(f"Ogg Opus container has no audio packets: {file_path}")
+            return None
+        
+        self.logger.info(f"Demuxed {len(frames)} Opus packets from Ogg container ({len(ogg_data)} bytes)")
+        return frames
     
     def _split_opus_packets(self, opus_data: bytes) -> Optional[List[bytes]]:
-        """使用 opuslib 智能分割连续的 Opus 数据为多个独立的包"""
+        """
+        分割连续的 Opus 数据为多个独立的包
+
+        优先使用长度前缀格式（一次线性扫描）；没有分帧信息时才回退到逐长度试解码
+        """
+        if is_length_prefixed_opus(opus_data):
+            frames = parse_length_prefixed_opus(opus_data, Config.MAX_OPUS_PACKET_SIZE)
+            if frames:
+                return frames
+        
         try:
-            import opuslib
-            decoder = opuslib.Decoder(Config.AUDIO_SAMPLE_RATE, Config.AUDIO_CHANNELS)
-            frame_size = int(Config.AUDIO_SAMPLE_RATE * Config.OPUS_FRAME_DURATION_MS / 1000)
-            
-            frames = []
-            offset = 0
-            max_attempts = 500
-            attempt = 0
-            
-            self.logger.info(f"Attempting intelligent Opus packet splitting for {len(opus_data)} bytes...")
-            
-            while offset < len(opus_data) and attempt < max_attempts:
-                attempt += 1
-                found = False
-                
-                for try_size in range(20, min(400, len(opus_data) - offset + 1), 1):
-                    if offset + try_size > len(opus_data):
-                        break
-                    
-                    try:
-                        packet = opus_data[offset:offset + try_size]
-                        pcm = decoder.decode(packet, frame_size)
-                        
-                        if len(pcm) > 0:
-                            frames.append(packet)
-                            offset += try_size
-                            found = True
-                            break
-                    except Exception:
-                        continue
-                
-                if not found:
-                    offset += 1
-                    if offset >= len(opus_data) or offset - (sum(len(f) for f in frames)) > 50:
-                        break
+            self.logger.info(f"No framing information, falling back to trial-decode splitting for {len(opus_data)} bytes...")
+            frames = split_opus_packets_by_decoding(
+                opus_data,
+                sample_rate=Config.AUDIO_SAMPLE_RATE,
+                channels=Config.AUDIO_CHANNELS,
+                frame_duration_ms=Config.OPUS_FRAME_DURATION_MS
+            )
             
             if frames:
                 total_split = sum(len(f) for f in frames)
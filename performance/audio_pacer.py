@@ -0,0 +1,201 @@
+"""
+共享音频节拍器：按绝对截止时间为所有连接释放音频帧
+
+持续输入模式（AUDIO_SEND_MODE="continuous"）原来在每帧之间 await asyncio.sleep(interval)，
+每帧都会累积发送耗时和调度延迟，高并发时 3 秒的语音要花明显超过 3 秒才能发完；
+而且每个连接各自维护一个定时器。
+
+这里每个事件循环只有一个 AudioPacer：所有连接的下一帧截止时间放在同一个最小堆里，
+只挂一个 loop.call_at 定时器，到期时一次性释放所有到期的帧。
+第 i 帧的截止时间固定为 start + i * interval（绝对时间），某一帧发晚了不会推迟后续帧，
+发送耗时不会累积成漂移。每个流记录每帧的节拍延迟（实际恢复发送时间 - 截止时间）。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+from typing import Dict, List, Optional
+
+# call_at 允许提前一个时钟分辨率触发，释放时用同样的容差判断到期
+_CLOCK_RESOLUTION = time.get_clock_info("monotonic").resolution
+
+
+class PacedStream:
+    """一个连接一次发送的帧节拍（第 i 帧的截止时间为 start + i * interval）"""
+
+    __slots__ = ("_pacer", "interval", "start", "index", "lags_ms", "_last_release")
+
+    def __init__(self, pacer: "AudioPacer", interval_ms: float, start: float):
+        self._pacer = pacer
+        self.interval = interval_ms / 1000.0
+        self.start = start
+        self.index = 0
+        self.lags_ms: List[float] = []
+        self._last_release: Optional[float] = None
+
+    async def next_frame(self) -> float:
+        """等待下一帧的截止时间（第一帧立即返回），返回本帧的节拍延迟（毫秒）"""
+        deadline = self.start + self.index * self.interval
+        self.index += 1
+        loop = self._pacer.loop
+        if deadline > loop.time():
+            await self._pacer.wait_until(deadline)
+        now = loop.time()
+        lag_ms = max(0.0, (now - deadline) * 1000)
+        self.lags_ms.append(lag_ms)
+        self._last_release = now
+        self._pacer.record_lag(lag_ms)
+        return lag_ms
+
+    def get_stats(self) -> Dict[str, float]:
+        """本次发送的节拍统计：实际用时与理论用时之差即为累积漂移"""
+        lags = self.lags_ms
+        if not lags:
+            return {"frames": 0}
+        sorted_lags = sorted(lags)
+        expected_ms = (len(lags) - 1) * self.interval * 1000
+        actual_ms = (self._last_release - self.start) * 1000
+        return {
+            "frames": len(lags),
+            "interval_ms": round(self.interval * 1000, 3),
+            "lag_avg_ms": round(sum(lags) / len(lags), 3),
+            "lag_p95_ms": round(sorted_lags[min(int(len(sorted_lags) * 0.95), len(sorted_lags) - 1)], 3),
+            "lag_max_ms": round(sorted_lags[-1], 3),
+            "expected_duration_ms": round(expected_ms, 3),
+            "actual_duration_ms": round(actual_ms, 3),
+            "drift_ms": round(actual_ms - expected_ms, 3),
+        }
+
+
+class AudioPacer:
+    """按绝对截止时间释放等待者的共享定时器（最小堆 + 单个 call_at）"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop or asyncio.get_running_loop()
+        self._heap: List[tuple] = []   # (deadline, seq, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_deadline: Optional[float] = None
+        self.released = 0
+        self.max_lag_ms = 0.0
+        self._lag_sum_ms = 0.0
+
+    def stream(self, interval_ms: float) -> PacedStream:
+        """为一次发送创建帧节拍，第一帧的截止时间为当前时刻"""
+        return PacedStream(self, interval_ms, self.loop.time())
+
+    def wait_until(self, deadline: float) -> asyncio.Future:
+        """返回在 deadline（loop.time() 时间）到达时完成的 future"""
+        future = self.loop.create_future()
+        heapq.heappush(self._heap, (deadline, next(self._seq), future))
+        if self._timer_deadline is None or deadline < self._timer_deadline:
+            self._arm(deadline)
+        return future
+
+    def _arm(self, deadline: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = self.loop.call_at(deadline, self._release_due)
+
+    def _release_due(self):
+        """释放所有已到期的等待者，并把定时器挂到下一个截止时间"""
+        self._timer = None
+        self._timer_deadline = None
+        heap = self._heap
+        horizon = self.loop.time() + _CLOCK_RESOLUTION
+        while heap and heap[0][0] <= horizon:
+            _, _, future = heapq.heappop(heap)
+            if not future.done():   # 发送方可能已被取消
+                future.set_result(None)
+        if heap:
+            self._arm(heap[0][0])
+
+    def record_lag(self, lag_ms: float):
+        self.released += 1
+        self._lag_sum_ms += lag_ms
+        if lag_ms > self.max_lag_ms:
+            self.max_lag_ms = lag_ms
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "released_frames": self.released,
+            "pending_frames": len(self._heap),
+            "lag_avg_ms": round(self._lag_sum_ms / self.released, 3) if self.released else 0.0,
+            "lag_max_ms": round(self.max_lag_ms, 3),
+        }
+
+
+# 每个事件循环一个共享节拍器
+_pacers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AudioPacer]" = weakref.WeakKeyDictionary()
+
+
+def get_pacer() -> AudioPacer:
+    """获取当前事件循环的共享节拍器（不存在时创建）"""
+    loop = asyncio.get_running_loop()
+    pacer = _pacers.get(loop)
+    if pacer is None:
+        pacer = AudioPacer(loop)
+        _pacers[loop] = pacer
+    return pacer
+
+
+class PacingTotals:
+    """
+    多次发送的节拍统计的累计值（用于报告，每次发送 O(1) 更新）
+
+    各次发送平均节拍延迟的分布由 latency_sketch 的直方图（pacing_stream_lag）记录，这里只保留总和与最大值。
+    """
+
+    def __init__(self):
+        self.streams = 0
+        self.frames = 0
+        self.lag_sum_ms = 0.0      # 按帧数加权的平均延迟之和
+        self.lag_max_ms = 0.0
+        self.drift_sum_ms = 0.0
+        self.drift_max_ms: Optional[float] = None
+
+    def add(self, stats: Optional[Dict[str, float]]):
+        """累计一次发送的 PacedStream 统计（没有帧的忽略）"""
+        if not stats or not stats.get("frames"):
+            return
+        self.streams += 1
+        self.frames += stats["frames"]
+        self.lag_sum_ms += stats["lag_avg_ms"] * stats["frames"]
+        self.lag_max_ms = max(self.lag_max_ms, stats["lag_max_ms"])
+        self.drift_sum_ms += stats["drift_ms"]
+        if self.drift_max_ms is None or stats["drift_ms"] > self.drift_max_ms:
+            self.drift_max_ms = stats["drift_ms"]
+
+    def summary(self, stream_lag: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+        """汇总（见 summarize_pacing）；stream_lag 为 pacing_stream_lag 直方图的统计，没有数据时返回 None"""
+        if not self.streams:
+            return None
+        return {
+            "streams": self.streams,
+            "frames": self.frames,
+            "lag_avg_ms": round(self.lag_sum_ms / self.frames, 3),
+            "lag_p95_of_stream_avg_ms": round(stream_lag["p95"], 3) if stream_lag else 0.0,
+            "lag_max_ms": round(self.lag_max_ms, 3),
+            "drift_avg_ms": round(self.drift_sum_ms / self.streams, 3),
+            "drift_max_ms": round(self.drift_max_ms, 3),
+        }
+
+
+def summarize_pacing(pacing_stats: List[Dict[str, float]],
+                     stream_lag: Optional[Dict[str, float]] = None) -> Optional[Dict[str, float]]:
+    """
+    汇总多次发送的节拍统计（用于报告），没有数据时返回 None
+
+    stream_lag 为各次发送平均延迟的直方图统计（报告中来自 latency_sketch）；未提供时从 pacing_stats 排序计算
+    """
+    totals = PacingTotals()
+    for stats in pacing_stats:
+        totals.add(stats)
+    if stream_lag is None and totals.streams:
+        avg_lags = sorted(p["lag_avg_ms"] for p in pacing_stats if p and p.get("frames"))
+        stream_lag = {"p95": avg_lags[min(int(len(avg_lags) * 0.95), len(avg_lags) - 1)]}
+    return totals.summary(stream_lag)
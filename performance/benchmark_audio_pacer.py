@@ -0,0 +1,73 @@
+"""
+持续输入模式发帧节拍对比：逐帧 asyncio.sleep(interval)（旧） vs 共享节拍器按绝对截止时间释放（新）
+
+用法：
+    python benchmark_audio_pacer.py [--streams N] [--frames F] [--interval-ms MS] [--work-us US]
+
+模拟 N 个连接同时发送 F 帧音频，每帧发送耗时用 --work-us 微秒的 CPU 忙等代替 websocket.send。
+输出每种方式下各流的实际发送时长相对理论时长 (F-1)*interval 的漂移，以及节拍器的逐帧节拍延迟。
+"""
+import time
+import asyncio
+import argparse
+
+from audio_pacer import get_pacer, summarize_pacing
+
+
+def busy_wait(us: float):
+    end = time.perf_counter() + us / 1e6
+    while time.perf_counter() < end:
+        pass
+
+
+async def sleep_stream(frames: int, interval_ms: float, work_us: float) -> float:
+    """旧方式：每帧之后 sleep 固定间隔，返回漂移（毫秒）"""
+    start = time.perf_counter()
+    for i in range(frames):
+        busy_wait(work_us)
+        if i < frames - 1:
+            await asyncio.sleep(interval_ms / 1000.0)
+    return (time.perf_counter() - start) * 1000 - (frames - 1) * interval_ms
+
+
+async def paced_stream(frames: int, interval_ms: float, work_us: float) -> dict:
+    """新方式：共享节拍器按绝对截止时间释放，返回该流的节拍统计"""
+    pacing = get_pacer().stream(interval_ms)
+    for _ in range(frames):
+        await pacing.next_frame()
+        busy_wait(work_us)
+    return pacing.get_stats()
+
+
+def describe(drifts: list) -> str:
+    drifts = sorted(drifts)
+    return (f"drift avg {sum(drifts) / len(drifts):8.1f}ms  "
+            f"p95 {drifts[int(len(drifts) * 0.95)]:8.1f}ms  max {drifts[-1]:8.1f}ms")
+
+
+async def run(args):
+    drifts = await asyncio.gather(*(sleep_stream(args.frames, args.interval_ms, args.work_us) for _ in range(args.streams)))
+    print(f"{'sleep per frame':<18} {describe(drifts)}")
+
+    stats = await asyncio.gather(*(paced_stream(args.frames, args.interval_ms, args.work_us) for _ in range(args.streams)))
+    print(f"{'shared pacer':<18} {describe([s['drift_ms'] for s in stats])}")
+    summary = summarize_pacing(stats)
+    print(f"{'':<18} frame lag avg {summary['lag_avg_ms']:.1f}ms  max {summary['lag_max_ms']:.1f}ms "
+          f"over {summary['frames']} frames")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio pacing drift benchmark")
+    parser.add_argument("--streams", type=int, default=1000, help="并发流数量")
+    parser.add_argument("--frames", type=int, default=50, help="每个流的帧数（50帧 x 60ms = 3秒语音）")
+    parser.add_argument("--interval-ms", type=float, default=60.0, help="帧间隔（软件编码60ms，硬件编码30ms）")
+    parser.add_argument("--work-us", type=float, default=20.0, help="每帧模拟发送耗时（微秒）")
+    args = parser.parse_args()
+
+    print(f"{args.streams} streams x {args.frames} frames @ {args.interval_ms}ms, "
+          f"expected duration {(args.frames - 1) * args.interval_ms:.0f}ms per stream")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,631 @@
+"""
+压测端自身开销基准：热点路径单独计时 + 对进程内模拟服务器的端到端吞吐，结果与基线 JSON 对比
+
+用法：
+    python benchmark_harness.py                                   # 运行全部测试并与基线对比
+    python benchmark_harness.py --only report,export --report-sizes 1000,10000
+    python benchmark_harness.py --save-baseline                   # 把本次结果保存为基线
+
+测的是仓库根目录的压测端（web_server / websocket_client / audio_encoder / mock_server），
+脚本启动时把根目录放在 sys.path 最前面，从哪个目录运行都一样。各项测试：
+    - frames:   AudioEncoder._load_audio_file_as_frames 每个文件的耗时（直接加载 / 帧缓存命中）
+    - messages: WebSocketClient._handle_json_message 按消息类型的每条耗时（含 JSON 解析，与接收循环一致）
+    - report:   generate_test_report 在 1k / 10k / 100k 条结果下的耗时（使用运行中累积的直方图和计数，
+                用例列表为 /api/report 默认的一页）及 JSON 序列化耗时
+    - export:   /api/report/csv、/api/report/pdf 导出耗时（结果从磁盘结果文件读取）
+    - emit:     emit_test_update 吞吐（合并限速发送 / 逐个立即发送）
+    - e2e:      多个连接对进程内模拟服务器（mock_server，运行在另一个线程的事件循环中）连续对话，
+                按客户端线程的 CPU 时间计算每核每秒轮数
+每项测试重复 --trials 次（默认 5），每个指标取最好的一次（耗时取最小、吞吐取最大）与基线对比，
+单次计时受调度和其他进程干扰的波动不会被当成回归；只打印第一次的明细。
+每项测试结束后打印进程峰值 RSS，运行全部测试时作为 peak_rss_mb 指标。日志写入 os.devnull，只计格式化和日志框架本身的开销。
+
+基线 JSON 中每个指标带单位、方向（lower / higher 更好）和噪声幅度（各次中最差比最好差多少）；
+与基线相比变差超过 --tolerance（默认 20%）加上本次和基线噪声幅度的较大者时标记为回归，此时退出码为 1。
+噪声幅度超过 --noise-limit（默认 50%）的指标在这台机器上测不准，只打印、不计入回归。
+基线与本机的平台或 CPU 数不同时只给出提示，数值仍照常对比；
+影响结果的运行设置（LOG_LEVEL、LOG_PAYLOAD_SAMPLE_RATE、各测试的规模）与基线不同时不做对比，退出码为 2
+（日志级别从 WARNING 改为 INFO，每条消息的处理耗时就会差一个数量级）。
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import contextlib
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+from logger import Logger
+from utils import parse_json_message
+from turn_timeline import START_LISTEN, FIRST_AUDIO_FRAME
+
+SECTIONS = ("frames", "messages", "report", "export", "emit", "e2e")
+# 与基线对比前必须一致的运行设置 -> 受影响的测试（None 表示所有测试）
+COMPARED_SETTINGS = {
+    "log_level": None,
+    "log_payload_sample_rate": None,
+    "trials": None,
+    "message_turns": "messages",
+    "export_size": "export",
+    "emit_events": "emit",
+    "connections": "e2e",
+    "turns": "e2e",
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_harness_baseline.json")
+
+SENTENCES = [
+    "好嘞，请稍等",
+    "东北长粒香米煮饭确实很香，米粒细长饱满。",
+    "冷却后口感依然柔软，适合做便当。",
+    "现在下单还可以享受满减优惠。",
+]
+AUTH_REPEAT = 200
+FAILURE_REASONS = ["No response received", "TTS timeout", "Connection lost"]
+
+
+class Metrics:
+    """本次运行的指标：名称 -> {"value", "unit", "better", "spread"}
+
+    同一指标记录多次（--trials）时 value 取最好的一次，spread 为最差一次比最好一次差多少（比例），
+    作为这台机器上该指标的噪声幅度。
+    """
+
+    def __init__(self):
+        self.values: Dict[str, Dict[str, Any]] = {}
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, name: str, value: Optional[float], unit: str, better: str = "lower"):
+        if value is None:
+            return
+        samples = self.samples.setdefault(name, [])
+        samples.append(value)
+        best, worst = (min(samples), max(samples)) if better == "lower" else (max(samples), min(samples))
+        spread = (worst / best - 1 if better == "lower" else best / worst - 1) if best > 0 and worst > 0 else 0.0
+        self.values[name] = {"value": round(best, 4), "unit": unit, "better": better, "spread": round(spread, 4)}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值 RSS（MB），没有 resource 模块的平台（Windows）返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def configure_logging():
+    """日志输出重定向到 os.devnull，保留格式化开销"""
+    logger = Logger()
+    logger.logger.handlers.clear()
+    handler = logging.StreamHandler(open(os.devnull, "w", encoding="utf-8"))
+    handler.setFormatter(logging.Formatter('%(asctime)s | %(levelname)-8s | %(message)s'))
+    logger.logger.addHandler(handler)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def collect_audio_files(paths: List[str], limit: int) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, n) for n in sorted(os.listdir(path)) if n.endswith(".opus"))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files[:limit] if limit else files
+
+
+def synthetic_result(i: int, rng: random.Random, start: datetime) -> Dict[str, Any]:
+    """一条与 test_single_audio 结构一致的结果（约 3% 失败）"""
+    success = rng.random() >= 0.03
+    stt = rng.lognormvariate(6.8, 0.3)
+    llm = rng.lognormvariate(6.5, 0.4)
+    tts = rng.lognormvariate(4.5, 0.5)
+    tts_duration = rng.lognormvariate(8.5, 0.3)
+    llm_text = " ".join(SENTENCES)
+    result = {
+        "index": i % 200 + 1,
+        "type": ("inquiry", "compare", "order")[i % 3],
+        "text": "你好，我想买点东北大米",
+        "audio_file": f"inquiry_{i % 200 + 1:03d}.opus",
+        "success": success,
+        "stt_text": "你好，我想买点东北大米",
+        "llm_text": llm_text if success else "",
+        "response_text": f"[STT] 你好，我想买点东北大米 | [LLM] {llm_text}" if success else "",
+        "error": None,
+        "timestamp": (start + timedelta(milliseconds=i * 50)).isoformat(),
+        "connection_id": i % 100 + 1,
+        "device_sn": f"FC012C2EA{i % 100:03d}",
+        "send_duration": 3200.0,
+        "stt_latency": stt,
+        "stt_latency_from_first_frame": stt,
+        "stt_latency_from_last_frame": stt - 120,
+        "llm_latency": llm if success else None,
+        "tts_latency": tts if success else None,
+        "tts_duration": tts_duration if success else None,
+        "e2e_response_time": stt + llm + tts + tts_duration if success else None,
+        "timeline": {"start_listen": 0.0, "first_audio_frame": 600.0, "stt": 600.0 + stt},
+        "turn_id": i // 100 + 1,
+        "straggler_messages": 0,
+        "sent_messages": 120,
+        "received_messages": 140,
+        "total_sent_bytes": 14000,
+        "total_received_bytes": 18000,
+    }
+    if not success:
+        result["failure_reason"] = rng.choice(FAILURE_REASONS)
+        result["error"] = result["failure_reason"]
+    return result
+
+
+def synthetic_results(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 10, 0, 0)
+    return [synthetic_result(i, rng, start) for i in range(count)]
+
+
+# ==================== 各项测试 ====================
+
+def bench_frames(args, metrics: Metrics):
+    from audio_encoder import AudioEncoder, AudioFrameCache
+
+    files = collect_audio_files(args.audio or [os.path.join(ROOT, "audio", "inquiries"),
+                                               os.path.join(ROOT, "audio", "opus")], args.max_files)
+    if not files:
+        print("frames: no .opus files found, skipped")
+        return
+    encoder = AudioEncoder()
+    per_file_ms, frame_counts = [], []
+    for path in files:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            frames = encoder._load_audio_file_as_frames(path)
+        per_file_ms.append((time.perf_counter() - start) * 1000 / args.repeat)
+        frame_counts.append(len(frames or []))
+
+    cache = AudioFrameCache()
+    for path in files:
+        cache.get_or_load(path, encoder._load_audio_file_as_frames)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for path in files:
+            cache.get_or_load(path, encoder._load_audio_file_as_frames)
+    hit_us = (time.perf_counter() - start) * 1e6 / (args.repeat * len(files))
+
+    avg = sum(per_file_ms) / len(per_file_ms)
+    print(f"frames: {len(files)} files, avg {sum(frame_counts) / len(files):.0f} frames/file")
+    print(f"  load     avg {avg:8.3f}ms  p95 {percentile(per_file_ms, 95):8.3f}ms  max {max(per_file_ms):8.3f}ms")
+    print(f"  cache hit     {hit_us:8.1f}us")
+    metrics.add("frames.load_ms_per_file", avg, "ms")
+    metrics.add("frames.load_p95_ms", percentile(per_file_ms, 95), "ms")
+    metrics.add("frames.cache_hit_us", hit_us, "us")
+
+
+def build_turn_messages() -> List[tuple]:
+    """一轮对话中服务器下发的 (消息类型, 原始JSON文本)"""
+    messages = [("stt", {"type": "stt", "text": "你好，我想买点东北大米", "session_id": "bench"})]
+    for sentence in SENTENCES:
+        messages.append(("llm", {"type": "llm", "emotion": "happy", "text": sentence}))
+    messages.append(("tts.start", {"type": "tts", "state": "start"}))
+    for sentence in SENTENCES:
+        messages.append(("tts.sentence_start", {"type": "tts", "state": "sentence_start", "text": sentence}))
+        messages.append(("tts.sentence_end", {"type": "tts", "state": "sentence_end", "text": sentence}))
+    messages.append(("tts.stop", {"type": "tts", "state": "stop"}))
+    return [(kind, json.dumps(m, ensure_ascii=False)) for kind, m in messages]
+
+
+def bench_messages(args, metrics: Metrics):
+    from websocket_client import WebSocketClient
+
+    raw_messages = build_turn_messages()
+
+    async def run():
+        client = WebSocketClient(connection_id=1, device_sn="BENCH")
+        # 认证响应每个连接只有一条，单条计时抖动太大，重复多次取平均
+        auth = {"type": "auth", "code": 0, "msg": "auth_success", "session_id": "bench"}
+        start = time.perf_counter_ns()
+        for _ in range(AUTH_REPEAT):
+            await client._handle_json_message(auth)
+        elapsed = {"auth": [time.perf_counter_ns() - start, AUTH_REPEAT]}
+        for _ in range(args.message_turns):
+            turn = client.begin_turn()
+            # 模拟本轮已发送 start_listen 和音频，使响应消息路由到本轮
+            turn.timeline.mark(START_LISTEN)
+            turn.timeline.mark(FIRST_AUDIO_FRAME)
+            for kind, raw in raw_messages:
+                start = time.perf_counter_ns()
+                await client._handle_json_message(parse_json_message(raw))
+                entry = elapsed.setdefault(kind, [0, 0])
+                entry[0] += time.perf_counter_ns() - start
+                entry[1] += 1
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    total_ns = sum(ns for kind, (ns, _) in elapsed.items() if kind != "auth")
+    total_count = sum(n for kind, (_, n) in elapsed.items() if kind != "auth")
+    print(f"messages: {len(raw_messages)} messages/turn x {args.message_turns} turns "
+          f"(LOG_LEVEL={Config.LOG_LEVEL}, sample rate {Config.LOG_PAYLOAD_SAMPLE_RATE})")
+    for kind, (ns, count) in elapsed.items():
+        us = ns / count / 1000
+        print(f"  {kind:<20} {us:8.1f}us/msg  ({count} msgs)")
+        metrics.add(f"messages.{kind}_us", us, "us")
+    rate = total_count / (total_ns / 1e9) if total_ns else 0
+    print(f"  {'all':<20} {rate:>10,.0f} msgs/sec/core")
+    metrics.add("messages.msgs_per_sec_core", rate, "msgs/s", "higher")
+
+
+def bench_report(args, metrics: Metrics):
+    import web_server
+    from latency_sketch import MetricSketches
+
+    print("report: generate_test_report (with live sketches and totals, one page of cases) / JSON serialization")
+    for size in args.report_sizes:
+        results = synthetic_results(size)
+        sketches = MetricSketches()
+        totals = web_server.ReportTotals()
+        start = time.perf_counter()
+        for result in results:
+            sketches.record(result)
+            totals.add(result)
+        record_us = (time.perf_counter() - start) * 1e6 / size
+        summary = {"total": size, "successful": sum(1 for r in results if r["success"])}
+        start_time, end_time = results[0]["timestamp"], results[-1]["timestamp"]
+
+        start = time.perf_counter()
+        report = web_server.generate_test_report(results[:web_server.REPORT_CASE_LIMIT], summary, start_time, end_time,
+                                                 {"concurrency": 100, "test_mode": "normal"},
+                                                 harness_stats={}, sketches=sketches, totals=totals)
+        generate_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        body = json.dumps(report, ensure_ascii=False, default=str)
+        serialize_ms = (time.perf_counter() - start) * 1000
+        print(f"  {size:>7} results  generate {generate_ms:9.1f}ms  json {serialize_ms:9.1f}ms "
+              f"({len(body) / 1024 / 1024:.1f}MB)  record {record_us:.1f}us/result  "
+              f"peak RSS {peak_rss_mb() or 0:.0f}MB")
+        metrics.add(f"report.generate_ms.{size}", generate_ms, "ms")
+        metrics.add(f"report.serialize_ms.{size}", serialize_ms, "ms")
+        metrics.add(f"report.record_us.{size}", record_us, "us")
+        del results, report, body
+
+
+def bench_export(args, metrics: Metrics):
+    import shutil
+    import web_server
+    from result_store import ResultStore
+    from run_settings import RunSettings
+
+    size = args.export_size
+    results = synthetic_results(size)
+    tmp_dir = tempfile.mkdtemp(prefix="bench_export_")
+    run = web_server.TestRun(f"bench_{size}", RunSettings.from_config(), {"concurrency": 100, "test_mode": "normal"})
+    try:
+        run.result_store = ResultStore(os.path.join(tmp_dir, "results.jsonl"), Config.RESULT_WINDOW_SIZE)
+        for result in results:
+            run.record_result(result)
+        run.state["summary"] = {"total": size, "successful": sum(1 for r in results if r["success"])}
+        run.state["start_time"], run.state["end_time"] = results[0]["timestamp"], results[-1]["timestamp"]
+        web_server.runs[run.run_id] = run
+        client = web_server.app.test_client()
+        print(f"export: {size} results from disk")
+        for fmt in ("csv", "pdf"):
+            start = time.perf_counter()
+            response = client.get(f"/api/report/{fmt}?run_id={run.run_id}")
+            body = response.get_data()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                print(f"  {fmt}: HTTP {response.status_code}")
+                continue
+            print(f"  {fmt:<4} {elapsed_ms:9.1f}ms  ({len(body) / 1024:.0f}KB)")
+            metrics.add(f"export.{fmt}_ms.{size}", elapsed_ms, "ms")
+    finally:
+        web_server.runs.pop(run.run_id, None)
+        if run.result_store is not None:
+            run.result_store.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def build_turn_events(i: int, result: Dict[str, Any]) -> List[tuple]:
+    """一轮对话在批量测试中发送的看板事件"""
+    current = {"index": result["index"], "type": result["type"], "text": result["text"], "status": "running"}
+    events = [("test_start", dict(current, connection_id=result["connection_id"]))]
+    llm_text = ""
+    for sentence in SENTENCES:
+        llm_text += sentence
+        events.append(("test_detail_update", {"index": result["index"], "type": result["type"],
+                                              "llm_sentence": sentence, "llm_text": llm_text,
+                                              "stt_text": result["stt_text"]}))
+    events.append(("test_result", {"result": result, "current_test": dict(current, status="completed")}))
+    events.append(("progress_update", {"progress": i + 1, "total": 0, "summary": {"total": i + 1}}))
+    return events
+
+
+def bench_emit(args, metrics: Metrics):
+    import web_server
+
+    results = synthetic_results(max(args.emit_events // 7, 1))
+    events = [event for i, result in enumerate(results) for event in build_turn_events(i, result)]
+    stream = web_server.event_stream
+    saved_rate = Config.SOCKETIO_FLUSH_HZ
+    print(f"emit: {len(events)} events (no dashboard connected)")
+    try:
+        for name, flush_hz in (("streamed", saved_rate or 10.0), ("direct", 0)):
+            Config.SOCKETIO_FLUSH_HZ = flush_hz
+            stream.flush()
+            stream.reset_stats()
+            # 计时期间暂停后台发送线程，提交循环不与它争用 GIL；提交完后手动把队列中的事件合并发出
+            with stream.paused():
+                start = time.perf_counter()
+                for event, data in events:
+                    web_server.emit_test_update(event, data)
+                submit_sec = time.perf_counter() - start
+                stream.flush()
+                total_sec = time.perf_counter() - start
+            stats = stream.get_stats()
+            line = (f"  {name:<9} submit {len(events) / submit_sec:>12,.0f} events/s  "
+                    f"delivered {len(events) / total_sec:>12,.0f} events/s")
+            if flush_hz:
+                line += f"  ({stats['frames']} frames, {stats['coalesced']} coalesced)"
+            print(line)
+            metrics.add(f"emit.{name}_submit_events_per_sec", len(events) / submit_sec, "events/s", "higher")
+            metrics.add(f"emit.{name}_delivered_events_per_sec", len(events) / total_sec, "events/s", "higher")
+    finally:
+        Config.SOCKETIO_FLUSH_HZ = saved_rate
+
+
+def start_mock_server(settings):
+    """在独立线程的事件循环中启动模拟服务器，返回 (server, loop, thread)"""
+    from mock_server import MockDeviceServer
+
+    server = MockDeviceServer(settings)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+        loop.run_until_complete(server.stop())
+        loop.close()
+
+    thread = threading.Thread(target=run, name="mock-server", daemon=True)
+    thread.start()
+    ready.wait()
+    return server, loop, thread
+
+
+def bench_e2e(args, metrics: Metrics):
+    from mock_server import MockServerSettings
+    from run_settings import RunSettings
+    from test_inquiries import InquiryTester
+    from websocket_client import WebSocketClient
+
+    files = collect_audio_files(args.audio or [os.path.join(ROOT, "audio", "inquiries"),
+                                               os.path.join(ROOT, "audio", "opus")], args.max_files)
+    if not files:
+        print("e2e: no .opus files found, skipped")
+        return
+    # 服务器不加延迟、TTS 不限速，测的是客户端处理一轮完整对话（上行音频 + 下行消息和音频帧）的开销
+    server, loop, thread = start_mock_server(MockServerSettings.from_dict({
+        "port": 0, "auth_latency": 0, "stt_latency": 0, "llm_latency": 0, "sentence_gap": 0,
+        "tts_first_audio": 0, "tts_speed": 0}))
+    saved_mode = Config.AUDIO_SEND_MODE
+    Config.AUDIO_SEND_MODE = "batch"   # 持续输入模式的发帧间隔是空闲等待，不计入开销
+    settings = RunSettings.from_config().with_ws_url(server.url)
+    tester = InquiryTester(settings=settings)
+
+    async def connection(connection_id: int) -> List[bool]:
+        client = WebSocketClient(connection_id=connection_id, device_sn=f"FC012C2EA{connection_id:03d}",
+                                 settings=settings)
+        if not await client.connect():
+            return []
+        await client.wait_for_auth(timeout=3.0)
+        outcomes = []
+        try:
+            for turn in range(args.turns):
+                audio_file = files[(connection_id + turn) % len(files)]
+                result = await tester.test_single_audio(client, audio_file, "bench", "inquiry", turn + 1)
+                outcomes.append(result["success"])
+        finally:
+            await client.close()
+        return outcomes
+
+    async def run():
+        return await asyncio.gather(*(connection(i + 1) for i in range(args.connections)))
+
+    try:
+        cpu_start, wall_start = time.thread_time(), time.perf_counter()
+        outcomes = [ok for conn in asyncio.run(run()) for ok in conn]
+        cpu_sec, wall_sec = time.thread_time() - cpu_start, time.perf_counter() - wall_start
+    finally:
+        Config.AUDIO_SEND_MODE = saved_mode
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+
+    turns = len(outcomes)
+    if not turns or not cpu_sec:
+        print("e2e: no turns completed")
+        return
+    print(f"e2e: {args.connections} connections x {args.turns} turns against {server.url} "
+          f"({sum(outcomes)}/{turns} successful)")
+    print(f"  wall {wall_sec:.1f}s  client CPU {cpu_sec:.2f}s  "
+          f"{turns / cpu_sec:,.1f} turns/sec/core  {cpu_sec * 1000 / turns:.2f}ms CPU/turn")
+    metrics.add("e2e.turns_per_sec_core", turns / cpu_sec, "turns/s", "higher")
+    metrics.add("e2e.cpu_ms_per_turn", cpu_sec * 1000 / turns, "ms")
+    metrics.add("e2e.success_rate", sum(outcomes) / turns * 100, "%", "higher")
+
+
+BENCHMARKS = {
+    "frames": bench_frames,
+    "messages": bench_messages,
+    "report": bench_report,
+    "export": bench_export,
+    "emit": bench_emit,
+    "e2e": bench_e2e,
+}
+
+
+# ==================== 基线 ====================
+
+def machine_info() -> Dict[str, Any]:
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()}
+
+
+def settings_mismatch(settings: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """返回与基线不一致的运行设置（只检查本次和基线都运行过的测试）"""
+    base_settings = baseline.get("settings", {})
+    sections = set(settings.get("sections", [])) & set(base_settings.get("sections", []))
+    return [
+        f"{name}={settings.get(name)!r} (baseline {base_settings.get(name)!r})"
+        for name, section in COMPARED_SETTINGS.items()
+        if (section is None or section in sections) and settings.get(name) != base_settings.get(name)
+    ]
+
+
+def compare_with_baseline(metrics: Metrics, baseline: Dict[str, Any], tolerance: float,
+                          noise_limit: float) -> List[str]:
+    """打印与基线的对比，返回回归的指标名
+
+    允许的变差为 tolerance 加上本次和基线中该指标的噪声幅度（spread）的较大者；
+    噪声幅度超过 noise_limit 的指标只打印，不计入回归。
+    """
+    base_metrics = baseline.get("metrics", {})
+    base_machine = baseline.get("machine", {})
+    current = machine_info()
+    if (base_machine.get("platform"), base_machine.get("cpu_count")) != (current["platform"], current["cpu_count"]):
+        print(f"note: baseline was recorded on {base_machine.get('platform')} "
+              f"({base_machine.get('cpu_count')} CPUs), results may not be comparable")
+    regressions = []
+    print(f"\n{'metric':<45} {'value':>14} {'baseline':>14} {'change':>9} {'noise':>7}")
+    for name, metric in metrics.values.items():
+        base = base_metrics.get(name)
+        if not base or not base.get("value"):
+            print(f"{name:<45} {metric['value']:>14,.3f} {'-':>14} {'new':>9}")
+            continue
+        change = metric["value"] / base["value"] - 1
+        noise = max(metric.get("spread", 0.0), base.get("spread", 0.0))
+        allowed = tolerance + noise
+        worse = change > allowed if metric["better"] == "lower" else change < -allowed / (1 + allowed)
+        if noise > noise_limit:
+            flag = "  (noisy, not gated)"
+        elif worse:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        else:
+            flag = ""
+        print(f"{name:<45} {metric['value']:>14,.3f} {base['value']:>14,.3f} {change * 100:>8.1f}% "
+              f"{noise * 100:>6.0f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harness self-overhead benchmark suite")
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"要运行的测试，逗号分隔（{', '.join(SECTIONS)}）")
+    parser.add_argument("--audio", action="append", default=None, help="Opus 文件或目录（默认 audio/inquiries 和 audio/opus）")
+    parser.add_argument("--max-files", type=int, default=20, help="最多使用的音频文件数，0 表示不限")
+    parser.add_argument("--repeat", type=int, default=3, help="帧加载每个文件的重复次数")
+    parser.add_argument("--message-turns", type=int, default=2000, help="消息处理测试的对话轮数")
+    parser.add_argument("--report-sizes", default="1000,10000,100000", help="报告测试的结果条数，逗号分隔")
+    parser.add_argument("--export-size", type=int, default=10000, help="导出测试的结果条数")
+    parser.add_argument("--emit-events", type=int, default=70000, help="事件发送测试的事件数")
+    parser.add_argument("--connections", type=int, default=20, help="端到端测试的连接数")
+    parser.add_argument("--turns", type=int, default=5, help="端到端测试每个连接的对话轮数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--trials", type=int, default=5, help="每项测试的重复次数，指标取最好的一次（默认 5）")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="变差超过该比例再加上指标的噪声幅度视为回归（默认 0.2）")
+    parser.add_argument("--noise-limit", type=float, default=0.5,
+                        help="噪声幅度超过该比例的指标不计入回归（默认 0.5）")
+    parser.add_argument("-o", "--output", default=None, help="另外把本次结果写入该 JSON 文件")
+    args = parser.parse_args()
+
+    sections = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    try:
+        args.report_sizes = [int(s) for s in args.report_sizes.split(",") if s.strip()]
+    except ValueError:
+        parser.error("--report-sizes must be comma-separated integers")
+
+    if args.trials < 1:
+        parser.error("--trials must be >= 1")
+
+    configure_logging()
+    metrics = Metrics()
+    for section in sections:
+        BENCHMARKS[section](args, metrics)
+        rss = peak_rss_mb()
+        print(f"  peak RSS after {section}: {rss:.0f}MB\n" if rss is not None else "")
+    # 其余几次按轮交替运行各项测试（机器短时间变慢时不会落在同一项测试的全部几次上），不打印明细
+    if args.trials > 1:
+        print(f"repeating {args.trials - 1} more time(s), best of {args.trials} trials kept for comparison")
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(args.trials - 1):
+                for section in sections:
+                    BENCHMARKS[section](args, metrics)
+    # 峰值 RSS 是整个进程的，只对完整的一组测试有意义（单独运行某项时通常明显更低）
+    if set(sections) == set(SECTIONS):
+        metrics.add("peak_rss_mb", peak_rss_mb(), "MB")
+
+    record = {
+        "created": datetime.now().isoformat(),
+        "machine": machine_info(),
+        "settings": {"sections": sections, "report_sizes": args.report_sizes, "export_size": args.export_size,
+                     "message_turns": args.message_turns, "emit_events": args.emit_events,
+                     "connections": args.connections, "turns": args.turns, "trials": args.trials,
+                     "log_level": Config.LOG_LEVEL, "log_payload_sample_rate": Config.LOG_PAYLOAD_SAMPLE_RATE},
+        "metrics": metrics.values,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        # 只运行了部分测试时保留基线中其他测试的指标
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                previous = json.load(f).get("metrics", {})
+            record["metrics"] = dict(previous, **metrics.values)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatched = settings_mismatch(record["settings"], baseline)
+    if mismatched:
+        print("run settings differ from the baseline, not comparing:")
+        for item in mismatched:
+            print(f"  {item}")
+        print("rerun with the baseline's settings, or record a new baseline with --save-baseline")
+        sys.exit(2)
+    regressions = compare_with_baseline(metrics, baseline, args.tolerance, args.noise_limit)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance * 100:.0f}% + noise: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nno regressions beyond {args.tolerance * 100:.0f}% + noise")
+
+
+if __name__ == "__main__":
+    main()
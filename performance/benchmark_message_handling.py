@@ -0,0 +1,104 @@
+"""
+消息处理吞吐基准：WebSocketClient._handle_json_message 每核每秒能处理多少条服务器消息
+
+用法：
+    python benchmark_message_handling.py [--turns N]
+
+用一轮典型对话（auth + stt + llm + tts start/sentence_start/sentence_end/stop）反复喂给客户端，
+分别在以下日志配置下计时（日志写入 os.devnull，只测格式化和日志框架本身的开销）：
+    - INFO，全部采样（LOG_PAYLOAD_SAMPLE_RATE=1.0，原有行为）
+    - INFO，采样率 0.01
+    - INFO，不采样
+    - WARNING（日志关闭）
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+from config import Config
+from logger import Logger
+from websocket_client import WebSocketClient
+from utils import parse_json_message
+from turn_timeline import START_LISTEN, FIRST_AUDIO_FRAME
+
+SENTENCES = [
+    "好嘞，请稍等，正在处理中",
+    "东北长粒香米煮饭确实很香，米粒细长饱满。",
+    "冷却后口感依然柔软，适合做便当。",
+    "现在下单还可以享受满减优惠。",
+]
+
+
+def build_turn_messages() -> list:
+    """一轮对话中服务器下发的原始JSON文本"""
+    messages = [{"type": "stt", "text": "你好，我想买点东北大米", "session_id": "bench"}]
+    for sentence in SENTENCES:
+        messages.append({"type": "llm", "emotion": "happy", "text": sentence})
+    messages.append({"type": "tts", "state": "start"})
+    for sentence in SENTENCES:
+        messages.append({"type": "tts", "state": "sentence_start", "text": sentence})
+        messages.append({"type": "tts", "state": "sentence_end", "text": sentence})
+    messages.append({"type": "tts", "state": "stop"})
+    return [json.dumps(m, ensure_ascii=False) for m in messages]
+
+
+def configure_logging(level: int):
+    """把日志输出重定向到 os.devnull，保留格式化开销"""
+    logger = Logger()
+    logger.logger.handlers.clear()
+    handler = logging.StreamHandler(open(os.devnull, "w", encoding="utf-8"))
+    handler.setFormatter(logging.Formatter('%(asctime)s | %(levelname)-8s | %(message)s'))
+    logger.logger.addHandler(handler)
+    logger.logger.setLevel(level)
+
+
+async def run_turns(turns: int, raw_messages: list) -> tuple:
+    """返回 (消息数, 耗时秒)"""
+    client = WebSocketClient(connection_id=1, device_sn="BENCH")
+    await client._handle_json_message({"type": "auth", "code": 0, "msg": "auth_success", "session_id": "bench"})
+
+    count = 0
+    start = time.perf_counter()
+    for _ in range(turns):
+        turn = client.begin_turn()
+        # 模拟本轮已发送 start_listen 和音频，使响应消息路由到本轮
+        turn.timeline.mark(START_LISTEN)
+        turn.timeline.mark(FIRST_AUDIO_FRAME)
+        for raw in raw_messages:
+            # 与 _receive_messages 一致：先解析再处理
+            data = parse_json_message(raw)
+            await client._handle_json_message(data)
+            count += 1
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocketClient message handling benchmark")
+    parser.add_argument("--turns", type=int, default=2000, help="每种配置运行的对话轮数")
+    args = parser.parse_args()
+
+    raw_messages = build_turn_messages()
+    scenarios = [
+        ("INFO, sample 1.0 (previous behaviour)", logging.INFO, 1.0),
+        ("INFO, sample 0.01", logging.INFO, 0.01),
+        ("INFO, sample 0", logging.INFO, 0.0),
+        ("WARNING (logging off)", logging.WARNING, 0.0),
+    ]
+
+    print(f"{len(raw_messages)} messages per turn, {args.turns} turns per scenario")
+    print(f"{'scenario':<40} {'msgs/sec/core':>15} {'us/msg':>10}")
+    baseline = None
+    for name, level, sample_rate in scenarios:
+        configure_logging(level)
+        Config.LOG_PAYLOAD_SAMPLE_RATE = sample_rate
+        count, elapsed = asyncio.run(run_turns(args.turns, raw_messages))
+        rate = count / elapsed if elapsed > 0 else 0
+        baseline = baseline or rate
+        print(f"{name:<40} {rate:>15,.0f} {elapsed / count * 1e6:>10.1f}   ({rate / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Opus 分帧性能对比：试解码分割（旧） vs 长度前缀解析（新）
+
+用法：
+    python benchmark_opus_split.py [opus文件或目录 ...] [--repeat N]
+
+Ogg 文件先解封装得到包列表（同时计时解封装），把包首尾相接得到裸 Opus 数据；裸 Opus 文件先用试解码
+分割得到包列表。然后对同一组包分别计时：在裸数据上试解码分割、解析打包后的长度前缀数据。
+opuslib/libopus 不可用时跳过旧方法，只测 Ogg 解封装和长度前缀解析。
+"""
+import os
+import sys
+import time
+import argparse
+from typing import List, Optional
+
+from opus_framing import (
+    demux_ogg_opus,
+    is_length_prefixed_opus,
+    parse_length_prefixed_opus,
+    pack_length_prefixed_opus,
+    split_opus_packets_by_decoding,
+)
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    """展开目录，收集 .opus 文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith('.opus'))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def time_call(func, repeat: int) -> float:
+    """返回 repeat 次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def time_trial_decode(raw: bytes) -> Optional[float]:
+    """试解码分割一次的耗时（毫秒，较慢只跑一次）；opuslib 不可用时返回 None"""
+    try:
+        return time_call(lambda: split_opus_packets_by_decoding(raw), 1)
+    except Exception:
+        return None
+
+
+def benchmark_file(file_path: str, repeat: int) -> Optional[dict]:
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if not data:
+        return None
+
+    result = {"file": os.path.basename(file_path), "bytes": len(data), "ogg_ms": None, "heuristic_ms": None}
+
+    if data[:4] == b'OggS':
+        try:
+            packets = demux_ogg_opus(data)
+        except ValueError as e:
+            print(f"  {result['file']}: invalid Ogg stream ({e})")
+            return None
+        result["ogg_ms"] = time_call(lambda: demux_ogg_opus(data), repeat)
+        result["heuristic_ms"] = time_trial_decode(b"".join(packets))
+    elif is_length_prefixed_opus(data):
+        packets = parse_length_prefixed_opus(data)
+    else:
+        try:
+            packets = split_opus_packets_by_decoding(data)
+        except Exception as e:
+            print(f"  {result['file']}: trial-decode splitting unavailable ({e})")
+            return None
+        result["heuristic_ms"] = time_trial_decode(data)
+
+    if not packets:
+        return None
+    framed = pack_length_prefixed_opus(packets)
+    result["packets"] = len(packets)
+    result["framed_ms"] = time_call(lambda: parse_length_prefixed_opus(framed), repeat)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opus packet framing benchmark")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("paths", nargs="*", default=[os.path.join(script_dir, "audio"),
+                                                     os.path.join(script_dir, "..", "audio", "opus")])
+    parser.add_argument("--repeat", type=int, default=100, help="Ogg 解封装和长度前缀解析的重复次数")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        print("No .opus files found")
+        sys.exit(1)
+
+    print(f"{'file':<40} {'bytes':>8} {'packets':>8} {'ogg-demux(ms)':>14} {'trial-decode(ms)':>17} "
+          f"{'framed(ms)':>11} {'speedup':>9}")
+    trial_decode_missing = False
+    for file_path in files:
+        r = benchmark_file(file_path, args.repeat)
+        if r is None:
+            continue
+        ogg = f"{r['ogg_ms']:.3f}" if r["ogg_ms"] is not None else "-"
+        heuristic = f"{r['heuristic_ms']:.2f}" if r["heuristic_ms"] is not None else "-"
+        trial_decode_missing = trial_decode_missing or r["heuristic_ms"] is None
+        speedup = f"{r['heuristic_ms'] / r['framed_ms']:.0f}x" if r["heuristic_ms"] and r["framed_ms"] > 0 else "-"
+        print(f"{r['file']:<40} {r['bytes']:>8} {r['packets']:>8} {ogg:>14} {heuristic:>17} "
+              f"{r['framed_ms']:>11.3f} {speedup:>9}")
+    if trial_decode_missing:
+        print("trial-decode: opuslib/libopus unavailable, old method not measured")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,18 @@ class Config:
     OPUS_FRAME_SIZE = AUDIO_SAMPLE_RATE * OPUS_FRAME_DURATION_MS // 1000  # 960 samples per frame
     OPUS_COMPLEXITY = 3  # Opus 编码复杂度（WiFi 板使用 3，ML307 使用 5）
     MAX_OPUS_PACKET_SIZE = 1000  # 最大 Opus 数据包大小（字节）
+
+    # 下行 TTS 音频指标（见 downlink_audio.py）：模拟设备抖动缓冲的深度（毫秒），
+    # 以及是否在进程内解码下行 Opus 帧求时长（默认按 TOC 字节计算，不解码）
+    DOWNLINK_JITTER_BUFFER_MS = float(os.getenv("DOWNLINK_JITTER_BUFFER_MS", "180"))
+    DOWNLINK_OPUS_DECODE = os.getenv("DOWNLINK_OPUS_DECODE", "false").lower() == "true"
+    # 服务器在回复前发送的垫话句（"|" 分隔），LLM 流式节奏指标中的首个有效句延迟会跳过它们（见 llm_cadence.py）
+    LLM_FILLER_PHRASES = [p for p in os.getenv("LLM_FILLER_PHRASES", "好嘞，请稍等").split("|") if p.strip()]
+    # 协议轨迹：非空时把每个连接收发的帧写入该二进制文件（路径中的 {pid} 替换为进程号），
+    # 用 trace_replay.py 按原始节奏或加速重放上行（见 protocol_trace.py）
+    PROTOCOL_TRACE_PATH = os.getenv("PROTOCOL_TRACE_PATH", "")
+    # 轨迹中是否保存下行音频帧的数据（默认只记录大小）
+    PROTOCOL_TRACE_DOWNLINK_AUDIO = os.getenv("PROTOCOL_TRACE_DOWNLINK_AUDIO", "false").lower() == "true"
     
     # 音频发送模式
     # "continuous": 持续输入模式 - 按照实际时间间隔发送（模拟真实采集节奏）
@@ -104,6 +116,21 @@ class Config:
     # "fast": 急速模式 - 只要大模型开始回复（has_llm + llm_text_buffer）就继续下一个问题
     TEST_MODE = os.getenv("TEST_MODE", "normal")  # 默认正常模式
     
+    # 开放模型到达曲线（见 arrival_scheduler.py），为空时使用闭环模式（完成一轮立即开始下一轮）
+    # 格式: "曲线:参数=值,..."，例如 "poisson:rate=5,duration_sec=60"、"ramp:start_rate=1,end_rate=20,duration_sec=120"
+    ARRIVAL_PROFILE = os.getenv("ARRIVAL_PROFILE", "")
+    # 派发延迟超过该值（毫秒）计为一次迟到派发（没有空闲连接或压测端来不及）
+    ARRIVAL_LATE_TOLERANCE_MS = float(os.getenv("ARRIVAL_LATE_TOLERANCE_MS", "10"))
+    
+    # 事件循环：USE_UVLOOP=true 且已安装 uvloop 时使用 uvloop（不支持Windows，未安装时回退标准事件循环）
+    USE_UVLOOP = os.getenv("USE_UVLOOP", "false").lower() == "true"
+    # 事件循环调度延迟采样（见 loop_runtime.py）：采样间隔，以及判定"压测端饱和"的 P99 阈值
+    LOOP_LAG_SAMPLE_INTERVAL_MS = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL_MS", "10"))
+    LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "50"))
+    
+    # test_inquiries.py 的检查点：每轮结果追加一行，每追加 N 条 fsync 一次（0 表示不主动 fsync）
+    CHECKPOINT_FSYNC_BATCH = int(os.getenv("CHECKPOINT_FSYNC_BATCH", "10"))
+    
     # 极限性能测试模式：减少等待时间以测试服务器极限并发处理能力
     # true=极限性能模式（减少等待，快速完成），false=完整响应模式（等待完整响应）
     STRESS_TEST_MODE = os.getenv("STRESS_TEST_MODE", "true").lower() == "true"
@@ -136,6 +163,9 @@ class Config:
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_TO_FILE = os.getenv("LOG_TO_FILE", "true").lower() == "true"
     LOG_TO_CONSOLE = os.getenv("LOG_TO_CONSOLE", "true").lower() == "true"
+    # 消息体日志采样率（0~1）：INFO级别下按轮次采样，只有被采样的轮次才输出完整JSON和横幅日志
+    # DEBUG级别始终输出；高并发压测时调低可显著降低客户端CPU占用
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
     
     @classmethod
     def calculate_sign(cls, device_sn: str) -> str:
@@ -150,9 +180,10 @@ class Config:
         return sign
     
     @classmethod
-    def get_websocket_url(cls, device_sn: Optional[str] = None) -> str:
-        """构建 WebSocket 连接 URL"""
-        host = cls.WSS_SERVER_HOST if cls.USE_SSL else cls.WS_SERVER_HOST
+    def get_websocket_url(cls, device_sn: Optional[str] = None, host: Optional[str] = None) -> str:
+        """构建 WebSocket 连接 URL（host 为空时按 USE_SSL 使用 WSS_SERVER_HOST 或 WS_SERVER_HOST）"""
+        if host is None:
+            host = cls.WSS_SERVER_HOST if cls.USE_SSL else cls.WS_SERVER_HOST
         
         # 如果提供了device_sn，使用它；否则使用默认值
         sn = device_sn if device_sn is not None else cls.DEVICE_SN
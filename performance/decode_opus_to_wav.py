@@ -9,6 +9,8 @@ except Exception as e:
     print("opuslib not installed or failed to import:", e)
     sys.exit(1)
 
+from opus_framing import parse_length_prefixed_opus
+
 
 def split_opus_frames(opus_data: bytes, sample_rate: int = 16000) -> List[bytes]:
     """
@@ -63,7 +65,10 @@ def decode_to_wav(opus_bytes: bytes, wav_path: str, sample_rate: int = 16000):
     decoder = Decoder(sample_rate, channels)
     frame_size = int(sample_rate * 0.06)
 
-    frames = split_opus_frames(opus_bytes, sample_rate)
+    # Length-prefixed files carry packet boundaries; only fall back to heuristic splitting for raw data
+    frames = parse_length_prefixed_opus(opus_bytes)
+    if frames is None:
+        frames = split_opus_frames(opus_bytes, sample_rate)
     if not frames:
         raise RuntimeError("Failed to split Opus data into frames; cannot decode.")
 
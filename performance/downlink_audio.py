@@ -0,0 +1,212 @@
+"""
+下行 TTS 音频流指标：逐帧到达时间、实时率、到达抖动和模拟播放卡顿
+
+以前 _receive_messages 收到二进制帧只累加字节数，不知道 TTS 音频什么时候到、到得够不够快，
+而"多久开始出声"和"播放是否断断续续"正是用户直接感受到的。每轮对话一个 DownlinkAudio：
+    - add(frame): 记录到达时间（单调时钟）和这一帧的音频时长。时长默认由 Opus TOC 字节计算
+      （opus_framing.opus_packet_duration_ms，不解码）；decode=True 时用 opuslib 在进程内解码，
+      按实际采样数计算（opuslib 不可用或解码失败时回退到 TOC）
+    - summary(buffer_ms):
+        audio_ms            收到的音频总时长
+        stream_ms           第一帧到最后一帧的到达间隔
+        rtf                 实时率 = 到达间隔 / 对应的音频时长（<1 比实时快，>1 时设备端必然卡顿）
+        jitter_ms           相邻两帧的到达间隔与前一帧音频时长之差的平均绝对值
+        max_gap_ms          相邻两帧的最大到达间隔
+        underruns/stall_ms  模拟设备抖动缓冲（simulate_playback）的卡顿次数和总卡顿时长
+首音频延迟（TTFA，最后一帧上行音频 -> 第一帧下行音频）由调用方从时间线计算。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from opus_framing import opus_packet_duration_ms
+
+# 单个 Opus 包的最大时长（毫秒），解码缓冲按此分配
+_MAX_PACKET_MS = 120
+
+
+def simulate_playback(arrivals_ms: List[float], durations_ms: List[float], buffer_ms: float) -> Tuple[int, float]:
+    """
+    模拟设备抖动缓冲的播放过程，返回 (卡顿次数, 总卡顿时长 ms)
+
+    缓冲中积累到 buffer_ms 的音频（或已收到最后一帧）后开始按实时速度播放；
+    已收到的音频播完而下一帧还没到时记一次卡顿，重新缓冲到 buffer_ms 后继续。
+    首次开始播放前的缓冲时间不算卡顿（计入首音频延迟）。
+    """
+    underruns = 0
+    stall_ms = 0.0
+    buffered = 0.0
+    play_end: Optional[float] = None     # 正在播放时：已收音频全部播完的时刻
+    stall_start: Optional[float] = None  # 卡顿中：开始卡顿的时刻
+    count = len(arrivals_ms)
+    for i, (arrival, duration) in enumerate(zip(arrivals_ms, durations_ms)):
+        if play_end is not None:
+            if arrival <= play_end:
+                play_end += duration
+                continue
+            underruns += 1
+            stall_start = play_end
+            play_end = None
+        buffered += duration
+        if buffered >= buffer_ms or i == count - 1:
+            if stall_start is not None:
+                stall_ms += arrival - stall_start
+                stall_start = None
+            play_end = arrival + buffered
+            buffered = 0.0
+    return underruns, stall_ms
+
+
+class DownlinkAudio:
+    """一轮对话收到的 TTS 音频帧（到达时间和时长）"""
+
+    __slots__ = ("arrivals_ns", "durations_ms", "bytes", "decode", "decode_errors",
+                 "_decoder", "_sample_rate", "_channels")
+
+    def __init__(self, decode: bool = False, sample_rate: int = 16000, channels: int = 1):
+        self.arrivals_ns: List[int] = []
+        self.durations_ms: List[float] = []
+        self.bytes = 0
+        self.decode = decode
+        self.decode_errors = 0
+        self._decoder = None
+        self._sample_rate = sample_rate
+        self._channels = channels
+
+    @property
+    def frames(self) -> int:
+        return len(self.arrivals_ns)
+
+    def add(self, frame: bytes, ns: Optional[int] = None):
+        """记录一帧（ns 为到达时间，默认取当前单调时钟）"""
+        if ns is None:
+            ns = time.perf_counter_ns()
+        self.arrivals_ns.append(ns)
+        self.durations_ms.append(self._duration_ms(frame))
+        self.bytes += len(frame)
+
+    def _duration_ms(self, frame: bytes) -> float:
+        if self.decode:
+            if self._decoder is None:
+                try:
+                    import opuslib
+                    self._decoder = opuslib.Decoder(self._sample_rate, self._channels)
+                except Exception:
+                    # opuslib 或 libopus 不可用：本轮改用 TOC
+                    self.decode = False
+                    return opus_packet_duration_ms(frame)
+            try:
+                pcm = self._decoder.decode(frame, self._sample_rate * _MAX_PACKET_MS // 1000)
+                return len(pcm) / (2 * self._channels) * 1000 / self._sample_rate
+            except Exception:
+                self.decode_errors += 1
+        return opus_packet_duration_ms(frame)
+
+    def summary(self, buffer_ms: float) -> Optional[Dict[str, Any]]:
+        """本轮下行音频指标（见模块说明），没有收到音频时返回 None"""
+        if not self.arrivals_ns:
+            return None
+        base = self.arrivals_ns[0]
+        arrivals = [(ns - base) / 1e6 for ns in self.arrivals_ns]
+        durations = self.durations_ms
+        gaps = [arrivals[i] - arrivals[i - 1] for i in range(1, len(arrivals))]
+        media_span = sum(durations[:-1])
+        underruns, stall_ms = simulate_playback(arrivals, durations, buffer_ms)
+        stats = {
+            "frames": len(arrivals),
+            "bytes": self.bytes,
+            "audio_ms": round(sum(durations), 3),
+            "stream_ms": round(arrivals[-1], 3),
+            "rtf": round(arrivals[-1] / media_span, 4) if media_span > 0 else None,
+            "jitter_ms": round(sum(abs(gap - durations[i]) for i, gap in enumerate(gaps)) / len(gaps), 3) if gaps else 0.0,
+            "max_gap_ms": round(max(gaps), 3) if gaps else 0.0,
+            "buffer_ms": buffer_ms,
+            "underruns": underruns,
+            "stall_ms": round(stall_ms, 3),
+            "duration_source": "decode" if self.decode else "toc",
+        }
+        if self.decode_errors:
+            stats["decode_errors"] = self.decode_errors
+        return stats
+
+
+class DownlinkTotals:
+    """
+    多轮下行音频指标的累计计数（用于报告，每轮 O(1) 更新）
+
+    实时率、抖动和卡顿时长的分布由 latency_sketch 的直方图记录（downlink_rtf / downlink_jitter /
+    downlink_stall），这里只保留帧数、卡顿次数、慢于实时的轮数等计数，报告时不再对各轮的值排序。
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.frames = 0
+        self.audio_ms = 0.0
+        self.buffer_ms: Optional[float] = None
+        self.duration_source: Optional[str] = None
+        self.slower_than_realtime_turns = 0
+        self.max_gap_ms = 0.0
+        self.underruns = 0
+        self.underrun_turns = 0
+        self.decode_errors = 0
+
+    def add(self, stats: Optional[Dict[str, Any]]):
+        """累计一轮的 DownlinkAudio.summary()（没有收到音频的轮次忽略）"""
+        if not stats or not stats.get("frames"):
+            return
+        if not self.turns:
+            self.buffer_ms = stats["buffer_ms"]
+            self.duration_source = stats.get("duration_source", "toc")
+        self.turns += 1
+        self.frames += stats["frames"]
+        self.audio_ms += stats["audio_ms"]
+        rtf = stats.get("rtf")
+        if rtf is not None and rtf > 1.0:
+            self.slower_than_realtime_turns += 1
+        self.max_gap_ms = max(self.max_gap_ms, stats["max_gap_ms"])
+        self.underruns += stats["underruns"]
+        if stats["underruns"]:
+            self.underrun_turns += 1
+        self.decode_errors += stats.get("decode_errors", 0)
+
+    def summary(self, metric_stats: Dict[str, Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        汇总（见 summarize_downlink），没有数据时返回 None
+
+        metric_stats 为 MetricSketches.performance_metrics()，取其中 downlink_rtf / downlink_jitter / downlink_stall
+        """
+        if not self.turns:
+            return None
+        rtf = metric_stats.get("downlink_rtf")
+        jitter = metric_stats.get("downlink_jitter") or {}
+        stall = metric_stats.get("downlink_stall") or {}
+        return {
+            "turns": self.turns,
+            "frames": self.frames,
+            "audio_sec": round(self.audio_ms / 1000, 3),
+            "buffer_ms": self.buffer_ms,
+            "duration_source": self.duration_source,
+            "rtf_avg": round(rtf["avg"], 4) if rtf else None,
+            "rtf_p95": round(rtf["p95"], 4) if rtf else None,
+            "rtf_max": round(rtf["max"], 4) if rtf else None,
+            "slower_than_realtime_turns": self.slower_than_realtime_turns,
+            "jitter_avg_ms": round(jitter.get("avg", 0.0), 3),
+            "jitter_p95_ms": round(jitter.get("p95", 0.0), 3),
+            "max_gap_ms": round(self.max_gap_ms, 3),
+            "underruns": self.underruns,
+            "underrun_turns": self.underrun_turns,
+            "underrun_turn_rate": round(self.underrun_turns / self.turns * 100, 2),
+            "stall_avg_ms": round(stall.get("avg", 0.0), 3),
+            "stall_max_ms": round(stall.get("max", 0.0), 3),
+            "decode_errors": self.decode_errors,
+        }
+
+
+def summarize_downlink(downlink_stats: List[Optional[Dict[str, Any]]],
+                       metric_stats: Dict[str, Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """汇总多轮的下行音频指标（分位数由 latency_sketch 的直方图给出），没有数据时返回 None"""
+    totals = DownlinkTotals()
+    for stats in downlink_stats:
+        totals.add(stats)
+    return totals.summary(metric_stats)
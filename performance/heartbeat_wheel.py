@@ -0,0 +1,120 @@
+"""
+心跳定时轮：所有连接共用一个定时任务发送心跳
+
+以前 IoTHardwareSimulator._start_heartbeat 给每个连接起一个 sleep 循环任务，上万个空闲连接就是
+上万个定时器和任务对象，而且同时建立的连接会在同一时刻一起发心跳。HeartbeatWheel：
+    - 心跳周期按 tick_sec 划分为若干槽（slot），连接加入时按轮转顺序分到各槽，心跳均匀分布在整个周期内
+    - 一个任务每 tick_sec 前进一个槽，并发发送该槽内所有连接的心跳（同一连接相邻两次心跳间隔一个周期）
+    - 事件循环落后时按计划时间补发跳过的槽，tick 滞后计入统计
+    - add/remove 为 O(1)，连接断开后由调用方 remove（发送失败只计数，不自动移除）
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class HeartbeatWheel:
+    """所有连接共用的心跳定时轮（见模块说明）"""
+
+    def __init__(self, interval_sec: float, send: Callable[[Any], Awaitable[bool]], tick_sec: float = 0.1):
+        """
+        Args:
+            interval_sec: 每个连接的心跳周期（秒）
+            send: send(item) 发送一次心跳，返回是否成功（例如 WebSocketClient.send_heartbeat 的包装）
+            tick_sec: 定时轮的步进间隔（秒），心跳周期内的槽数 = interval_sec / tick_sec
+        """
+        if interval_sec <= 0 or tick_sec <= 0:
+            raise ValueError("heartbeat interval_sec and tick_sec must be positive")
+        self.interval_sec = interval_sec
+        self.send = send
+        self.slot_count = max(1, round(interval_sec / tick_sec))
+        self.tick_sec = interval_sec / self.slot_count
+        self._slots: List[Dict[Hashable, Any]] = [{} for _ in range(self.slot_count)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._next_slot = 0   # 新连接分配到的槽（轮转）
+        self._cursor = 0      # 下一个要处理的槽
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+        self.ticks = 0
+        self.max_tick_lag_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def add(self, key: Hashable, item: Any):
+        """加入一个连接（已存在时忽略）；第一次心跳在加入后一个周期内"""
+        if key in self._slot_of:
+            return
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.slot_count
+        self._slots[slot][key] = item
+        self._slot_of[key] = slot
+
+    def remove(self, key: Hashable):
+        """移除一个连接（不存在时忽略）"""
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
+
+    def clear(self):
+        """移除所有连接"""
+        for slot in self._slots:
+            slot.clear()
+        self._slot_of.clear()
+
+    async def _send(self, item: Any) -> bool:
+        try:
+            return bool(await self.send(item))
+        except Exception:
+            return False
+
+    async def _tick(self):
+        slot = self._slots[self._cursor]
+        self._cursor = (self._cursor + 1) % self.slot_count
+        self.ticks += 1
+        if not slot:
+            return
+        results = await asyncio.gather(*(self._send(item) for item in list(slot.values())))
+        ok = sum(results)
+        self.sent += ok
+        self.failed += len(results) - ok
+
+    async def run(self):
+        """运行定时轮，直到 stop() 或任务被取消"""
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            due += self.tick_sec
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                self.max_tick_lag_ms = max(self.max_tick_lag_ms, -delay * 1000)
+            await self._tick()
+
+    def start(self) -> asyncio.Task:
+        """在当前事件循环中启动定时轮任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self._slot_of),
+            "interval_sec": self.interval_sec,
+            "slots": self.slot_count,
+            "sent": self.sent,
+            "failed": self.failed,
+            "max_tick_lag_ms": round(self.max_tick_lag_ms, 3),
+        }
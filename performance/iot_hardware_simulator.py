@@ -1,10 +1,11 @@
 import asyncio
 from typing import List, Optional
 
-from config import Config
 from logger import Logger
 from audio_encoder import AudioEncoder
 from websocket_client import WebSocketClient
+from run_settings import RunSettings
+from heartbeat_wheel import HeartbeatWheel
 
 
 class IoTHardwareSimulator:
@@ -17,11 +18,13 @@ class IoTHardwareSimulator:
     - 可选发送 stop_listen / enter_vad / exit_detect / play_voice / change_role
     """
 
-    def __init__(self, connection_id: int = 1, logger: Optional[Logger] = None):
+    def __init__(self, connection_id: int = 1, logger: Optional[Logger] = None,
+                 settings: Optional[RunSettings] = None):
         self.connection_id = connection_id
         self.logger = logger or Logger()
-        self.client = WebSocketClient(connection_id=self.connection_id)
+        self.client = WebSocketClient(connection_id=self.connection_id, settings=settings)
         self._heartbeat_task: Optional[asyncio.Task] = None
+        self._heartbeat_wheel: Optional[HeartbeatWheel] = None
 
     async def _start_heartbeat(self, interval_sec: int = 10):
         try:
@@ -38,6 +41,9 @@ class IoTHardwareSimulator:
     async def close(self):
         if self._heartbeat_task and not self._heartbeat_task.done():
             self._heartbeat_task.cancel()
+        if self._heartbeat_wheel is not None:
+            self._heartbeat_wheel.remove(self.connection_id)
+            self._heartbeat_wheel = None
         await self.client.close()
 
     async def play_welcome(self):
@@ -53,8 +59,15 @@ class IoTHardwareSimulator:
     async def change_role(self, role_type: int = 0):
         await self.client.send_change_role(role_type)
 
-    async def start_heartbeat(self, interval_sec: int = 10):
-        if self._heartbeat_task is None or self._heartbeat_task.done():
+    async def start_heartbeat(self, interval_sec: int = 10, wheel: Optional[HeartbeatWheel] = None):
+        """
+        开始定期发送心跳。模拟大量设备时传入共享的 wheel（send 为 lambda client: client.send_heartbeat()），
+        由定时轮统一调度，不再每个连接一个定时任务；此时 interval_sec 由 wheel 决定
+        """
+        if wheel is not None:
+            self._heartbeat_wheel = wheel
+            wheel.add(self.connection_id, self.client)
+        elif self._heartbeat_task is None or self._heartbeat_task.done():
             self._heartbeat_task = asyncio.create_task(self._start_heartbeat(interval_sec))
 
     async def send_speech(self, text: str, audio_frames: Optional[List[bytes]] = None,
@@ -70,12 +83,7 @@ class IoTHardwareSimulator:
         # - start_listen（不含 vad_side）
         # - 批量连续二进制帧
         # - 可选 stop_listen
-        original_send_stop = Config.SEND_STOP_LISTEN
-        try:
-            # 强制发送 stop_listen 由参数控制
-            Config.SEND_STOP_LISTEN = send_stop
-            return await self.client.send_user_message(text=text, audio_frames=frames)
-        finally:
-            Config.SEND_STOP_LISTEN = original_send_stop
+        # - 是否发送 stop_listen 由参数控制（只作用于本次发送，不修改全局 Config）
+        return await self.client.send_user_message(text=text, audio_frames=frames, send_stop=send_stop)
 
 
@@ -0,0 +1,141 @@
+"""
+LLM 流式节奏：每句回复文本的到达时间、句间间隔、生成速度和首个有效句延迟
+
+以前 _handle_json_message 把每个 llm 文本块和 TTS sentence_start 文本都追加到 llm_text_buffer，
+但只保留了第一句（llm_response_time）和第二句（tts_second_sentence_time）的时间，
+LLM 生成变慢和 TTS 排队变长在报告里看起来一样。现在时间线记录每个句子事件
+（TurnTimeline.mark_sentence，来源为 "llm" 或 "tts"），sentence_cadence 按来源分别计算：
+    - offsets_ms / chars / filler   每句相对 STT 的到达时间、字数、是否为垫话句（逐句数组）
+    - first_content_ms              STT -> 第一句有效内容（跳过"好嘞，请稍等"之类的垫话句）
+    - gaps_ms                       相邻两句有效内容的到达间隔
+    - chars_per_sec                 第一句有效内容之后的字数 / 第一句到最后一句的时间（生成速度，不含首句延迟）
+两个来源都有时，按文本匹配同一句，queue_ms 为 TTS sentence_start 晚于 LLM 文本的时间（TTS 排队）。
+LLM 的间隔和速度反映生成吞吐，TTS 的间隔减去排队时间才是 TTS 自身的节奏。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SOURCES = ("llm", "tts")
+
+# (来源, 到达时间 ns, 文本)
+SentenceEvent = Tuple[str, int, str]
+
+
+def normalize_text(text: str) -> str:
+    """只保留文字和数字（去掉标点和空白），用于垫话句判断和两个来源的文本匹配"""
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def is_filler(text: str, fillers: Iterable[str]) -> bool:
+    """文本以任一垫话句开头（忽略标点）即视为垫话句，例如"好嘞，请稍等，正在处理中" """
+    normalized = normalize_text(text)
+    return any(f and normalized.startswith(f) for f in (normalize_text(f) for f in fillers))
+
+
+def _source_cadence(entries: List[Tuple[int, str]], reference_ns: int, fillers: Tuple[str, ...],
+                    has_reference: bool) -> Dict[str, Any]:
+    filler_flags = [is_filler(text, fillers) for _, text in entries]
+    content = [(ns, text) for (ns, text), filler in zip(entries, filler_flags) if not filler]
+    gaps = [(content[i][0] - content[i - 1][0]) / 1e6 for i in range(1, len(content))]
+    span_sec = (content[-1][0] - content[0][0]) / 1e9 if content else 0.0
+    later_chars = sum(len(text) for _, text in content[1:])
+    return {
+        "offsets_ms": [round((ns - reference_ns) / 1e6, 3) for ns, _ in entries],
+        "chars": [len(text) for _, text in entries],
+        "filler": filler_flags,
+        "content_sentences": len(content),
+        "first_content_ms": round((content[0][0] - reference_ns) / 1e6, 3) if content and has_reference else None,
+        "gaps_ms": [round(gap, 3) for gap in gaps],
+        "chars_per_sec": round(later_chars / span_sec, 2) if span_sec > 0 else None,
+    }
+
+
+def sentence_cadence(events: List[SentenceEvent], stt_ns: Optional[int],
+                     fillers: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """
+    一轮对话的句子节奏（见模块说明），没有句子事件时返回 None
+
+    Args:
+        events: 时间线记录的 (来源, 到达时间 ns, 文本)
+        stt_ns: STT 结果的到达时间，作为偏移和首句延迟的起点；没有 STT 时以第一句为起点，首句延迟为 None
+        fillers: 垫话句文本
+    """
+    if not events:
+        return None
+    fillers = tuple(fillers)
+    has_reference = stt_ns is not None
+    reference_ns = stt_ns if has_reference else min(ns for _, ns, _ in events)
+    cadence: Dict[str, Any] = {"reference": "stt" if has_reference else "first_sentence"}
+    by_source = {source: [(ns, text) for s, ns, text in events if s == source] for source in SOURCES}
+    for source, entries in by_source.items():
+        if entries:
+            cadence[source] = _source_cadence(entries, reference_ns, fillers, has_reference)
+
+    # 同一句文本在 LLM 和 TTS 两个来源的到达时间差
+    if "llm" in cadence and "tts" in cadence:
+        llm_times: Dict[str, int] = {}
+        for ns, text in by_source["llm"]:
+            llm_times.setdefault(normalize_text(text), ns)
+        queue = []
+        for ns, text in by_source["tts"]:
+            llm_ns = llm_times.get(normalize_text(text))
+            if llm_ns is not None and ns >= llm_ns and not is_filler(text, fillers):
+                queue.append(round((ns - llm_ns) / 1e6, 3))
+        cadence["queue_ms"] = queue
+
+    firsts = [cadence[s]["first_content_ms"] for s in SOURCES
+              if s in cadence and cadence[s]["first_content_ms"] is not None]
+    cadence["first_content_ms"] = min(firsts) if firsts else None
+    return cadence
+
+
+class CadenceTotals:
+    """多轮句子节奏的累计计数（用于报告，每轮 O(1) 更新；分位数由 latency_sketch 的直方图给出）"""
+
+    def __init__(self):
+        self.turns = 0
+        self.sources: Dict[str, Dict[str, int]] = {}
+        self.queue_matched_sentences = 0
+
+    def add(self, cadence: Optional[Dict[str, Any]]):
+        """累计一轮的 sentence_cadence() 结果（None 忽略）"""
+        if not cadence:
+            return
+        self.turns += 1
+        for source in SOURCES:
+            per_source = cadence.get(source)
+            if per_source is None:
+                continue
+            counts = self.sources.setdefault(source, {
+                "turns": 0, "sentences": 0, "content_sentences": 0, "filler_turns": 0, "no_content_turns": 0,
+            })
+            counts["turns"] += 1
+            counts["sentences"] += len(per_source["offsets_ms"])
+            counts["content_sentences"] += per_source["content_sentences"]
+            if any(per_source["filler"]):
+                counts["filler_turns"] += 1
+            if not per_source["content_sentences"]:
+                counts["no_content_turns"] += 1
+        if cadence.get("queue_ms"):
+            self.queue_matched_sentences += len(cadence["queue_ms"])
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """汇总（见 summarize_cadence），没有数据时返回 None"""
+        if not self.turns:
+            return None
+        summary: Dict[str, Any] = {"turns": self.turns}
+        for source in SOURCES:
+            if source in self.sources:
+                summary[source] = dict(self.sources[source])
+        if self.queue_matched_sentences:
+            summary["queue_matched_sentences"] = self.queue_matched_sentences
+        return summary
+
+
+def summarize_cadence(cadences: List[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """汇总多轮的句子节奏计数（分位数由 latency_sketch 的直方图给出），没有数据时返回 None"""
+    totals = CadenceTotals()
+    for cadence in cadences:
+        totals.add(cadence)
+    return totals.summary()
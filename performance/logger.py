@@ -56,21 +56,25 @@ class Logger:
         else:
             self.log_file_path = None
     
-    def debug(self, message: str):
-        """DEBUG 级别日志"""
-        self.logger.debug(message)
+    def is_enabled_for(self, level: int) -> bool:
+        """判断某个级别的日志是否会输出（用于跳过昂贵的日志格式化，如大段JSON）"""
+        return self.logger.isEnabledFor(level)
     
-    def info(self, message: str):
+    def debug(self, message: str, *args):
+        """DEBUG 级别日志（args 非空时按 % 格式延迟格式化，级别未开启时不格式化）"""
+        self.logger.debug(message, *args)
+    
+    def info(self, message: str, *args):
         """INFO 级别日志"""
-        self.logger.info(message)
+        self.logger.info(message, *args)
     
-    def warning(self, message: str):
+    def warning(self, message: str, *args):
         """WARNING 级别日志"""
-        self.logger.warning(message)
+        self.logger.warning(message, *args)
     
-    def error(self, message: str):
+    def error(self, message: str, *args):
         """ERROR 级别日志"""
-        self.logger.error(message)
+        self.logger.error(message, *args)
     
     def connection(self, connection_id: int, status: str, duration: Optional[float] = None, url: Optional[str] = None):
         """记录连接日志"""
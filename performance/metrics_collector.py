@@ -23,6 +23,8 @@ class MetricsCollector:
         self.metrics: List[Dict[str, Any]] = []
         self.test_start_time: Optional[float] = None
         self.test_end_time: Optional[float] = None
+        # 压测端自身指标（事件循环调度延迟等），由测试运行器写入
+        self.harness_metrics: Dict[str, Any] = {}
         
         # 确保目录存在
         Config.create_directories()
@@ -107,6 +109,15 @@ class MetricsCollector:
         ]
         audio_to_second_tts_stats = calculate_statistics(audio_to_second_tts_delays) if audio_to_second_tts_delays else {}
         
+        # 开放模型：从计划到达时刻算起的延迟（协调遗漏修正 = 派发延迟 + 实测延迟）
+        audio_to_tts_corrected = [
+            m.get("audio_to_tts_delay") + m.get("dispatch_lag_ms")
+            for m in successful_metrics
+            if m.get("dispatch_lag_ms") is not None
+            and m.get("audio_to_tts_delay") is not None and m.get("audio_to_tts_delay") > 0
+        ]
+        audio_to_tts_corrected_stats = calculate_statistics(audio_to_tts_corrected) if audio_to_tts_corrected else {}
+        
         # 计算 QPS 和吞吐量
         duration = (self.test_end_time - self.test_start_time) if self.test_end_time and self.test_start_time else 0
         qps = total_messages / duration if duration > 0 else 0.0
@@ -132,6 +143,9 @@ class MetricsCollector:
             "p99_audio_to_second_tts_delay": audio_to_second_tts_stats.get("p99", 0.0),
             "min_audio_to_second_tts_delay": audio_to_second_tts_stats.get("min", 0.0),
             "max_audio_to_second_tts_delay": audio_to_second_tts_stats.get("max", 0.0),
+            "avg_audio_to_tts_delay_corrected": audio_to_tts_corrected_stats.get("avg", 0.0),
+            "p95_audio_to_tts_delay_corrected": audio_to_tts_corrected_stats.get("p95", 0.0),
+            "p99_audio_to_tts_delay_corrected": audio_to_tts_corrected_stats.get("p99", 0.0),
             "qps": qps,
             "test_duration": duration
         }
@@ -193,6 +207,7 @@ class MetricsCollector:
         data = {
             "test_info": test_info,
             "summary": summary,
+            "harness_metrics": self.harness_metrics,
             "connections": self.metrics
         }
         
@@ -254,6 +269,26 @@ class MetricsCollector:
         self.logger.info("")
         self.logger.info("吞吐量指标:")
         self.logger.info(f"  QPS (每秒查询数): {summary['qps']:.2f}")
+        loop_lag = self.harness_metrics.get("loop_lag")
+        if loop_lag and loop_lag.get("samples"):
+            self.logger.info("")
+            self.logger.info(f"压测端事件循环（{loop_lag['loop']}）调度延迟:")
+            self.logger.info(f"  P50: {loop_lag['lag_p50_ms']}ms  P95: {loop_lag['lag_p95_ms']}ms  "
+                             f"P99: {loop_lag['lag_p99_ms']}ms  最大: {loop_lag['lag_max_ms']}ms")
+            if loop_lag.get("harness_saturated"):
+                self.logger.warning(f"  调度延迟P99超过 {loop_lag['warn_ms']}ms，压测端可能是瓶颈，延迟数据偏高")
+        dispatch = self.harness_metrics.get("dispatch")
+        if dispatch:
+            self.logger.info("")
+            self.logger.info(f"开放模型到达调度（{dispatch['profile']}{', 泊松' if dispatch.get('poisson') else ''}）:")
+            self.logger.info(f"  计划到达: {dispatch['expected_arrivals']}  实际派发: {dispatch['dispatched']}  "
+                             f"达成到达率: {dispatch.get('achieved_rate', 0)}/秒")
+            self.logger.info(f"  迟到派发(>{dispatch['late_tolerance_ms']}ms): {dispatch.get('late', 0)}  "
+                             f"派发延迟P99: {dispatch.get('lag_p99_ms', 0)}ms  最大: {dispatch.get('lag_max_ms', 0)}ms")
+            if summary.get("p99_audio_to_tts_delay_corrected"):
+                self.logger.info(f"  修正后延迟（派发延迟 + 发送结束→第一句TTS）: 平均 {summary['avg_audio_to_tts_delay_corrected'] / 1000.0:.3f}秒  "
+                                 f"P95 {summary['p95_audio_to_tts_delay_corrected'] / 1000.0:.3f}秒  "
+                                 f"P99 {summary['p99_audio_to_tts_delay_corrected'] / 1000.0:.3f}秒")
         self.logger.info("=" * 60)
         
         # 记录统计日志
@@ -0,0 +1,252 @@
+"""
+协议轨迹：把每个连接收发的帧连同单调时钟时间戳写入紧凑的二进制文件，供 trace_replay.py 按时间重放
+
+一次真实压测里的流量形态（连接何时建立、每轮 start_listen / 音频帧 / stop_listen 的节奏、
+服务器应答的时序）以前无法保存，想复现只能重新解码音频、重新跑测试逻辑。TraceWriter：
+    - 一个进程一个轨迹文件，多个连接共用，每个连接是一个会话（递增的会话 ID）
+    - 记录发送的 JSON 控制消息和 Opus 帧（含数据，重放时原样发送）、收到的 JSON 消息；
+      收到的音频帧默认只记录大小（downlink_audio=True 时连同数据一起记录）
+    - 时间戳为相对轨迹开始的纳秒数（time.perf_counter_ns），文件头记录开始时的墙上时钟
+
+文件格式（小端）：
+    文件头：magic "PTRC" (4) + 版本 (1) + 开始时间 (float64, Unix 毫秒)
+    记录：  类型 (1) + 会话 ID (4) + 时间 (8, ns) + 长度 (4) + 数据（RECV_BINARY_SIZE 没有数据，长度即帧大小）
+    SESSION_OPEN 的数据是 JSON：url、headers、device_sn、connection_id
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import atexit
+import json
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+MAGIC = b"PTRC"
+VERSION = 1
+_FILE_HEADER = struct.Struct("<4sBd")
+_RECORD_HEADER = struct.Struct("<BIQI")
+
+# 记录类型
+SESSION_OPEN = 1
+SEND_TEXT = 2
+SEND_BINARY = 3
+RECV_TEXT = 4
+RECV_BINARY = 5
+RECV_BINARY_SIZE = 6
+SESSION_CLOSE = 7
+
+KIND_NAMES = {
+    SESSION_OPEN: "session_open", SEND_TEXT: "send_text", SEND_BINARY: "send_binary",
+    RECV_TEXT: "recv_text", RECV_BINARY: "recv_binary", RECV_BINARY_SIZE: "recv_binary_size",
+    SESSION_CLOSE: "session_close",
+}
+
+Frame = Union[str, bytes, bytearray, memoryview]
+
+
+class TraceWriter:
+    """轨迹文件写入（线程安全，写入经过文件缓冲）"""
+
+    def __init__(self, path: str, downlink_audio: bool = False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.downlink_audio = downlink_audio
+        self._file = open(path, "wb")
+        self._lock = threading.Lock()
+        self._start_ns = time.perf_counter_ns()
+        self._next_session = 1
+        self.records = 0
+        self._file.write(_FILE_HEADER.pack(MAGIC, VERSION, time.time() * 1000))
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def _write(self, kind: int, session: int, payload: Optional[Frame], size: Optional[int] = None):
+        ns = time.perf_counter_ns() - self._start_ns
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        length = size if payload is None else len(payload)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(_RECORD_HEADER.pack(kind, session, ns, length))
+            if payload is not None:
+                self._file.write(payload)
+            self.records += 1
+
+    def open_session(self, url: str, headers: Optional[Dict[str, str]] = None, **meta: Any) -> "TraceSession":
+        """开始记录一个连接（连接建立后调用）"""
+        with self._lock:
+            session_id = self._next_session
+            self._next_session += 1
+        info = dict(meta, url=url, headers=headers or {})
+        self._write(SESSION_OPEN, session_id, json.dumps(info, ensure_ascii=False))
+        return TraceSession(self, session_id)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class TraceSession:
+    """一个连接在轨迹中的会话"""
+
+    __slots__ = ("writer", "session_id", "closed")
+
+    def __init__(self, writer: TraceWriter, session_id: int):
+        self.writer = writer
+        self.session_id = session_id
+        self.closed = False
+
+    def sent(self, frame: Frame):
+        self.writer._write(SEND_TEXT if isinstance(frame, str) else SEND_BINARY, self.session_id, frame)
+
+    def received(self, frame: Frame):
+        if isinstance(frame, str):
+            self.writer._write(RECV_TEXT, self.session_id, frame)
+        elif self.writer.downlink_audio:
+            self.writer._write(RECV_BINARY, self.session_id, frame)
+        else:
+            self.writer._write(RECV_BINARY_SIZE, self.session_id, None, len(frame))
+
+    def close(self):
+        """结束会话（重复调用无副作用）"""
+        if not self.closed:
+            self.closed = True
+            self.writer._write(SESSION_CLOSE, self.session_id, None, 0)
+
+
+_shared_writers: Dict[str, TraceWriter] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_writer(path: str, downlink_audio: bool = False) -> TraceWriter:
+    """
+    进程内共享的轨迹文件（同一路径只打开一次，进程退出时关闭）
+
+    路径中的 {pid} 替换为进程号，多进程分片时每个工作进程写自己的文件
+    """
+    path = path.replace("{pid}", str(os.getpid()))
+    with _shared_lock:
+        writer = _shared_writers.get(path)
+        if writer is None or writer.closed:
+            writer = TraceWriter(path, downlink_audio)
+            _shared_writers[path] = writer
+            atexit.register(writer.close)
+        return writer
+
+
+class TraceRecord(NamedTuple):
+    kind: int
+    session: int
+    t_ns: int
+    size: int
+    payload: Optional[bytes]
+
+    def text(self) -> str:
+        return self.payload.decode("utf-8") if self.payload is not None else ""
+
+
+class SessionTrace(NamedTuple):
+    """一个会话的重放数据"""
+    session: int
+    info: Dict[str, Any]
+    open_ns: int
+    uplink: List[Tuple[int, Union[str, bytes]]]   # (时间 ns, 文本或二进制帧)
+    recv_text: int
+    recv_binary: int
+    recv_bytes: int
+    close_ns: Optional[int]
+
+
+class TraceReader:
+    """读取轨迹文件；文件格式不正确时抛出 ValueError"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = f.read()
+        if len(self._data) < _FILE_HEADER.size:
+            raise ValueError(f"{path}: not a protocol trace (file too short)")
+        magic, version, start_wall_ms = _FILE_HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a protocol trace (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported trace version {version}")
+        self.start_wall_ms = start_wall_ms
+
+    def __iter__(self) -> Iterator[TraceRecord]:
+        data = self._data
+        offset = _FILE_HEADER.size
+        end = len(data)
+        while offset + _RECORD_HEADER.size <= end:
+            kind, session, t_ns, length = _RECORD_HEADER.unpack_from(data, offset)
+            offset += _RECORD_HEADER.size
+            if kind in (RECV_BINARY_SIZE, SESSION_CLOSE):
+                yield TraceRecord(kind, session, t_ns, length, None)
+                continue
+            if offset + length > end:
+                # 写入中断（进程被杀）留下的不完整记录
+                break
+            yield TraceRecord(kind, session, t_ns, length, data[offset:offset + length])
+            offset += length
+
+    def sessions(self) -> List[SessionTrace]:
+        """按会话整理（按会话开始时间排序）；没有 SESSION_OPEN 的会话被忽略"""
+        builders: Dict[int, Dict[str, Any]] = {}
+        for record in self:
+            if record.kind == SESSION_OPEN:
+                builders[record.session] = {
+                    "info": json.loads(record.text()), "open_ns": record.t_ns, "uplink": [],
+                    "recv_text": 0, "recv_binary": 0, "recv_bytes": 0, "close_ns": None,
+                }
+                continue
+            builder = builders.get(record.session)
+            if builder is None:
+                continue
+            if record.kind == SEND_TEXT:
+                builder["uplink"].append((record.t_ns, record.text()))
+            elif record.kind == SEND_BINARY:
+                builder["uplink"].append((record.t_ns, record.payload))
+            elif record.kind == RECV_TEXT:
+                builder["recv_text"] += 1
+                builder["recv_bytes"] += record.size
+            elif record.kind in (RECV_BINARY, RECV_BINARY_SIZE):
+                builder["recv_binary"] += 1
+                builder["recv_bytes"] += record.size
+            elif record.kind == SESSION_CLOSE:
+                builder["close_ns"] = record.t_ns
+        sessions = [SessionTrace(session=sid, **b) for sid, b in builders.items()]
+        sessions.sort(key=lambda s: s.open_ns)
+        return sessions
+
+    def summary(self) -> Dict[str, Any]:
+        """轨迹概况：各类记录数和字节数、会话数、时长"""
+        counts: Dict[str, List[int]] = {}
+        last_ns = 0
+        sessions = set()
+        for record in self:
+            entry = counts.setdefault(KIND_NAMES.get(record.kind, str(record.kind)), [0, 0])
+            entry[0] += 1
+            entry[1] += record.size
+            last_ns = max(last_ns, record.t_ns)
+            sessions.add(record.session)
+        return {
+            "path": self.path,
+            "file_bytes": len(self._data),
+            "start_wall_ms": self.start_wall_ms,
+            "duration_sec": round(last_ns / 1e9, 3),
+            "sessions": len(sessions),
+            "records": {kind: {"count": c, "bytes": b} for kind, (c, b) in counts.items()},
+        }
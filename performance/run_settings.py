@@ -0,0 +1,75 @@
+"""
+单次运行的设置：连接目标和协议行为，创建后不可修改
+
+以前 /api/start 和单语音测试直接改写 Config 的类属性（WS_SERVER_HOST、USE_SSL、TEST_MODE），
+IoT 模拟器发送语音时临时改写 SEND_STOP_LISTEN：整个进程只有一套设置，单语音测试会把正在运行的
+批量测试悄悄切到另一个服务器，也无法同时压测两个服务器。RunSettings 在运行开始时从 Config 取默认值、
+应用本次请求的覆盖项，之后随 InquiryTester / WebSocketClient 向下传递，Config 本身不再被修改：
+    - from_config(**overrides): 以 Config 的当前值为默认值
+    - with_ws_url(url): 按 ws:// 或 wss:// 地址设置服务器（返回新对象）
+    - websocket_url(sn): 本次运行的连接 URL
+
+RunSettings 是 NamedTuple，可以直接 pickle，多进程分片时原样传给工作进程。
+"""
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import Config
+
+
+def parse_ws_url(ws_url: str) -> Tuple[str, str, bool]:
+    """
+    ws://host:port 或 wss://host:port -> (ws 地址, wss 地址, 是否使用 SSL)
+
+    地址格式不正确时抛出 ValueError
+    """
+    if not (ws_url.startswith("ws://") or ws_url.startswith("wss://")):
+        raise ValueError("WebSocket地址格式不正确，应以 ws:// 或 wss:// 开头")
+    use_ssl = ws_url.startswith("wss://")
+    parsed = urlparse("http://" + ws_url.split("://", 1)[1])
+    host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
+    return f"ws://{host_with_port}", f"wss://{host_with_port}", use_ssl
+
+
+class RunSettings(NamedTuple):
+    """一次运行（批量测试、单语音测试、模拟器会话）使用的服务器地址和协议行为"""
+
+    ws_server_host: str
+    wss_server_host: str
+    use_ssl: bool
+    test_mode: str = "normal"         # "normal" 等待完整响应，"fast" 收到LLM回复即结束本轮
+    send_stop_listen: bool = True     # 发送完音频后是否发送 stop_listen
+    listening_mode: str = "manual"    # start_listen 的监听模式
+
+    @classmethod
+    def from_config(cls, **overrides: Any) -> "RunSettings":
+        """以 Config 当前值为默认值创建，overrides 覆盖其中的字段"""
+        values = {
+            "ws_server_host": Config.WS_SERVER_HOST,
+            "wss_server_host": Config.WSS_SERVER_HOST,
+            "use_ssl": Config.USE_SSL,
+            "test_mode": Config.TEST_MODE,
+            "send_stop_listen": Config.SEND_STOP_LISTEN,
+            "listening_mode": Config.LISTENING_MODE,
+        }
+        values.update(overrides)
+        return cls(**values)
+
+    def with_ws_url(self, ws_url: Optional[str]) -> "RunSettings":
+        """使用 ws_url 指定的服务器（为空时返回自身）"""
+        if not ws_url:
+            return self
+        ws_host, wss_host, use_ssl = parse_ws_url(ws_url)
+        return self._replace(ws_server_host=ws_host, wss_server_host=wss_host, use_ssl=use_ssl)
+
+    @property
+    def server_host(self) -> str:
+        return self.wss_server_host if self.use_ssl else self.ws_server_host
+
+    def websocket_url(self, device_sn: Optional[str] = None) -> str:
+        return Config.get_websocket_url(device_sn, host=self.server_host)
+
+    def to_dict(self) -> Dict[str, Any]:
+        settings = self._asdict()
+        settings["server"] = self.server_host
+        return settings
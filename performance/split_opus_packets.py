@@ -1,8 +1,15 @@
 """
 使用Opus解码器验证并分割连续的Opus数据包
+
+分割结果以长度前缀格式（OPLP，见 opus_framing.py）保存，之后加载只需一次线性扫描，无需再试解码
 """
 import opuslib
 import sys
+from opus_framing import (
+    is_length_prefixed_opus,
+    parse_length_prefixed_opus,
+    pack_length_prefixed_opus,
+)
 
 def split_opus_packets(opus_data, sample_rate=16000, channels=1):
     """
@@ -81,13 +88,20 @@ if __name__ == "__main__":
     with open(file_path, 'rb') as f:
         opus_data = f.read()
     
+    if is_length_prefixed_opus(opus_data):
+        packets = parse_length_prefixed_opus(opus_data)
+        if packets is None:
+            print("Error: malformed length-prefixed Opus file")
+            sys.exit(1)
+        print(f"File is already length-prefixed: {len(packets)} packets, nothing to do")
+        sys.exit(0)
+    
     packets = split_opus_packets(opus_data)
     
-    # 保存分割后的包
+    # 保存分割后的包（长度前缀格式，保留包边界）
     if packets:
         output_file = file_path.replace('.opus', '_split.opus')
         with open(output_file, 'wb') as f:
-            for packet in packets:
-                f.write(packet)
-        print(f"\nSplit packets saved to: {output_file}")
+            f.write(pack_length_prefixed_opus(packets))
+        print(f"\nSplit packets saved to: {output_file} (length-prefixed, {len(packets)} packets)")
 
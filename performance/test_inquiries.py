@@ -6,25 +6,39 @@ import os
 import asyncio
 import json
 import time
+import argparse
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from logger import Logger
 from config import Config
 from websocket_client import WebSocketClient
+from run_settings import RunSettings
+import loop_runtime
 from audio_encoder import AudioEncoder
+from result_store import ResultStore
+from turn_timeline import LAST_AUDIO_FRAME, FIRST_TTS_AUDIO, STT
+from llm_cadence import sentence_cadence
 
 # 音频目录
 AUDIO_DIR = os.path.join(os.path.dirname(__file__), "audio", "inquiries")
+# 结果目录
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
 
 class InquiryTester:
     """询问测试类（基于test_runner.py的逻辑）"""
     
-    def __init__(self):
+    def __init__(self, resume_from: Optional[str] = None, settings: Optional[RunSettings] = None):
         self.logger = Logger()
+        # 本次运行的服务器地址和测试模式（未指定时取 Config 当前值），由本测试器创建的连接使用同一份设置
+        self.settings = settings or RunSettings.from_config()
         self.audio_encoder = AudioEncoder()
         self.results: List[Dict[str, Any]] = []
         self.test_start_time = datetime.now()
+        # 检查点：每轮结果追加一行到 JSONL（见 result_store），resume_from 指定时从该检查点继续
+        self.resume_from = resume_from
+        self.checkpoint: Optional[ResultStore] = None
+        self.completed: set = set()  # 已完成的 (type, index)，恢复时跳过
         
     def parse_inquiries_file(self, file_path: str) -> tuple:
         """解析询问文件，提取所有询问和购买文本"""
@@ -100,16 +114,8 @@ class InquiryTester:
             self.logger.info(f"Audio file: {os.path.basename(audio_file)}")
             self.logger.info(f"{'='*60}")
             
-            # 重置响应状态（为本次测试准备）
-            client.stt_text = ""
-            client.llm_text_buffer = []
-            client.has_tts_stop = False
-            client.has_stt = False
-            client.has_llm = False
-            client.has_tts_start = False
-            client.send_time = None
-            client.send_end_time = None
-            client.tts_stop_time = None  # 重置TTS stop时间
+            # 开始新一轮（分配新的轮次状态，上一轮的迟到消息不会写入本轮）
+            client.begin_turn()
             
             # 加载音频帧（与test_runner.py的逻辑一致）
             audio_frames = self.load_audio_frames(audio_file)
@@ -130,7 +136,8 @@ class InquiryTester:
             # 根据配置选择测试模式
             # "normal": 正常模式 - 等待完整响应（TTS stop）后再进行下一个问题
             # "fast": 急速模式 - 只要大模型开始回复（has_llm + llm_text_buffer）就继续下一个问题
-            test_mode = Config.TEST_MODE.lower()
+            # 取连接所属运行的设置（单语音测试共用测试器，每次测试的连接设置可以不同）
+            test_mode = client.settings.test_mode.lower()
             
             max_wait_time = Config.TTS_TIMEOUT / 1000.0  # 转换为秒
             wait_time = 0
@@ -281,6 +288,20 @@ class InquiryTester:
             else:
                 result["total_response_time"] = None
             
+            # 下行TTS音频：首音频延迟（从最后一帧上行音频到第一帧TTS音频）、实时率、到达抖动、模拟播放卡顿
+            turn = client.turn
+            tts_first_audio_ms = turn.timeline.elapsed_ms(LAST_AUDIO_FRAME, FIRST_TTS_AUDIO)
+            result["tts_first_audio_latency"] = tts_first_audio_ms if tts_first_audio_ms is not None and 0 <= tts_first_audio_ms <= 60000 else None
+            if turn.downlink is not None and turn.downlink.frames:
+                result["downlink_audio"] = turn.downlink.summary(Config.DOWNLINK_JITTER_BUFFER_MS)
+            
+            # LLM流式节奏：每句到达时间、句间间隔、生成速度、首个有效句延迟（跳过垫话句，从STT开始）
+            cadence = sentence_cadence(turn.timeline.sentences, turn.timeline.get(STT), Config.LLM_FILLER_PHRASES)
+            if cadence is not None:
+                result["llm_cadence"] = cadence
+                first_content_ms = cadence["first_content_ms"]
+                result["first_content_sentence_latency"] = first_content_ms if first_content_ms is not None and 0 <= first_content_ms <= 60000 else None
+            
             # 收集消息统计
             result["sent_messages"] = getattr(client, 'sent_messages', 0)
             result["received_messages"] = getattr(client, 'received_messages', 0)
@@ -393,11 +414,13 @@ class InquiryTester:
         self.logger.info("开始测试询问和购买音频")
         self.logger.info(f"总询问数: {len(inquiries_texts)}")
         self.logger.info(f"总购买数: {len(purchases_texts)}")
-        self.logger.info(f"服务器地址: {Config.get_websocket_url()}")
+        self.logger.info(f"服务器地址: {self.settings.websocket_url()}")
         self.logger.info("=" * 60)
         
+        self.open_checkpoint()
+        
         # 创建WebSocket客户端（与test_runner.py的逻辑一致）
-        client = WebSocketClient(connection_id=1)
+        client = WebSocketClient(connection_id=1, settings=self.settings)
         
         try:
             # 建立连接（与test_runner.py的逻辑一致）
@@ -451,24 +474,24 @@ class InquiryTester:
                     self.logger.error(f"Purchase audio file not found: purchase_{i+1:03d}.opus")
                     continue
                 
-                # 1. 测试询问（等待完整响应）
-                inquiry_result = await self.test_single_audio(
-                    client, inquiry_file, inquiry_text, "inquiry", i + 1
-                )
-                self.results.append(inquiry_result)
-                
                 # 等待响应完全结束（与test_runner.py的逻辑一致）
                 final_wait = 0.5
-                await asyncio.sleep(final_wait)
                 
-                # 2. 测试购买（等待完整响应）
-                purchase_result = await self.test_single_audio(
-                    client, purchase_file, purchase_text, "purchase", i + 1
-                )
-                self.results.append(purchase_result)
+                # 1. 测试询问（等待完整响应），从检查点恢复时跳过已完成的轮次
+                if ("inquiry", i + 1) not in self.completed:
+                    inquiry_result = await self.test_single_audio(
+                        client, inquiry_file, inquiry_text, "inquiry", i + 1
+                    )
+                    self.record_result(inquiry_result)
+                    await asyncio.sleep(final_wait)
                 
-                # 等待响应完全结束
-                await asyncio.sleep(final_wait)
+                # 2. 测试购买（等待完整响应）
+                if ("purchase", i + 1) not in self.completed:
+                    purchase_result = await self.test_single_audio(
+                        client, purchase_file, purchase_text, "purchase", i + 1
+                    )
+                    self.record_result(purchase_result)
+                    await asyncio.sleep(final_wait)
                 
                 # 每10个测试对后保存一次结果
                 if (i + 1) % 10 == 0:
@@ -485,19 +508,84 @@ class InquiryTester:
                 await client.close()
             
             # 保存最终结果
-            self.save_results()
+            self.save_results(final=True)
+            self.checkpoint.close()
             
             # 打印摘要
             self.print_summary()
     
-    def save_results(self):
-        """保存测试结果"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        results_dir = os.path.join(os.path.dirname(__file__), "results")
-        os.makedirs(results_dir, exist_ok=True)
+    @staticmethod
+    def checkpoint_path(resume_from: str) -> str:
+        """--resume 参数对应的检查点 JSONL 路径（也可以传入 .index.json）"""
+        if resume_from.endswith(".index.json"):
+            return resume_from[:-len(".index.json")] + ".jsonl"
+        return resume_from
+    
+    def open_checkpoint(self):
+        """
+        打开检查点：resume_from 指定时载入其中已完成的结果并继续追加，否则按开始时间新建
+
+        检查点中的每条结果（成功或失败）都算作已完成，恢复时不会重试失败的轮次。
+        resume_from 指向的检查点不存在时抛出 FileNotFoundError（不会静默地从头开始）
+        """
+        if self.resume_from:
+            path = self.checkpoint_path(self.resume_from)
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Checkpoint not found: {path}")
+        else:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"inquiry_test_results_{self.test_start_time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.checkpoint = ResultStore(path, window=0, fsync_batch=Config.CHECKPOINT_FSYNC_BATCH)
+        if self.resume_from:
+            self.results = self.checkpoint.load_all()
+            self.completed = {(r.get("type"), r.get("index")) for r in self.results}
+            try:
+                with open(self._checkpoint_stem() + ".index.json", encoding="utf-8") as f:
+                    self.test_start_time = datetime.fromisoformat(json.load(f)["test_start_time"])
+            except (OSError, ValueError, KeyError):
+                pass
+            self.logger.info(f"Resuming from checkpoint {path}: {len(self.results)} results already completed")
+    
+    def _checkpoint_stem(self) -> str:
+        return os.path.splitext(self.checkpoint.path)[0]
+    
+    def record_result(self, result: Dict[str, Any]):
+        """记录一轮结果并追加到检查点"""
+        self.results.append(result)
+        self.completed.add((result.get("type"), result.get("index")))
+        if self.checkpoint is not None:
+            self.checkpoint.append(result)
+    
+    def save_results(self, final: bool = False):
+        """
+        保存检查点：已追加的结果落盘，并更新摘要索引（<名称>.index.json，原子替换）
+        
+        结果在 record_result 时已逐条追加，这里不再重写全部结果；final=True 时另外生成一次
+        完整的 JSON 和文本结果文件（与检查点同名）。
+        """
+        if self.checkpoint is None:
+            self.open_checkpoint()
+        self.checkpoint.sync()
+        stem = self._checkpoint_stem()
+        successful = sum(1 for r in self.results if r.get("success"))
+        index = {
+            "checkpoint": os.path.basename(self.checkpoint.path),
+            "test_start_time": self.test_start_time.isoformat(),
+            "updated_time": datetime.now().isoformat(),
+            "total_tests": len(self.results),
+            "successful": successful,
+            "failed": len(self.results) - successful,
+            "finished": final,
+        }
+        tmp_file = stem + ".index.json.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, stem + ".index.json")
+        if not final:
+            return
         
-        results_file = os.path.join(results_dir, f"inquiry_test_results_{timestamp}.json")
-        text_file = os.path.join(results_dir, f"inquiry_test_results_{timestamp}.txt")
+        results_file = stem + ".json"
+        text_file = stem + ".txt"
         
         # 保存JSON格式
         with open(results_file, 'w', encoding='utf-8') as f:
@@ -554,11 +642,18 @@ class InquiryTester:
             self.logger.warning("没有执行任何测试，请检查音频文件是否存在")
         self.logger.info("=" * 60)
 
-async def main():
+async def main(resume_from: Optional[str] = None):
     """主函数"""
-    tester = InquiryTester()
+    tester = InquiryTester(resume_from)
     await tester.run_test()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="询问和购买测试")
+    parser.add_argument("--resume", default=None,
+                        help="从检查点继续（results/inquiry_test_results_<时间>.jsonl），跳过已完成的轮次"
+                             "（失败的轮次也算已完成，不会重试）")
+    args = parser.parse_args()
+    if args.resume and not os.path.isfile(InquiryTester.checkpoint_path(args.resume)):
+        parser.error(f"checkpoint not found: {InquiryTester.checkpoint_path(args.resume)}")
+    loop_runtime.run(main(args.resume), Config.USE_UVLOOP)
 
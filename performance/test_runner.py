@@ -11,6 +11,9 @@ from websocket_client import WebSocketClient
 from iot_hardware_simulator import IoTHardwareSimulator
 from metrics_collector import MetricsCollector
 from audio_encoder import AudioEncoder
+import loop_runtime
+from loop_runtime import LoopLagMonitor
+from arrival_scheduler import OpenLoopDispatcher, build_profile, parse_profile_spec
 
 class TestRunner:
     """测试运行器类"""
@@ -21,6 +24,9 @@ class TestRunner:
         self.audio_encoder = AudioEncoder() if Config.SEND_AUDIO_DATA else None
         self.clients: List[WebSocketClient] = []
         self.running = True
+        # 停止事件：Ctrl+C 时置位，唤醒所有正在等待响应的连接
+        self.stop_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         
         # 预生成音频帧列表（如果启用）
         self.test_audio_frames: Optional[List[bytes]] = None
@@ -41,6 +47,8 @@ class TestRunner:
         """信号处理器（Ctrl+C）"""
         self.logger.info("收到中断信号，正在停止测试...")
         self.running = False
+        if self._loop is not None and self.stop_event is not None:
+            self._loop.call_soon_threadsafe(self.stop_event.set)
     
     async def _delayed_connection(self, connection_id: int, delay: float) -> WebSocketClient:
         """延迟启动连接（用于均匀分布连接启动时间）"""
@@ -64,23 +72,10 @@ class TestRunner:
                 if Config.HEARTBEAT_ENABLED:
                     await simulator.start_heartbeat(Config.HEARTBEAT_INTERVAL_SEC)
 
-                # 等待服务器下发 auth/session_id
+                # 等待服务器下发 auth/session_id（事件驱动，收到即返回）
                 # 极限性能模式：减少等待时间
-                if Config.STRESS_TEST_MODE:
-                    max_wait_server_msg = Config.STRESS_AUTH_WAIT_SEC
-                    initial_wait = 0.1
-                else:
-                    max_wait_server_msg = 3.0
-                    initial_wait = 0.2
-                
-                wait_server_msg_time = 0.0
-                check_interval = 0.1
-                await asyncio.sleep(initial_wait)
-                while wait_server_msg_time < max_wait_server_msg and simulator.client.is_connected:
-                    if simulator.client.auth_received or simulator.client.session_id:
-                        break
-                    await asyncio.sleep(check_interval)
-                    wait_server_msg_time += check_interval
+                max_wait_server_msg = Config.STRESS_AUTH_WAIT_SEC if Config.STRESS_TEST_MODE else 3.0
+                await simulator.client.wait_for_auth(timeout=max_wait_server_msg)
                 
                 # 性能测试模式：每个连接只发送一次消息，避免产生多次聊天记录
                 # 使用 auto 或 manual 模式，确保一次完整的请求-响应循环
@@ -104,15 +99,12 @@ class TestRunner:
                 else:
                     max_wait_time = Config.TTS_TIMEOUT / 1000.0
                 
-                wait_time = 0
-                check_interval = 0.1
-                
-                while wait_time < max_wait_time and self.running:
-                    await asyncio.sleep(check_interval)
-                    wait_time += check_interval
-                    if simulator.client.has_tts_stop:
-                        self.logger.info(f"连接 #{connection_id}: 通过模拟器收到完整响应，耗时 {wait_time:.1f}秒")
-                        break
+                loop = asyncio.get_running_loop()
+                wait_start = loop.time()
+                await self._wait_for_response(simulator.client, max_wait_time)
+                wait_time = loop.time() - wait_start
+                if simulator.client.has_tts_stop:
+                    self.logger.info(f"连接 #{connection_id}: 通过模拟器收到完整响应，耗时 {wait_time:.1f}秒")
                 
                 # 等待结束后，记录收到的响应状态（用于诊断）
                 if not simulator.client.has_tts_stop:
@@ -148,27 +140,10 @@ class TestRunner:
                 self.logger.error_log(connection_id, "ConnectionFailed", "Failed to establish connection")
                 return client
             
-            # 等待收到服务器消息
+            # 等待收到服务器消息（auth 或 session_id，事件驱动，收到即返回）
             # 极限性能模式：减少等待时间
-            if Config.STRESS_TEST_MODE:
-                max_wait_server_msg = Config.STRESS_AUTH_WAIT_SEC
-                initial_wait = 0.1
-            else:
-                max_wait_server_msg = 3.0
-                initial_wait = 0.2
-            
-            wait_server_msg_time = 0
-            check_interval = 0.1  # 每 100ms 检查一次
-            
-            # 等待一小段时间让消息到达
-            await asyncio.sleep(initial_wait)
-            
-            # 检查是否收到消息或有 session_id
-            while wait_server_msg_time < max_wait_server_msg and client.is_connected:
-                if client.auth_received or client.session_id:
-                    break
-                await asyncio.sleep(check_interval)
-                wait_server_msg_time += check_interval
+            max_wait_server_msg = Config.STRESS_AUTH_WAIT_SEC if Config.STRESS_TEST_MODE else 3.0
+            await client.wait_for_auth(timeout=max_wait_server_msg)
             
             if not client.session_id and not client.auth_received:
                 self.logger.debug(f"Connection #{connection_id}: No auth message received, proceeding anyway")
@@ -190,30 +165,23 @@ class TestRunner:
                 else:
                     max_wait_time = Config.TTS_TIMEOUT / 1000.0  # 转换为秒
                 
-                wait_time = 0
-                check_interval = 0.1  # 每 100ms 检查一次
-                
                 # 记录初始连接状态
                 initial_connected = client.is_connected
                 self.logger.debug(f"Connection #{connection_id}: Starting wait, connected: {initial_connected}")
                 
-                while wait_time < max_wait_time and self.running:
-                    await asyncio.sleep(check_interval)
-                    wait_time += check_interval
-                    
-                    # 定期检查连接状态（每5秒检查一次）
-                    if int(wait_time * 10) % 50 == 0:  # 每5秒
-                        if not client.is_connected:
-                            self.logger.warning(
-                                f"Connection #{connection_id}: Connection lost during wait "
-                                f"(at {wait_time:.1f}s), received_msgs: {client.received_messages}"
-                            )
-                            break
-                    
-                    # 检查是否收到完整响应
-                    if client.has_tts_stop:
-                        self.logger.info(f"Connection #{connection_id}: Received complete response at {wait_time:.1f}s")
-                        break
+                # 等待TTS stop事件（连接断开或测试停止时提前返回）
+                loop = asyncio.get_running_loop()
+                wait_start = loop.time()
+                await self._wait_for_response(client, max_wait_time)
+                wait_time = loop.time() - wait_start
+                
+                if client.has_tts_stop:
+                    self.logger.info(f"Connection #{connection_id}: Received complete response at {wait_time:.1f}s")
+                elif not client.is_connected:
+                    self.logger.warning(
+                        f"Connection #{connection_id}: Connection lost during wait "
+                        f"(at {wait_time:.1f}s), received_msgs: {client.received_messages}"
+                    )
                 
                 # 记录等待结束时的状态
                 final_connected = client.is_connected
@@ -236,8 +204,109 @@ class TestRunner:
         
         return client
     
+    async def _wait_for_response(self, client: WebSocketClient, timeout: float) -> bool:
+        """等待完整响应（TTS stop），连接断开、测试停止或超时时返回，返回是否收到"""
+        if not self.running:
+            return client.has_tts_stop
+        events = [client.tts_stop_event]
+        if self.stop_event is not None:
+            events.append(self.stop_event)
+        await client.wait_for_stage(*events, timeout=timeout)
+        return client.has_tts_stop
+    
+    async def run_connections(self, actual_connections: int) -> list:
+        """闭环模式：每个连接建立后发送一次消息并等待响应"""
+        # 创建所有连接任务
+        # 极限性能测试：100个连接在1秒内均匀分布发送，模拟真实场景
+        tasks = []
+        if actual_connections > 1:
+            # 计算每个连接之间的间隔（秒）
+            total_spread_time = 1.0  # 1秒内分布
+            interval = total_spread_time / actual_connections
+            
+            self.logger.info(f"连接启动方式: 在 {total_spread_time} 秒内均匀分布 {actual_connections} 个连接（间隔 {interval*1000:.1f}ms）")
+            
+            for i in range(1, actual_connections + 1):
+                if not self.running:
+                    break
+                # 计算这个连接的启动延迟
+                delay = (i - 1) * interval
+                task = asyncio.create_task(self._delayed_connection(i, delay))
+                tasks.append(task)
+        else:
+            # 单个连接，直接启动
+            for i in range(1, actual_connections + 1):
+                if not self.running:
+                    break
+                task = asyncio.create_task(self.run_single_connection(i))
+                tasks.append(task)
+        
+        # 等待所有任务完成
+        self.logger.info(f"等待 {len(tasks)} 个连接完成...")
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def run_open_model(self, actual_connections: int, profile) -> list:
+        """开放模型：先建立全部连接，再按到达曲线把对话派发给空闲连接（每轮记录一条指标）"""
+        self.logger.info(f"开放模型到达调度: {profile.describe()}")
+        max_wait_server_msg = Config.STRESS_AUTH_WAIT_SEC if Config.STRESS_TEST_MODE else 3.0
+        if Config.STRESS_TEST_MODE:
+            max_wait_time = Config.get_stress_response_wait_sec()
+        else:
+            max_wait_time = Config.TTS_TIMEOUT / 1000.0
+        audio_frames = self.test_audio_frames if Config.SEND_AUDIO_DATA else None
+        
+        async def connect(connection_id: int) -> WebSocketClient:
+            client = WebSocketClient(connection_id)
+            self.clients.append(client)
+            if await client.connect():
+                await client.wait_for_auth(timeout=max_wait_server_msg)
+            else:
+                self.logger.error_log(connection_id, "ConnectionFailed", "Failed to establish connection")
+            return client
+        
+        clients = await asyncio.gather(*(connect(i) for i in range(1, actual_connections + 1)))
+        ready = [c for c in clients if c.is_connected]
+        # 连接失败的连接也计入指标（与闭环模式一致）
+        for client in clients:
+            if not client.is_connected:
+                self.metrics_collector.add_metrics(client.get_metrics())
+        self.logger.info(f"已建立 {len(ready)}/{len(clients)} 个连接，开始按到达曲线派发")
+        
+        async def run_turn(client: WebSocketClient, arrival):
+            client.begin_turn()
+            await client.send_user_message(Config.TEST_MESSAGE, audio_frames)
+            await self._wait_for_response(client, max_wait_time)
+            self.metrics_collector.add_metrics(arrival.annotate(client.get_metrics()))
+        
+        results = []
+        if ready:
+            dispatcher = OpenLoopDispatcher(
+                profile, ready, run_turn, should_stop=lambda: not self.running,
+                late_tolerance_ms=Config.ARRIVAL_LATE_TOLERANCE_MS
+            )
+            dispatch_stats = await dispatcher.run()
+            self.metrics_collector.harness_metrics["dispatch"] = dispatch_stats
+            self.logger.info(
+                f"派发完成: 计划 {dispatch_stats['expected_arrivals']}, 实际 {dispatch_stats['dispatched']}, "
+                f"达成到达率 {dispatch_stats.get('achieved_rate', 0)}/s, 迟到派发 {dispatch_stats.get('late', 0)}"
+            )
+        
+        for client in ready:
+            try:
+                await client.close()
+            except Exception as e:
+                results.append(e)
+        return results
+    
     async def run_concurrent_test(self):
         """运行并发测试"""
+        self._loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        # 采样事件循环调度延迟，判断高尾延迟是否来自压测端自身
+        loop_monitor = LoopLagMonitor(self._loop, Config.LOOP_LAG_SAMPLE_INTERVAL_MS)
+        loop_monitor.start()
+        if not self.running:
+            self.stop_event.set()
         # 获取实际并发连接数（调试模式返回1）
         actual_connections = Config.get_concurrent_connections()
         mode_str = "DEBUG MODE" if Config.DEBUG_MODE else "TEST MODE"
@@ -264,6 +333,7 @@ class TestRunner:
         
         self.logger.info(f"测试消息: {Config.TEST_MESSAGE}")
         self.logger.info(f"服务器地址: {Config.get_websocket_url()}")
+        self.logger.info(f"事件循环: {loop_runtime.loop_implementation(self._loop)}")
         self.logger.info(f"设备SN: {Config.DEVICE_SN} (已注册)")
         self.logger.info(f"板卡类型: {Config.BOARD_TYPE}")
         self.logger.info(f"发送音频数据: {Config.SEND_AUDIO_DATA}")
@@ -271,34 +341,13 @@ class TestRunner:
         
         self.metrics_collector.start_test()
         
-        # 创建所有连接任务
-        # 极限性能测试：100个连接在1秒内均匀分布发送，模拟真实场景
-        tasks = []
-        if actual_connections > 1:
-            # 计算每个连接之间的间隔（秒）
-            total_spread_time = 1.0  # 1秒内分布
-            interval = total_spread_time / actual_connections
-            
-            self.logger.info(f"连接启动方式: 在 {total_spread_time} 秒内均匀分布 {actual_connections} 个连接（间隔 {interval*1000:.1f}ms）")
-            
-            for i in range(1, actual_connections + 1):
-                if not self.running:
-                    break
-                # 计算这个连接的启动延迟
-                delay = (i - 1) * interval
-                task = asyncio.create_task(self._delayed_connection(i, delay))
-                tasks.append(task)
+        arrival = parse_profile_spec(Config.ARRIVAL_PROFILE)
+        if arrival:
+            results = await self.run_open_model(actual_connections, build_profile(arrival))
         else:
-            # 单个连接，直接启动
-            for i in range(1, actual_connections + 1):
-                if not self.running:
-                    break
-                task = asyncio.create_task(self.run_single_connection(i))
-                tasks.append(task)
-        
-        # 等待所有任务完成
-        self.logger.info(f"等待 {len(tasks)} 个连接完成...")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+            results = await self.run_connections(actual_connections)
+        loop_monitor.stop()
+        self.metrics_collector.harness_metrics["loop_lag"] = loop_monitor.get_stats(Config.LOOP_LAG_WARN_MS)
         
         # 检查结果中的异常
         for i, result in enumerate(results, 1):
@@ -307,10 +356,11 @@ class TestRunner:
                 import traceback
                 self.logger.error(traceback.format_exc())
         
-        # 收集指标
-        for client in self.clients:
-            metrics = client.get_metrics()
-            self.metrics_collector.add_metrics(metrics)
+        # 收集指标（开放模型已按轮次记录）
+        if not arrival:
+            for client in self.clients:
+                metrics = client.get_metrics()
+                self.metrics_collector.add_metrics(metrics)
         
         self.metrics_collector.end_test()
         
@@ -331,10 +381,17 @@ class TestRunner:
         if not is_valid:
             self.logger.error(f"配置验证失败: {error_message}")
             sys.exit(1)
+        try:
+            arrival = parse_profile_spec(Config.ARRIVAL_PROFILE)
+            if arrival:
+                build_profile(arrival)
+        except ValueError as e:
+            self.logger.error(f"到达曲线配置无效 (ARRIVAL_PROFILE): {e}")
+            sys.exit(1)
         
         # 运行测试
         try:
-            asyncio.run(self.run_concurrent_test())
+            loop_runtime.run(self.run_concurrent_test(), Config.USE_UVLOOP)
         except KeyboardInterrupt:
             self.logger.info("测试被用户中断")
         except Exception as e:
@@ -0,0 +1,158 @@
+"""
+单轮对话时间线：用单调高精度时钟记录每个协议事件
+
+time.time() 会被 NTP 调整、分辨率也较粗，两次读数相减得到的延迟可能为负或跳变。
+这里所有事件都用 time.perf_counter_ns() 记录，只在模块导入时读取一次墙上时钟作为锚点，
+需要显示绝对时间时再由锚点换算（ns_to_wall_ms），保证同一进程内的时间差只来自单调时钟。
+
+每轮对话开始前创建新的 TurnTimeline，本轮之后收到的事件才会写入，
+因此不再需要"时间戳在发送前 2 秒以内"之类的启发式判断。
+TurnState 把时间线和本轮的响应状态（STT/LLM 文本、各阶段标志）放在一起，每轮一个对象。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+# 进程级锚点：墙上时钟只读取这一次
+_ANCHOR_NS = time.perf_counter_ns()
+_ANCHOR_WALL_MS = time.time() * 1000
+
+# 协议事件
+START_LISTEN = "start_listen"              # start_listen 已发送
+FIRST_AUDIO_FRAME = "first_audio_frame"    # 第一帧音频发送前
+LAST_AUDIO_FRAME = "last_audio_frame"      # 最后一帧音频发送后
+STOP_LISTEN = "stop_listen"                # stop_listen 已发送
+STT = "stt"                                # 第一个 STT 结果
+FIRST_LLM = "first_llm"                    # 第一个 LLM 结果（或第一句 sentence_start 文本）
+TTS_START = "tts_start"                    # TTS start（没有时用第一句 sentence_start）
+SECOND_SENTENCE = "second_sentence"        # 第二句 sentence_start（跳过"好嘞，请稍等"）
+TTS_STOP = "tts_stop"                      # TTS stop
+FIRST_TTS_AUDIO = "first_tts_audio"        # 本轮第一帧下行 TTS 音频到达
+
+# 常用的回退组合：按顺序取第一个已记录的事件
+SEND_END = (STOP_LISTEN, LAST_AUDIO_FRAME)   # 发送语音结束（发送了 stop_listen 时以其为准）
+RESPONSE_END = (TTS_STOP, TTS_START)         # 响应结束（没有 TTS stop 时用 TTS start）
+
+EventRef = Union[str, Tuple[str, ...]]
+
+
+def now_ns() -> int:
+    """当前单调时钟读数（纳秒）"""
+    return time.perf_counter_ns()
+
+
+def ns_to_wall_ms(ns: int) -> float:
+    """把单调时钟读数换算为墙上时钟毫秒时间戳（仅用于显示）"""
+    return _ANCHOR_WALL_MS + (ns - _ANCHOR_NS) / 1e6
+
+
+def monotonic_wall_ms() -> float:
+    """锚定到墙上时钟的单调毫秒时间戳，可与 utils.get_timestamp() 的结果对照显示"""
+    return ns_to_wall_ms(time.perf_counter_ns())
+
+
+class TurnTimeline:
+    """一轮对话的事件时间线（纳秒，单调时钟）"""
+
+    __slots__ = ("created_ns", "events", "sentence_starts", "sentences")
+
+    def __init__(self):
+        self.created_ns = time.perf_counter_ns()
+        self.events: Dict[str, int] = {}
+        self.sentence_starts: List[int] = []
+        self.sentences: List[Tuple[str, int, str]] = []   # 每个回复句子事件：(来源 "llm"/"tts", 时间, 文本)
+
+    def mark(self, event: str, ns: Optional[int] = None, overwrite: bool = False) -> int:
+        """记录事件时间（默认只保留第一次），返回该事件最终的时间"""
+        if ns is None:
+            ns = time.perf_counter_ns()
+        if overwrite or event not in self.events:
+            self.events[event] = ns
+        return self.events[event]
+
+    def mark_sentence_start(self, ns: Optional[int] = None) -> int:
+        """记录一句 sentence_start，返回这是第几句（从 1 开始）"""
+        if ns is None:
+            ns = time.perf_counter_ns()
+        self.sentence_starts.append(ns)
+        if len(self.sentence_starts) == 2:
+            self.mark(SECOND_SENTENCE, ns)
+        return len(self.sentence_starts)
+
+    def mark_sentence(self, source: str, text: str, ns: Optional[int] = None) -> int:
+        """记录一个回复句子事件（llm 文本块或 TTS sentence_start），返回其时间"""
+        if ns is None:
+            ns = time.perf_counter_ns()
+        self.sentences.append((source, ns, text))
+        return ns
+
+    def has(self, event: str) -> bool:
+        return event in self.events
+
+    def get(self, event: EventRef) -> Optional[int]:
+        """事件时间（纳秒）；传入元组时返回第一个已记录的事件"""
+        if isinstance(event, str):
+            return self.events.get(event)
+        for name in event:
+            ns = self.events.get(name)
+            if ns is not None:
+                return ns
+        return None
+
+    def wall_ms(self, event: EventRef) -> Optional[float]:
+        """事件的墙上时钟毫秒时间戳（仅用于显示）"""
+        ns = self.get(event)
+        return ns_to_wall_ms(ns) if ns is not None else None
+
+    def elapsed_ms(self, start: EventRef, end: EventRef) -> Optional[float]:
+        """两个事件之间的耗时（毫秒），任一事件未记录时返回 None"""
+        start_ns = self.get(start)
+        end_ns = self.get(end)
+        if start_ns is None or end_ns is None:
+            return None
+        return (end_ns - start_ns) / 1e6
+
+    def since_ms(self, event: EventRef) -> Optional[float]:
+        """从事件发生到现在的耗时（毫秒）"""
+        ns = self.get(event)
+        return (time.perf_counter_ns() - ns) / 1e6 if ns is not None else None
+
+    def to_dict(self) -> Dict[str, object]:
+        """导出为相对本轮开始的毫秒偏移，附带墙上时钟起点，便于写入结果文件"""
+        base = self.created_ns
+        return {
+            "start_wall_ms": round(ns_to_wall_ms(base), 3),
+            "events_ms": {name: round((ns - base) / 1e6, 3) for name, ns in self.events.items()},
+            "sentence_starts_ms": [round((ns - base) / 1e6, 3) for ns in self.sentence_starts],
+        }
+
+
+class TurnState:
+    """
+    一轮对话的响应状态
+
+    每轮由 WebSocketClient.begin_turn() 新建并分配递增的轮次 ID，
+    服务器消息只写入所属轮次，上一轮的迟到消息不会污染本轮。
+    """
+
+    __slots__ = ("turn_id", "timeline", "stt_text", "llm_text_buffer",
+                 "has_stt", "has_llm", "has_tts_start", "has_tts_stop", "stragglers", "pacing", "downlink")
+
+    def __init__(self, turn_id: int):
+        self.turn_id = turn_id
+        self.timeline = TurnTimeline()
+        self.stt_text = ""
+        self.llm_text_buffer: List[str] = []   # LLM返回的文本内容
+        self.has_stt = False
+        self.has_llm = False
+        self.has_tts_start = False
+        self.has_tts_stop = False
+        self.stragglers = 0   # 本轮进行期间收到的、属于其它轮次的迟到消息数
+        self.pacing: Optional[Dict[str, float]] = None   # 持续输入模式的帧节拍统计（见 audio_pacer）
+        self.downlink = None   # 本轮收到的下行 TTS 音频帧（DownlinkAudio，见 downlink_audio）
+
+    @property
+    def started(self) -> bool:
+        """本轮是否已发送 start_listen（之后到达的响应才可能属于本轮）"""
+        return START_LISTEN in self.timeline.events
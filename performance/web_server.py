@@ -26,6 +26,8 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from test_inquiries import InquiryTester
 from config import Config
+from run_settings import RunSettings
+import loop_runtime
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'test-secret-key-2025'
@@ -54,6 +56,8 @@ test_state = {
 # 测试器实例
 tester_instance = None
 test_thread = None
+# 最近一次 /api/start 的服务器地址和测试模式（见 run_settings），不再写回 Config
+current_run_settings = None
 
 def emit_test_update(event, data):
     """发送测试更新到前端"""
@@ -72,8 +76,8 @@ def emit_test_update(event, data):
 class WebInquiryTester(InquiryTester):
     """带WebSocket通知的测试器"""
     
-    def __init__(self):
-        super().__init__()
+    def __init__(self, settings=None):
+        super().__init__(settings=settings)
         self.current_index = 0
         self.current_client = None  # 保存当前测试的客户端，用于实时更新
     
@@ -218,10 +222,6 @@ class WebInquiryTester(InquiryTester):
             connections_per_sn = 1
             total_connections = len(device_sns)
         
-        # 设置测试模式到Config（供test_single_audio使用）
-        from config import Config
-        Config.TEST_MODE = test_mode
-        
         try:
             # 初始化状态
             test_state["is_running"] = True
@@ -295,7 +295,7 @@ class WebInquiryTester(InquiryTester):
                 connection_id = 1
                 for sn in device_sns:
                     for conn_idx in range(connections_per_sn):
-                        clients.append(WebSocketClient(connection_id=connection_id, device_sn=sn))
+                        clients.append(WebSocketClient(connection_id=connection_id, device_sn=sn, settings=self.settings))
                         connection_id += 1
                 
                 self.logger.info(f"共创建 {len(clients)} 个WebSocket客户端")
@@ -461,8 +461,8 @@ class WebInquiryTester(InquiryTester):
 def run_test_async():
     """在异步环境中运行测试"""
     global tester_instance
-    tester_instance = WebInquiryTester()
-    loop = asyncio.new_event_loop()
+    tester_instance = WebInquiryTester(settings=current_run_settings)
+    loop = loop_runtime.new_event_loop(Config.USE_UVLOOP)
     asyncio.set_event_loop(loop)
     loop.run_until_complete(tester_instance.run_test())
     loop.close()
@@ -882,7 +882,7 @@ def format_pdf_time(ms):
 @app.route('/api/start', methods=['POST'])
 def start_test():
     """开始测试"""
-    global test_state, test_thread
+    global test_state, test_thread, current_run_settings
     
     if test_state["is_running"]:
         return jsonify({"error": "测试正在进行中"}), 400
@@ -907,29 +907,12 @@ def start_test():
     if test_mode not in ['normal', 'fast']:
         return jsonify({"error": "测试模式无效，必须是 'normal' 或 'fast'"}), 400
     
-    # 验证WebSocket URL（如果提供了）
-    if ws_url and not (ws_url.startswith('ws://') or ws_url.startswith('wss://')):
-        return jsonify({"error": "WebSocket地址格式不正确，应以 ws:// 或 wss:// 开头"}), 400
-    
-    # 如果提供了WebSocket URL，设置到Config
-    if ws_url:
-        from config import Config
-        from urllib.parse import urlparse
-        # 解析URL，判断是WS还是WSS
-        # 处理ws://和wss://协议
-        if ws_url.startswith('wss://'):
-            parsed = urlparse(ws_url.replace('wss://', 'http://'))
-            host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-            Config.WSS_SERVER_HOST = f"wss://{host_with_port}"
-            Config.WS_SERVER_HOST = f"ws://{host_with_port}"
-            Config.USE_SSL = True
-        else:
-            parsed = urlparse(ws_url.replace('ws://', 'http://'))
-            host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-            Config.WS_SERVER_HOST = f"ws://{host_with_port}"
-            Config.WSS_SERVER_HOST = f"wss://{host_with_port}"
-            Config.USE_SSL = False
-        print(f"WebSocket URL已设置为: {Config.WSS_SERVER_HOST if Config.USE_SSL else Config.WS_SERVER_HOST} (USE_SSL={Config.USE_SSL})")
+    # 本次运行的服务器地址和测试模式（不修改全局 Config）
+    try:
+        run_settings = RunSettings.from_config(test_mode=test_mode).with_ws_url(ws_url)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    print(f"WebSocket URL: {run_settings.server_host} (USE_SSL={run_settings.use_ssl})")
     
     # 保存设置到全局变量，供测试使用
     test_state["settings"] = {
@@ -938,6 +921,7 @@ def start_test():
         "test_mode": test_mode,
         "ws_url": ws_url
     }
+    current_run_settings = run_settings
     
     # 重置状态
     test_state["is_running"] = True
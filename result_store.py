@@ -0,0 +1,127 @@
+"""
+磁盘结果存储：每轮结果追加写入 JSONL 文件，内存中只保留最近 window 条
+
+长时间压测（例如通宵稳定性测试）如果把每条结果（含完整 STT/LLM 文本）都留在内存里，
+进程内存无限增长，新打开的看板还会一次收到全部结果。ResultStore：
+    - append: 结果序列化为一行 JSON 追加到文件并立即 flush，同时记录该行的字节偏移
+    - recent: 最近 window 条结果（内存中），用于看板状态和实时推送
+    - page:   按偏移索引分页读取任意区间，不加载整个文件
+    - load_all / iter_results: 生成报告时从磁盘读取全部结果
+    - fsync_batch: 每追加 N 条 fsync 一次（0 表示只 flush，交给操作系统），sync() 立即落盘；
+      进程或机器中断后文件里是完整的若干行（最后半行在重新打开时丢弃），可以作为检查点恢复
+
+测试线程写入、Flask 请求线程读取：写入和偏移索引在锁内更新，读取使用独立的文件句柄，
+只读到加锁时记录的文件末尾，不会读到写了一半的行。
+
+本模块不依赖 config/logger，performance/ 下的独立脚本也可以直接使用。
+"""
+import os
+import json
+import threading
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+
+class ResultStore:
+    """追加写入的 JSONL 结果文件 + 最近 window 条的内存窗口"""
+
+    def __init__(self, path: str, window: int = 200, fsync_batch: int = 0):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self._unsynced = 0
+        self.window: deque = deque(maxlen=max(window, 0))
+        self._lock = threading.Lock()
+        self._offsets = array("Q")     # 每行的起始字节偏移
+        self._end = 0                  # 已完整写入的文件末尾
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # 已存在的文件：重建偏移索引后继续追加
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break   # 上次中断时写了一半的行，丢弃
+                    self._offsets.append(offset)
+                    offset += len(line)
+            self._end = offset
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+            for record in self._read_range(max(len(self._offsets) - self.window.maxlen, 0), len(self._offsets)):
+                self.window.append(record)
+        self._file = open(path, "ab")
+
+    @classmethod
+    def create(cls, directory: str, prefix: str = "run", window: int = 200) -> "ResultStore":
+        """在 directory 下新建 <prefix>_<时间>.jsonl"""
+        filename = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+        return cls(os.path.join(directory, filename), window)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def append(self, result: Dict[str, Any]):
+        line = (json.dumps(result, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._offsets.append(self._end)
+            self._end += len(line)
+            self.window.append(result)
+            self._unsynced += 1
+            if self.fsync_batch and self._unsynced >= self.fsync_batch:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def sync(self):
+        """把已追加的结果落盘（fsync）"""
+        with self._lock:
+            if self._unsynced and not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """内存中最近的结果（按完成顺序）"""
+        with self._lock:
+            return list(self.window)
+
+    def _read_range(self, start: int, stop: int) -> Iterator[Dict[str, Any]]:
+        if start >= stop:
+            return
+        end = self._offsets[stop] if stop < len(self._offsets) else self._end
+        with open(self.path, "rb") as f:
+            f.seek(self._offsets[start])
+            data = f.read(end - self._offsets[start])
+        for line in data.splitlines():
+            yield json.loads(line)
+
+    def page(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """第 offset 条起的 limit 条结果（offset 为负数时从末尾倒数）"""
+        with self._lock:
+            total = len(self._offsets)
+            if offset < 0:
+                offset = max(total + offset, 0)
+            stop = min(offset + max(limit, 0), total)
+            return list(self._read_range(offset, stop))
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """逐条读取全部结果（读取开始时已写入的部分）"""
+        with self._lock:
+            total = len(self._offsets)
+        batch = 1000
+        for start in range(0, total, batch):
+            with self._lock:
+                records = list(self._read_range(start, min(start + batch, total)))
+            yield from records
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        return list(self.iter_results())
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
@@ -0,0 +1,344 @@
+"""
+多进程分片压测：把连接集合分到 N 个工作进程，每个进程有独立的事件循环
+
+Web 测试原来把所有客户端放在 Flask 后台线程的一个事件循环里，同时还要服务 SocketIO，
+整个压测端只能用满一个核。分片模式下：
+    - 协调者（web_server 的测试线程）按连接ID把 (connection_id, sn) 列表切成连续的 N 段，
+      每个工作进程只负责自己那一段连接（也就是 device_sns 的一个切片）；
+    - 测试任务放在跨进程的任务队列里，各进程的客户端完成一个再取下一个（与单进程的共享队列一致），
+      某个进程连接失败时它的任务会被其它进程取走；
+    - 工作进程把结果和前端事件（test_start、test_detail_update）通过结果队列流回协调者，
+      协调者照常更新 test_state、发送进度并生成同样的报告。
+
+工作进程用 spawn 方式启动（Windows 只支持 spawn，也避免在带线程的 Flask 进程里 fork），
+本次运行的 RunSettings（服务器地址、测试模式等）随分片计划一起传给子进程。
+"""
+import os
+import asyncio
+import multiprocessing
+import queue
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from run_settings import RunSettings
+from test_inquiries import InquiryTester
+import loop_runtime
+from loop_runtime import LoopLagMonitor
+from arrival_scheduler import OpenLoopDispatcher, build_profile
+
+# 工作进程 -> 协调者 的消息
+MSG_EVENT = "event"     # (MSG_EVENT, 事件名, 数据)：转发给前端的 SocketIO 事件
+MSG_RESULT = "result"   # (MSG_RESULT, 测试结果, concurrency_index)
+MSG_DONE = "done"       # (MSG_DONE, 分片序号, 分片统计)
+
+
+def plan_shards(device_sns: List[str], connections_per_sn: int, workers: int) -> List[Dict[str, Any]]:
+    """
+    按连接ID把连接切成连续的 workers 段（连接ID与单进程模式一致，从1开始）
+
+    Returns:
+        [{"shard_index", "connections": [(connection_id, sn), ...], "device_sns"}, ...]
+    """
+    connections = []
+    connection_id = 1
+    for sn in device_sns:
+        for _ in range(connections_per_sn):
+            connections.append((connection_id, sn))
+            connection_id += 1
+
+    workers = max(1, min(workers, len(connections)))
+    base, extra = divmod(len(connections), workers)
+    shards = []
+    start = 0
+    for shard_index in range(workers):
+        size = base + (1 if shard_index < extra else 0)
+        shard_connections = connections[start:start + size]
+        start += size
+        shards.append({
+            "shard_index": shard_index,
+            "connections": shard_connections,
+            "device_sns": list(dict.fromkeys(sn for _, sn in shard_connections)),
+        })
+    return shards
+
+
+class ShardInquiryTester(InquiryTester):
+    """工作进程内的测试器：前端事件不直接发送，而是放进结果队列交给协调者转发"""
+
+    def __init__(self, shard_index: int, result_queue, settings: Optional[RunSettings] = None):
+        super().__init__(settings=settings)
+        self.shard_index = shard_index
+        self.result_queue = result_queue
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        self.result_queue.put((MSG_EVENT, event, data))
+
+    def _create_tts_sentence_callback(self, client, test_index: int, test_type: str, test_text: str):
+        """与 WebInquiryTester 相同的流式句子推送（test_detail_update）"""
+        sent_sentence_count = [0]
+
+        def callback(text: str, stt_text: str = ""):
+            llm_sentences = client.llm_text_buffer
+            new_sentences = llm_sentences[sent_sentence_count[0]:]
+            if new_sentences:
+                sent_sentence_count[0] = len(llm_sentences)
+                new_sentence = new_sentences[-1]
+            else:
+                new_sentence = ""
+            self.emit("test_detail_update", {
+                "index": test_index,
+                "type": test_type,
+                "text": test_text,
+                "stt_text": client.stt_text or "",
+                "llm_text": " ".join(llm_sentences),
+                "llm_sentence": new_sentence,
+                "status": "testing"
+            })
+
+        return callback
+
+    async def test_single_audio(self, client, audio_file: str, text: str,
+                                test_type: str, index: int, concurrency_index: int = None) -> dict:
+        client._tts_sentence_callback = self._create_tts_sentence_callback(client, index, test_type, text)
+        self.emit("test_start", {
+            "index": index,
+            "type": test_type,
+            "text": text,
+            "audio_file": os.path.basename(audio_file),
+            "status": "running",
+            "timestamp": datetime.now().isoformat(),
+            "concurrency_index": concurrency_index
+        })
+        try:
+            result = await super().test_single_audio(client, audio_file, text, test_type, index)
+        finally:
+            client._tts_sentence_callback = None
+
+        result["index"] = index
+        result["type"] = test_type
+        result["text"] = text
+        if "timestamp" not in result:
+            result["timestamp"] = datetime.now().isoformat()
+        return result
+
+
+async def _feed_tasks(task_queue, local_queue: asyncio.Queue, consumers: int, stop_event):
+    """把跨进程任务队列里的任务搬到本进程的队列（容量=活跃连接数，不多囤任务，便于其它进程分担）"""
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        try:
+            item = await loop.run_in_executor(None, task_queue.get, True, 0.5)
+        except queue.Empty:
+            continue
+        if item is None:   # 协调者在所有任务之后为每个进程放一个结束标记
+            break
+        await local_queue.put(item)
+    for _ in range(consumers):
+        await local_queue.put(None)
+
+
+async def _run_shard(shard: Dict[str, Any], settings: RunSettings, task_queue, result_queue, stop_event):
+    from websocket_client import WebSocketClient
+
+    shard_index = shard["shard_index"]
+    tester = ShardInquiryTester(shard_index, result_queue, settings)
+    logger = tester.logger
+    clients = [WebSocketClient(connection_id=cid, device_sn=sn, settings=settings)
+               for cid, sn in shard["connections"]]
+    stats = {
+        "shard_index": shard_index,
+        "pid": multiprocessing.current_process().pid,
+        "connections": len(clients),
+        "device_sns": len(shard["device_sns"]),
+        "connected": 0,
+        "completed": 0,
+    }
+    logger.info(f"分片 #{shard_index}: {len(clients)} 个连接, SN: {', '.join(shard['device_sns'])}")
+    loop_monitor = LoopLagMonitor(interval_ms=Config.LOOP_LAG_SAMPLE_INTERVAL_MS)
+    loop_monitor.start()
+
+    async def connect_and_auth(client):
+        connected = await client.connect()
+        if not connected:
+            logger.error(f"SN {client.device_sn}: 连接失败 (Conn #{client.connection_id})")
+            return False
+        await client.wait_for_auth(timeout=3.0)
+        if client.auth_failed:
+            logger.error(f"SN {client.device_sn}: 鉴权失败 (Conn #{client.connection_id})")
+            return False
+        return True
+
+    connect_results = await asyncio.gather(*(connect_and_auth(c) for c in clients))
+    active_clients = [c for c, ok in zip(clients, connect_results) if ok]
+    stats["connected"] = len(active_clients)
+
+    async def run_client_tasks(client):
+        concurrency_index = client.connection_id - 1
+        while not stop_event.is_set():
+            test_item = await local_queue.get()
+            if test_item is None:
+                break
+            try:
+                test_result = await tester.test_single_audio(
+                    client, test_item["inquiry_file"], test_item["inquiry_text"],
+                    "inquiry", test_item["index"], concurrency_index=concurrency_index
+                )
+                result_queue.put((MSG_RESULT, test_result, concurrency_index))
+                stats["completed"] += 1
+                if Config.INTER_TURN_GAP_MS > 0:
+                    await asyncio.sleep(Config.INTER_TURN_GAP_MS / 1000.0)
+            except Exception as e:
+                logger.error(f"SN {client.device_sn} (Conn #{client.connection_id}) 处理任务时出错: {e}")
+
+    async def run_arrival(client, arrival):
+        test_item = arrival.item
+        try:
+            test_result = await tester.test_single_audio(
+                client, test_item["inquiry_file"], test_item["inquiry_text"],
+                "inquiry", test_item["index"], concurrency_index=client.connection_id - 1
+            )
+        except Exception as e:
+            logger.error(f"SN {client.device_sn} (Conn #{client.connection_id}) 处理任务时出错: {e}")
+            return
+        result_queue.put((MSG_RESULT, arrival.annotate(test_result), client.connection_id - 1))
+        stats["completed"] += 1
+
+    if active_clients and shard.get("arrival"):
+        # 开放模型：本分片按缩放后的到达曲线派发，任务列表错开起点循环使用
+        items = shard["items"]
+        offset = shard_index % len(items) if items else 0
+        dispatcher = OpenLoopDispatcher(
+            build_profile(shard["arrival"], shard.get("arrival_scale", 1.0)), active_clients, run_arrival,
+            items=items[offset:] + items[:offset], max_arrivals=shard.get("max_arrivals"),
+            should_stop=stop_event.is_set, late_tolerance_ms=Config.ARRIVAL_LATE_TOLERANCE_MS
+        )
+        stats["dispatch"] = await dispatcher.run()
+    elif active_clients:
+        local_queue: asyncio.Queue = asyncio.Queue(maxsize=len(active_clients))
+        feeder = asyncio.create_task(_feed_tasks(task_queue, local_queue, len(active_clients), stop_event))
+        await asyncio.gather(*(run_client_tasks(c) for c in active_clients))
+        feeder.cancel()
+        try:
+            await feeder
+        except asyncio.CancelledError:
+            pass
+    else:
+        logger.error(f"分片 #{shard_index}: 所有连接均失败，任务留给其它分片")
+
+    for c in active_clients:
+        if c.is_connected:
+            await c.close()
+
+    loop_monitor.stop()
+    stats["loop_lag"] = loop_monitor.get_stats(Config.LOOP_LAG_WARN_MS)
+    if tester.frame_cache is not None:
+        stats["frame_cache"] = tester.frame_cache.get_stats()
+    return stats
+
+
+def shard_worker_main(shard: Dict[str, Any], settings: RunSettings,
+                      task_queue, result_queue, stop_event):
+    """工作进程入口（spawn 启动，必须是模块级函数）"""
+    stats = {"shard_index": shard["shard_index"], "connections": len(shard["connections"])}
+    try:
+        stats = loop_runtime.run(_run_shard(shard, settings, task_queue, result_queue, stop_event),
+                                 Config.USE_UVLOOP)
+    except Exception as e:
+        stats["error"] = str(e)
+    finally:
+        result_queue.put((MSG_DONE, shard["shard_index"], stats))
+
+
+class ShardedRun:
+    """
+    协调者一侧：启动工作进程、分发任务、从结果队列读取消息
+
+    用法：
+        run = ShardedRun(shards)
+        run.start(test_items)
+        while not run.finished:
+            for message in run.poll(timeout=0.5): ...
+        run.join()
+    """
+
+    def __init__(self, shards: List[Dict[str, Any]], settings: Optional[RunSettings] = None):
+        self.shards = shards
+        self.settings = settings or RunSettings.from_config()
+        self._ctx = multiprocessing.get_context("spawn")
+        self.task_queue = self._ctx.Queue()
+        self.result_queue = self._ctx.Queue()
+        self.stop_event = self._ctx.Event()
+        self.processes: List[multiprocessing.Process] = []
+        self.shard_stats: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def finished(self) -> bool:
+        return len(self.shard_stats) >= len(self.processes)
+
+    def start(self, test_items: List[Dict[str, Any]]):
+        for item in test_items:
+            self.task_queue.put(item)
+        for _ in self.shards:
+            self.task_queue.put(None)
+        for shard in self.shards:
+            process = self._ctx.Process(
+                target=shard_worker_main,
+                args=(shard, self.settings, self.task_queue, self.result_queue, self.stop_event),
+                name=f"shard-{shard['shard_index']}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def stop(self):
+        """通知工作进程不再领取新任务（进行中的对话会完成）"""
+        self.stop_event.set()
+
+    def poll(self, timeout: float = 0.5) -> List[tuple]:
+        """读取结果队列中已到达的消息（最多等待 timeout 秒），并处理异常退出的工作进程"""
+        messages = []
+        try:
+            messages.append(self.result_queue.get(timeout=timeout))
+            while True:
+                messages.append(self.result_queue.get_nowait())
+        except queue.Empty:
+            pass
+        for message in messages:
+            if message[0] == MSG_DONE:
+                self.shard_stats[message[1]] = message[2]
+        if not messages:
+            # 没有发出 done 就退出的进程（被杀死、崩溃）视为已结束
+            for shard, process in zip(self.shards, self.processes):
+                if shard["shard_index"] not in self.shard_stats and not process.is_alive():
+                    self.shard_stats[shard["shard_index"]] = {
+                        "shard_index": shard["shard_index"],
+                        "connections": len(shard["connections"]),
+                        "error": f"worker exited with code {process.exitcode}",
+                    }
+        return messages
+
+    def join(self, timeout: float = 5.0):
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        # 停止时任务队列里可能还有没取走的任务，不等待其写入线程
+        self.task_queue.cancel_join_thread()
+        self.task_queue.close()
+        self.result_queue.close()
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [self.shard_stats[i] for i in sorted(self.shard_stats)]
+
+
+def merge_frame_cache_stats(shard_stats: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """合并各分片的帧缓存统计（每个进程各有一份缓存）"""
+    caches = [s["frame_cache"] for s in shard_stats if s.get("frame_cache")]
+    if not caches:
+        return None
+    merged = {key: sum(c.get(key, 0) for c in caches)
+              for key in ("entries", "bytes", "max_bytes", "hits", "misses", "evictions")}
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = round(merged["hits"] / lookups * 100, 2) if lookups > 0 else 0.0
+    return merged
@@ -16,6 +16,14 @@ let testState = {
     }
 };
 
+// 看板显示的运行：后端可以同时进行多个运行，事件带 run_id，只处理当前显示的运行
+let activeRunId = null;
+
+// 报告等接口的 run_id 查询参数
+function runQuery() {
+    return activeRunId ? `?run_id=${encodeURIComponent(activeRunId)}` : '';
+}
+
 // 并发状态管理
 let concurrencyState = {
     requestCount: 0,  // 实际请求数量
@@ -144,13 +152,31 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// 事件名 -> 处理函数（batch_update 帧中的事件按同样的处理函数分发）
+const socketHandlers = {};
+
+function onSocketEvent(event, handler) {
+    const filtered = (data) => {
+        // 其他运行（例如另一个页面同时开始的测试）的事件不显示
+        if (data && data.run_id && activeRunId && data.run_id !== activeRunId) {
+            return;
+        }
+        if (data && data.run_id && !activeRunId) {
+            activeRunId = data.run_id;
+        }
+        handler(data);
+    };
+    socketHandlers[event] = filtered;
+    socket.on(event, filtered);
+}
+
 // 设置WebSocket监听
 function setupSocketListeners() {
     socket.on('connect', () => {
         console.log('Connected to server');
     });
 
-    socket.on('test_started', (data) => {
+    onSocketEvent('test_started', (data) => {
         console.log('Test started', data);
         updateUIForTestStart();
         // 清空并发状态指示器，准备接收新的请求
@@ -161,7 +187,7 @@ function setupSocketListeners() {
         }
     });
 
-    socket.on('test_start', (data) => {
+    onSocketEvent('test_start', (data) => {
         console.log('Test start', data);
         addConversationItem(data, 'running');
         // 添加新的请求方块（等待响应状态），并绑定到测试的index和type
@@ -176,7 +202,7 @@ function setupSocketListeners() {
         }
     });
 
-    socket.on('test_result', (data) => {
+    onSocketEvent('test_result', (data) => {
         console.log('Test result', data);
         // 确保result对象存在且包含必要字段
         if (data && data.result) {
@@ -187,13 +213,13 @@ function setupSocketListeners() {
         }
     });
 
-    socket.on('progress_update', (data) => {
+    onSocketEvent('progress_update', (data) => {
         console.log('Progress update', data);
         updateProgress(data.progress, data.total, data.total_opus_files);
         updateSummary(data.summary);
     });
 
-    socket.on('test_completed', (data) => {
+    onSocketEvent('test_completed', (data) => {
         console.log('Test completed', data);
         updateUIForTestComplete();
         // 更新统计信息（如果后端发送了summary）
@@ -203,19 +229,29 @@ function setupSocketListeners() {
         // 报告按钮始终显示，不需要额外操作
     });
 
-    socket.on('test_error', (data) => {
+    onSocketEvent('test_error', (data) => {
         console.error('Test error', data);
         showError(data.error);
         updateUIForTestComplete();
         // 报告按钮始终显示，不需要额外操作
     });
 
+    // 后端把高频事件合并成批发送：按顺序分发给各事件的处理函数
+    socket.on('batch_update', (frame) => {
+        (frame.events || []).forEach(([event, data]) => {
+            const handler = socketHandlers[event];
+            if (handler) {
+                handler(data);
+            }
+        });
+    });
+
     socket.on('status_update', (data) => {
         console.log('Status update', data);
         addStatusMessage(data.message);
     });
 
-    socket.on('test_detail_update', (data) => {
+    onSocketEvent('test_detail_update', (data) => {
         console.log('Test detail update', data);
         // 实时更新对话流中的LLM回答
         updateConversationItemLLM(data);
@@ -232,6 +268,7 @@ async function loadStatus() {
         const response = await fetch('/api/status');
         const status = await response.json();
         testState = status;
+        activeRunId = status.run_id || null;
         updateUI();
     } catch (error) {
         console.error('Failed to load status', error);
@@ -243,6 +280,8 @@ async function startTest() {
     try {
         // 重置所有页面状态
         resetTestState();
+        // 新运行的事件可能先于启动请求的响应到达，收到第一个事件时记下它的 run_id
+        activeRunId = null;
         
         // 获取当前设置
         const settings = {
@@ -274,12 +313,13 @@ async function startTest() {
             body: JSON.stringify(settings)
         });
 
+        const data = await response.json();
         if (response.ok) {
+            activeRunId = data.run_id;
             document.getElementById('btnStart').disabled = true;
             document.getElementById('btnStop').disabled = false;
             // resetTestState() 已经清空了对话，这里不需要再次调用
         } else {
-            const data = await response.json();
             alert('启动测试失败: ' + (data.error || '未知错误'));
         }
     } catch (error) {
@@ -295,7 +335,8 @@ async function stopTest() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
-            }
+            },
+            body: JSON.stringify({ run_id: activeRunId })
         });
 
         if (response.ok) {
@@ -1086,7 +1127,7 @@ async function showReport() {
         
         try {
             // 获取报告数据
-            const response = await fetch('/api/report');
+            const response = await fetch('/api/report' + runQuery());
             if (!response.ok) {
                 throw new Error('获取报告失败');
             }
@@ -1119,7 +1160,7 @@ function closeReport() {
 function exportReportPDF() {
     // 创建下载链接
     const link = document.createElement('a');
-    link.href = '/api/report/pdf';
+    link.href = '/api/report/pdf' + runQuery();
     link.download = `测试报告_${new Date().toISOString().slice(0, 19).replace(/:/g, '-')}.pdf`;
     document.body.appendChild(link);
     link.click();
@@ -1133,7 +1174,7 @@ function exportReportPDF() {
 function exportReportCSV() {
     // 创建下载链接
     const link = document.createElement('a');
-    link.href = '/api/report/csv';
+    link.href = '/api/report/csv' + runQuery();
     link.download = `测试报告_${new Date().toISOString().slice(0, 19).replace(/:/g, '-')}.csv`;
     document.body.appendChild(link);
     link.click();
@@ -1147,7 +1188,7 @@ function exportReportCSV() {
 function exportReportJSON() {
     // 创建下载链接
     const link = document.createElement('a');
-    link.href = '/api/report/json';
+    link.href = '/api/report/json' + runQuery();
     link.download = `测试报告_${new Date().toISOString().slice(0, 19).replace(/:/g, '-')}.json`;
     document.body.appendChild(link);
     link.click();
@@ -1709,7 +1750,7 @@ function renderCharts(report) {
         const ctx4 = document.getElementById('timelineChart');
         if (ctx4) {
             const timeline = report.timeline;
-            const labels = timeline.map((_, i) => `测试 #${i + 1}`);
+            const labels = timeline.map((t, i) => `测试 #${t.index || i + 1}`);
             // 将毫秒转换为秒
             const responseTimes = timeline.map(t => (t.e2e_response_time || 0) / 1000);
             const successData = timeline.map(t => t.success ? 1 : 0);
@@ -5,27 +5,71 @@
 import os
 import asyncio
 import json
-import time
+import argparse
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from logger import Logger
 from config import Config
 from websocket_client import WebSocketClient
-from audio_encoder import AudioEncoder
+from run_settings import RunSettings
+from audio_encoder import AudioEncoder, AudioFrameCache
+from corpus_archive import CorpusArchive, load_text_map
+import loop_runtime
+from loop_runtime import LoopLagMonitor
+from result_store import ResultStore
+from llm_cadence import sentence_cadence
+from turn_timeline import (
+    FIRST_AUDIO_FRAME, LAST_AUDIO_FRAME, STT, FIRST_LLM, TTS_START, TTS_STOP, SEND_END, RESPONSE_END, FIRST_TTS_AUDIO,
+)
 
 # 音频目录
 AUDIO_DIR = os.path.join(os.path.dirname(__file__), "audio", "inquiries")
+# 结果目录
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
 
 class InquiryTester:
     """询问测试类（基于test_runner.py的逻辑）"""
-    
-    def __init__(self):
+
+    def __init__(self, resume_from: Optional[str] = None, settings: Optional[RunSettings] = None):
         self.logger = Logger()
+        # 本次运行的服务器地址和测试模式（未指定时取 Config 当前值），由本测试器创建的连接使用同一份设置
+        self.settings = settings or RunSettings.from_config()
         self.audio_encoder = AudioEncoder()
+        # 帧缓存：同一个测试器（一次测试运行）内的所有客户端共享
+        self.frame_cache = AudioFrameCache() if Config.AUDIO_FRAME_CACHE_ENABLED else None
+        # 语料归档：首次使用时打开，帧以memoryview零拷贝交给客户端
+        self._corpus: Optional[CorpusArchive] = None
+        self._corpus_checked = False
         self.results: List[Dict[str, Any]] = []
         self.test_start_time = datetime.now()
-        
+        # 事件循环调度延迟采样器：由运行测试的入口启动，用于判断压测端是否饱和
+        self.loop_monitor: Optional[LoopLagMonitor] = None
+        # 检查点：每轮结果追加一行到 JSONL（见 result_store），resume_from 指定时从该检查点继续
+        self.resume_from = resume_from
+        self.checkpoint: Optional[ResultStore] = None
+        self.completed: set = set()  # 已完成的 (type, index)，恢复时跳过
+        
+    def get_corpus(self) -> Optional[CorpusArchive]:
+        """打开语料归档（只尝试一次），不可用时返回None，调用方回退到逐文件读取"""
+        if not self._corpus_checked:
+            self._corpus_checked = True
+            if Config.CORPUS_ARCHIVE_ENABLED:
+                try:
+                    self._corpus = CorpusArchive.open_for_dir(AUDIO_DIR, build_if_stale=Config.CORPUS_ARCHIVE_AUTO_BUILD)
+                except Exception as e:
+                    self.logger.warning(f"Corpus archive unavailable, loading audio files individually: {e}")
+                if self._corpus is not None:
+                    self.logger.info(f"Using corpus archive: {self._corpus.path} ({len(self._corpus)} entries)")
+        return self._corpus
+    
+    def _load_text_map(self) -> Dict[str, str]:
+        """获取 {filename: text} 映射：优先从语料归档读取，否则解析file_list.txt"""
+        corpus = self.get_corpus()
+        if corpus is not None:
+            return corpus.text_map()
+        return load_text_map(AUDIO_DIR)
+    
     def parse_inquiries_file(self, file_path: str) -> tuple:
         """解析询问文件，提取所有询问和购买文本"""
         inquiries = []
@@ -90,7 +134,6 @@ class InquiryTester:
             测试任务列表
         """
         import random
-        import re
         
         # 统一使用inquiry_indices（实际是所有audio_文件的索引）
         all_indices = inquiry_indices if inquiry_indices else []
@@ -104,22 +147,8 @@ class InquiryTester:
         # 从所有文件中随机选择指定数量
         selected_indices = random.sample(all_indices, actual_test_count)
         
-        # 从file_list.txt读取文本映射（用于准确匹配文本）
-        file_list_txt = os.path.join(AUDIO_DIR, "file_list.txt")
-        text_map = {}  # {filename: text}
-        if os.path.exists(file_list_txt):
-            with open(file_list_txt, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
-                        continue
-                    # 解析格式：001: filename.opus - 文本内容
-                    match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s+(.+)', line)
-                    if match:
-                        filename = match.group(2)
-                        text = match.group(3)
-                        if text:  # 只保存非空文本
-                            text_map[filename] = text
+        # 读取文本映射（用于准确匹配文本）
+        text_map = self._load_text_map()  # {filename: text}
         
         # 构建测试任务（统一使用inquiry_file和inquiry_text，保持兼容性）
         all_test_items = []
@@ -151,6 +180,14 @@ class InquiryTester:
             找到的文件索引列表，按数字顺序排序
         """
         indices = []
+        
+        # 有语料归档时直接从归档索引读取，不扫描目录
+        corpus = self.get_corpus()
+        if corpus is not None:
+            indices = [e.index for e in corpus.entries() if e.filename.startswith("audio_")]
+            indices.sort()
+            return indices
+        
         if not os.path.exists(AUDIO_DIR):
             return indices
         
@@ -175,26 +212,10 @@ class InquiryTester:
         优先从file_list.txt读取文本内容（所有audio_前缀的文件）
         返回 (texts, [], []) 元组（保持兼容性，但只使用第一个元素）
         """
-        import re
         texts = []
         
-        # 优先从file_list.txt读取文本映射（所有audio_前缀的文件）
-        file_list_txt = os.path.join(AUDIO_DIR, "file_list.txt")
-        text_map = {}  # {filename: text}
-        if os.path.exists(file_list_txt):
-            with open(file_list_txt, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
-                        continue
-                    
-                    # 解析格式：001: filename.opus - 文本内容
-                    match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s+(.+)', line)
-                    if match:
-                        filename = match.group(2)
-                        text = match.group(3)
-                        if text:  # 只保存非空文本
-                            text_map[filename] = text
+        # 优先从语料归档/file_list.txt读取文本映射（所有audio_前缀的文件）
+        text_map = self._load_text_map()  # {filename: text}
         
         # 扫描所有audio_前缀的文件，按索引顺序获取文本
         audio_indices = self.scan_audio_files()
@@ -225,12 +246,28 @@ class InquiryTester:
         if os.path.exists(file_path):
             return file_path
         
+        # 只打包在归档中的语料也可以使用
+        corpus = self.get_corpus()
+        if corpus is not None and corpus.find(filename) is not None:
+            return file_path
+        
         return None
     
     def load_audio_frames(self, audio_file: str) -> Optional[List[bytes]]:
-        """加载Opus文件为帧列表（与test_runner.py的逻辑一致）"""
+        """
+        加载Opus文件为帧列表（与test_runner.py的逻辑一致）
+        
+        优先从语料归档取memoryview帧（零拷贝），其次帧缓存，最后读取文件
+        """
         try:
-            frames = self.audio_encoder._load_audio_file_as_frames(audio_file)
+            corpus = self.get_corpus()
+            position = corpus.find(audio_file) if corpus is not None else None
+            if position is not None:
+                frames = corpus.frames(position)
+            elif self.frame_cache is not None:
+                frames = self.frame_cache.get_or_load(audio_file, self.audio_encoder._load_audio_file_as_frames)
+            else:
+                frames = self.audio_encoder._load_audio_file_as_frames(audio_file)
             if frames:
                 self.logger.debug(f"Loaded {len(frames)} Opus frames from {os.path.basename(audio_file)}")
             return frames
@@ -269,16 +306,8 @@ class InquiryTester:
             self.logger.info(f"Audio file: {os.path.basename(audio_file)}")
             self.logger.info(f"{'='*60}")
             
-            # 重置响应状态（为本次测试准备）
-            client.stt_text = ""
-            client.llm_text_buffer = []
-            client.has_tts_stop = False
-            client.has_stt = False
-            client.has_llm = False
-            client.has_tts_start = False
-            client.send_time = None
-            client.send_end_time = None
-            client.tts_stop_time = None  # 重置TTS stop时间
+            # 开始新一轮：分配新的 TurnState（轮次 ID 递增），上一轮的迟到消息只计数、不写入本轮
+            turn = client.begin_turn()
             
             # 加载音频帧（与test_runner.py的逻辑一致）
             self.logger.info(f"Connection #{client.connection_id}: Loading audio file: {audio_file}")
@@ -289,79 +318,41 @@ class InquiryTester:
                 return result
             self.logger.info(f"Connection #{client.connection_id}: Successfully loaded {len(audio_frames)} audio frames from {audio_file}")
             
-            # 记录发送消息前的时间，用于判断后续消息是否属于本次测试
-            send_start_time = time.time()
-            send_start_time_ms = send_start_time * 1000  # 转换为毫秒时间戳，用于与TTS stop时间戳比较
+            # 本轮的事件时间线（单调时钟），其中的事件都属于本次测试
+            timeline = turn.timeline
             
             # 发送消息（完全使用test_runner.py的逻辑：send_user_message）
             # 这与之前成功的测试完全一致
             await client.send_user_message(text, audio_frames)
             
-            # 记录发送消息后的时间，用于判断后续消息是否属于本次测试
-            send_complete_time = time.time()
-            
             # 根据配置选择测试模式
             # "normal": 正常模式 - 等待完整响应（TTS stop）后再进行下一个问题
             # "fast": 急速模式 - 只要大模型开始回复（has_llm + llm_text_buffer）就继续下一个问题
-            test_mode = Config.TEST_MODE.lower()
+            # 取连接所属运行的设置（单语音测试共用测试器，每次测试的连接设置可以不同）
+            test_mode = client.settings.test_mode.lower()
             
             max_wait_time = Config.TTS_TIMEOUT / 1000.0  # 转换为秒
-            wait_time = 0
-            check_interval = 0.1  # 每 100ms 检查一次
+            loop = asyncio.get_running_loop()
+            wait_start = loop.time()
             
-            while wait_time < max_wait_time:
-                await asyncio.sleep(check_interval)
-                wait_time += check_interval
-                
-                # 检查连接状态
-                if not client.is_connected:
-                    self.logger.warning(f"Connection #{client.connection_id}: Connection lost during wait")
-                    break
-                
-                # 注意：为了确保每个会话完成，即使是急速模式也等待完整响应（TTS stop）
-                # 不再提前退出，必须等待TTS stop才能继续下一个对话
-                # if test_mode == "fast":
-                #     # 急速模式：只要大模型开始回复就继续下一个问题
-                #     # 检查是否收到LLM响应（必须是大模型开始回复，不能仅仅是STT）
-                #     # has_llm 标志只在收到LLM消息或TTS的sentence_start时设置，不会因为STT而设置
-                #     # llm_text_buffer 也只在LLM相关消息时填充
-                #     if client.has_llm:
-                #         # 进一步确认：必须有实际的LLM内容（不能仅仅是STT）
-                #         has_llm_content = (hasattr(client, 'llm_text_buffer') and 
-                #                           client.llm_text_buffer and 
-                #                           len(client.llm_text_buffer) > 0)
-                #         if has_llm_content:
-                #             self.logger.info(f"Connection #{client.connection_id}: LLM response started at {wait_time:.1f}s, proceeding to next question (fast mode)")
-                #             break
-                
-                # 正常模式或急速模式：如果收到完整响应（TTS stop），都可以提前退出
-                # 但需要验证TTS stop是否属于本次测试（时间戳在发送消息之后）
-                if client.has_tts_stop and client.tts_stop_time is not None:
-                    # 检查TTS stop时间是否在发送消息之后（允许2秒误差）
-                    # tts_stop_time是毫秒时间戳，send_start_time_ms也是毫秒时间戳
-                    if client.tts_stop_time >= send_start_time_ms - 2000:  # 允许2秒误差（2000ms）
-                        self.logger.info(f"Connection #{client.connection_id}: Received complete response at {wait_time:.1f}s")
-                        break
-                    else:
-                        # TTS stop是上一个测试的，忽略
-                        tts_stop_time_sec = client.tts_stop_time / 1000.0
-                        self.logger.debug(f"Connection #{client.connection_id}: TTS stop time ({tts_stop_time_sec:.3f}s) is before send start ({send_start_time:.3f}s), ignoring")
-            
-            # 等待循环结束后，再给一点时间让异步消息处理完成
-            # 为了确保每个会话完成，必须等待完整响应（TTS stop）
-            # 验证TTS stop是否属于本次测试
-            tts_stop_valid = False
-            if client.has_tts_stop and client.tts_stop_time is not None:
-                # tts_stop_time是毫秒时间戳，send_start_time_ms也是毫秒时间戳
-                if client.tts_stop_time >= send_start_time_ms - 2000:  # 允许2秒误差（2000ms）
-                    tts_stop_valid = True
+            # 注意：为了确保每个会话完成，即使是急速模式也等待完整响应（TTS stop）
+            # 接收任务收到TTS stop时置位 tts_stop_event，这里直接等待事件（连接断开时提前返回），不再轮询
+            await client.wait_for_stage(client.tts_stop_event, timeout=max_wait_time)
+            wait_time = loop.time() - wait_start
+            if not client.is_connected:
+                self.logger.warning(f"Connection #{client.connection_id}: Connection lost during wait")
+            
+            # 本轮时间线中有TTS stop即为本次测试的完整响应
+            tts_stop_valid = timeline.has(TTS_STOP)
+            if tts_stop_valid:
+                self.logger.info(f"Connection #{client.connection_id}: Received complete response at {wait_time:.1f}s")
             
             # 如果没有收到有效的TTS stop，继续等待直到收到TTS stop或超时
-            if not tts_stop_valid:
+            if not tts_stop_valid and client.is_connected:
                 # 额外等待时间：最多等待10秒，确保收到完整响应
-                max_additional_wait = 10.0  # 最多额外等待10秒
-                additional_wait_time = 0
-                check_interval = 0.2  # 每200ms检查一次
+                max_additional_wait = 10.0
+                no_response_wait = 3.0  # 3秒内既没有TTS start也没有TTS stop，认为服务器没有响应
+                additional_start = loop.time()
                 
                 # 诊断日志：记录等待开始时的状态
                 self.logger.info(
@@ -374,40 +365,27 @@ class InquiryTester:
                     f"LLM_Text: {' '.join(getattr(client, 'llm_text_buffer', []))[:50]}..."
                 )
                 
-                while additional_wait_time < max_additional_wait:
-                    await asyncio.sleep(check_interval)
-                    additional_wait_time += check_interval
-                    
-                    # 检查是否收到有效的TTS stop
-                    if client.has_tts_stop and client.tts_stop_time is not None:
-                        if client.tts_stop_time >= send_start_time_ms - 2000:
-                            self.logger.info(f"Connection #{client.connection_id}: Received TTS stop after additional wait ({additional_wait_time:.1f}s)")
-                            tts_stop_valid = True
-                            break
-                    
-                    # 每2秒输出一次诊断信息
-                    if int(additional_wait_time * 5) % 10 == 0 and additional_wait_time > 0:
-                        self.logger.info(
-                            f"Connection #{client.connection_id}: [DIAGNOSTIC] Waiting... ({additional_wait_time:.1f}s) | "
-                            f"Has_STT: {client.has_stt} | "
-                            f"Has_LLM: {client.has_llm} | "
-                            f"Has_TTS_Start: {client.has_tts_start} | "
-                            f"Has_TTS_Stop: {client.has_tts_stop} | "
-                            f"TTS_Sentence_Count: {getattr(client, 'tts_sentence_count', 0)}"
-                        )
-                    
-                    # 如果收到了TTS start，说明服务器已经开始响应，继续等待
-                    if client.has_tts_start:
-                        continue
-                    # 如果既没有TTS start也没有TTS stop，可能服务器没有响应，等待一段时间后退出
-                    elif additional_wait_time >= 3.0:  # 如果等待超过3秒还没有任何响应，退出
+                # 如果还没有TTS start，先等待服务器开始响应
+                if not client.has_tts_start:
+                    responded = await client.wait_for_stage(
+                        client.tts_start_event, client.tts_stop_event, timeout=no_response_wait
+                    )
+                    if not responded:
                         self.logger.warning(
-                            f"Connection #{client.connection_id}: [DIAGNOSTIC] No response after {additional_wait_time:.1f}s, stopping wait | "
+                            f"Connection #{client.connection_id}: [DIAGNOSTIC] No response after {loop.time() - additional_start:.1f}s, stopping wait | "
                             f"Final state - Has_STT: {client.has_stt}, Has_LLM: {client.has_llm}, "
                             f"Has_TTS_Start: {client.has_tts_start}, Has_TTS_Stop: {client.has_tts_stop}"
                         )
-                        break
                 
+                # 服务器已经开始响应，等待TTS stop直到额外等待时间用完
+                if client.has_tts_start or client.has_tts_stop:
+                    remaining = max_additional_wait - (loop.time() - additional_start)
+                    await client.wait_for_stage(client.tts_stop_event, timeout=remaining)
+                    if timeline.has(TTS_STOP):
+                        self.logger.info(f"Connection #{client.connection_id}: Received TTS stop after additional wait ({loop.time() - additional_start:.1f}s)")
+                        tts_stop_valid = True
+                
+                additional_wait_time = loop.time() - additional_start
                 if not tts_stop_valid:
                     self.logger.warning(
                         f"Connection #{client.connection_id}: [DIAGNOSTIC] Did not receive complete TTS stop response after {wait_time + additional_wait_time:.1f}s total wait time | "
@@ -425,16 +403,8 @@ class InquiryTester:
             result["llm_text"] = llm_text
             result["response_text"] = f"[STT] {stt_text} | [LLM] {llm_text}" if (stt_text or llm_text) else ""
             
-            # 重新验证TTS stop是否有效（在额外等待后再次检查，确保使用最新的状态）
-            # 注意：tts_stop_valid 可能已经在上面被设置为True了，这里只是再次确认
-            if not tts_stop_valid and client.has_tts_stop and client.tts_stop_time is not None:
-                # tts_stop_time是毫秒时间戳，send_start_time_ms也是毫秒时间戳
-                if client.tts_stop_time >= send_start_time_ms - 2000:  # 允许2秒误差（2000ms）
-                    tts_stop_valid = True
-                else:
-                    # TTS stop时间在发送消息之前，说明是上一个测试的stop，忽略
-                    tts_stop_time_sec = client.tts_stop_time / 1000.0
-                    self.logger.debug(f"TTS stop time ({tts_stop_time_sec:.3f}s) is before send start ({send_start_time:.3f}s), ignoring")
+            # 重新检查TTS stop（在额外等待后再次检查，确保使用最新的状态）
+            tts_stop_valid = tts_stop_valid or timeline.has(TTS_STOP)
             
             # 判断成功：如果鉴权失败，直接标记为失败
             # 成功的条件：
@@ -445,141 +415,76 @@ class InquiryTester:
             result["success"] = not client.auth_failed and (tts_stop_valid or has_llm_content)
             
             # 收集性能指标（时间单位：毫秒）
-            # 注意：send_time, stt_response_time等都是毫秒时间戳，直接相减即可得到毫秒差值
-            # 但需要确保时间戳属于本次测试（在send_start_time之后）
-            send_start_time_ms = send_start_time * 1000  # 转换为毫秒时间戳
+            # 所有指标都由本轮时间线（perf_counter_ns）计算；超出合理范围的值视为异常，记为 None
+            def bounded(value, upper):
+                return value if value is not None and 0 <= value <= upper else None
             
             # 性能指标：详细拆解各个阶段的延迟（精细化指标）
-            # 1. 音频发送阶段
-            if client.send_time:
-                result["send_time"] = client.send_time
-            if client.send_end_time:
-                result["send_end_time"] = client.send_end_time
-                # 计算音频发送耗时（从第一帧到最后一帧）
-                if client.send_time and client.send_end_time >= send_start_time_ms - 2000:
-                    send_duration_ms = client.send_end_time - client.send_time
-                    if 0 <= send_duration_ms <= 60000:
-                        result["send_duration"] = send_duration_ms
+            # 1. 音频发送阶段（send_time/send_end_time 为墙上时钟时间戳，仅用于显示）
+            if timeline.has(FIRST_AUDIO_FRAME):
+                result["send_time"] = timeline.wall_ms(FIRST_AUDIO_FRAME)
+            if timeline.get(SEND_END) is not None:
+                result["send_end_time"] = timeline.wall_ms(SEND_END)
+                # 计算音频发送耗时（从第一帧到发送结束）
+                send_duration_ms = bounded(timeline.elapsed_ms(FIRST_AUDIO_FRAME, SEND_END), 60000)
+                if send_duration_ms is not None:
+                    result["send_duration"] = send_duration_ms
             
             # 2. STT服务延迟（详细拆解）
             # STT是流式处理，收到第一个包就开始处理，但最终结果在发送完所有包后才返回
-            if client.send_time and client.stt_response_time:
-                if client.send_time >= send_start_time_ms - 2000 and client.stt_response_time >= send_start_time_ms - 2000:
-                    # 从第一帧发送到STT响应（包含发送时间+STT处理时间）
-                    stt_latency_from_first = client.stt_response_time - client.send_time
-                    if 0 <= stt_latency_from_first <= 60000:
-                        result["stt_latency"] = stt_latency_from_first  # 保持兼容性
-                        result["stt_latency_from_first_frame"] = stt_latency_from_first
-                    
-                    # 从最后一帧发送到STT响应（纯STT处理时间，更准确）
-                    if client.send_end_time and client.send_end_time >= send_start_time_ms - 2000:
-                        stt_latency_from_last = client.stt_response_time - client.send_end_time
-                        if 0 <= stt_latency_from_last <= 60000:
-                            result["stt_latency_from_last_frame"] = stt_latency_from_last
-                else:
-                    result["stt_latency"] = None
-            else:
-                result["stt_latency"] = None
-            
-            # 3. LLM服务延迟（详细拆解）
-            if client.stt_response_time and client.llm_response_time:
-                if client.stt_response_time >= send_start_time_ms - 2000 and client.llm_response_time >= send_start_time_ms - 2000:
-                    # 从STT完成到LLM响应（纯LLM处理时间）
-                    llm_latency_ms = client.llm_response_time - client.stt_response_time
-                    if 0 <= llm_latency_ms <= 60000:
-                        result["llm_latency"] = llm_latency_ms
-                    else:
-                        result["llm_latency"] = None
-                else:
-                    result["llm_latency"] = None
-            else:
-                result["llm_latency"] = None
-            
-            # 4. TTS服务延迟（详细拆解）
-            if client.llm_response_time and client.tts_start_time:
-                if client.llm_response_time >= send_start_time_ms - 2000 and client.tts_start_time >= send_start_time_ms - 2000:
-                    # 从LLM完成到TTS开始（TTS启动延迟）
-                    tts_latency_ms = client.tts_start_time - client.llm_response_time
-                    if 0 <= tts_latency_ms <= 10000:
-                        result["tts_latency"] = tts_latency_ms
-                    else:
-                        result["tts_latency"] = None
-                else:
-                    result["tts_latency"] = None
-            else:
-                result["tts_latency"] = None
+            # 从第一帧发送到STT响应（包含发送时间+STT处理时间）
+            result["stt_latency"] = bounded(timeline.elapsed_ms(FIRST_AUDIO_FRAME, STT), 60000)  # 保持兼容性
+            if result["stt_latency"] is not None:
+                result["stt_latency_from_first_frame"] = result["stt_latency"]
+                # 从最后一帧发送到STT响应（纯STT处理时间，更准确）
+                stt_latency_from_last = bounded(timeline.elapsed_ms(SEND_END, STT), 60000)
+                if stt_latency_from_last is not None:
+                    result["stt_latency_from_last_frame"] = stt_latency_from_last
+            
+            # 3. LLM服务延迟：从STT完成到LLM响应（纯LLM处理时间）
+            result["llm_latency"] = bounded(timeline.elapsed_ms(STT, FIRST_LLM), 60000)
+            
+            # 4. TTS服务延迟：从LLM完成到TTS开始（TTS启动延迟）
+            result["tts_latency"] = bounded(timeline.elapsed_ms(FIRST_LLM, TTS_START), 10000)
             
             # TTS持续时间（从TTS开始到TTS结束）
-            if client.tts_start_time and client.tts_stop_time:
-                if client.tts_start_time >= send_start_time_ms - 2000 and client.tts_stop_time >= send_start_time_ms - 2000:
-                    tts_duration_ms = client.tts_stop_time - client.tts_start_time
-                    if 0 <= tts_duration_ms <= 120000:
-                        result["tts_duration"] = tts_duration_ms
-                    else:
-                        result["tts_duration"] = None
-                else:
-                    result["tts_duration"] = None
-            else:
-                result["tts_duration"] = None
+            result["tts_duration"] = bounded(timeline.elapsed_ms(TTS_START, TTS_STOP), 120000)
             
-            # 5. 端到端响应时间（多个维度）
+            # 5. 端到端响应时间（多个维度，没有TTS stop时以TTS start为终点）
             # 5.1 从第一帧发送到TTS结束（完整端到端时间）
-            if client.send_time and client.tts_stop_time:
-                if client.send_time >= send_start_time_ms - 2000 and client.tts_stop_time >= send_start_time_ms - 2000:
-                    e2e_from_first = client.tts_stop_time - client.send_time
-                    if 0 <= e2e_from_first <= 120000:
-                        result["e2e_response_time"] = e2e_from_first  # 保持兼容性
-                        result["e2e_from_first_frame"] = e2e_from_first
-                else:
-                    result["e2e_response_time"] = None
-            elif client.send_time and client.tts_start_time:
-                if client.send_time >= send_start_time_ms - 2000 and client.tts_start_time >= send_start_time_ms - 2000:
-                    e2e_from_first = client.tts_start_time - client.send_time
-                    if 0 <= e2e_from_first <= 120000:
-                        result["e2e_response_time"] = e2e_from_first
-                        result["e2e_from_first_frame"] = e2e_from_first
-                else:
-                    result["e2e_response_time"] = None
-            else:
-                result["e2e_response_time"] = None
+            result["e2e_response_time"] = bounded(timeline.elapsed_ms(FIRST_AUDIO_FRAME, RESPONSE_END), 120000)  # 保持兼容性
+            if result["e2e_response_time"] is not None:
+                result["e2e_from_first_frame"] = result["e2e_response_time"]
             
             # 5.2 从最后一帧发送到TTS结束（不包含发送时间）
-            if client.send_end_time and client.tts_stop_time:
-                if client.send_end_time >= send_start_time_ms - 2000 and client.tts_stop_time >= send_start_time_ms - 2000:
-                    e2e_from_last = client.tts_stop_time - client.send_end_time
-                    if 0 <= e2e_from_last <= 120000:
-                        result["e2e_from_last_frame"] = e2e_from_last
-            elif client.send_end_time and client.tts_start_time:
-                if client.send_end_time >= send_start_time_ms - 2000 and client.tts_start_time >= send_start_time_ms - 2000:
-                    e2e_from_last = client.tts_start_time - client.send_end_time
-                    if 0 <= e2e_from_last <= 120000:
-                        result["e2e_from_last_frame"] = e2e_from_last
-            
             # 5.3 从STT响应到TTS结束（STT后的完整处理时间）
-            if client.stt_response_time and client.tts_stop_time:
-                if client.stt_response_time >= send_start_time_ms - 2000 and client.tts_stop_time >= send_start_time_ms - 2000:
-                    e2e_from_stt = client.tts_stop_time - client.stt_response_time
-                    if 0 <= e2e_from_stt <= 120000:
-                        result["e2e_from_stt"] = e2e_from_stt
-            elif client.stt_response_time and client.tts_start_time:
-                if client.stt_response_time >= send_start_time_ms - 2000 and client.tts_start_time >= send_start_time_ms - 2000:
-                    e2e_from_stt = client.tts_start_time - client.stt_response_time
-                    if 0 <= e2e_from_stt <= 120000:
-                        result["e2e_from_stt"] = e2e_from_stt
-            
             # 5.4 从LLM响应到TTS结束（LLM后的完整处理时间）
-            if client.llm_response_time and client.tts_stop_time:
-                if client.llm_response_time >= send_start_time_ms - 2000 and client.tts_stop_time >= send_start_time_ms - 2000:
-                    e2e_from_llm = client.tts_stop_time - client.llm_response_time
-                    if 0 <= e2e_from_llm <= 120000:
-                        result["e2e_from_llm"] = e2e_from_llm
-            elif client.llm_response_time and client.tts_start_time:
-                if client.llm_response_time >= send_start_time_ms - 2000 and client.tts_start_time >= send_start_time_ms - 2000:
-                    e2e_from_llm = client.tts_start_time - client.llm_response_time
-                    if 0 <= e2e_from_llm <= 120000:
-                        result["e2e_from_llm"] = e2e_from_llm
+            for key, start_event in (("e2e_from_last_frame", SEND_END), ("e2e_from_stt", STT), ("e2e_from_llm", FIRST_LLM)):
+                value = bounded(timeline.elapsed_ms(start_event, RESPONSE_END), 120000)
+                if value is not None:
+                    result[key] = value
+            
+            # 6. 下行TTS音频：首音频延迟（从最后一帧上行音频到第一帧TTS音频）、实时率、到达抖动、模拟播放卡顿
+            result["tts_first_audio_latency"] = bounded(timeline.elapsed_ms(LAST_AUDIO_FRAME, FIRST_TTS_AUDIO), 60000)
+            if turn.downlink is not None and turn.downlink.frames:
+                result["downlink_audio"] = turn.downlink.summary(Config.DOWNLINK_JITTER_BUFFER_MS)
+            
+            # 7. LLM流式节奏：每句到达时间、句间间隔、生成速度、首个有效句延迟（跳过垫话句，从STT开始）
+            cadence = sentence_cadence(timeline.sentences, timeline.get(STT), Config.LLM_FILLER_PHRASES)
+            if cadence is not None:
+                result["llm_cadence"] = cadence
+                result["first_content_sentence_latency"] = bounded(cadence["first_content_ms"], 60000)
+            
+            # 本轮事件时间线（相对本轮开始的毫秒偏移）
+            result["timeline"] = timeline.to_dict()
+            
+            # 持续输入模式下的帧节拍统计（节拍延迟、相对理论时长的累积漂移）
+            if turn.pacing is not None:
+                result["pacing"] = turn.pacing
             
             # 收集消息统计
+            result["turn_id"] = turn.turn_id
+            result["straggler_messages"] = turn.stragglers  # 本轮期间收到的上一轮迟到消息
             result["sent_messages"] = getattr(client, 'sent_messages', 0)
             result["received_messages"] = getattr(client, 'received_messages', 0)
             result["total_sent_bytes"] = getattr(client, 'total_sent_bytes', 0)
@@ -596,8 +501,6 @@ class InquiryTester:
                 result["failure_reason"] = "STT received but no LLM response"
             elif client.has_llm and not client.has_tts_stop:
                 result["failure_reason"] = "LLM received but no TTS stop (incomplete response)"
-            elif not tts_stop_valid:
-                result["failure_reason"] = "TTS stop time invalid (likely from previous test)"
             elif wait_time >= max_wait_time:
                 result["failure_reason"] = f"Timeout (waited {wait_time:.1f}s)"
             else:
@@ -623,9 +526,9 @@ class InquiryTester:
                 self.logger.warning(f"  - Response status: {status}")
                 
                 # 记录时间信息
-                if client.send_time:
-                    send_time_sec = client.send_time / 1000.0
-                    elapsed = time.time() - send_time_sec
+                if timeline.has(FIRST_AUDIO_FRAME):
+                    send_time_sec = timeline.wall_ms(FIRST_AUDIO_FRAME) / 1000.0
+                    elapsed = timeline.since_ms(FIRST_AUDIO_FRAME) / 1000.0
                     self.logger.warning(f"  - Send time: {send_time_sec:.3f}s, Elapsed: {elapsed:.1f}s")
                 
                 # 记录收到的文本
@@ -643,13 +546,8 @@ class InquiryTester:
                 self.logger.warning(f"  - Messages sent: {client.sent_messages}, received: {client.received_messages}")
                 self.logger.warning(f"  - Bytes sent: {client.total_sent_bytes}, received: {client.total_received_bytes}")
                 
-                # 记录TTS stop时间验证
-                if client.has_tts_stop and client.tts_stop_time:
-                    tts_stop_time_sec = client.tts_stop_time / 1000.0
-                    time_diff = tts_stop_time_sec - send_start_time
-                    self.logger.warning(f"  - TTS stop time: {tts_stop_time_sec:.3f}s, Time diff from send: {time_diff:.3f}s")
-                    if time_diff < -2.0:
-                        self.logger.warning(f"  - ⚠️ TTS stop time is before send time (likely from previous test)")
+                # 记录本轮事件时间线（相对本轮开始的毫秒偏移）
+                self.logger.warning(f"  - Timeline (ms): {result['timeline']['events_ms']}")
                 
                 # 记录失败原因
                 if client.auth_failed:
@@ -662,8 +560,6 @@ class InquiryTester:
                     self.logger.warning(f"  - ❌ Failure reason: STT received but no LLM response")
                 elif client.has_llm and not client.has_tts_stop:
                     self.logger.warning(f"  - ❌ Failure reason: LLM received but no TTS stop (incomplete response)")
-                elif not tts_stop_valid:
-                    self.logger.warning(f"  - ❌ Failure reason: TTS stop time invalid (likely from previous test)")
                 else:
                     self.logger.warning(f"  - ❌ Failure reason: Timeout (waited {wait_time:.1f}s)")
             
@@ -691,11 +587,15 @@ class InquiryTester:
         self.logger.info("开始测试询问和购买音频")
         self.logger.info(f"总询问数: {len(inquiries_texts)}")
         self.logger.info(f"总购买数: {len(purchases_texts)}")
-        self.logger.info(f"服务器地址: {Config.get_websocket_url()}")
+        self.logger.info(f"服务器地址: {self.settings.websocket_url()}")
         self.logger.info("=" * 60)
         
+        self.loop_monitor = LoopLagMonitor(interval_ms=Config.LOOP_LAG_SAMPLE_INTERVAL_MS)
+        self.loop_monitor.start()
+        self.open_checkpoint()
+        
         # 创建WebSocket客户端（与test_runner.py的逻辑一致）
-        client = WebSocketClient(connection_id=1)
+        client = WebSocketClient(connection_id=1, settings=self.settings)
         
         try:
             # 建立连接（与test_runner.py的逻辑一致）
@@ -706,19 +606,8 @@ class InquiryTester:
                 self.logger.error("Failed to connect to server")
                 return
             
-            # 等待收到服务器消息（与test_runner.py的逻辑一致）
-            max_wait_server_msg = 3.0
-            initial_wait = 0.2
-            wait_server_msg_time = 0
-            check_interval = 0.1
-            
-            await asyncio.sleep(initial_wait)
-            
-            while wait_server_msg_time < max_wait_server_msg and client.is_connected:
-                if client.auth_received or client.session_id:
-                    break
-                await asyncio.sleep(check_interval)
-                wait_server_msg_time += check_interval
+            # 等待收到服务器的鉴权消息（事件驱动，收到即返回）
+            await client.wait_for_auth(timeout=3.0)
             
             # 检查鉴权结果
             if client.auth_failed:
@@ -749,24 +638,28 @@ class InquiryTester:
                     self.logger.error(f"Purchase audio file not found: purchase_{i+1:03d}.opus")
                     continue
                 
-                # 1. 测试询问（等待完整响应）
-                inquiry_result = await self.test_single_audio(
-                    client, inquiry_file, inquiry_text, "inquiry", i + 1
-                )
-                self.results.append(inquiry_result)
+                # 轮次间隔（迟到消息由客户端按轮次路由，间隔可以为 0）
+                inter_turn_gap = Config.INTER_TURN_GAP_MS / 1000.0
                 
-                # 等待响应完全结束（与test_runner.py的逻辑一致）
-                final_wait = 0.5
-                await asyncio.sleep(final_wait)
+                # 1. 测试询问（等待完整响应），从检查点恢复时跳过已完成的轮次
+                if ("inquiry", i + 1) not in self.completed:
+                    inquiry_result = await self.test_single_audio(
+                        client, inquiry_file, inquiry_text, "inquiry", i + 1
+                    )
+                    self.record_result(inquiry_result)
+                    
+                    if inter_turn_gap > 0:
+                        await asyncio.sleep(inter_turn_gap)
                 
                 # 2. 测试购买（等待完整响应）
-                purchase_result = await self.test_single_audio(
-                    client, purchase_file, purchase_text, "purchase", i + 1
-                )
-                self.results.append(purchase_result)
-                
-                # 等待响应完全结束
-                await asyncio.sleep(final_wait)
+                if ("purchase", i + 1) not in self.completed:
+                    purchase_result = await self.test_single_audio(
+                        client, purchase_file, purchase_text, "purchase", i + 1
+                    )
+                    self.record_result(purchase_result)
+                    
+                    if inter_turn_gap > 0:
+                        await asyncio.sleep(inter_turn_gap)
                 
                 # 每10个测试对后保存一次结果
                 if (i + 1) % 10 == 0:
@@ -781,21 +674,97 @@ class InquiryTester:
             # 关闭连接（与test_runner.py的逻辑一致）
             if client.is_connected:
                 await client.close()
+            self.loop_monitor.stop()
             
             # 保存最终结果
-            self.save_results()
+            self.save_results(final=True)
+            self.checkpoint.close()
             
             # 打印摘要
             self.print_summary()
     
-    def save_results(self):
-        """保存测试结果"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        results_dir = os.path.join(os.path.dirname(__file__), "results")
-        os.makedirs(results_dir, exist_ok=True)
+    def get_harness_metrics(self) -> Dict[str, Any]:
+        """压测端自身指标（帧缓存、事件循环调度延迟）"""
+        metrics: Dict[str, Any] = {}
+        if self.frame_cache is not None:
+            metrics["frame_cache"] = self.frame_cache.get_stats()
+        if self.loop_monitor is not None:
+            metrics["loop_lag"] = self.loop_monitor.get_stats(Config.LOOP_LAG_WARN_MS)
+        return metrics
+    
+    @staticmethod
+    def checkpoint_path(resume_from: str) -> str:
+        """--resume 参数对应的检查点 JSONL 路径（也可以传入 .index.json）"""
+        if resume_from.endswith(".index.json"):
+            return resume_from[:-len(".index.json")] + ".jsonl"
+        return resume_from
+    
+    def open_checkpoint(self):
+        """
+        打开检查点：resume_from 指定时载入其中已完成的结果并继续追加，否则按开始时间新建
+
+        检查点中的每条结果（成功或失败）都算作已完成，恢复时不会重试失败的轮次。
+        resume_from 指向的检查点不存在时抛出 FileNotFoundError（不会静默地从头开始）
+        """
+        if self.resume_from:
+            path = self.checkpoint_path(self.resume_from)
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Checkpoint not found: {path}")
+        else:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"inquiry_test_results_{self.test_start_time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.checkpoint = ResultStore(path, window=0, fsync_batch=Config.CHECKPOINT_FSYNC_BATCH)
+        if self.resume_from:
+            self.results = self.checkpoint.load_all()
+            self.completed = {(r.get("type"), r.get("index")) for r in self.results}
+            try:
+                with open(self._checkpoint_stem() + ".index.json", encoding="utf-8") as f:
+                    self.test_start_time = datetime.fromisoformat(json.load(f)["test_start_time"])
+            except (OSError, ValueError, KeyError):
+                pass
+            self.logger.info(f"Resuming from checkpoint {path}: {len(self.results)} results already completed")
+    
+    def _checkpoint_stem(self) -> str:
+        return os.path.splitext(self.checkpoint.path)[0]
+    
+    def record_result(self, result: Dict[str, Any]):
+        """记录一轮结果并追加到检查点"""
+        self.results.append(result)
+        self.completed.add((result.get("type"), result.get("index")))
+        if self.checkpoint is not None:
+            self.checkpoint.append(result)
+    
+    def save_results(self, final: bool = False):
+        """
+        保存检查点：已追加的结果落盘，并更新摘要索引（<名称>.index.json，原子替换）
         
-        results_file = os.path.join(results_dir, f"inquiry_test_results_{timestamp}.json")
-        text_file = os.path.join(results_dir, f"inquiry_test_results_{timestamp}.txt")
+        结果在 record_result 时已逐条追加，这里不再重写全部结果；final=True 时另外生成一次
+        完整的 JSON 和文本结果文件（与检查点同名）。
+        """
+        if self.checkpoint is None:
+            self.open_checkpoint()
+        self.checkpoint.sync()
+        stem = self._checkpoint_stem()
+        successful = sum(1 for r in self.results if r.get("success"))
+        index = {
+            "checkpoint": os.path.basename(self.checkpoint.path),
+            "test_start_time": self.test_start_time.isoformat(),
+            "updated_time": datetime.now().isoformat(),
+            "total_tests": len(self.results),
+            "successful": successful,
+            "failed": len(self.results) - successful,
+            "finished": final,
+            "harness_metrics": self.get_harness_metrics(),
+        }
+        tmp_file = stem + ".index.json.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, stem + ".index.json")
+        if not final:
+            return
+        
+        results_file = stem + ".json"
+        text_file = stem + ".txt"
         
         # 保存JSON格式
         with open(results_file, 'w', encoding='utf-8') as f:
@@ -803,6 +772,7 @@ class InquiryTester:
                 "test_start_time": self.test_start_time.isoformat(),
                 "test_end_time": datetime.now().isoformat(),
                 "total_tests": len(self.results),
+                "harness_metrics": index["harness_metrics"],
                 "results": self.results
             }, f, ensure_ascii=False, indent=2)
         
@@ -850,13 +820,36 @@ class InquiryTester:
             self.logger.info("成功: 0 (0.0%)")
             self.logger.info("失败: 0 (0.0%)")
             self.logger.warning("没有执行任何测试，请检查音频文件是否存在")
+        if self.frame_cache is not None:
+            cache_stats = self.frame_cache.get_stats()
+            self.logger.info(
+                f"帧缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} "
+                f"(命中率 {cache_stats['hit_rate']}%), 淘汰 {cache_stats['evictions']}, "
+                f"占用 {cache_stats['bytes']} 字节"
+            )
+        if self.loop_monitor is not None:
+            lag = self.loop_monitor.get_stats(Config.LOOP_LAG_WARN_MS)
+            if lag.get("samples"):
+                self.logger.info(
+                    f"事件循环({lag['loop']})调度延迟: P50 {lag['lag_p50_ms']}ms / P95 {lag['lag_p95_ms']}ms / "
+                    f"P99 {lag['lag_p99_ms']}ms / 最大 {lag['lag_max_ms']}ms"
+                )
+                if lag["harness_saturated"]:
+                    self.logger.warning(f"事件循环调度延迟P99超过 {lag['warn_ms']}ms，压测端可能是瓶颈，延迟数据偏高")
         self.logger.info("=" * 60)
 
-async def main():
+async def main(resume_from: Optional[str] = None):
     """主函数"""
-    tester = InquiryTester()
+    tester = InquiryTester(resume_from)
     await tester.run_test()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="询问和购买测试")
+    parser.add_argument("--resume", default=None,
+                        help="从检查点继续（results/inquiry_test_results_<时间>.jsonl），跳过已完成的轮次"
+                             "（失败的轮次也算已完成，不会重试）")
+    args = parser.parse_args()
+    if args.resume and not os.path.isfile(InquiryTester.checkpoint_path(args.resume)):
+        parser.error(f"checkpoint not found: {InquiryTester.checkpoint_path(args.resume)}")
+    loop_runtime.run(main(args.resume), Config.USE_UVLOOP)
 
@@ -0,0 +1,293 @@
+"""
+协议轨迹重放：按录制时的时间轴把轨迹中每个会话的上行帧重新发给服务器，作为可重复的负载基准
+
+PROTOCOL_TRACE_PATH 录下一次真实压测的流量形态（见 protocol_trace.py）后，重放不需要再读取
+音频语料、不需要跑测试逻辑，只把录下的帧原样发出去：
+    - 每个会话按录制时的建连时间（相对第一个会话）建立连接，使用录制的 URL 路径/查询参数和请求头，
+      只把协议、主机和端口替换为 --server
+    - 建连后等待服务器的第一条消息（auth），再按录制时相对建连的偏移发送上行帧（开放模型：
+      不等服务器应答，服务器变慢时表现为应答延后，而不是发送变慢）
+    - --speed 1 为原速，N 为 N 倍速（所有时间间隔除以 N），max 为不等待、尽快发送
+    - 上行发完后继续接收，直到收到的消息数达到录制时的数量或空闲 --drain-sec 秒
+      （空闲从最后一次收到消息和最后一次发送中较晚的时刻算起，最后一轮的应答从发完音频才开始）
+    - 服务器的应答跟不上压缩后的时间轴时，下一轮的 start_listen 会打断上一轮的回复
+      （收到的 tts stop 比录制时少），这是开放模型重放的预期行为
+报告包括会话成功/失败数、建连耗时、发送的帧数/字节数、发送滞后（实际发送时间 - 计划时间，
+反映重放端自身是否跟得上）、按类型统计的收到的消息数与录制时的对比、实际达到的倍速。
+
+用法：
+    python trace_replay.py traces/run.ptrc --info
+    python trace_replay.py traces/run.ptrc --server ws://127.0.0.1:8765 --speed 4
+    python trace_replay.py traces/run.ptrc --server ws://127.0.0.1:8765 --speed max --limit 200 -o replay.json
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import websockets
+
+from protocol_trace import SessionTrace, TraceReader
+
+
+def _percentile(sorted_values, ratio: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * ratio), len(sorted_values) - 1)]
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """"max" 返回 None（不等待），其他为正数倍速"""
+    if value.lower() == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError(f"speed must be > 0 or 'max', got {value}")
+    return speed
+
+
+def retarget_url(recorded_url: str, server: Optional[str]) -> str:
+    """把录制的 URL 的协议、主机和端口替换为 server（保留路径和查询参数）；server 为空时原样返回"""
+    if not server:
+        return recorded_url
+    recorded = urlsplit(recorded_url)
+    target = urlsplit(server if "://" in server else f"ws://{server}")
+    path = recorded.path if target.path in ("", "/") else target.path
+    return urlunsplit((target.scheme, target.netloc, path, recorded.query, ""))
+
+
+class SessionReplay:
+    """重放一个会话：建连、等待 auth、按时间轴发送上行帧、接收应答"""
+
+    def __init__(self, session: SessionTrace, url: str, speed: Optional[float],
+                 connect_timeout: float, auth_timeout: float, drain_sec: float):
+        self.session = session
+        self.url = url
+        self.speed = speed
+        self.connect_timeout = connect_timeout
+        self.auth_timeout = auth_timeout
+        self.drain_sec = drain_sec
+        self.result: Dict[str, Any] = {
+            "session": session.session, "ok": False, "error": None, "connect_ms": None,
+            "frames_sent": 0, "bytes_sent": 0, "recv_text": 0, "recv_binary": 0, "recv_bytes": 0,
+            "recv_types": Counter(), "recorded_recv_text": session.recv_text,
+            "recorded_recv_binary": session.recv_binary,
+        }
+        self.send_lags_ms: List[float] = []
+        self._first_message = asyncio.Event()
+        self._last_message_at = time.perf_counter()
+        self._last_sent_at = self._last_message_at
+        self._received = 0
+
+    def _offset_sec(self, t_ns: int) -> float:
+        return (t_ns - self.session.open_ns) / 1e9 / self.speed
+
+    async def _receive(self, websocket):
+        result = self.result
+        try:
+            async for message in websocket:
+                self._received += 1
+                self._last_message_at = time.perf_counter()
+                self._first_message.set()
+                if isinstance(message, bytes):
+                    result["recv_binary"] += 1
+                    result["recv_bytes"] += len(message)
+                    continue
+                result["recv_text"] += 1
+                result["recv_bytes"] += len(message.encode("utf-8"))
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    result["recv_types"]["invalid"] += 1
+                    continue
+                msg_type = data.get("type", "unknown") if isinstance(data, dict) else "unknown"
+                if msg_type == "tts" and data.get("state") in ("start", "stop"):
+                    msg_type = f"tts_{data['state']}"
+                result["recv_types"][msg_type] += 1
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._first_message.set()
+
+    async def run(self):
+        result = self.result
+        info = self.session.info
+        headers = list((info.get("headers") or {}).items())
+        start = time.perf_counter()
+        try:
+            websocket = await asyncio.wait_for(
+                websockets.connect(self.url, additional_headers=headers or None,
+                                   ping_interval=None, ping_timeout=None, max_size=None),
+                timeout=self.connect_timeout)
+        except Exception as e:
+            result["error"] = f"connect: {type(e).__name__}: {e}"
+            return result
+        opened = time.perf_counter()
+        result["connect_ms"] = round((opened - start) * 1000, 3)
+        receiver = asyncio.create_task(self._receive(websocket))
+        try:
+            # 录制时客户端收到 auth 后才开始发送；上行时间轴从建连开始，auth 变慢会表现为发送滞后
+            try:
+                await asyncio.wait_for(self._first_message.wait(), timeout=self.auth_timeout)
+            except asyncio.TimeoutError:
+                pass
+            for t_ns, frame in self.session.uplink:
+                if self.speed is not None:
+                    due = opened + self._offset_sec(t_ns)
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    self.send_lags_ms.append(max(0.0, (time.perf_counter() - due) * 1000))
+                await websocket.send(frame)
+                self._last_sent_at = time.perf_counter()
+                result["frames_sent"] += 1
+                result["bytes_sent"] += len(frame.encode("utf-8") if isinstance(frame, str) else frame)
+            # 继续接收应答，直到达到录制时的数量或空闲 drain_sec（从最后一次收发算起）
+            expected = self.session.recv_text + self.session.recv_binary
+            while not receiver.done() and self._received < expected:
+                idle = time.perf_counter() - max(self._last_message_at, self._last_sent_at)
+                if idle >= self.drain_sec:
+                    break
+                await asyncio.sleep(min(0.05, self.drain_sec - idle))
+            result["ok"] = True
+        except websockets.ConnectionClosed as e:
+            result["error"] = f"closed by server: {e}"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            await websocket.close()
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+        return result
+
+
+async def replay(sessions: List[SessionTrace], server: Optional[str], speed: Optional[float],
+                 connect_timeout: float = 10.0, auth_timeout: float = 5.0,
+                 drain_sec: float = 5.0) -> Dict[str, Any]:
+    """按录制的时间轴并发重放所有会话，返回汇总结果"""
+    if not sessions:
+        raise ValueError("trace has no sessions")
+    base_ns = sessions[0].open_ns
+    replays = [SessionReplay(s, retarget_url(s.info.get("url", ""), server), speed,
+                             connect_timeout, auth_timeout, drain_sec) for s in sessions]
+    start = time.perf_counter()
+    start_lags_ms: List[float] = []
+
+    async def launch(item: SessionReplay):
+        if speed is not None:
+            due = start + (item.session.open_ns - base_ns) / 1e9 / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start_lags_ms.append(max(0.0, (time.perf_counter() - due) * 1000))
+        return await item.run()
+
+    results = await asyncio.gather(*(launch(item) for item in replays))
+    wall_sec = time.perf_counter() - start
+    return summarize_replay(sessions, results, [lag for r in replays for lag in r.send_lags_ms],
+                            start_lags_ms, wall_sec, speed)
+
+
+def summarize_replay(sessions: List[SessionTrace], results: List[Dict[str, Any]], send_lags_ms: List[float],
+                     start_lags_ms: List[float], wall_sec: float, speed: Optional[float]) -> Dict[str, Any]:
+    """汇总各会话的重放结果"""
+    def distribution(values: List[float]) -> Optional[Dict[str, float]]:
+        if not values:
+            return None
+        values = sorted(values)
+        return {"p50": round(_percentile(values, 0.5), 3), "p99": round(_percentile(values, 0.99), 3),
+                "max": round(values[-1], 3)}
+
+    recorded_end_ns = max((s.close_ns if s.close_ns is not None else (s.uplink[-1][0] if s.uplink else s.open_ns))
+                          for s in sessions)
+    recorded_sec = (recorded_end_ns - sessions[0].open_ns) / 1e9
+    recv_types: Counter = Counter()
+    for r in results:
+        recv_types.update(r["recv_types"])
+    failed = [r for r in results if not r["ok"]]
+    return {
+        "speed": "max" if speed is None else speed,
+        "sessions": len(results),
+        "ok": len(results) - len(failed),
+        "failed": len(failed),
+        "errors": dict(Counter(r["error"] for r in failed).most_common(10)),
+        "recorded_sec": round(recorded_sec, 3),
+        "wall_sec": round(wall_sec, 3),
+        "achieved_speed": round(recorded_sec / wall_sec, 3) if wall_sec > 0 else None,
+        "connect_ms": distribution([r["connect_ms"] for r in results if r["connect_ms"] is not None]),
+        "start_lag_ms": distribution(start_lags_ms),
+        "send_lag_ms": distribution(send_lags_ms),
+        "frames_sent": sum(r["frames_sent"] for r in results),
+        "bytes_sent": sum(r["bytes_sent"] for r in results),
+        "recv_text": sum(r["recv_text"] for r in results),
+        "recv_binary": sum(r["recv_binary"] for r in results),
+        "recv_bytes": sum(r["recv_bytes"] for r in results),
+        "recorded_recv_text": sum(s.recv_text for s in sessions),
+        "recorded_recv_binary": sum(s.recv_binary for s in sessions),
+        "recv_types": dict(sorted(recv_types.items())),
+    }
+
+
+def print_summary(summary: Dict[str, Any], log=print):
+    speed = summary["speed"] if summary["speed"] == "max" else f"{summary['speed']:g}x"
+    log(f"Replayed {summary['sessions']} sessions at {speed}: "
+        f"{summary['ok']} ok, {summary['failed']} failed, "
+        f"{summary['wall_sec']}s wall for {summary['recorded_sec']}s recorded "
+        f"(achieved {summary['achieved_speed']}x)")
+    log(f"  sent {summary['frames_sent']} frames / {summary['bytes_sent']} bytes, "
+        f"send lag {summary['send_lag_ms']}, connect {summary['connect_ms']}")
+    log(f"  received {summary['recv_text']} text (recorded {summary['recorded_recv_text']}), "
+        f"{summary['recv_binary']} audio (recorded {summary['recorded_recv_binary']}), types {summary['recv_types']}")
+    for error, count in summary["errors"].items():
+        log(f"  error x{count}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the uplink side of a protocol trace against a server")
+    parser.add_argument("trace", help="PROTOCOL_TRACE_PATH 录制的轨迹文件")
+    parser.add_argument("--server", default=None, help="目标服务器（如 ws://127.0.0.1:8765，默认使用录制时的地址）")
+    parser.add_argument("--speed", default="1", help="重放倍速：1 为原速，N 为 N 倍速，max 为尽快发送")
+    parser.add_argument("--limit", type=int, default=0, help="只重放前 N 个会话（按建连时间）")
+    parser.add_argument("--connect-timeout", type=float, default=10, help="建连超时（秒）")
+    parser.add_argument("--auth-timeout", type=float, default=5, help="等待服务器第一条消息的超时（秒）")
+    parser.add_argument("--drain-sec", type=float, default=5, help="上行发完后的最长空闲接收时间（秒）")
+    parser.add_argument("--uvloop", action="store_true", help="使用 uvloop 事件循环（需已安装）")
+    parser.add_argument("--info", action="store_true", help="只打印轨迹概况，不重放")
+    parser.add_argument("-o", "--output", default=None, help="结果JSON文件（默认 results/trace_replay_<时间>.json）")
+    args = parser.parse_args()
+
+    import loop_runtime
+
+    try:
+        reader = TraceReader(args.trace)
+        speed = parse_speed(args.speed)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.info:
+        print(json.dumps(reader.summary(), indent=2, ensure_ascii=False))
+        return
+    sessions = reader.sessions()
+    if args.limit > 0:
+        sessions = sessions[:args.limit]
+    if not sessions:
+        parser.error(f"{args.trace}: no sessions to replay")
+
+    summary = loop_runtime.run(
+        replay(sessions, args.server, speed, args.connect_timeout, args.auth_timeout, args.drain_sec),
+        args.uvloop)
+    summary["trace"] = os.path.abspath(args.trace)
+    print_summary(summary)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"trace_replay_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
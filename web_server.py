@@ -4,8 +4,10 @@
 import os
 import json
 import asyncio
+import uuid
 import threading
 import multiprocessing
+from collections import OrderedDict
 from datetime import datetime
 from flask import Flask, render_template, jsonify, request, send_file
 from flask_socketio import SocketIO, emit
@@ -26,6 +28,19 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from test_inquiries import InquiryTester
 from config import Config
+from run_settings import RunSettings
+from audio_pacer import PacingTotals
+from downlink_audio import DownlinkTotals
+from llm_cadence import CadenceTotals
+from loop_runtime import LoopLagMonitor, summarize_loop_lag
+from arrival_scheduler import OpenLoopDispatcher, build_profile, parse_profile_spec, merge_dispatch_stats
+from latency_sketch import MetricSketches
+from result_store import ResultStore
+from event_stream import EventStream
+from async_runtime import AsyncRuntime
+from capacity_search import CapacitySearch, InquiryStageRunner, SLO, parse_search_settings
+from device_fleet import DeviceFleet, parse_fleet_settings
+from sharded_runner import ShardedRun, plan_shards, merge_frame_cache_stats, MSG_RESULT, MSG_EVENT
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'test-secret-key-2025'
@@ -33,30 +48,217 @@ app.config['SECRET_KEY'] = 'test-secret-key-2025'
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', logger=False, engineio_logger=False)
 CORS(app)
 
-# 全局测试状态
-test_state = {
-    "is_running": False,
-    "progress": 0,
-    "total": 0,
-    "current_test": None,
-    "results": [],
-    "summary": {
+def new_test_state():
+    """一次批量测试的初始状态（/api/status 返回的结构）"""
+    return {
+        "run_id": None,
+        "is_running": False,
+        "progress": 0,
         "total": 0,
-        "successful": 0,
-        "failed": 0,
-        "success_rate": 0.0
-    },
-    "start_time": None,
-    "end_time": None,
-    "error": None
-}
-
-# 测试器实例
-tester_instance = None
-test_thread = None
+        "current_test": None,
+        "results": [],  # 最近 RESULT_WINDOW_SIZE 条结果，全部结果在 result_store（磁盘）中
+        "summary": {
+            "total": 0,
+            "successful": 0,
+            "failed": 0,
+            "success_rate": 0.0
+        },
+        "start_time": None,
+        "end_time": None,
+        "error": None
+    }
 
-def emit_test_update(event, data):
-    """发送测试更新到前端"""
+def new_run_id():
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+# PDF 报告中列出的失败用例数
+REPORT_FAILED_CASES = 20
+# /api/report 每页最多返回的用例数（用例列表和时间线）
+REPORT_CASE_LIMIT = 1000
+
+def build_test_case(test_id, r):
+    """报告用例列表中的一条（test_id 为结果在运行中的序号，从 1 开始）"""
+    return {
+        "test_id": test_id,
+        "timestamp": r.get("timestamp"),
+        "type": r.get("type", "unknown"),
+        "index": r.get("index", 0),
+        "success": r.get("success", False),
+        "request_text": r.get("text", ""),
+        "stt_text": r.get("stt_text", ""),
+        "llm_text": r.get("llm_text", ""),
+        "response_text": r.get("response_text", ""),
+        "audio_file": r.get("audio_file", ""),
+        "connection_id": r.get("connection_id"),
+        "device_sn": r.get("device_sn", ""),
+        "stt_latency_ms": r.get("stt_latency"),
+        "llm_latency_ms": r.get("llm_latency"),
+        "tts_latency_ms": r.get("tts_latency"),
+        "e2e_response_time_ms": r.get("e2e_response_time"),
+        "tts_first_audio_ms": r.get("tts_first_audio_latency"),
+        "first_content_sentence_ms": r.get("first_content_sentence_latency"),
+        "downlink_rtf": (r.get("downlink_audio") or {}).get("rtf"),
+        "downlink_underruns": (r.get("downlink_audio") or {}).get("underruns"),
+        "failure_reason": r.get("failure_reason"),
+        "error": r.get("error"),
+        "sent_messages": r.get("sent_messages", 0),
+        "received_messages": r.get("received_messages", 0),
+        "total_sent_bytes": r.get("total_sent_bytes", 0),
+        "total_received_bytes": r.get("total_received_bytes", 0)
+    }
+
+def build_case_sections(results, offset=0):
+    """报告的用例列表和时间线（results 为从第 offset 条开始的一段结果）"""
+    test_cases = []
+    timeline_data = []
+    for i, r in enumerate(results, offset + 1):
+        test_cases.append(build_test_case(i, r))
+        timeline_data.append({
+            "index": i,
+            "timestamp": r.get("timestamp"),
+            "type": r.get("type"),
+            "success": r.get("success", False),
+            "e2e_response_time": r.get("e2e_response_time")
+        })
+    return test_cases, timeline_data
+
+class ReportTotals:
+    """
+    报告中的计数：成功/失败数、失败原因、按类型统计、前几个失败用例，以及发帧节拍、下行音频和 LLM 节奏的累计值
+
+    每条结果到达时 O(1) 更新（分位数在 MetricSketches 中），生成报告时不再读取和遍历全部结果，
+    只有分页的用例列表和时间线从结果存储读取。测试线程写入、Flask 请求线程读取，都在锁内完成。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.successful = 0
+        self.failure_reasons = {}
+        self.by_type = {}  # 测试类型 -> [总数, 成功数]
+        self.failed_cases = []
+        self.pacing = PacingTotals()
+        self.downlink = DownlinkTotals()
+        self.cadence = CadenceTotals()
+
+    def add(self, result):
+        """计入一条结果"""
+        success = result.get("success", False)
+        with self._lock:
+            self.total += 1
+            counts = self.by_type.setdefault(result.get("type"), [0, 0])
+            counts[0] += 1
+            if success:
+                self.successful += 1
+                counts[1] += 1
+            else:
+                reason = result.get("failure_reason", "Unknown")
+                self.failure_reasons[reason] = self.failure_reasons.get(reason, 0) + 1
+                if len(self.failed_cases) < REPORT_FAILED_CASES:
+                    self.failed_cases.append(build_test_case(self.total, result))
+            self.pacing.add(result.get("pacing"))
+            self.downlink.add(result.get("downlink_audio"))
+            self.cadence.add(result.get("llm_cadence"))
+
+    @classmethod
+    def from_results(cls, results):
+        totals = cls()
+        for r in results:
+            totals.add(r)
+        return totals
+
+    def snapshot(self, metric_stats):
+        """报告用的计数副本（metric_stats 为 MetricSketches.performance_metrics()，提供各汇总的分位数）"""
+        with self._lock:
+            return {
+                "total": self.total,
+                "successful": self.successful,
+                "failure_reasons": dict(self.failure_reasons),
+                "by_type": {test_type: tuple(counts) for test_type, counts in self.by_type.items()},
+                "failed_cases": list(self.failed_cases),
+                "pacing": self.pacing.summary(metric_stats.get("pacing_stream_lag")),
+                "downlink_audio": self.downlink.summary(metric_stats),
+                "llm_cadence": self.cadence.summary(),
+            }
+
+class TestRun:
+    """
+    一次批量测试：run_id、连接设置（RunSettings，创建后不变）、状态、结果存储和分位数直方图
+
+    每次 /api/start 新建一个 TestRun 并登记到 runs 中，测试器和连接只读写自己这次运行的对象，
+    多个运行可以同时进行（例如分别压测两个服务器），互不影响。
+    """
+
+    def __init__(self, run_id, settings: RunSettings, options=None):
+        self.run_id = run_id
+        self.settings = settings
+        self.state = new_test_state()
+        self.state["run_id"] = run_id
+        self.state["settings"] = options or {}
+        self.state["run_settings"] = settings.to_dict()
+        # 每轮结果追加到 JSONL 文件（见 result_store），运行开始时创建
+        self.result_store = None
+        # 各指标的流式分位数直方图（每轮结果写入一次，报告和实时进度直接读取）
+        self.sketches = MetricSketches()
+        # 报告中的计数（成功数、失败原因、下行音频等），与直方图一起随每轮结果更新
+        self.totals = ReportTotals()
+        self.tester = None
+        self.job = None
+
+    def record_result(self, result):
+        """结果写入结果存储，并更新直方图和报告计数"""
+        self.result_store.append(result)
+        self.sketches.record(result)
+        self.totals.add(result)
+
+    @property
+    def is_active(self):
+        return self.state["is_running"] or (self.job is not None and not self.job.finished)
+
+    def to_dict(self):
+        """运行概要（不含结果），用于 /api/runs"""
+        return {
+            "run_id": self.run_id,
+            "job_id": self.job.id if self.job is not None else None,
+            "is_running": self.is_active,
+            "start_time": self.state["start_time"],
+            "end_time": self.state["end_time"],
+            "progress": self.state["progress"],
+            "total": self.state["total"],
+            "summary": self.state["summary"],
+            "error": self.state["error"],
+            "settings": self.state["settings"],
+            "run_settings": self.state["run_settings"],
+        }
+
+# 运行登记表：run_id -> TestRun（按开始顺序）；未结束的运行始终保留，已结束的只保留最近 RUN_HISTORY_SIZE 个
+runs = OrderedDict()
+# 看板默认显示的运行（最近一次开始的运行）
+current_run = None
+# 常驻异步运行时：批量测试、单语音测试、TTS 生成等异步任务都提交到同一个事件循环（见 async_runtime）
+runtime = AsyncRuntime(Config.USE_UVLOOP)
+
+def register_run(run):
+    """登记新运行并设为看板默认显示的运行"""
+    global current_run
+    runs[run.run_id] = run
+    current_run = run
+    finished = [run_id for run_id, r in runs.items() if not r.is_active and r is not run]
+    for run_id in finished[:max(len(finished) - Config.RUN_HISTORY_SIZE, 0)]:
+        del runs[run_id]
+        event_stream.discard_group(run_id)
+
+def get_run(run_id=None):
+    """run_id 对应的运行，run_id 为空时返回最近一次开始的运行（都可能为 None）"""
+    if run_id:
+        return runs.get(run_id)
+    return current_run
+
+def active_runs():
+    return [run for run in list(runs.values()) if run.is_active]
+
+def _emit_now(event, data):
+    """立即发送一个事件到前端"""
     # Flask-SocketIO 5.x 版本：从后台线程发送消息需要使用应用上下文
     # 不需要 broadcast 参数，默认就是广播所有连接的客户端
     try:
@@ -69,14 +271,58 @@ def emit_test_update(event, data):
         import traceback
         traceback.print_exc()
 
+def _merge_detail_update(previous, update):
+    """合并同一轮对话的两次 test_detail_update：文本取最新，新增句子依次拼接"""
+    merged = dict(update)
+    sentences = [s for s in (previous.get("llm_sentence"), update.get("llm_sentence")) if s]
+    merged["llm_sentence"] = " ".join(sentences)
+    return merged
+
+# 批量测试的高频事件经合并限速层发送（见 event_stream），测试线程不阻塞在前端 I/O 上；
+# 开始/完成/出错事件与它们走同一队列以保持顺序，但会立即唤醒发送线程
+STREAMED_EVENTS = {"test_started", "test_start", "test_result", "progress_update", "test_detail_update",
+                   "capacity_stage", "fleet_sample", "test_completed", "test_error"}
+event_stream = EventStream(
+    _emit_now, rate_hz=Config.SOCKETIO_FLUSH_HZ or 10.0,
+    # 进度按运行合并，只保留最新一个（同时进行的多个运行各自保留）
+    merge={"progress_update": (lambda d: d.get("run_id"), lambda previous, update: update),
+           "test_detail_update": (lambda d: (d.get("run_id"), d.get("index"), d.get("type")), _merge_detail_update)},
+    urgent=("test_started", "test_completed", "test_error"),
+    # 同一编号的用例可能在一个周期内先后运行两次（任务列表循环使用），以开始/结果事件为界分开合并
+    barriers={"test_start": lambda d: (d.get("run_id"), d.get("index"), d.get("type")),
+              "test_result": lambda d: (d.get("run_id"), d["result"].get("index"), d["result"].get("type"))},
+    # 按运行分别统计，同时进行的运行互不影响（见 collect_harness_stats）
+    group=lambda d: d.get("run_id") if isinstance(d, dict) else None
+)
+
+def emit_test_update(event, data):
+    """发送测试更新到前端"""
+    if Config.SOCKETIO_FLUSH_HZ > 0 and event in STREAMED_EVENTS:
+        event_stream.submit(event, data)
+    else:
+        _emit_now(event, data)
+
 class WebInquiryTester(InquiryTester):
     """带WebSocket通知的测试器"""
     
-    def __init__(self):
-        super().__init__()
+    def __init__(self, run=None, settings=None):
+        """
+        Args:
+            run: 所属的批量测试运行（TestRun），状态、结果和事件都记到该运行下；
+                 为 None 时（单语音测试）使用独立的状态，连接设置取 settings
+        """
+        super().__init__(settings=run.settings if run is not None else settings)
+        self.run = run
+        self.state = run.state if run is not None else new_test_state()
         self.current_index = 0
         self.current_client = None  # 保存当前测试的客户端，用于实时更新
     
+    def emit(self, event, data):
+        """发送测试事件（批量测试的事件带上 run_id，看板据此区分同时进行的多个运行）"""
+        if self.run is not None:
+            data["run_id"] = self.run.run_id
+        emit_test_update(event, data)
+
     def _create_tts_sentence_callback(self, client, test_index: int, test_type: str, test_text: str, is_single_test: bool = False):
         """为每个测试创建独立的TTS句子回调函数，绑定到该测试的index和type"""
         # 存储已发送的句子数量，用于流式显示
@@ -109,7 +355,7 @@ class WebInquiryTester(InquiryTester):
             # 根据是否为单语音测试选择不同的事件
             if is_single_test:
                 # 单语音测试使用专门的事件
-                emit_test_update("single_test_update", {
+                self.emit("single_test_update", {
                     "stt_text": current_stt_text,
                     "llm_text": cumulative_text,  # 累积文本（用于完整显示）
                     "llm_sentence": new_sentence,  # 新句子（用于流式追加）
@@ -117,7 +363,7 @@ class WebInquiryTester(InquiryTester):
                 })
             else:
                 # 批量测试使用原有的事件
-                emit_test_update("test_detail_update", {
+                self.emit("test_detail_update", {
                     "index": test_index,
                     "type": test_type,
                     "text": test_text,
@@ -143,7 +389,7 @@ class WebInquiryTester(InquiryTester):
             )
         
         # 更新当前测试状态
-        test_state["current_test"] = {
+        self.state["current_test"] = {
             "index": index,
             "type": test_type,
             "text": text,
@@ -153,10 +399,10 @@ class WebInquiryTester(InquiryTester):
         }
         
         # 发送测试开始事件（包含并发索引）
-        test_start_data = test_state["current_test"].copy()
+        test_start_data = self.state["current_test"].copy()
         if concurrency_index is not None:
             test_start_data["concurrency_index"] = concurrency_index
-        emit_test_update("test_start", test_start_data)
+        self.emit("test_start", test_start_data)
         
         # 执行测试
         try:
@@ -167,8 +413,8 @@ class WebInquiryTester(InquiryTester):
                 client._tts_sentence_callback = None
         
         # 更新结果（确保包含所有必要字段）
-        test_state["current_test"]["status"] = "completed" if result.get("success", False) else "failed"
-        test_state["current_test"]["result"] = result
+        self.state["current_test"]["status"] = "completed" if result.get("success", False) else "failed"
+        self.state["current_test"]["result"] = result
         
         # 确保result包含所有字段
         result["index"] = index
@@ -178,9 +424,9 @@ class WebInquiryTester(InquiryTester):
             result["timestamp"] = datetime.now().isoformat()
         
         # 发送结果更新（包含完整的result数据和并发索引）
-        emit_test_update("test_result", {
+        self.emit("test_result", {
             "result": result,
-            "current_test": test_state["current_test"],
+            "current_test": self.state["current_test"],
             "concurrency_index": concurrency_index
         })
         
@@ -188,10 +434,8 @@ class WebInquiryTester(InquiryTester):
     
     async def run_test(self):
         """重写运行测试方法，添加进度通知 - 使用前端设置的SN、并发数和测试模式"""
-        global test_state
-        
-        # 从test_state获取设置，如果没有则使用默认值
-        settings = test_state.get("settings", {})
+        # 从运行状态获取设置，如果没有则使用默认值
+        settings = self.state.get("settings", {})
         device_sns = settings.get("device_sns", [
             "FC012C2EA0D4",
             "FC012C2EA174",
@@ -230,17 +474,25 @@ class WebInquiryTester(InquiryTester):
             connections_per_sn = 1
             total_connections = len(device_sns)
         
-        # 设置测试模式到Config（供test_single_audio使用）
-        from config import Config
-        Config.TEST_MODE = test_mode
+        # 工作进程数：>1 时把连接分片到多个进程（见 sharded_runner）
+        workers = settings.get("workers") or Config.WORKER_PROCESSES
         
         try:
             # 初始化状态
-            test_state["is_running"] = True
-            test_state["error"] = None
-            test_state["start_time"] = datetime.now().isoformat()
-            test_state["results"] = []
-            test_state["summary"] = {
+            self.state["is_running"] = True
+            self.state["error"] = None
+            self.state["start_time"] = datetime.now().isoformat()
+            self.state["results"] = []
+            self.run.sketches.reset()
+            self.run.totals = ReportTotals()
+            self.run.result_store = ResultStore(os.path.join(Config.RUNS_DIR, f"web_run_{self.run.run_id}.jsonl"),
+                                                Config.RESULT_WINDOW_SIZE)
+            self.state["result_file"] = self.run.result_store.path
+            self.state["shard_stats"] = None
+            self.state["dispatch_stats"] = None
+            self.state["capacity_search"] = None
+            self.state["fleet"] = None
+            self.state["summary"] = {
                 "total": 0,
                 "successful": 0,
                 "failed": 0,
@@ -254,23 +506,8 @@ class WebInquiryTester(InquiryTester):
             # 统一处理所有audio_前缀的文件（不再区分类型）
             inquiries_texts, compares_texts, orders_texts = self.parse_text_files()
             
-            # 从file_list.txt读取文本映射（用于准确匹配文本）
-            import re
-            FILE_LIST_TXT = os.path.join(os.path.dirname(__file__), "audio", "inquiries", "file_list.txt")
-            text_map = {}  # {filename: text}
-            if os.path.exists(FILE_LIST_TXT):
-                with open(FILE_LIST_TXT, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
-                            continue
-                        # 解析格式：001: filename.opus - 文本内容
-                        match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s+(.+)', line)
-                        if match:
-                            filename = match.group(2)
-                            text = match.group(3)
-                            if text:  # 只保存非空文本
-                                text_map[filename] = text
+            # 读取文本映射（用于准确匹配文本，优先使用语料归档）
+            text_map = self._load_text_map()  # {filename: text}
             
             # 准备所有测试任务（统一处理，不再区分类型）
             all_test_items = []
@@ -327,29 +564,43 @@ class WebInquiryTester(InquiryTester):
                         actual_test_count += 1
                 self.logger.info(f"实际会执行 {actual_test_count} 个测试（测试任务数: {len(all_test_items)}）")
             
+            # 开放模型：测试数由到达曲线决定（任务列表循环使用），设置了测试数量时以其为上限
+            arrival = settings.get("arrival")
+            if arrival:
+                actual_test_count = build_profile(arrival).expected_count()
+                if test_count and test_count > 0:
+                    actual_test_count = min(actual_test_count, test_count)
+            
+            # 容量搜索：阶段数和每阶段轮次取决于服务器表现，事先无法确定总数（任务列表循环使用）
+            capacity = settings.get("capacity")
+            if capacity:
+                actual_test_count = 0
+            # 设备群：只有活跃连接做对话，轮次数同样取决于运行时长和服务器表现
+            fleet = settings.get("fleet")
+            if fleet:
+                actual_test_count = 0
+                total_connections_for_notification = fleet["connections"]
+            
             # 设置实际测试数（用于进度显示）
-            test_state["total"] = actual_test_count
-            test_state["total_opus_files"] = total_opus_files  # 保存opus文件总数
+            self.state["total"] = actual_test_count
+            self.state["total_opus_files"] = total_opus_files  # 保存opus文件总数
             
-            # 保存settings到test_state，供报告使用
-            if "settings" not in test_state:
-                test_state["settings"] = {}
-            test_state["settings"]["total_opus_files"] = total_opus_files
-            test_state["settings"]["test_count"] = test_count
+            # 保存settings到运行状态，供报告使用
+            if "settings" not in self.state:
+                self.state["settings"] = {}
+            self.state["settings"]["total_opus_files"] = total_opus_files
+            self.state["settings"]["test_count"] = test_count
             
             # 发送测试开始通知（在计算 actual_test_count 之后）
-            emit_test_update("test_started", {
-                "start_time": test_state["start_time"],
+            self.emit("test_started", {
+                "start_time": self.state["start_time"],
                 "total": actual_test_count,  # 实际测试数（设置的测试数或所有文件数）
                 "total_opus_files": total_opus_files,  # opus文件总数
                 "concurrency_count": total_connections_for_notification
             })
             
-            # 单SN并发测试
-            from websocket_client import WebSocketClient
-            
             try:
-                if not test_state["is_running"]:
+                if not self.state["is_running"]:
                     return
 
                 self.logger.info(f"\n{'='*60}")
@@ -357,160 +608,428 @@ class WebInquiryTester(InquiryTester):
                 self.logger.info(f"SN列表: {', '.join(device_sns)}")
                 self.logger.info(f"{'='*60}")
 
-                # 为每个SN创建多个客户端（如果需要）
-                clients = []
-                connection_id = 1
-                for sn in device_sns:
-                    for conn_idx in range(connections_per_sn):
-                        clients.append(WebSocketClient(connection_id=connection_id, device_sn=sn))
-                        connection_id += 1
-                
-                self.logger.info(f"共创建 {len(clients)} 个WebSocket客户端")
-
-                # 建立连接并等待鉴权
-                async def connect_and_auth(client, sn):
-                    connected = await client.connect()
-                    if not connected:
-                        self.logger.error(f"SN {sn}: 连接失败 (Conn #{client.connection_id})")
-                        return False
-                    max_wait_server_msg = 3.0
-                    initial_wait = 0.2
-                    await asyncio.sleep(initial_wait)
-                    wait_server_msg_time = 0
-                    check_interval = 0.1
-                    while wait_server_msg_time < max_wait_server_msg and client.is_connected:
-                        if client.auth_received or client.session_id:
-                            break
-                        await asyncio.sleep(check_interval)
-                        wait_server_msg_time += check_interval
-                    if client.auth_failed:
-                        self.logger.error(f"SN {sn}: 鉴权失败 (Conn #{client.connection_id})")
-                        return False
-                    self.logger.info(f"SN {sn}: 鉴权成功 (Conn #{client.connection_id})")
-                    return True
-
-                # 获取每个客户端对应的SN
-                client_sns = []
-                for sn in device_sns:
-                    client_sns.extend([sn] * connections_per_sn)
-                
-                connect_results = await asyncio.gather(*(connect_and_auth(c, sn) for c, sn in zip(clients, client_sns)))
-                active_clients = [c for c, ok in zip(clients, connect_results) if ok]
-                if not active_clients:
-                    self.logger.error("所有连接均失败，终止测试")
+                if capacity:
+                    completed = await self._run_capacity_search(device_sns, all_test_items, capacity)
+                elif fleet:
+                    # 设备群的连接在所有SN之间轮流分配，不按并发数截取SN列表
+                    completed = await self._run_fleet(settings.get("device_sns") or device_sns, all_test_items, fleet)
+                elif workers > 1:
+                    completed = await self._run_sharded(device_sns, connections_per_sn, workers, all_test_items)
+                else:
+                    completed = await self._run_in_process(device_sns, connections_per_sn, all_test_items)
+                if not completed:
                     return
 
-                # 创建共享任务队列，所有客户端从队列中取任务
-                task_queue = asyncio.Queue()
-                for item in all_test_items:
-                    await task_queue.put(item)
-
-                async def run_client_tasks(client):
-                    """每个客户端独立从队列中取任务，完成一个立即取下一个"""
-                    while test_state["is_running"]:
-                        try:
-                            # 从队列中取任务，如果队列为空则等待最多1秒
-                            test_item = await asyncio.wait_for(task_queue.get(), timeout=1.0)
-                        except asyncio.TimeoutError:
-                            # 队列为空，退出
-                            break
-                        
-                        if not test_state["is_running"]:
-                            # 如果测试被停止，将任务放回队列
-                            await task_queue.put(test_item)
-                            break
-                        
-                        try:
-                            # 统一处理所有测试任务（不再区分类型）
-                            if "inquiry_file" in test_item:
-                                test_result = await self.test_single_audio(
-                                    client, test_item["inquiry_file"], test_item["inquiry_text"],
-                                    "inquiry", test_item["index"], concurrency_index=client.connection_id - 1
-                                )
-                                self.results.append(test_result)
-                                test_state["results"].append(test_result)
-                                test_state["progress"] = len(test_state["results"])
-                                if test_result["success"]:
-                                    test_state["summary"]["successful"] += 1
-                                else:
-                                    test_state["summary"]["failed"] += 1
-                                test_state["summary"]["total"] += 1
-                                test_state["summary"]["success_rate"] = (
-                                    test_state["summary"]["successful"] / test_state["summary"]["total"] * 100
-                                    if test_state["summary"]["total"] > 0 else 0
-                                )
-                                emit_test_update("progress_update", {
-                                    "progress": test_state["progress"],
-                                    "total": test_state["total"],
-                                    "total_opus_files": test_state.get("total_opus_files", 0),
-                                    "summary": test_state["summary"]
-                                })
-                                await asyncio.sleep(0.2)
-                            
-                            # 标记任务完成
-                            task_queue.task_done()
-                        except Exception as e:
-                            self.logger.error(f"SN {client.device_sn} (Conn #{client.connection_id}) 处理任务时出错: {e}")
-                            task_queue.task_done()
-                            continue
-                    
-                    self.logger.info(f"SN {client.device_sn} (Conn #{client.connection_id}): 任务处理完成")
-
-                # 启动所有客户端的任务处理协程
-                tasks = [run_client_tasks(client) for client in active_clients]
-                
-                if tasks:
-                    # 等待所有任务完成
-                    await asyncio.gather(*tasks)
-                    
-                    # 等待队列中剩余任务完成（如果有）
-                    await task_queue.join()
-
-                # 关闭所有连接
-                for c in active_clients:
-                    if c.is_connected:
-                        await c.close()
-
                 # 测试完成
                 self.logger.info(f"\n{'='*60}")
                 self.logger.info(f"所有测试完成")
-                self.logger.info(f"总测试数: {test_state['summary']['total']}")
-                self.logger.info(f"成功: {test_state['summary']['successful']}")
-                self.logger.info(f"失败: {test_state['summary']['failed']}")
-                self.logger.info(f"成功率: {test_state['summary']['success_rate']:.2f}%")
+                self.logger.info(f"总测试数: {self.state['summary']['total']}")
+                self.logger.info(f"成功: {self.state['summary']['successful']}")
+                self.logger.info(f"失败: {self.state['summary']['failed']}")
+                self.logger.info(f"成功率: {self.state['summary']['success_rate']:.2f}%")
                 self.logger.info(f"{'='*60}\n")
                 
-                test_state["end_time"] = datetime.now().isoformat()
-                emit_test_update("test_completed", {
-                    "end_time": test_state["end_time"],
-                    "summary": test_state["summary"],
-                    "results": test_state["results"]
+                self.state["end_time"] = datetime.now().isoformat()
+                self.emit("test_completed", {
+                    "end_time": self.state["end_time"],
+                    "summary": self.state["summary"],
+                    "results": self.state["results"]
                 })
                 
             except Exception as e:
-                test_state["error"] = str(e)
-                test_state["is_running"] = False
-                emit_test_update("test_error", {"error": str(e)})
+                self.state["error"] = str(e)
+                self.state["is_running"] = False
+                self.emit("test_error", {"error": str(e)})
                 import traceback
                 print(traceback.format_exc())
             finally:
-                test_state["is_running"] = False
+                self.state["is_running"] = False
+                self.run.result_store.close()
                 
         except Exception as e:
-            test_state["error"] = str(e)
-            test_state["is_running"] = False
-            emit_test_update("test_error", {"error": str(e)})
+            self.state["error"] = str(e)
+            self.state["is_running"] = False
+            self.emit("test_error", {"error": str(e)})
             import traceback
             print(traceback.format_exc())
 
-def run_test_async():
-    """在异步环境中运行测试"""
-    global tester_instance
-    tester_instance = WebInquiryTester()
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(tester_instance.run_test())
-    loop.close()
+    def _record_result(self, test_result):
+        """记录一个测试结果：更新 self.state 汇总并发送进度"""
+        # 全部结果写入磁盘，内存中只保留最近的窗口（长时间运行内存不增长）
+        self.run.record_result(test_result)
+        self.state["results"].append(test_result)
+        if len(self.state["results"]) > Config.RESULT_WINDOW_SIZE:
+            del self.state["results"][0]
+        self.state["progress"] = len(self.run.result_store)
+        if test_result["success"]:
+            self.state["summary"]["successful"] += 1
+        else:
+            self.state["summary"]["failed"] += 1
+        self.state["summary"]["total"] += 1
+        self.state["summary"]["success_rate"] = (
+            self.state["summary"]["successful"] / self.state["summary"]["total"] * 100
+            if self.state["summary"]["total"] > 0 else 0
+        )
+        self.emit("progress_update", {
+            "progress": self.state["progress"],
+            "total": self.state["total"],
+            "total_opus_files": self.state.get("total_opus_files", 0),
+            "summary": self.state["summary"],
+            "percentiles": self.run.sketches.live()  # 实时 P50/P95/P99（毫秒）
+        })
+
+    async def _run_sharded(self, device_sns, connections_per_sn, workers, all_test_items) -> bool:
+        """
+        多进程分片模式：连接分到多个工作进程，本线程只负责汇总结果和推送前端事件
+        
+        所有分片都没有建立任何连接时返回False
+        """
+        shards = plan_shards(device_sns, connections_per_sn, workers)
+        arrival = self.state.get("settings", {}).get("arrival")
+        if arrival:
+            # 开放模型：每个分片按 1/N 的到达率独立调度（多个泊松过程叠加仍是泊松过程）
+            test_count = self.state.get("settings", {}).get("test_count")
+            for shard in shards:
+                shard["arrival"] = arrival
+                shard["arrival_scale"] = 1.0 / len(shards)
+                shard["max_arrivals"] = -(-test_count // len(shards)) if test_count else None
+                shard["items"] = all_test_items
+        for shard in shards:
+            self.logger.info(f"分片 #{shard['shard_index']}: {len(shard['connections'])} 个连接, "
+                             f"SN数量: {len(shard['device_sns'])}")
+        
+        run = ShardedRun(shards, self.settings)
+        run.start([] if arrival else all_test_items)
+        loop = asyncio.get_running_loop()
+        try:
+            while not run.finished:
+                if not self.state["is_running"]:
+                    run.stop()
+                messages = await loop.run_in_executor(None, run.poll, 0.5)
+                for message in messages:
+                    kind = message[0]
+                    if kind == MSG_RESULT:
+                        _, test_result, concurrency_index = message
+                        self.state["current_test"] = {
+                            "index": test_result.get("index"),
+                            "type": test_result.get("type"),
+                            "text": test_result.get("text"),
+                            "audio_file": os.path.basename(test_result.get("audio_file", "")),
+                            "status": "completed" if test_result.get("success", False) else "failed",
+                            "timestamp": test_result.get("timestamp"),
+                            "result": test_result
+                        }
+                        self.emit("test_result", {
+                            "result": test_result,
+                            "current_test": self.state["current_test"],
+                            "concurrency_index": concurrency_index
+                        })
+                        self._record_result(test_result)
+                    elif kind == MSG_EVENT:
+                        _, event, data = message
+                        if event == "test_start":
+                            self.state["current_test"] = data
+                        self.emit(event, data)
+        finally:
+            run.stop()
+            await loop.run_in_executor(None, run.join)
+        
+        shard_stats = run.get_stats()
+        self.state["shard_stats"] = shard_stats
+        for stats in shard_stats:
+            if stats.get("error"):
+                self.logger.error(f"分片 #{stats['shard_index']} 异常退出: {stats['error']}")
+        if not any(stats.get("connected") for stats in shard_stats):
+            self.logger.error("所有连接均失败，终止测试")
+            return False
+        return True
+
+    async def _run_closed_loop(self, active_clients, all_test_items):
+        """闭环模式：每个客户端完成一个任务后立即从共享队列取下一个"""
+        # 创建共享任务队列，所有客户端从队列中取任务
+        task_queue = asyncio.Queue()
+        for item in all_test_items:
+            await task_queue.put(item)
+
+        async def run_client_tasks(client):
+            """每个客户端独立从队列中取任务，完成一个立即取下一个"""
+            while self.state["is_running"]:
+                try:
+                    # 从队列中取任务，如果队列为空则等待最多1秒
+                    test_item = await asyncio.wait_for(task_queue.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    # 队列为空，退出
+                    break
+                
+                if not self.state["is_running"]:
+                    # 如果测试被停止，将任务放回队列
+                    await task_queue.put(test_item)
+                    break
+                
+                try:
+                    # 统一处理所有测试任务（不再区分类型）
+                    if "inquiry_file" in test_item:
+                        test_result = await self.test_single_audio(
+                            client, test_item["inquiry_file"], test_item["inquiry_text"],
+                            "inquiry", test_item["index"], concurrency_index=client.connection_id - 1
+                        )
+                        self._record_result(test_result)
+                        if Config.INTER_TURN_GAP_MS > 0:
+                            await asyncio.sleep(Config.INTER_TURN_GAP_MS / 1000.0)
+                    
+                    # 标记任务完成
+                    task_queue.task_done()
+                except Exception as e:
+                    self.logger.error(f"SN {client.device_sn} (Conn #{client.connection_id}) 处理任务时出错: {e}")
+                    task_queue.task_done()
+                    continue
+            
+            self.logger.info(f"SN {client.device_sn} (Conn #{client.connection_id}): 任务处理完成")
+
+        # 启动所有客户端的任务处理协程
+        tasks = [run_client_tasks(client) for client in active_clients]
+        
+        if tasks:
+            # 等待所有任务完成
+            await asyncio.gather(*tasks)
+            
+            # 等待队列中剩余任务完成（如果有）
+            await task_queue.join()
+
+    async def _run_open_model(self, active_clients, all_test_items, arrival):
+        """开放模型：按到达曲线把任务派发给空闲连接（任务列表循环使用），记录派发延迟"""
+        profile = build_profile(arrival)
+        test_count = self.state.get("settings", {}).get("test_count")
+        self.logger.info(f"开放模型到达调度: {profile.describe()}")
+
+        async def run_turn(client, arrival_slot):
+            test_item = arrival_slot.item
+            try:
+                test_result = await self.test_single_audio(
+                    client, test_item["inquiry_file"], test_item["inquiry_text"],
+                    "inquiry", test_item["index"], concurrency_index=client.connection_id - 1
+                )
+            except Exception as e:
+                self.logger.error(f"SN {client.device_sn} (Conn #{client.connection_id}) 处理任务时出错: {e}")
+                return
+            self._record_result(arrival_slot.annotate(test_result))
+
+        dispatcher = OpenLoopDispatcher(
+            profile, active_clients, run_turn, items=all_test_items, max_arrivals=test_count,
+            should_stop=lambda: not self.state["is_running"],
+            late_tolerance_ms=Config.ARRIVAL_LATE_TOLERANCE_MS
+        )
+        self.state["dispatch_stats"] = await dispatcher.run()
+        self.logger.info(f"派发统计: {self.state['dispatch_stats']}")
+
+    async def _run_capacity_search(self, device_sns, all_test_items, capacity) -> bool:
+        """容量搜索：逐阶段调整并发数/到达率，按 SLO 找出最大可承受负载，没有测试任务时返回False"""
+        if not all_test_items:
+            self.logger.error("没有可用的测试任务，终止容量搜索")
+            return False
+        slo = SLO.from_dict(capacity["slo"])
+        self.logger.info(f"容量搜索: {capacity['dimension']} {capacity['start']:g}..{capacity['max']:g}, SLO: {slo.describe()}")
+
+        async def run_item(client, test_item):
+            return await self.test_single_audio(
+                client, test_item["inquiry_file"], test_item["inquiry_text"],
+                "inquiry", test_item["index"], concurrency_index=client.connection_id - 1
+            )
+
+        def on_stage(stage):
+            self.logger.info(f"容量搜索阶段 {stage['stage']}: {capacity['dimension']}={stage['level']}, "
+                             f"吞吐量 {stage['throughput']}/s, 延迟 {stage.get('latency_slo_ms')}ms, "
+                             f"成功率 {stage['success_rate']}% -> {'通过' if stage['passed'] else '未通过'}")
+            self.emit("capacity_stage", dict(stage, dimension=capacity["dimension"]))
+
+        stage_runner = InquiryStageRunner(
+            run_item, device_sns, all_test_items, capacity["dimension"], capacity["stage_duration_sec"],
+            capacity["connections"], capacity["cooldown_sec"], capacity["poisson"],
+            Config.ARRIVAL_LATE_TOLERANCE_MS, on_result=self._record_result,
+            should_stop=lambda: not self.state["is_running"], logger=self.logger, settings=self.settings
+        )
+        search = CapacitySearch(
+            stage_runner, slo, capacity["start"], capacity["max"], capacity["growth"], capacity["resolution"],
+            integer=capacity["dimension"] == "concurrency", dimension=capacity["dimension"],
+            should_stop=lambda: not self.state["is_running"], on_stage=on_stage
+        )
+        self.state["capacity_search"] = await search.run()
+        capacity_level = self.state["capacity_search"]["capacity"]
+        self.logger.info(f"容量搜索完成: 满足SLO的最大{capacity['dimension']} = "
+                         f"{capacity_level['level'] if capacity_level else '无'}")
+        return True
+
+    async def _run_fleet(self, device_sns, all_test_items, fleet) -> bool:
+        """设备群：错开建立大量空闲连接，少量活跃连接循环对话，记录连接/鉴权/内存/断连的时间序列"""
+        if fleet["active"] and not all_test_items:
+            self.logger.error("没有可用的测试任务，设备群的活跃连接无法进行对话")
+            return False
+
+        async def run_item(client, test_item):
+            return await self.test_single_audio(
+                client, test_item["inquiry_file"], test_item["inquiry_text"],
+                "inquiry", test_item["index"], concurrency_index=client.connection_id - 1
+            )
+
+        def on_sample(point):
+            self.emit("fleet_sample", dict(point))
+
+        device_fleet = DeviceFleet(
+            fleet, device_sns, run_item, all_test_items, on_result=self._record_result, on_sample=on_sample,
+            should_stop=lambda: not self.state["is_running"], logger=self.logger, run_settings=self.settings
+        )
+        self.state["fleet"] = await device_fleet.run()
+        summary = self.state["fleet"]["summary"]
+        self.logger.info(f"设备群完成: 在线峰值 {summary['connected_peak']}/{summary['target']}, "
+                         f"鉴权P95 {summary['auth_p95_ms']}ms, 服务器断开 {summary['server_disconnects']}, "
+                         f"压测端RSS峰值 {summary['peak_rss_mb']}MB")
+        return True
+
+    async def _run_in_process(self, device_sns, connections_per_sn, all_test_items) -> bool:
+        """在当前事件循环中运行所有连接（单进程模式），所有连接均失败时返回False"""
+        from websocket_client import WebSocketClient
+        
+        # 为每个SN创建多个客户端（如果需要）
+        clients = []
+        connection_id = 1
+        for sn in device_sns:
+            for conn_idx in range(connections_per_sn):
+                clients.append(WebSocketClient(connection_id=connection_id, device_sn=sn, settings=self.settings))
+                connection_id += 1
+        
+        self.logger.info(f"共创建 {len(clients)} 个WebSocket客户端")
+
+        # 建立连接并等待鉴权
+        async def connect_and_auth(client, sn):
+            connected = await client.connect()
+            if not connected:
+                self.logger.error(f"SN {sn}: 连接失败 (Conn #{client.connection_id})")
+                return False
+            await client.wait_for_auth(timeout=3.0)
+            if client.auth_failed:
+                self.logger.error(f"SN {sn}: 鉴权失败 (Conn #{client.connection_id})")
+                return False
+            self.logger.info(f"SN {sn}: 鉴权成功 (Conn #{client.connection_id})")
+            return True
+
+        # 获取每个客户端对应的SN
+        client_sns = []
+        for sn in device_sns:
+            client_sns.extend([sn] * connections_per_sn)
+        
+        try:
+            connect_results = await asyncio.gather(*(connect_and_auth(c, sn) for c, sn in zip(clients, client_sns)))
+            active_clients = [c for c, ok in zip(clients, connect_results) if ok]
+            if not active_clients:
+                self.logger.error("所有连接均失败，终止测试")
+                return False
+
+            arrival = self.state.get("settings", {}).get("arrival")
+            if arrival:
+                await self._run_open_model(active_clients, all_test_items, arrival)
+            else:
+                await self._run_closed_loop(active_clients, all_test_items)
+            return True
+        finally:
+            # 关闭所有连接（任务被取消时也要关闭，常驻事件循环上不能遗留连接）
+            for c in clients:
+                if c.is_connected:
+                    await c.close()
+
+async def run_test_async(run):
+    """批量测试任务（在常驻运行时的事件循环中执行）"""
+    tester = run.tester = WebInquiryTester(run)
+    # 采样本次运行期间事件循环的调度延迟，报告中据此判断压测端是否饱和
+    # （同时进行的多个运行共用一个事件循环，各自的采样结果反映的是整个循环的负载）
+    tester.loop_monitor = LoopLagMonitor(asyncio.get_running_loop(), Config.LOOP_LAG_SAMPLE_INTERVAL_MS)
+    tester.loop_monitor.start()
+    try:
+        await tester.run_test()
+    except asyncio.CancelledError:
+        run.state["is_running"] = False
+        run.state["error"] = "测试已取消"
+        run.state["end_time"] = datetime.now().isoformat()
+        tester.emit("test_error", {"error": "测试已取消"})
+        raise
+    finally:
+        tester.loop_monitor.stop()
+
+# ==================== 单语音测试：复用已鉴权连接 ====================
+
+# 单语音测试共用的测试器（音频帧缓存在多次测试之间保留）和已鉴权连接
+# 连接按 (运行设置, SN) 保存，只在运行时的事件循环中访问，不需要加锁
+single_tester = None
+single_test_clients = {}
+
+def get_single_tester():
+    global single_tester
+    if single_tester is None:
+        single_tester = WebInquiryTester()
+    return single_tester
+
+async def acquire_single_test_client(settings, device_sn):
+    """
+    获取单语音测试用的已鉴权连接：已有可用连接时直接复用，否则新建连接并等待鉴权
+
+    Returns:
+        (client, error)：失败时 client 为 None，error 为错误信息
+    """
+    from websocket_client import WebSocketClient
+
+    key = (settings, device_sn)
+    client = single_test_clients.pop(key, None)
+    if client is not None:
+        if client.is_connected and not client.auth_failed and not client._is_websocket_closed():
+            single_test_clients[key] = client
+            return client, None
+        await client.close()
+
+    client = WebSocketClient(connection_id=1, device_sn=device_sn, settings=settings)
+    if not await client.connect():
+        return None, "WebSocket连接失败"
+    # 等待服务器鉴权响应（事件驱动，收到即返回）
+    await client.wait_for_auth(timeout=3.0)
+    if client.auth_failed:
+        await client.close()
+        return None, "WebSocket鉴权失败"
+    single_test_clients[key] = client
+    return client, None
+
+async def close_single_test_clients():
+    """关闭全部保留的单语音测试连接，返回关闭的连接数"""
+    clients = list(single_test_clients.values())
+    single_test_clients.clear()
+    for client in clients:
+        if client.is_connected:
+            await client.close()
+    return len(clients)
+
+async def run_single_test_turn(settings, device_sn, opus_file, text):
+    """在复用的连接上执行一次单语音测试，返回测试结果（连接或鉴权失败时发送错误事件并返回 None）"""
+    key = (settings, device_sn)
+    client, error = await acquire_single_test_client(settings, device_sn)
+    if client is None:
+        socketio.emit('single_test_error', {"error": error})
+        return None
+    tester = get_single_tester()
+    reusable = False
+    try:
+        # 为单语音测试创建实时更新回调
+        client._tts_sentence_callback = tester._create_tts_sentence_callback(
+            client, 1, "single", text, is_single_test=True
+        )
+        # 执行单次测试（传入is_single_test=True，但回调已设置，不会覆盖）
+        test_result = await tester.test_single_audio(
+            client, opus_file, text, "single", 1, is_single_test=True
+        )
+        reusable = client.is_connected
+        return test_result
+    finally:
+        # 测试出错、被取消或连接已断开时不再复用
+        if not reusable:
+            if single_test_clients.get(key) is client:
+                del single_test_clients[key]
+            await client.close()
 
 @app.route('/')
 def index():
@@ -522,26 +1041,118 @@ def opus_management():
     """Opus文件管理页面"""
     return render_template('opus_management.html')
 
+def run_not_found(run_id):
+    return jsonify({"error": f"运行不存在: {run_id}"}), 404
+
 @app.route('/api/status')
 def get_status():
-    """获取测试状态"""
-    return jsonify(test_state)
+    """获取测试状态：?run_id= 指定运行，未指定时为最近一次开始的运行"""
+    run_id = request.args.get("run_id")
+    run = get_run(run_id)
+    if run is None:
+        return run_not_found(run_id) if run_id else jsonify(new_test_state())
+    return jsonify(run.state)
+
+@app.route('/api/runs')
+def list_runs():
+    """运行登记表：全部未结束的运行和最近 RUN_HISTORY_SIZE 个已结束的运行（按开始顺序）"""
+    return jsonify({
+        "runs": [run.to_dict() for run in list(runs.values())],
+        "current_run_id": current_run.run_id if current_run is not None else None
+    })
+
+@app.route('/api/runs/<run_id>')
+def get_run_info(run_id):
+    """单个运行的概要"""
+    run = get_run(run_id)
+    if run is None:
+        return run_not_found(run_id)
+    return jsonify(run.to_dict())
 
 @app.route('/api/results')
 def get_results():
-    """获取测试结果"""
+    """分页获取测试结果：?offset=0&limit=100&run_id=（offset 为负数时从末尾倒数），从磁盘结果存储读取"""
+    run_id = request.args.get("run_id")
+    run = get_run(run_id)
+    if run_id and run is None:
+        return run_not_found(run_id)
+    offset = request.args.get("offset", 0, type=int)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    store = run.result_store if run is not None else None
     return jsonify({
-        "results": test_state["results"],
-        "summary": test_state["summary"]
+        "run_id": run.run_id if run is not None else None,
+        "results": store.page(offset, limit) if store is not None else [],
+        "total": len(store) if store is not None else 0,
+        "offset": offset,
+        "limit": limit,
+        "summary": run.state["summary"] if run is not None else new_test_state()["summary"]
     })
 
-def generate_test_report(results, summary, start_time, end_time, settings):
-    """生成测试报告"""
-    import statistics
+def load_run_results(run, offset=0, limit=None):
+    """运行的第 offset 条起的 limit 条结果（从磁盘结果存储分页读取，limit 为 None 时读到末尾）"""
+    if run.result_store is not None:
+        total = len(run.result_store)
+        return run.result_store.page(offset, total if limit is None else limit)
+    results = run.state.get("results", [])
+    return results[offset:] if limit is None else results[offset:offset + limit]
+
+def iter_run_results(run):
+    """逐条读取运行的全部结果，用于导出完整的用例列表"""
+    if run is None:
+        return iter(())
+    if run.result_store is not None:
+        return run.result_store.iter_results()
+    return iter(run.state.get("results", []))
+
+def collect_harness_stats(run):
+    """收集压测端自身的运行指标（帧缓存等），用于报告"""
+    stats = {}
+    tester = run.tester
+    shard_stats = run.state.get("shard_stats")
+    if shard_stats:
+        # 分片模式下客户端运行在工作进程中，帧缓存按进程合并
+        stats["shards"] = shard_stats
+        frame_cache = merge_frame_cache_stats(shard_stats)
+        if frame_cache:
+            stats["frame_cache"] = frame_cache
+        loop_lag = summarize_loop_lag([s.get("loop_lag") for s in shard_stats])
+        if loop_lag:
+            stats["loop_lag"] = loop_lag
+        dispatch = merge_dispatch_stats([s.get("dispatch") for s in shard_stats])
+        if dispatch:
+            stats["dispatch"] = dispatch
+    elif tester is not None:
+        if getattr(tester, "frame_cache", None) is not None:
+            stats["frame_cache"] = tester.frame_cache.get_stats()
+        if getattr(tester, "loop_monitor", None) is not None:
+            stats["loop_lag"] = tester.loop_monitor.get_stats(Config.LOOP_LAG_WARN_MS)
+    if run.state.get("dispatch_stats"):
+        stats["dispatch"] = run.state["dispatch_stats"]
+    if Config.SOCKETIO_FLUSH_HZ > 0:
+        stats["event_stream"] = event_stream.get_stats(run.run_id)
+    return stats
+
+def generate_test_report(results, summary, start_time, end_time, settings, harness_stats=None,
+                         capacity_search=None, sketches=None, fleet=None, totals=None, case_offset=0):
+    """
+    生成测试报告
+
+    sketches/totals 为运行中累计的直方图和计数（TestRun.sketches / TestRun.totals），此时 results 只是
+    用例列表和时间线这一页的结果（从第 case_offset 条开始）；未传入时 results 为全部结果，从中重建
+    """
+    if sketches is None or totals is None:
+        sketches = MetricSketches.from_results(results)
+        totals = ReportTotals.from_results(results)
+        case_offset = 0
+    
+    # 性能指标统计（专业测试角度：精细化拆解各个阶段的延迟）
+    # 运行过程中每轮结果已写入流式直方图（见 latency_sketch），这里直接读取分位数
+    metric_stats = sketches.performance_metrics()
+    counts = totals.snapshot(metric_stats)
     
     # 基础统计
-    total_tests = len(results)
-    successful_tests = sum(1 for r in results if r.get("success", False))
+    total_tests = counts["total"]
+    successful_tests = counts["successful"]
     failed_tests = total_tests - successful_tests
     success_rate = (successful_tests / total_tests * 100) if total_tests > 0 else 0
     
@@ -556,86 +1167,31 @@ def generate_test_report(results, summary, start_time, end_time, settings):
         except:
             pass
     
-    # 性能指标统计（专业测试角度：精细化拆解各个阶段的延迟）
-    # 过滤掉无效值：None、负值、异常大的值
-    
-    # 1. 音频发送阶段
-    send_durations = [r.get("send_duration") for r in results if r.get("send_duration") is not None and r.get("send_duration") >= 0 and r.get("send_duration") <= 60000]
-    
-    # 2. STT服务延迟（优先使用从最后一帧计算的延迟，纯STT处理时间）
-    stt_latencies = []
-    stt_latencies_from_first = []
-    stt_latencies_from_last = []
-    for r in results:
-        # 从最后一帧计算的延迟（纯STT处理时间，更准确）
-        stt_latency_from_last = r.get("stt_latency_from_last_frame")
-        if stt_latency_from_last is not None and 0 <= stt_latency_from_last <= 60000:
-            stt_latencies_from_last.append(stt_latency_from_last)
-            stt_latencies.append(stt_latency_from_last)  # 优先使用这个
-        
-        # 从第一帧计算的延迟（包含发送时间）
-        stt_latency_from_first = r.get("stt_latency_from_first_frame") or r.get("stt_latency")
-        if stt_latency_from_first is not None and 0 <= stt_latency_from_first <= 60000:
-            stt_latencies_from_first.append(stt_latency_from_first)
-            if stt_latency_from_last is None:  # 如果没有最后一帧的延迟，使用第一帧的
-                stt_latencies.append(stt_latency_from_first)
-    
-    # 3. LLM服务延迟
-    llm_latencies = [r.get("llm_latency") for r in results if r.get("llm_latency") is not None and r.get("llm_latency") >= 0 and r.get("llm_latency") <= 60000]
-    
-    # 4. TTS服务延迟
-    tts_latencies = [r.get("tts_latency") for r in results if r.get("tts_latency") is not None and r.get("tts_latency") >= 0 and r.get("tts_latency") <= 10000]
-    tts_durations = [r.get("tts_duration") for r in results if r.get("tts_duration") is not None and r.get("tts_duration") >= 0 and r.get("tts_duration") <= 120000]
-    
-    # 5. 端到端响应时间（多个维度）
-    e2e_from_first = [r.get("e2e_from_first_frame") or r.get("e2e_response_time") for r in results if (r.get("e2e_from_first_frame") or r.get("e2e_response_time")) is not None and (r.get("e2e_from_first_frame") or r.get("e2e_response_time")) >= 0 and (r.get("e2e_from_first_frame") or r.get("e2e_response_time")) <= 120000]
-    e2e_from_last = [r.get("e2e_from_last_frame") for r in results if r.get("e2e_from_last_frame") is not None and r.get("e2e_from_last_frame") >= 0 and r.get("e2e_from_last_frame") <= 120000]
-    e2e_from_stt = [r.get("e2e_from_stt") for r in results if r.get("e2e_from_stt") is not None and r.get("e2e_from_stt") >= 0 and r.get("e2e_from_stt") <= 120000]
-    e2e_from_llm = [r.get("e2e_from_llm") for r in results if r.get("e2e_from_llm") is not None and r.get("e2e_from_llm") >= 0 and r.get("e2e_from_llm") <= 120000]
-    
-    def calc_stats(times):
-        if not times:
-            return None
-        sorted_times = sorted(times)
-        return {
-            "min": min(times),
-            "max": max(times),
-            "avg": statistics.mean(times),
-            "median": statistics.median(times),
-            "p95": sorted_times[int(len(sorted_times) * 0.95)] if len(sorted_times) > 0 else None,
-            "p99": sorted_times[int(len(sorted_times) * 0.99)] if len(sorted_times) > 0 else None,
-            "count": len(times)
-        }
+    # 压测端指标：帧缓存等由调用方传入，持续输入模式的发帧节拍来自运行中的累计值
+    harness_metrics = dict(harness_stats or {})
+    if counts["pacing"]:
+        harness_metrics["pacing"] = counts["pacing"]
+    
+    # 下行TTS音频：卡顿次数等计数来自运行中的累计值，实时率/抖动/卡顿时长的分位数来自直方图
+    downlink_audio = counts["downlink_audio"]
+    # LLM流式节奏：各来源的句子数、垫话句轮数（分位数来自直方图）
+    llm_cadence = counts["llm_cadence"]
     
     # 失败原因统计
-    failure_reasons = {}
-    for r in results:
-        if not r.get("success", False):
-            reason = r.get("failure_reason", "Unknown")
-            failure_reasons[reason] = failure_reasons.get(reason, 0) + 1
+    failure_reasons = counts["failure_reasons"]
     
     # 按测试类型统计（支持三种类型：inquiry、compare、order/purchase）
-    inquiry_results = [r for r in results if r.get("type") == "inquiry"]
-    compare_results = [r for r in results if r.get("type") == "compare"]
-    order_results = [r for r in results if r.get("type") in ["order", "purchase"]]
-    
-    inquiry_success = sum(1 for r in inquiry_results if r.get("success", False))
-    compare_success = sum(1 for r in compare_results if r.get("success", False))
-    order_success = sum(1 for r in order_results if r.get("success", False))
+    by_type = counts["by_type"]
+    inquiry_total, inquiry_success = by_type.get("inquiry", (0, 0))
+    compare_total, compare_success = by_type.get("compare", (0, 0))
+    order_total = sum(by_type.get(t, (0, 0))[0] for t in ("order", "purchase"))
+    order_success = sum(by_type.get(t, (0, 0))[1] for t in ("order", "purchase"))
     
     # 吞吐量计算（QPS）
     qps = total_tests / duration_seconds if duration_seconds > 0 else 0
     
-    # 时间线数据（用于图表）
-    timeline_data = []
-    for i, r in enumerate(results):
-        timeline_data.append({
-            "index": i + 1,
-            "timestamp": r.get("timestamp"),
-            "type": r.get("type"),
-            "success": r.get("success", False),
-            "e2e_response_time": r.get("e2e_response_time")
-        })
+    # 用例列表和时间线（用于图表）：只包含传入的这一页结果
+    test_cases, timeline_data = build_case_sections(results, case_offset)
     
     # 收集测试环境信息
     from config import Config
@@ -648,35 +1204,6 @@ def generate_test_report(results, summary, start_time, end_time, settings):
         "platform": sys.platform
     }
     
-    # 详细的测试用例列表（每个测试的完整信息）
-    test_cases = []
-    for i, r in enumerate(results):
-        test_case = {
-            "test_id": i + 1,
-            "timestamp": r.get("timestamp"),
-            "type": r.get("type", "unknown"),
-            "index": r.get("index", 0),
-            "success": r.get("success", False),
-            "request_text": r.get("text", ""),
-            "stt_text": r.get("stt_text", ""),
-            "llm_text": r.get("llm_text", ""),
-            "response_text": r.get("response_text", ""),
-            "audio_file": r.get("audio_file", ""),
-            "connection_id": r.get("connection_id"),
-            "device_sn": r.get("device_sn", ""),
-            "stt_latency_ms": r.get("stt_latency"),
-            "llm_latency_ms": r.get("llm_latency"),
-            "tts_latency_ms": r.get("tts_latency"),
-            "e2e_response_time_ms": r.get("e2e_response_time"),
-            "failure_reason": r.get("failure_reason"),
-            "error": r.get("error"),
-            "sent_messages": r.get("sent_messages", 0),
-            "received_messages": r.get("received_messages", 0),
-            "total_sent_bytes": r.get("total_sent_bytes", 0),
-            "total_received_bytes": r.get("total_received_bytes", 0)
-        }
-        test_cases.append(test_case)
-    
     report = {
         "test_info": {
             "start_time": start_time,
@@ -689,88 +1216,140 @@ def generate_test_report(results, summary, start_time, end_time, settings):
             "total_opus_files": settings.get("total_opus_files", 0)
         },
         "test_environment": test_environment,
-        "test_cases": test_cases,  # 详细的测试用例列表
+        "test_cases": test_cases,  # 详细的测试用例列表（分页，见 test_cases_page）
+        "test_cases_page": {"offset": case_offset, "count": len(test_cases), "total": total_tests},
         "summary": {
             "total_tests": total_tests,
             "successful_tests": successful_tests,
             "failed_tests": failed_tests,
             "success_rate": round(success_rate, 2),
             "qps": round(qps, 2),
-            "inquiry_total": len(inquiry_results),
+            "inquiry_total": inquiry_total,
             "inquiry_success": inquiry_success,
-            "inquiry_success_rate": round((inquiry_success / len(inquiry_results) * 100) if inquiry_results else 0, 2),
-            "compare_total": len(compare_results),
+            "inquiry_success_rate": round((inquiry_success / inquiry_total * 100) if inquiry_total else 0, 2),
+            "compare_total": compare_total,
             "compare_success": compare_success,
-            "compare_success_rate": round((compare_success / len(compare_results) * 100) if compare_results else 0, 2),
-            "order_total": len(order_results),
+            "compare_success_rate": round((compare_success / compare_total * 100) if compare_total else 0, 2),
+            "order_total": order_total,
             "order_success": order_success,
-            "order_success_rate": round((order_success / len(order_results) * 100) if order_results else 0, 2),
+            "order_success_rate": round((order_success / order_total * 100) if order_total else 0, 2),
             # 兼容旧格式
-            "purchase_total": len(order_results),
+            "purchase_total": order_total,
             "purchase_success": order_success,
-            "purchase_success_rate": round((order_success / len(order_results) * 100) if order_results else 0, 2)
+            "purchase_success_rate": round((order_success / order_total * 100) if order_total else 0, 2)
         },
         "performance_metrics": {
             # 1. 音频发送阶段
-            "send_duration": calc_stats(send_durations),  # 音频发送耗时（从第一帧到最后一帧）
+            "send_duration": metric_stats["send_duration"],  # 音频发送耗时（从第一帧到最后一帧）
             
             # 2. STT服务延迟
-            "stt_latency": calc_stats(stt_latencies),  # STT延迟（优先使用从最后一帧计算的，纯STT处理时间）
-            "stt_latency_from_first_frame": calc_stats(stt_latencies_from_first),  # STT延迟（从第一帧发送，包含发送时间）
-            "stt_latency_from_last_frame": calc_stats(stt_latencies_from_last),  # STT延迟（从最后一帧发送，纯STT处理时间）
+            "stt_latency": metric_stats["stt_latency"],  # STT延迟（优先使用从最后一帧计算的，纯STT处理时间）
+            "stt_latency_from_first_frame": metric_stats["stt_latency_from_first_frame"],  # STT延迟（从第一帧发送，包含发送时间）
+            "stt_latency_from_last_frame": metric_stats["stt_latency_from_last_frame"],  # STT延迟（从最后一帧发送，纯STT处理时间）
             
             # 3. LLM服务延迟
-            "llm_latency": calc_stats(llm_latencies),  # LLM延迟（从STT完成到LLM响应）
+            "llm_latency": metric_stats["llm_latency"],  # LLM延迟（从STT完成到LLM响应）
             
             # 4. TTS服务延迟
-            "tts_latency": calc_stats(tts_latencies),  # TTS启动延迟（从LLM完成到TTS开始）
-            "tts_duration": calc_stats(tts_durations),  # TTS持续时间（从TTS开始到TTS结束）
+            "tts_latency": metric_stats["tts_latency"],  # TTS启动延迟（从LLM完成到TTS开始）
+            "tts_duration": metric_stats["tts_duration"],  # TTS持续时间（从TTS开始到TTS结束）
             
             # 5. 端到端响应时间（多个维度）
-            "e2e_response_time": calc_stats(e2e_from_first),  # 端到端响应时间（从第一帧发送到TTS结束）
-            "e2e_from_first_frame": calc_stats(e2e_from_first),  # 从第一帧发送到TTS结束
-            "e2e_from_last_frame": calc_stats(e2e_from_last),  # 从最后一帧发送到TTS结束（不包含发送时间）
-            "e2e_from_stt": calc_stats(e2e_from_stt),  # 从STT响应到TTS结束（STT后的完整处理时间）
-            "e2e_from_llm": calc_stats(e2e_from_llm)  # 从LLM响应到TTS结束（LLM后的完整处理时间）
+            "e2e_response_time": metric_stats["e2e_response_time"],  # 端到端响应时间（从第一帧发送到TTS结束）
+            "e2e_from_first_frame": metric_stats["e2e_from_first_frame"],  # 从第一帧发送到TTS结束
+            "e2e_from_last_frame": metric_stats["e2e_from_last_frame"],  # 从最后一帧发送到TTS结束（不包含发送时间）
+            "e2e_from_stt": metric_stats["e2e_from_stt"],  # 从STT响应到TTS结束（STT后的完整处理时间）
+            "e2e_from_llm": metric_stats["e2e_from_llm"],  # 从LLM响应到TTS结束（LLM后的完整处理时间）
+            
+            # 6. 开放模型（按到达曲线派发时才有）
+            "dispatch_lag": metric_stats["dispatch_lag"],  # 派发延迟（实际派发 - 计划到达）
+            "e2e_response_time_corrected": metric_stats["e2e_response_time_corrected"],  # 从计划到达时刻到TTS结束（协调遗漏修正）
+            
+            # 7. 下行TTS音频
+            "tts_first_audio_latency": metric_stats["tts_first_audio_latency"],  # 首音频延迟（从最后一帧上行音频到第一帧TTS音频）
+            "downlink_jitter": metric_stats["downlink_jitter"],  # 每轮TTS音频帧到达抖动
+            
+            # 8. LLM流式节奏（llm 为 LLM 文本块，tts 为 TTS sentence_start，跳过垫话句）
+            "first_content_sentence_latency": metric_stats["first_content_sentence_latency"],  # 从STT到第一句有效内容
+            "llm_sentence_gap": metric_stats["llm_sentence_gap"],  # LLM相邻两句的到达间隔（每句一个样本）
+            "tts_sentence_gap": metric_stats["tts_sentence_gap"],  # TTS相邻两句sentence_start的间隔
+            "tts_queue_delay": metric_stats["tts_queue_delay"],  # 同一句TTS sentence_start晚于LLM文本的时间（TTS排队）
+            "llm_chars_per_sec": metric_stats["llm_chars_per_sec"],  # LLM生成速度（字/秒，不是毫秒）
+            "tts_chars_per_sec": metric_stats["tts_chars_per_sec"]  # TTS句子推进速度（字/秒）
         },
+        "llm_cadence": llm_cadence,  # LLM流式节奏：各来源的句子数、有效句数、出现垫话句的轮数
+        "downlink_audio": downlink_audio,  # 下行TTS音频：实时率、到达抖动、模拟设备抖动缓冲的卡顿次数和时长
         "failure_analysis": {
             "failure_reasons": failure_reasons,
+            "failed_cases": counts["failed_cases"],  # 前 REPORT_FAILED_CASES 个失败用例
             "failure_rate": round((failed_tests / total_tests * 100) if total_tests > 0 else 0, 2)
         },
+        "harness_metrics": harness_metrics,  # 压测端自身指标（帧缓存命中率、发帧节拍等）
+        "capacity_search": capacity_search,  # 容量搜索：各阶段吞吐量-延迟曲线、满足SLO的最大负载和拐点
+        "fleet": fleet,  # 设备群：设置、汇总（在线数、鉴权耗时、断连、压测端内存）和时间序列
         "timeline": timeline_data
     }
     
     return report
 
+def build_run_report(run, case_offset=0, case_limit=REPORT_CASE_LIMIT):
+    """
+    生成运行的测试报告（run 为 None 时生成空报告）
+
+    统计部分来自运行中累计的直方图和计数，只有用例列表和时间线从结果存储读取
+    第 case_offset 条起的 case_limit 条（offset 为负数时从末尾倒数，limit 为 0 时不读取）
+    """
+    if run is None:
+        return generate_test_report([], new_test_state()["summary"], None, None, {})
+    state = run.state
+    total = len(run.result_store) if run.result_store is not None else len(state.get("results", []))
+    if case_offset < 0:
+        case_offset = max(total + case_offset, 0)
+    page = load_run_results(run, case_offset, case_limit) if case_limit > 0 else []
+    return generate_test_report(page, state.get("summary", {}), state.get("start_time"),
+                                state.get("end_time"), state.get("settings", {}),
+                                harness_stats=collect_harness_stats(run),
+                                capacity_search=state.get("capacity_search"),
+                                sketches=run.sketches, fleet=state.get("fleet"), totals=run.totals,
+                                case_offset=case_offset)
+
+def report_with_all_cases(run):
+    """导出用的报告：统计部分同 build_run_report，用例列表和时间线逐条读取全部结果"""
+    report = build_run_report(run, case_limit=0)
+    report["test_cases"], report["timeline"] = build_case_sections(iter_run_results(run))
+    report["test_cases_page"] = {"offset": 0, "count": len(report["test_cases"]),
+                                 "total": report["summary"]["total_tests"]}
+    return report
+
 @app.route('/api/report')
 def get_report():
-    """获取测试报告（包含详细统计和指标）"""
-    global test_state
-    
-    results = test_state.get("results", [])
-    summary = test_state.get("summary", {})
-    start_time = test_state.get("start_time")
-    end_time = test_state.get("end_time")
-    settings = test_state.get("settings", {})
+    """
+    获取测试报告（包含详细统计和指标）：?run_id= 指定运行，未指定时为最近一次开始的运行
+
+    用例列表和时间线分页返回：?offset=0&limit=1000（offset 为负数时从末尾倒数），其余统计不受分页影响
+    """
+    run_id = request.args.get("run_id")
+    run = get_run(run_id)
+    if run_id and run is None:
+        return run_not_found(run_id)
+    offset = request.args.get("offset", 0, type=int)
+    limit = min(max(request.args.get("limit", REPORT_CASE_LIMIT, type=int), 0), REPORT_CASE_LIMIT)
     
     # 计算详细统计
-    report = generate_test_report(results, summary, start_time, end_time, settings)
+    report = build_run_report(run, offset, limit)
     
     return jsonify(report)
 
 @app.route('/api/report/pdf')
 def export_report_pdf():
     """导出测试报告为PDF"""
-    global test_state
-    
-    results = test_state.get("results", [])
-    summary = test_state.get("summary", {})
-    start_time = test_state.get("start_time")
-    end_time = test_state.get("end_time")
-    settings = test_state.get("settings", {})
+    run_id = request.args.get("run_id")
+    run = get_run(run_id)
+    if run_id and run is None:
+        return run_not_found(run_id)
     
-    # 生成报告数据
-    report = generate_test_report(results, summary, start_time, end_time, settings)
+    # 计算详细统计（PDF 只列出前几个失败用例，不读取用例列表）
+    report = build_run_report(run, case_limit=0)
     
     # 生成PDF
     pdf_buffer = generate_pdf_report(report)
@@ -791,17 +1370,14 @@ def export_report_pdf():
 @app.route('/api/report/csv')
 def export_report_csv():
     """导出测试报告为CSV（专业测试团队使用）"""
-    global test_state
     import csv
+    run_id = request.args.get("run_id")
+    run = get_run(run_id)
+    if run_id and run is None:
+        return run_not_found(run_id)
     
-    results = test_state.get("results", [])
-    summary = test_state.get("summary", {})
-    start_time = test_state.get("start_time")
-    end_time = test_state.get("end_time")
-    settings = test_state.get("settings", {})
-    
-    # 生成报告数据
-    report = generate_test_report(results, summary, start_time, end_time, settings)
+    # 计算详细统计（用例列表在下面逐条读取）
+    report = build_run_report(run, case_limit=0)
     
     # 创建CSV内容
     output = io.StringIO()
@@ -852,7 +1428,10 @@ def export_report_csv():
     writer.writerow(["性能指标"])
     writer.writerow(["指标", "平均值(ms)", "中位数(ms)", "P95(ms)", "P99(ms)", "最小值(ms)", "最大值(ms)", "样本数"])
     for key, name in [("stt_latency", "STT服务延迟"), ("llm_latency", "LLM服务延迟"), 
-                      ("tts_latency", "TTS服务延迟"), ("e2e_response_time", "端到端响应时间")]:
+                      ("tts_latency", "TTS服务延迟"), ("e2e_response_time", "端到端响应时间"),
+                      ("tts_first_audio_latency", "TTS首音频延迟"), ("downlink_jitter", "TTS音频到达抖动"),
+                      ("first_content_sentence_latency", "首个有效句延迟"), ("llm_sentence_gap", "LLM句间间隔"),
+                      ("tts_sentence_gap", "TTS句间间隔"), ("tts_queue_delay", "TTS排队延迟")]:
         metric = metrics.get(key)
         if metric and metric.get("count", 0) > 0:
             writer.writerow([
@@ -878,15 +1457,152 @@ def export_report_csv():
             percentage = (count / total_failures * 100) if total_failures > 0 else 0
             writer.writerow([reason, count, round(percentage, 2)])
         writer.writerow([])
-    
-    # 详细测试用例列表
-    test_cases = report.get("test_cases", [])
+
+    # 下行TTS音频
+    downlink_audio = report.get("downlink_audio")
+    if downlink_audio:
+        writer.writerow(["下行TTS音频"])
+        writer.writerow(["有音频的轮数", downlink_audio.get("turns", 0)])
+        writer.writerow(["音频总时长(秒)", downlink_audio.get("audio_sec", 0)])
+        writer.writerow(["实时率平均", downlink_audio.get("rtf_avg", "")])
+        writer.writerow(["实时率P95", downlink_audio.get("rtf_p95", "")])
+        writer.writerow(["慢于实时的轮数", downlink_audio.get("slower_than_realtime_turns", 0)])
+        writer.writerow(["帧到达抖动平均(ms)", downlink_audio.get("jitter_avg_ms", 0)])
+        writer.writerow(["帧最大到达间隔(ms)", downlink_audio.get("max_gap_ms", 0)])
+        writer.writerow(["模拟抖动缓冲(ms)", downlink_audio.get("buffer_ms", 0)])
+        writer.writerow(["播放卡顿次数", downlink_audio.get("underruns", 0)])
+        writer.writerow(["出现卡顿的轮数占比(%)", downlink_audio.get("underrun_turn_rate", 0)])
+        writer.writerow(["卡顿时长最大(ms)", downlink_audio.get("stall_max_ms", 0)])
+        writer.writerow([])
+
+    # LLM流式节奏（生成速度单位为字/秒）
+    llm_cadence = report.get("llm_cadence")
+    if llm_cadence:
+        writer.writerow(["LLM流式节奏"])
+        writer.writerow(["来源", "轮数", "句子数", "有效句数", "出现垫话句的轮数", "无有效句的轮数",
+                         "速度平均(字/秒)", "速度中位数(字/秒)", "速度P95(字/秒)"])
+        for source, name in (("llm", "LLM文本"), ("tts", "TTS sentence_start")):
+            counts = llm_cadence.get(source)
+            if not counts:
+                continue
+            speed = metrics.get(f"{source}_chars_per_sec") or {}
+            writer.writerow([
+                name, counts["turns"], counts["sentences"], counts["content_sentences"],
+                counts["filler_turns"], counts["no_content_turns"],
+                round(speed["avg"], 2) if speed.get("avg") else "",
+                round(speed["median"], 2) if speed.get("median") else "",
+                round(speed["p95"], 2) if speed.get("p95") else ""
+            ])
+        writer.writerow([])
+
+    # 压测端指标
+    harness_metrics = report.get("harness_metrics", {})
+    frame_cache = harness_metrics.get("frame_cache")
+    pacing = harness_metrics.get("pacing")
+    loop_lag = harness_metrics.get("loop_lag")
+    dispatch = harness_metrics.get("dispatch")
+    if frame_cache or pacing or loop_lag or dispatch:
+        writer.writerow(["压测端指标"])
+    if frame_cache:
+        writer.writerow(["帧缓存命中", frame_cache.get("hits", 0)])
+        writer.writerow(["帧缓存未命中", frame_cache.get("misses", 0)])
+        writer.writerow(["帧缓存命中率(%)", frame_cache.get("hit_rate", 0)])
+        writer.writerow(["帧缓存淘汰数", frame_cache.get("evictions", 0)])
+        writer.writerow(["帧缓存占用(字节)", frame_cache.get("bytes", 0)])
+    if pacing:
+        writer.writerow(["发帧节拍流数", pacing.get("streams", 0)])
+        writer.writerow(["发帧节拍延迟平均(ms)", pacing.get("lag_avg_ms", 0)])
+        writer.writerow(["发帧节拍延迟最大(ms)", pacing.get("lag_max_ms", 0)])
+        writer.writerow(["发送时长漂移平均(ms)", pacing.get("drift_avg_ms", 0)])
+        writer.writerow(["发送时长漂移最大(ms)", pacing.get("drift_max_ms", 0)])
+    if loop_lag and loop_lag.get("samples"):
+        writer.writerow(["事件循环", loop_lag.get("loop", "")])
+        writer.writerow(["事件循环调度延迟P50(ms)", loop_lag.get("lag_p50_ms", 0)])
+        writer.writerow(["事件循环调度延迟P95(ms)", loop_lag.get("lag_p95_ms", 0)])
+        writer.writerow(["事件循环调度延迟P99(ms)", loop_lag.get("lag_p99_ms", 0)])
+        writer.writerow(["事件循环调度延迟最大(ms)", loop_lag.get("lag_max_ms", 0)])
+        if "harness_saturated" in loop_lag:
+            writer.writerow(["压测端饱和", "是" if loop_lag["harness_saturated"] else "否"])
+    if dispatch:
+        writer.writerow(["到达曲线", dispatch.get("profile", "") + (" (poisson)" if dispatch.get("poisson") else "")])
+        writer.writerow(["计划到达数", dispatch.get("expected_arrivals", 0)])
+        writer.writerow(["实际派发数", dispatch.get("dispatched", 0)])
+        writer.writerow(["达成到达率(次/秒)", dispatch.get("achieved_rate", 0)])
+        writer.writerow(["派发延迟超限数", dispatch.get("late", 0)])
+        writer.writerow(["派发延迟P99(ms)", dispatch.get("lag_p99_ms", 0)])
+        writer.writerow(["派发延迟最大(ms)", dispatch.get("lag_max_ms", 0)])
+    if frame_cache or pacing or loop_lag or dispatch:
+        writer.writerow([])
+
+    # 容量搜索
+    capacity_search = report.get("capacity_search")
+    if capacity_search:
+        slo = capacity_search["slo"]
+        capacity = capacity_search.get("capacity")
+        knee = capacity_search.get("knee")
+        writer.writerow(["容量搜索"])
+        writer.writerow(["负载维度", capacity_search["dimension"]])
+        writer.writerow(["SLO", f"{slo['metric']} P{slo['percentile']:g} <= {slo['max_ms']:g}ms, 成功率 >= {slo['min_success_rate']:g}%"])
+        writer.writerow(["满足SLO的最大负载", capacity["level"] if capacity else "无"])
+        writer.writerow(["拐点负载", knee["level"] if knee else ""])
+        writer.writerow(["拐点吞吐量(轮/秒)", knee["throughput"] if knee else ""])
+        writer.writerow(["负载", "吞吐量(轮/秒)", "P50(ms)", "P95(ms)", "P99(ms)", "成功率(%)", "满足SLO"])
+        for point in capacity_search.get("curve", []):
+            writer.writerow([
+                point["level"], point["throughput"],
+                point.get("latency_p50_ms", ""), point.get("latency_p95_ms", ""), point.get("latency_p99_ms", ""),
+                point["success_rate"], "是" if point["passed"] else "否"
+            ])
+        writer.writerow([])
+
+    # 设备群
+    fleet = report.get("fleet")
+    if fleet:
+        fleet_summary = fleet["summary"]
+        heartbeat = fleet_summary["heartbeat"]
+        writer.writerow(["设备群"])
+        writer.writerow(["目标连接数", fleet_summary["target"]])
+        writer.writerow(["在线峰值", fleet_summary["connected_peak"]])
+        writer.writerow(["结束时在线数", fleet_summary["connected_final"]])
+        writer.writerow(["连接失败数", fleet_summary["connect_failed"]])
+        writer.writerow(["鉴权前被拒绝数", fleet_summary["rejected"]])
+        writer.writerow(["鉴权失败数", fleet_summary["auth_failed"]])
+        writer.writerow(["鉴权超时数", fleet_summary["auth_timeout"]])
+        writer.writerow(["建连用时(秒)", fleet_summary["ramp_sec"] if fleet_summary["ramp_sec"] is not None else ""])
+        writer.writerow(["达成建连速率(个/秒)", fleet_summary["achieved_connect_rate"] or ""])
+        writer.writerow(["鉴权耗时P50(ms)", fleet_summary["auth_p50_ms"] or ""])
+        writer.writerow(["鉴权耗时P95(ms)", fleet_summary["auth_p95_ms"] or ""])
+        writer.writerow(["鉴权耗时P99(ms)", fleet_summary["auth_p99_ms"] or ""])
+        writer.writerow(["服务器主动断开数", fleet_summary["server_disconnects"]])
+        writer.writerow(["关闭码", "; ".join(f"{code}: {count}" for code, count in fleet_summary["close_codes"].items())])
+        writer.writerow(["心跳发送数", heartbeat["sent"]])
+        writer.writerow(["心跳失败数", heartbeat["failed"]])
+        writer.writerow(["心跳定时轮最大滞后(ms)", heartbeat["max_tick_lag_ms"]])
+        writer.writerow(["活跃连接数", fleet_summary["active"]])
+        writer.writerow(["活跃连接成功/失败轮数", f"{fleet_summary['turns']}/{fleet_summary['turn_failed']}"])
+        writer.writerow(["压测端RSS峰值(MB)", fleet_summary["peak_rss_mb"] or ""])
+        writer.writerow(["每连接内存(KB)", fleet_summary["rss_per_connection_kb"] or ""])
+        writer.writerow(["时间(秒)", "在线数", "握手中", "新建连接", "建连速率(个/秒)", "鉴权P50(ms)", "鉴权P95(ms)",
+                         "失败数", "服务器断开数", "心跳数", "对话轮数", "RSS(MB)", "文件描述符数"])
+        for point in fleet.get("series", []):
+            writer.writerow([
+                point["t"], point["connected"], point["connecting"], point["connects"], point["connect_rate"],
+                point["auth_p50_ms"] if point["auth_p50_ms"] is not None else "",
+                point["auth_p95_ms"] if point["auth_p95_ms"] is not None else "",
+                point["failures"], point["server_disconnects"], point["heartbeats"], point["turns"],
+                point["rss_mb"] if point["rss_mb"] is not None else "",
+                point["open_fds"] if point["open_fds"] is not None else ""
+            ])
+        writer.writerow([])
+
+    # 详细测试用例列表（从结果存储逐条读取）
+    test_cases = (build_test_case(i, r) for i, r in enumerate(iter_run_results(run), 1))
     writer.writerow(["详细测试用例列表"])
     writer.writerow([
         "测试ID", "时间戳", "类型", "索引", "状态", "请求文本", "STT文本", "LLM文本",
         "音频文件", "连接ID", "设备SN", "STT延迟(ms)", "LLM延迟(ms)", "TTS延迟(ms)",
-        "端到端响应时间(ms)", "失败原因", "错误信息", "发送消息数", "接收消息数",
-        "发送字节数", "接收字节数"
+        "端到端响应时间(ms)", "TTS首音频延迟(ms)", "TTS音频实时率", "播放卡顿次数", "首个有效句延迟(ms)",
+        "失败原因", "错误信息", "发送消息数", "接收消息数", "发送字节数", "接收字节数"
     ])
     
     for tc in test_cases:
@@ -906,6 +1622,10 @@ def export_report_csv():
             round(tc.get("llm_latency_ms", 0), 2) if tc.get("llm_latency_ms") else "",
             round(tc.get("tts_latency_ms", 0), 2) if tc.get("tts_latency_ms") else "",
             round(tc.get("e2e_response_time_ms", 0), 2) if tc.get("e2e_response_time_ms") else "",
+            round(tc.get("tts_first_audio_ms", 0), 2) if tc.get("tts_first_audio_ms") else "",
+            tc.get("downlink_rtf") if tc.get("downlink_rtf") is not None else "",
+            tc.get("downlink_underruns") if tc.get("downlink_underruns") is not None else "",
+            round(tc.get("first_content_sentence_ms", 0), 2) if tc.get("first_content_sentence_ms") else "",
             tc.get("failure_reason", ""),
             tc.get("error", ""),
             tc.get("sent_messages", 0),
@@ -933,16 +1653,13 @@ def export_report_csv():
 @app.route('/api/report/json')
 def export_report_json():
     """导出测试报告为JSON（专业测试团队使用）"""
-    global test_state
-    
-    results = test_state.get("results", [])
-    summary = test_state.get("summary", {})
-    start_time = test_state.get("start_time")
-    end_time = test_state.get("end_time")
-    settings = test_state.get("settings", {})
+    run_id = request.args.get("run_id")
+    run = get_run(run_id)
+    if run_id and run is None:
+        return run_not_found(run_id)
     
-    # 生成报告数据
-    report = generate_test_report(results, summary, start_time, end_time, settings)
+    # 计算详细统计（导出包含全部用例）
+    report = report_with_all_cases(run)
     
     # 添加导出元数据
     report["export_info"] = {
@@ -1149,6 +1866,16 @@ def generate_pdf_report(report):
             'e2e_from_stt': '端到端时间（从STT响应到TTS结束）',
             'e2e_from_llm': '端到端时间（从LLM响应到TTS结束）',
             'e2e_response_time': '端到端时间（综合，从第一帧发送）'
+        },
+        '下行TTS音频': {
+            'tts_first_audio_latency': 'TTS首音频延迟（从最后一帧上行音频到第一帧TTS音频）',
+            'downlink_jitter': 'TTS音频帧到达抖动（每轮平均）'
+        },
+        'LLM流式节奏': {
+            'first_content_sentence_latency': '首个有效句延迟（从STT到第一句非垫话句）',
+            'llm_sentence_gap': 'LLM句间间隔（相邻两句LLM文本）',
+            'tts_sentence_gap': 'TTS句间间隔（相邻两句sentence_start）',
+            'tts_queue_delay': 'TTS排队延迟（同一句sentence_start晚于LLM文本）'
         }
     }
     
@@ -1189,7 +1916,67 @@ def generate_pdf_report(report):
             ]))
             story.append(metric_table)
             story.append(Spacer(1, 8*mm))
-    
+
+    # 下行TTS音频（实时率、卡顿）
+    downlink_audio = report.get("downlink_audio")
+    if downlink_audio:
+        story.append(Paragraph("<b>下行TTS音频播放</b>", heading_style))
+        downlink_data = [
+            ['指标', '数值'],
+            ['有音频的轮数', str(downlink_audio.get("turns", 0))],
+            ['实时率（平均 / P95 / 最大）', f"{downlink_audio.get('rtf_avg')} / {downlink_audio.get('rtf_p95')} / {downlink_audio.get('rtf_max')}"],
+            ['慢于实时的轮数', str(downlink_audio.get("slower_than_realtime_turns", 0))],
+            ['帧最大到达间隔', format_pdf_time(downlink_audio.get("max_gap_ms"))],
+            ['模拟抖动缓冲', format_pdf_time(downlink_audio.get("buffer_ms"))],
+            ['播放卡顿次数', str(downlink_audio.get("underruns", 0))],
+            ['出现卡顿的轮数占比', f"{downlink_audio.get('underrun_turn_rate', 0)}%"],
+            ['卡顿时长（平均 / 最大）', f"{format_pdf_time(downlink_audio.get('stall_avg_ms'))} / {format_pdf_time(downlink_audio.get('stall_max_ms'))}"],
+        ]
+        downlink_table = Table(downlink_data, colWidths=[60*mm, 100*mm])
+        downlink_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), chinese_font_bold_name),
+            ('FONTNAME', (0, 1), (-1, -1), chinese_font_name),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
+        ]))
+        story.append(downlink_table)
+        story.append(Spacer(1, 8*mm))
+
+    # LLM流式节奏：生成速度（字/秒）和句子计数
+    llm_cadence = report.get("llm_cadence")
+    if llm_cadence:
+        story.append(Paragraph("<b>LLM流式节奏</b>", heading_style))
+        cadence_data = [['来源', '有效句/句子数', '垫话句轮数', '速度 平均/中位数/P95（字/秒）']]
+        for source, name in (("llm", "LLM文本"), ("tts", "TTS sentence_start")):
+            counts = llm_cadence.get(source)
+            if not counts:
+                continue
+            speed = metrics.get(f"{source}_chars_per_sec") or {}
+            speed_text = " / ".join(f"{speed[k]:.1f}" if speed.get(k) else "N/A" for k in ("avg", "median", "p95"))
+            cadence_data.append([name, f"{counts['content_sentences']}/{counts['sentences']}",
+                                 str(counts["filler_turns"]), speed_text])
+        cadence_table = Table(cadence_data, colWidths=[40*mm, 35*mm, 25*mm, 60*mm])
+        cadence_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), chinese_font_bold_name),
+            ('FONTNAME', (0, 1), (-1, -1), chinese_font_name),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
+        ]))
+        story.append(cadence_table)
+        story.append(Spacer(1, 8*mm))
+
     # 失败分析
     failure_analysis = report.get("failure_analysis", {})
     failure_reasons = failure_analysis.get("failure_reasons", {})
@@ -1219,8 +2006,8 @@ def generate_pdf_report(report):
         story.append(Spacer(1, 10*mm))
     
     # 测试用例摘要（显示前20个失败的测试用例）
-    test_cases = report.get("test_cases", [])
-    failed_cases = [tc for tc in test_cases if not tc.get("success", False)]
+    failed_cases = failure_analysis.get("failed_cases", [])
+    failed_total = report.get("summary", {}).get("failed_tests", len(failed_cases))
     if failed_cases:
         story.append(Paragraph("失败测试用例详情（前20个）", heading_style))
         case_data = [['测试ID', '类型', '请求文本', '失败原因', '响应时间(ms)']]
@@ -1248,9 +2035,9 @@ def generate_pdf_report(report):
             ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#fef2f2')]),
         ]))
         story.append(case_table)
-        if len(failed_cases) > 20:
+        if failed_total > 20:
             story.append(Spacer(1, 5*mm))
-            story.append(Paragraph(f"注：共有 {len(failed_cases)} 个失败用例，此处仅显示前20个。完整列表请查看CSV或JSON导出。", normal_style))
+            story.append(Paragraph(f"注：共有 {failed_total} 个失败用例，此处仅显示前20个。完整列表请查看CSV或JSON导出。", normal_style))
         story.append(Spacer(1, 10*mm))
     
     # 生成PDF
@@ -1320,11 +2107,8 @@ def generate_tts():
         # 调用generate_tts_audio.py生成音频
         from generate_tts_audio import synthesize_speech
         
-        # 异步生成PCM
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(synthesize_speech(text, temp_pcm, audio_format="raw"))
-        loop.close()
+        # 在常驻运行时中生成PCM，等待完成
+        result = runtime.run(lambda: synthesize_speech(text, temp_pcm, audio_format="raw"), "tts", text[:50])
         
         if not result.get("success", False):
             shutil.rmtree(temp_dir, ignore_errors=True)
@@ -1369,13 +2153,116 @@ def generate_tts():
         traceback.print_exc()
         return jsonify({"error": f"生成TTS失败: {str(e)}"}), 500
 
+def save_single_test_audio(temp_opus, text):
+    """把单语音测试生成的 Opus 文件和文字保存到记录中（audio_NNN.opus + file_list.txt）"""
+    try:
+        # 获取下一个可用的文件编号
+        import glob
+        import re
+        import shutil
+        pattern = os.path.join(AUDIO_DIR, "audio_*.opus")
+        existing_files = glob.glob(pattern)
+        current_index = 1
+        if existing_files:
+            indices = []
+            for file in existing_files:
+                basename = os.path.basename(file)
+                match = re.match(r'audio_(\d+)\.opus', basename)
+                if match:
+                    indices.append(int(match.group(1)))
+            if indices:
+                current_index = max(indices) + 1
+                
+        # 检查文件是否已存在，如果存在则使用下一个索引
+        while True:
+            filename = f"audio_{current_index:03d}.opus"
+            output_file = os.path.join(AUDIO_DIR, filename)
+            if os.path.exists(output_file):
+                current_index += 1
+            else:
+                break
+                
+        # 复制临时Opus文件到目标位置
+        if os.path.exists(temp_opus):
+            shutil.copy2(temp_opus, output_file)
+                    
+            # 更新file_list.txt
+            # 先读取现有的file_list.txt，保留已存在文件的文本内容
+            existing_text_map = {}
+            if os.path.exists(FILE_LIST_TXT):
+                with open(FILE_LIST_TXT, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
+                            continue
+                        # 解析格式：001: filename.opus - 文本内容
+                        match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s*(.+)', line)
+                        if match:
+                            existing_filename = match.group(2)
+                            existing_text = match.group(3)
+                            if existing_text:  # 只保存非空文本
+                                existing_text_map[existing_filename] = existing_text
+                    
+            # 添加新文件的文本内容
+            existing_text_map[filename] = text
+                    
+            # 重新扫描所有文件
+            inquiries, compares, orders = scan_opus_files()
+                    
+            # 用existing_text_map中的文本内容覆盖扫描结果
+            for file_list in [inquiries, compares, orders]:
+                for file_info in file_list:
+                    if file_info["filename"] in existing_text_map:
+                        file_info["text"] = existing_text_map[file_info["filename"]]
+                    
+            # 确保新文件在列表中
+            found = False
+            for file_list in [inquiries, compares, orders]:
+                if any(f["filename"] == filename for f in file_list):
+                    # 确保文本内容正确
+                    for f in file_list:
+                        if f["filename"] == filename:
+                            f["text"] = text
+                    found = True
+                    break
+                    
+            # 如果不在任何列表中，添加到inquiries
+            if not found:
+                file_stat = os.stat(output_file)
+                inquiries.append({
+                    "index": f"{current_index:03d}",
+                    "filename": filename,
+                    "text": text,
+                    "file_size": file_stat.st_size,
+                    "created_time": datetime.fromtimestamp(file_stat.st_ctime).isoformat()
+                })
+                    
+            # 生成新的file_list.txt
+            from generate_batch_tts import generate_file_list
+            generate_file_list(
+                [(int(f["index"]), f["filename"], f["text"]) for f in inquiries],
+                [(int(f["index"]), f["filename"], f["text"]) for f in compares],
+                [(int(f["index"]), f["filename"], f["text"]) for f in orders],
+                FILE_LIST_TXT
+            )
+                    
+            socketio.emit('single_test_saved', {
+                "filename": filename,
+                "text": text,
+                "message": f"已保存到记录：{filename}"
+            })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        # 保存失败不影响测试结果，只记录错误
+        print(f"保存Opus文件失败: {e}")
+
 @app.route('/api/single-test', methods=['POST'])
 def single_test():
     """执行单语音测试"""
-    global test_state
-    
-    if test_state["is_running"]:
-        return jsonify({"error": "测试正在进行中，请先停止当前测试"}), 400
+    # 单语音测试使用自己的连接设置，可以和批量测试同时进行，但同一时间只执行一个单语音测试
+    if runtime.active("single_test"):
+        return jsonify({"error": "单语音测试正在进行中"}), 400
     
     data = request.get_json() or {}
     text = data.get('text', '').strip()
@@ -1386,8 +2273,8 @@ def single_test():
     # 获取测试配置（多层fallback）
     device_sns = data.get('device_sns', [])
     if not device_sns:
-        # 从test_state获取默认配置
-        settings = test_state.get("settings", {})
+        # 从最近一次批量测试的设置获取默认配置
+        settings = current_run.state.get("settings", {}) if current_run is not None else {}
         device_sns = settings.get("device_sns", [])
     
     # 如果还是没有，使用Config中的默认值（单设备SN）
@@ -1401,61 +2288,53 @@ def single_test():
     
     ws_url = data.get('ws_url', '')
     test_mode = data.get('test_mode', 'normal')
+    try:
+        run_settings = RunSettings.from_config(test_mode=test_mode).with_ws_url(ws_url)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # 在新线程中执行测试
-    def run_single_test():
-        global test_state
-        temp_dir = None
+    # 提交到常驻运行时执行（复用已鉴权的连接）
+    async def run_single_test():
+        from functools import partial
+        from generate_tts_audio import synthesize_speech
+        import subprocess
+        import tempfile
+        import shutil
+        
+        loop = asyncio.get_running_loop()
+        temp_dir = tempfile.mkdtemp(prefix='tts_test_')
+        temp_pcm = os.path.join(temp_dir, 'temp_audio.pcm')
+        temp_opus = os.path.join(temp_dir, 'temp_audio.opus')
         try:
-            # 生成TTS音频
-            from generate_tts_audio import synthesize_speech
-            import subprocess
-            import tempfile
-            import shutil
-            
-            temp_dir = tempfile.mkdtemp(prefix='tts_test_')
-            temp_pcm = os.path.join(temp_dir, 'temp_audio.pcm')
-            temp_opus = os.path.join(temp_dir, 'temp_audio.opus')
-            
             socketio.emit('single_test_start', {
                 "text": text,
                 "status": "正在生成TTS音频..."
             })
             
-            # 异步生成PCM
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(synthesize_speech(text, temp_pcm, audio_format="raw"))
-            loop.close()
+            # 生成PCM
+            result = await synthesize_speech(text, temp_pcm, audio_format="raw")
             
             if not result.get("success", False):
                 socketio.emit('single_test_error', {"error": f"TTS生成失败: {result.get('error', 'Unknown error')}"})
-                if temp_dir:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
                 return
             
-            # 转换为Opus
+            # 转换为Opus（ffmpeg 在线程池中执行，不阻塞事件循环）
             socketio.emit('single_test_start', {
                 "text": text,
                 "status": "正在转换音频格式..."
             })
             
             try:
-                subprocess.run([
+                await loop.run_in_executor(None, partial(subprocess.run, [
                     "ffmpeg", "-y", "-f", "s16le", "-ar", "16000", "-ac", "1",
                     "-i", temp_pcm, "-c:a", "libopus", "-b:a", "32k", "-frame_duration", "60",
                     temp_opus
-                ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
             except subprocess.CalledProcessError as e:
                 socketio.emit('single_test_error', {"error": f"音频转换失败: {str(e)}"})
-                if temp_dir:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
                 return
             
             # 执行测试
-            test_state["is_running"] = True
-            test_state["start_time"] = datetime.now().isoformat()
-            
             socketio.emit('single_test_start', {
                 "text": text,
                 "status": "TTS生成完成，正在执行测试..."
@@ -1464,221 +2343,39 @@ def single_test():
             # 使用第一个设备SN进行测试
             device_sn = device_sns[0] if device_sns else None
             
-            # 如果提供了WebSocket URL，设置到Config
-            if ws_url:
-                from urllib.parse import urlparse
-                from config import Config as ConfigModule  # 在函数内部重新导入
-                if ws_url.startswith('wss://'):
-                    parsed = urlparse(ws_url.replace('wss://', 'http://'))
-                    host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-                    ConfigModule.WSS_SERVER_HOST = f"wss://{host_with_port}"
-                    ConfigModule.WS_SERVER_HOST = f"ws://{host_with_port}"
-                    ConfigModule.USE_SSL = True
-                else:
-                    parsed = urlparse(ws_url.replace('ws://', 'http://'))
-                    host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-                    ConfigModule.WS_SERVER_HOST = f"ws://{host_with_port}"
-                    ConfigModule.WSS_SERVER_HOST = f"wss://{host_with_port}"
-                    ConfigModule.USE_SSL = False
-            
-            # 执行测试
-            from websocket_client import WebSocketClient
-            
-            # 使用WebInquiryTester以支持实时更新
-            tester = WebInquiryTester()
-            client = WebSocketClient(connection_id=1, device_sn=device_sn)
-            
-            # 建立WebSocket连接
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            async def run_test_with_connection():
-                # 先建立连接
-                connected = await client.connect()
-                if not connected:
-                    socketio.emit('single_test_error', {"error": "WebSocket连接失败"})
-                    if temp_dir:
-                        shutil.rmtree(temp_dir, ignore_errors=True)
-                    return None
-                
-                # 等待一小段时间让服务器响应（鉴权）
-                await asyncio.sleep(0.2)
-                wait_server_msg_time = 0
-                max_wait_server_msg = 3.0
-                check_interval = 0.1
-                while wait_server_msg_time < max_wait_server_msg and client.is_connected:
-                    if client.auth_received or client.session_id:
-                        break
-                    await asyncio.sleep(check_interval)
-                    wait_server_msg_time += check_interval
-                
-                if client.auth_failed:
-                    socketio.emit('single_test_error', {"error": "WebSocket鉴权失败"})
-                    if temp_dir:
-                        shutil.rmtree(temp_dir, ignore_errors=True)
-                    return None
-                
-                # 为单语音测试创建实时更新回调
-                client._tts_sentence_callback = tester._create_tts_sentence_callback(
-                    client, 1, "single", text, is_single_test=True
-                )
-                
-                # 执行单次测试（传入is_single_test=True，但回调已设置，不会覆盖）
-                test_result = await tester.test_single_audio(
-                    client, temp_opus, text, "single", 1, is_single_test=True
-                )
-                
-                # 关闭连接
-                if client.is_connected:
-                    await client.close()
-                
-                return test_result
-            
-            # 执行测试
-            test_result = loop.run_until_complete(run_test_with_connection())
-            loop.close()
-            
+            test_result = await run_single_test_turn(run_settings, device_sn, temp_opus, text)
             if test_result is None:
                 return
             
-            # 保存Opus文件和文字到记录中
-            try:
-                # 获取下一个可用的文件编号
-                import glob
-                import re
-                pattern = os.path.join(AUDIO_DIR, "audio_*.opus")
-                existing_files = glob.glob(pattern)
-                current_index = 1
-                if existing_files:
-                    indices = []
-                    for file in existing_files:
-                        basename = os.path.basename(file)
-                        match = re.match(r'audio_(\d+)\.opus', basename)
-                        if match:
-                            indices.append(int(match.group(1)))
-                    if indices:
-                        current_index = max(indices) + 1
-                
-                # 检查文件是否已存在，如果存在则使用下一个索引
-                while True:
-                    filename = f"audio_{current_index:03d}.opus"
-                    output_file = os.path.join(AUDIO_DIR, filename)
-                    if os.path.exists(output_file):
-                        current_index += 1
-                    else:
-                        break
-                
-                # 复制临时Opus文件到目标位置
-                if os.path.exists(temp_opus):
-                    shutil.copy2(temp_opus, output_file)
-                    
-                    # 更新file_list.txt
-                    # 先读取现有的file_list.txt，保留已存在文件的文本内容
-                    existing_text_map = {}
-                    if os.path.exists(FILE_LIST_TXT):
-                        with open(FILE_LIST_TXT, 'r', encoding='utf-8') as f:
-                            for line in f:
-                                line = line.strip()
-                                if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
-                                    continue
-                                # 解析格式：001: filename.opus - 文本内容
-                                match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s*(.+)', line)
-                                if match:
-                                    existing_filename = match.group(2)
-                                    existing_text = match.group(3)
-                                    if existing_text:  # 只保存非空文本
-                                        existing_text_map[existing_filename] = existing_text
-                    
-                    # 添加新文件的文本内容
-                    existing_text_map[filename] = text
-                    
-                    # 重新扫描所有文件
-                    inquiries, compares, orders = scan_opus_files()
-                    
-                    # 用existing_text_map中的文本内容覆盖扫描结果
-                    for file_list in [inquiries, compares, orders]:
-                        for file_info in file_list:
-                            if file_info["filename"] in existing_text_map:
-                                file_info["text"] = existing_text_map[file_info["filename"]]
-                    
-                    # 确保新文件在列表中
-                    found = False
-                    for file_list in [inquiries, compares, orders]:
-                        if any(f["filename"] == filename for f in file_list):
-                            # 确保文本内容正确
-                            for f in file_list:
-                                if f["filename"] == filename:
-                                    f["text"] = text
-                            found = True
-                            break
-                    
-                    # 如果不在任何列表中，添加到inquiries
-                    if not found:
-                        file_stat = os.stat(output_file)
-                        inquiries.append({
-                            "index": f"{current_index:03d}",
-                            "filename": filename,
-                            "text": text,
-                            "file_size": file_stat.st_size,
-                            "created_time": datetime.fromtimestamp(file_stat.st_ctime).isoformat()
-                        })
-                    
-                    # 生成新的file_list.txt
-                    from generate_batch_tts import generate_file_list
-                    generate_file_list(
-                        [(int(f["index"]), f["filename"], f["text"]) for f in inquiries],
-                        [(int(f["index"]), f["filename"], f["text"]) for f in compares],
-                        [(int(f["index"]), f["filename"], f["text"]) for f in orders],
-                        FILE_LIST_TXT
-                    )
-                    
-                    socketio.emit('single_test_saved', {
-                        "filename": filename,
-                        "text": text,
-                        "message": f"已保存到记录：{filename}"
-                    })
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                # 保存失败不影响测试结果，只记录错误
-                print(f"保存Opus文件失败: {e}")
-            
-            # 清理临时文件
-            if temp_dir:
-                shutil.rmtree(temp_dir, ignore_errors=True)
+            # 保存Opus文件和文字到记录中（文件读写在线程池中执行）
+            await loop.run_in_executor(None, save_single_test_audio, temp_opus, text)
             
             # 发送测试结果
-            test_state["end_time"] = datetime.now().isoformat()
-            test_state["is_running"] = False
-            
             socketio.emit('single_test_complete', {
                 "result": test_result,
                 "text": text
             })
             
+        except asyncio.CancelledError:
+            socketio.emit('single_test_error', {"error": "测试已取消"})
+            raise
         except Exception as e:
             import traceback
             traceback.print_exc()
-            test_state["is_running"] = False
             socketio.emit('single_test_error', {"error": str(e)})
-            if temp_dir:
-                try:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                except:
-                    pass
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
     
-    test_thread = threading.Thread(target=run_single_test, daemon=True)
-    test_thread.start()
+    job = runtime.submit(run_single_test, "single_test", text[:50])
     
-    return jsonify({"status": "started"})
+    return jsonify({"status": "started", "job_id": job.id})
 
 @app.route('/api/single-test-from-file', methods=['POST'])
 def single_test_from_file():
     """使用已有的Opus文件执行单语音测试"""
-    global test_state
-    
-    if test_state["is_running"]:
-        return jsonify({"error": "测试正在进行中，请先停止当前测试"}), 400
+    # 单语音测试使用自己的连接设置，可以和批量测试同时进行，但同一时间只执行一个单语音测试
+    if runtime.active("single_test"):
+        return jsonify({"error": "单语音测试正在进行中"}), 400
     
     data = request.get_json() or {}
     filename = data.get('filename', '').strip()
@@ -1695,8 +2392,8 @@ def single_test_from_file():
     # 获取测试配置（多层fallback）
     device_sns = data.get('device_sns', [])
     if not device_sns:
-        # 从test_state获取默认配置
-        settings = test_state.get("settings", {})
+        # 从最近一次批量测试的设置获取默认配置
+        settings = current_run.state.get("settings", {}) if current_run is not None else {}
         device_sns = settings.get("device_sns", [])
     
     # 如果还是没有，使用Config中的默认值（单设备SN）
@@ -1710,14 +2407,14 @@ def single_test_from_file():
     
     ws_url = data.get('ws_url', '')
     test_mode = data.get('test_mode', 'normal')
+    try:
+        run_settings = RunSettings.from_config(test_mode=test_mode).with_ws_url(ws_url)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # 在新线程中执行测试
-    def run_single_test_from_file():
-        global test_state
+    # 提交到常驻运行时执行（复用已鉴权的连接和音频帧缓存）
+    async def run_single_test_from_file():
         try:
-            test_state["is_running"] = True
-            test_state["start_time"] = datetime.now().isoformat()
-            
             socketio.emit('single_test_start', {
                 "text": text or filename,
                 "status": "正在执行测试..."
@@ -1726,150 +2423,104 @@ def single_test_from_file():
             # 使用第一个设备SN进行测试
             device_sn = device_sns[0] if device_sns else None
             
-            # 如果提供了WebSocket URL，设置到Config
-            if ws_url:
-                from urllib.parse import urlparse
-                from config import Config as ConfigModule  # 在函数内部重新导入
-                if ws_url.startswith('wss://'):
-                    parsed = urlparse(ws_url.replace('wss://', 'http://'))
-                    host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-                    ConfigModule.WSS_SERVER_HOST = f"wss://{host_with_port}"
-                    ConfigModule.WS_SERVER_HOST = f"ws://{host_with_port}"
-                    ConfigModule.USE_SSL = True
-                else:
-                    parsed = urlparse(ws_url.replace('ws://', 'http://'))
-                    host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-                    ConfigModule.WS_SERVER_HOST = f"ws://{host_with_port}"
-                    ConfigModule.WSS_SERVER_HOST = f"wss://{host_with_port}"
-                    ConfigModule.USE_SSL = False
-            
-            # 执行测试
-            from websocket_client import WebSocketClient
-            
-            # 使用WebInquiryTester以支持实时更新
-            tester = WebInquiryTester()
-            client = WebSocketClient(connection_id=1, device_sn=device_sn)
-            
-            # 建立WebSocket连接
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            async def run_test_with_connection():
-                # 先建立连接
-                connected = await client.connect()
-                if not connected:
-                    socketio.emit('single_test_error', {"error": "WebSocket连接失败"})
-                    return None
-                
-                # 等待一小段时间让服务器响应（鉴权）
-                await asyncio.sleep(0.2)
-                wait_server_msg_time = 0
-                max_wait_server_msg = 3.0
-                check_interval = 0.1
-                while wait_server_msg_time < max_wait_server_msg and client.is_connected:
-                    if client.auth_received or client.session_id:
-                        break
-                    await asyncio.sleep(check_interval)
-                    wait_server_msg_time += check_interval
-                
-                if client.auth_failed:
-                    socketio.emit('single_test_error', {"error": "WebSocket鉴权失败"})
-                    return None
-                
-                # 为单语音测试创建实时更新回调
-                client._tts_sentence_callback = tester._create_tts_sentence_callback(
-                    client, 1, "single", text or filename, is_single_test=True
-                )
-                
-                # 执行单次测试（使用已有的Opus文件）
-                test_result = await tester.test_single_audio(
-                    client, opus_file, text or filename, "single", 1, is_single_test=True
-                )
-                
-                # 关闭连接
-                if client.is_connected:
-                    await client.close()
-                
-                return test_result
-            
-            # 执行测试
-            test_result = loop.run_until_complete(run_test_with_connection())
-            loop.close()
-            
+            # 执行单次测试（使用已有的Opus文件）
+            test_result = await run_single_test_turn(run_settings, device_sn, opus_file, text or filename)
             if test_result is None:
                 return
             
             # 发送测试结果
-            test_state["end_time"] = datetime.now().isoformat()
-            test_state["is_running"] = False
-            
             socketio.emit('single_test_complete', {
                 "result": test_result,
                 "text": text or filename
             })
             
+        except asyncio.CancelledError:
+            socketio.emit('single_test_error', {"error": "测试已取消"})
+            raise
         except Exception as e:
             import traceback
             traceback.print_exc()
-            test_state["is_running"] = False
             socketio.emit('single_test_error', {"error": str(e)})
     
-    test_thread = threading.Thread(target=run_single_test_from_file, daemon=True)
-    test_thread.start()
+    job = runtime.submit(run_single_test_from_file, "single_test", filename)
     
-    return jsonify({"status": "started"})
+    return jsonify({"status": "started", "job_id": job.id})
 
 @app.route('/api/start', methods=['POST'])
 def start_test():
-    """开始测试"""
-    global test_state, test_thread
-    
-    if test_state["is_running"]:
-        return jsonify({"error": "测试正在进行中"}), 400
-    
+    """开始测试：新建一个运行（TestRun），返回其 run_id"""
     # 获取前端传来的设置
     data = request.get_json() or {}
+    # 默认同一时间只进行一个批量测试（上一次停止后可能还在关闭连接，结束前不能开始新的测试）；
+    # concurrent=true 时与正在进行的运行同时执行，例如同时压测两个服务器
+    if active_runs() and not data.get('concurrent', False):
+        return jsonify({"error": "测试正在进行中"}), 400
+    
     concurrency = data.get('concurrency', 10)
     device_sns = data.get('device_sns', [])
     test_mode = data.get('test_mode', 'normal')
     ws_url = data.get('ws_url', '')
+    workers = data.get('workers', Config.WORKER_PROCESSES)
+    # 开放模型到达曲线（可选），例如 {"profile": "poisson", "rate": 5, "duration_sec": 60}
+    try:
+        arrival = data.get('arrival') or parse_profile_spec(Config.ARRIVAL_PROFILE)
+    except ValueError as e:
+        return jsonify({"error": f"到达曲线设置无效: {e}"}), 400
+    # 运行类型：normal（默认）、capacity_search（按 SLO 自动搜索最大并发/到达率，见 capacity_search）
+    # 或 fleet（大量空闲连接 + 少量活跃连接，见 device_fleet）
+    run_type = data.get('run_type', 'normal')
     
     # 验证设置
     if not device_sns or len(device_sns) == 0:
         return jsonify({"error": "请至少设置一个设备SN"}), 400
     
-    if concurrency < 1 or concurrency > 100:
-        return jsonify({"error": "并发数必须在1-100之间"}), 400
+    if not isinstance(workers, int) or workers < 1 or workers > (os.cpu_count() or 1) * 4:
+        return jsonify({"error": f"工作进程数必须在1-{(os.cpu_count() or 1) * 4}之间"}), 400
     
-    if len(device_sns) > concurrency:
-        return jsonify({"error": f"设备SN数量({len(device_sns)})不能超过并发数({concurrency})"}), 400
+    # 每个工作进程最多承载 MAX_CONNECTIONS_PER_WORKER 个连接，多进程分片时上限随进程数增加；
+    # 设备群的连接数由 fleet.connections 决定（上限 FLEET_MAX_CONNECTIONS），不检查并发数
+    if run_type != 'fleet':
+        max_concurrency = Config.MAX_CONNECTIONS_PER_WORKER * workers
+        if concurrency < 1 or concurrency > max_concurrency:
+            return jsonify({"error": f"并发数必须在1-{max_concurrency}之间"}), 400
+        
+        if len(device_sns) > concurrency:
+            return jsonify({"error": f"设备SN数量({len(device_sns)})不能超过并发数({concurrency})"}), 400
     
     if test_mode not in ['normal', 'fast']:
         return jsonify({"error": "测试模式无效，必须是 'normal' 或 'fast'"}), 400
     
-    # 验证WebSocket URL（如果提供了）
-    if ws_url and not (ws_url.startswith('ws://') or ws_url.startswith('wss://')):
-        return jsonify({"error": "WebSocket地址格式不正确，应以 ws:// 或 wss:// 开头"}), 400
+    if arrival:
+        if not isinstance(arrival, dict):
+            return jsonify({"error": "到达曲线设置必须是对象"}), 400
+        try:
+            build_profile(arrival)
+        except ValueError as e:
+            return jsonify({"error": f"到达曲线设置无效: {e}"}), 400
     
-    # 如果提供了WebSocket URL，设置到Config
-    if ws_url:
-        from config import Config
-        from urllib.parse import urlparse
-        # 解析URL，判断是WS还是WSS
-        # 处理ws://和wss://协议
-        if ws_url.startswith('wss://'):
-            parsed = urlparse(ws_url.replace('wss://', 'http://'))
-            host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-            Config.WSS_SERVER_HOST = f"wss://{host_with_port}"
-            Config.WS_SERVER_HOST = f"ws://{host_with_port}"
-            Config.USE_SSL = True
-        else:
-            parsed = urlparse(ws_url.replace('ws://', 'http://'))
-            host_with_port = f"{parsed.hostname}" + (f":{parsed.port}" if parsed.port else "")
-            Config.WS_SERVER_HOST = f"ws://{host_with_port}"
-            Config.WSS_SERVER_HOST = f"wss://{host_with_port}"
-            Config.USE_SSL = False
-        print(f"WebSocket URL已设置为: {Config.WSS_SERVER_HOST if Config.USE_SSL else Config.WS_SERVER_HOST} (USE_SSL={Config.USE_SSL})")
+    capacity = None
+    if run_type == 'capacity_search':
+        try:
+            capacity = parse_search_settings(data.get('capacity') or {})
+        except ValueError as e:
+            return jsonify({"error": f"容量搜索设置无效: {e}"}), 400
+        pool_size = capacity["max"] if capacity["dimension"] == "concurrency" else capacity["connections"]
+        if pool_size > Config.MAX_CONNECTIONS_PER_WORKER:
+            return jsonify({"error": f"容量搜索的连接数不能超过{Config.MAX_CONNECTIONS_PER_WORKER}"}), 400
+    fleet = None
+    if run_type == 'fleet':
+        try:
+            fleet = parse_fleet_settings(data.get('fleet') or {}, Config.FLEET_MAX_CONNECTIONS)
+        except ValueError as e:
+            return jsonify({"error": f"设备群设置无效: {e}"}), 400
+    elif run_type not in ('normal', 'capacity_search'):
+        return jsonify({"error": "运行类型无效，必须是 'normal'、'capacity_search' 或 'fleet'"}), 400
+    
+    # 本次运行的连接设置（验证并解析WebSocket URL，不修改 Config）
+    try:
+        run_settings = RunSettings.from_config(test_mode=test_mode).with_ws_url(ws_url)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # 获取测试数量（可选）
     test_count = data.get("test_count")
@@ -1881,33 +2532,73 @@ def start_test():
         except (ValueError, TypeError):
             test_count = None
     
-    # 保存设置到全局变量，供测试使用
-    test_state["settings"] = {
+    # 保存设置到本次运行，供测试和报告使用
+    run = TestRun(new_run_id(), run_settings, {
         "concurrency": concurrency,
         "device_sns": device_sns,
         "test_mode": test_mode,
         "ws_url": ws_url,
-        "test_count": test_count
-    }
-    
-    # 重置状态
-    test_state["is_running"] = True
-    test_state["progress"] = 0
-    test_state["results"] = []
-    test_state["error"] = None
+        "websocket_url": run_settings.server_host,
+        "test_count": test_count,
+        "workers": workers,
+        "arrival": arrival,
+        "run_type": run_type,
+        "capacity": capacity,
+        "fleet": fleet
+    })
+    run.state["is_running"] = True
+    register_run(run)
     
-    # 在新线程中运行测试
-    test_thread = threading.Thread(target=run_test_async, daemon=True)
-    test_thread.start()
+    # 提交到常驻运行时执行
+    run.job = runtime.submit(lambda: run_test_async(run), "batch_test", run.run_id)
     
-    return jsonify({"status": "started"})
+    return jsonify({"status": "started", "run_id": run.run_id, "job_id": run.job.id})
 
 @app.route('/api/stop', methods=['POST'])
 def stop_test():
-    """停止测试"""
-    global test_state
-    test_state["is_running"] = False
-    return jsonify({"status": "stopped"})
+    """停止测试：run_id 指定运行（请求体或查询参数），未指定时停止最近一次开始的运行"""
+    data = request.get_json(silent=True) or {}
+    run_id = data.get("run_id") or request.args.get("run_id")
+    run = get_run(run_id)
+    if run is None:
+        if run_id:
+            return run_not_found(run_id)
+        return jsonify({"status": "stopped"})
+    run.state["is_running"] = False
+    return jsonify({"status": "stopped", "run_id": run.run_id})
+
+@app.route('/api/jobs')
+def list_jobs():
+    """常驻运行时的任务表：?kind=batch_test 只返回该类型"""
+    kind = request.args.get("kind") or None
+    return jsonify({
+        "jobs": [job.to_dict() for job in runtime.jobs(kind)],
+        "runtime": runtime.get_stats(),
+        "single_test_connections": len(single_test_clients)
+    })
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = runtime.get(job_id)
+    if job is None:
+        return jsonify({"error": f"任务不存在: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消任务（立即取消其 asyncio 任务，批量测试会关闭连接并发送 test_error）"""
+    job = runtime.get(job_id)
+    if job is None:
+        return jsonify({"error": f"任务不存在: {job_id}"}), 404
+    if not runtime.cancel(job_id):
+        return jsonify({"error": f"任务已结束: {job.status}"}), 400
+    return jsonify({"status": "cancelling", "job": job.to_dict()})
+
+@app.route('/api/single-test/connections', methods=['DELETE'])
+def close_single_test_connections():
+    """关闭单语音测试保留的已鉴权连接（下次单语音测试重新连接）"""
+    closed = runtime.run(close_single_test_clients, "close_connections", timeout=10)
+    return jsonify({"closed": closed})
 
 # ==================== Opus文件管理API ====================
 
@@ -1947,21 +2638,8 @@ def scan_opus_files():
     orders = []  # 保持为空，不再使用
     
     # 优先从file_list.txt读取文本映射（最准确）
-    text_map = {}
-    if os.path.exists(FILE_LIST_TXT):
-        with open(FILE_LIST_TXT, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
-                    continue
-                
-                # 解析格式：001: filename.opus - 文本内容
-                match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s+(.+)', line)
-                if match:
-                    filename = match.group(2)
-                    text = match.group(3)
-                    if text:  # 只保存非空文本
-                        text_map[filename] = text
+    from corpus_archive import load_text_map
+    text_map = load_text_map(AUDIO_DIR)
     
     # 统一扫描所有audio_前缀的文件
     pattern = os.path.join(AUDIO_DIR, "audio_*.opus")
@@ -2103,6 +2781,7 @@ def upload_text_file():
             return jsonify({"error": "文本内容为空"}), 400
         
         # 生成Opus文件
+        from functools import partial
         from generate_tts_audio import synthesize_speech
         import subprocess
         import tempfile
@@ -2110,170 +2789,161 @@ def upload_text_file():
         generated_files = []
         # 统一管理，不再区分类型，不追加到文本文件
         
-        # 在后台线程中异步生成音频文件（避免请求超时）
-        def generate_files_async():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        # 提交到常驻运行时异步生成音频文件（避免请求超时）
+        async def generate_files():
+            result_files = []
+            # 获取所有现有文件的最大编号（不区分类型）
+            import glob
+            import re
             
-            async def generate_files():
-                result_files = []
-                # 获取所有现有文件的最大编号（不区分类型）
-                import glob
-                import re
-                
-                # 扫描所有audio_前缀的opus文件，找到最大编号
-                pattern = os.path.join(AUDIO_DIR, "audio_*.opus")
-                existing_files = glob.glob(pattern)
-                max_index = 0
-                
-                for file_path in existing_files:
-                    basename = os.path.basename(file_path)
-                    # 只匹配audio_前缀的文件
-                    match = re.match(r'audio_(\d+)\.opus', basename)
-                    if match:
-                        index = int(match.group(1))
-                        if index > max_index:
-                            max_index = index
+            # 扫描所有audio_前缀的opus文件，找到最大编号
+            pattern = os.path.join(AUDIO_DIR, "audio_*.opus")
+            existing_files = glob.glob(pattern)
+            max_index = 0
+            
+            for file_path in existing_files:
+                basename = os.path.basename(file_path)
+                # 只匹配audio_前缀的文件
+                match = re.match(r'audio_(\d+)\.opus', basename)
+                if match:
+                    index = int(match.group(1))
+                    if index > max_index:
+                        max_index = index
+            
+            current_index = max_index + 1
+            file_type = "audio"  # 统一使用audio前缀
+            
+            for idx, text in enumerate(texts):
+                # 检查文件是否已存在，如果存在则使用下一个索引
+                while True:
+                    filename = f"{file_type}_{current_index:03d}.opus"
+                    output_file = os.path.join(AUDIO_DIR, filename)
+                    
+                    if os.path.exists(output_file):
+                        # 文件已存在，使用下一个索引
+                        current_index += 1
+                        print(f"File {filename} already exists, using next index: {current_index:03d}")
+                    else:
+                        # 文件不存在，可以使用这个索引
+                        break
                 
-                current_index = max_index + 1
-                file_type = "audio"  # 统一使用audio前缀
+                # 生成PCM
+                temp_pcm = os.path.join(tempfile.gettempdir(), f"temp_{current_index}_{idx}.pcm")
+                success = await synthesize_speech(text, temp_pcm, audio_format="raw")
                 
-                for idx, text in enumerate(texts):
-                    # 检查文件是否已存在，如果存在则使用下一个索引
-                    while True:
-                        filename = f"{file_type}_{current_index:03d}.opus"
-                        output_file = os.path.join(AUDIO_DIR, filename)
-                        
+                if success:
+                    # 转换为Opus
+                    try:
+                        # 再次检查文件是否已存在（防止并发问题）
                         if os.path.exists(output_file):
-                            # 文件已存在，使用下一个索引
                             current_index += 1
-                            print(f"File {filename} already exists, using next index: {current_index:03d}")
-                        else:
-                            # 文件不存在，可以使用这个索引
-                            break
-                    
-                    # 生成PCM
-                    temp_pcm = os.path.join(tempfile.gettempdir(), f"temp_{current_index}_{idx}.pcm")
-                    success = await synthesize_speech(text, temp_pcm, audio_format="raw")
-                    
-                    if success:
-                        # 转换为Opus
-                        try:
-                            # 再次检查文件是否已存在（防止并发问题）
-                            if os.path.exists(output_file):
-                                current_index += 1
-                                filename = f"{file_type}_{current_index:03d}.opus"
-                                output_file = os.path.join(AUDIO_DIR, filename)
-                            
-                            subprocess.run([
-                                "ffmpeg", "-y", "-f", "s16le", "-ar", "16000", "-ac", "1",
-                                "-i", temp_pcm, "-c:a", "libopus", "-b:a", "32k", "-frame_duration", "60",
-                                output_file
-                            ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                            
-                            if os.path.exists(temp_pcm):
-                                os.remove(temp_pcm)
-                            
-                            result_files.append({
-                                "index": f"{current_index:03d}",
-                                "filename": filename,
-                                "text": text
-                            })
-                            
-                            # 移动到下一个索引
-                            current_index += 1
-                            
-                            await asyncio.sleep(0.5)  # 避免API限流
-                        except Exception as e:
-                            print(f"Failed to convert {filename}: {e}")
-                            # 即使失败也移动到下一个索引，避免重复尝试
-                            current_index += 1
-                    else:
-                        print(f"Failed to generate PCM for {filename}")
-                        # 即使失败也移动到下一个索引
+                            filename = f"{file_type}_{current_index:03d}.opus"
+                            output_file = os.path.join(AUDIO_DIR, filename)
+                        
+                        # ffmpeg 在线程池中执行，不阻塞运行时的事件循环
+                        await asyncio.get_running_loop().run_in_executor(None, partial(subprocess.run, [
+                            "ffmpeg", "-y", "-f", "s16le", "-ar", "16000", "-ac", "1",
+                            "-i", temp_pcm, "-c:a", "libopus", "-b:a", "32k", "-frame_duration", "60",
+                            output_file
+                        ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+                        
+                        if os.path.exists(temp_pcm):
+                            os.remove(temp_pcm)
+                        
+                        result_files.append({
+                            "index": f"{current_index:03d}",
+                            "filename": filename,
+                            "text": text
+                        })
+                        
+                        # 移动到下一个索引
                         current_index += 1
-                
-                # 重新生成file_list.txt（使用新生成的文件信息 + 已存在的文件）
-                # 先读取现有的file_list.txt，保留已存在文件的文本内容
-                existing_text_map = {}
-                if os.path.exists(FILE_LIST_TXT):
-                    with open(FILE_LIST_TXT, 'r', encoding='utf-8') as f:
-                        for line in f:
-                            line = line.strip()
-                            if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
-                                continue
-                            # 解析格式：001: filename.opus - 文本内容（文本可能为空）
-                            match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s*(.+)', line)
-                            if match:
-                                filename = match.group(2)
-                                text = match.group(3)
-                                if text:  # 只保存非空文本
-                                    existing_text_map[filename] = text
-                
-                # 更新新生成文件的文本内容（覆盖已有内容）
-                for file_info in result_files:
-                    existing_text_map[file_info["filename"]] = file_info["text"]
-                
-                # 重新扫描所有文件
-                inquiries, compares, orders = scan_opus_files()
-                
-                # 用existing_text_map中的文本内容覆盖扫描结果（确保新生成的文件有文本）
+                        
+                        await asyncio.sleep(0.5)  # 避免API限流
+                    except Exception as e:
+                        print(f"Failed to convert {filename}: {e}")
+                        # 即使失败也移动到下一个索引，避免重复尝试
+                        current_index += 1
+                else:
+                    print(f"Failed to generate PCM for {filename}")
+                    # 即使失败也移动到下一个索引
+                    current_index += 1
+            
+            # 重新生成file_list.txt（使用新生成的文件信息 + 已存在的文件）
+            # 先读取现有的file_list.txt，保留已存在文件的文本内容
+            existing_text_map = {}
+            if os.path.exists(FILE_LIST_TXT):
+                with open(FILE_LIST_TXT, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line or line in ["Inquiry Files:", "Compare Files:", "Order Files:"]:
+                            continue
+                        # 解析格式：001: filename.opus - 文本内容（文本可能为空）
+                        match = re.match(r'(\d+):\s+(\w+_\d+\.opus)\s+-\s*(.+)', line)
+                        if match:
+                            filename = match.group(2)
+                            text = match.group(3)
+                            if text:  # 只保存非空文本
+                                existing_text_map[filename] = text
+            
+            # 更新新生成文件的文本内容（覆盖已有内容）
+            for file_info in result_files:
+                existing_text_map[file_info["filename"]] = file_info["text"]
+            
+            # 重新扫描所有文件
+            inquiries, compares, orders = scan_opus_files()
+            
+            # 用existing_text_map中的文本内容覆盖扫描结果（确保新生成的文件有文本）
+            for file_list in [inquiries, compares, orders]:
+                for file_info in file_list:
+                    if file_info["filename"] in existing_text_map:
+                        file_info["text"] = existing_text_map[file_info["filename"]]
+            
+            # 确保所有新生成的文件都在列表中（如果扫描时遗漏了）
+            for file_info in result_files:
+                # 检查是否已经在某个列表中
+                found = False
                 for file_list in [inquiries, compares, orders]:
-                    for file_info in file_list:
-                        if file_info["filename"] in existing_text_map:
-                            file_info["text"] = existing_text_map[file_info["filename"]]
-                
-                # 确保所有新生成的文件都在列表中（如果扫描时遗漏了）
-                for file_info in result_files:
-                    # 检查是否已经在某个列表中
-                    found = False
-                    for file_list in [inquiries, compares, orders]:
-                        if any(f["filename"] == file_info["filename"] for f in file_list):
-                            # 确保文本内容正确
-                            for f in file_list:
-                                if f["filename"] == file_info["filename"]:
-                                    f["text"] = file_info["text"]
-                            found = True
-                            break
-                    
-                    # 如果不在任何列表中，添加到inquiries（因为audio_xxx默认归类到inquiries）
-                    if not found:
-                        file_path = os.path.join(AUDIO_DIR, file_info["filename"])
-                        if os.path.exists(file_path):
-                            file_stat = os.stat(file_path)
-                            inquiries.append({
-                                "index": file_info["index"],
-                                "filename": file_info["filename"],
-                                "text": file_info["text"],
-                                "file_size": file_stat.st_size,
-                                "created_time": datetime.fromtimestamp(file_stat.st_ctime).isoformat()
-                            })
-                
-                # 生成新的file_list.txt（确保新生成文件的文本内容被保存）
-                from generate_batch_tts import generate_file_list
-                generate_file_list(
-                    [(int(f["index"]), f["filename"], f["text"]) for f in inquiries],
-                    [(int(f["index"]), f["filename"], f["text"]) for f in compares],
-                    [(int(f["index"]), f["filename"], f["text"]) for f in orders],
-                    FILE_LIST_TXT
-                )
+                    if any(f["filename"] == file_info["filename"] for f in file_list):
+                        # 确保文本内容正确
+                        for f in file_list:
+                            if f["filename"] == file_info["filename"]:
+                                f["text"] = file_info["text"]
+                        found = True
+                        break
                 
-                return result_files
+                # 如果不在任何列表中，添加到inquiries（因为audio_xxx默认归类到inquiries）
+                if not found:
+                    file_path = os.path.join(AUDIO_DIR, file_info["filename"])
+                    if os.path.exists(file_path):
+                        file_stat = os.stat(file_path)
+                        inquiries.append({
+                            "index": file_info["index"],
+                            "filename": file_info["filename"],
+                            "text": file_info["text"],
+                            "file_size": file_stat.st_size,
+                            "created_time": datetime.fromtimestamp(file_stat.st_ctime).isoformat()
+                        })
+            
+            # 生成新的file_list.txt（确保新生成文件的文本内容被保存）
+            from generate_batch_tts import generate_file_list
+            generate_file_list(
+                [(int(f["index"]), f["filename"], f["text"]) for f in inquiries],
+                [(int(f["index"]), f["filename"], f["text"]) for f in compares],
+                [(int(f["index"]), f["filename"], f["text"]) for f in orders],
+                FILE_LIST_TXT
+            )
             
-            result = loop.run_until_complete(generate_files())
-            loop.close()
-            return result
+            return result_files
         
-        # 在后台线程中执行（不阻塞请求）
-        import threading
-        thread = threading.Thread(target=generate_files_async, daemon=True)
-        thread.start()
+        job = runtime.submit(generate_files, "opus_generate", f"{len(texts)} texts")
         
         # 立即返回，告知用户文件正在生成
         return jsonify({
             "success": True,
             "message": f"已开始生成{len(texts)}个文件，请稍后刷新页面查看",
-            "generated_files": []  # 实际文件在后台生成
+            "generated_files": [],  # 实际文件在后台生成
+            "job_id": job.id
         })
     except Exception as e:
         import traceback
@@ -2399,7 +3069,7 @@ def handle_connect():
     """客户端连接"""
     emit('connected', {'message': 'Connected to test server'})
     # 发送当前状态
-    emit('status_update', test_state)
+    emit('status_update', current_run.state if current_run is not None else new_test_state())
 
 @socketio.on('disconnect')
 def handle_disconnect():
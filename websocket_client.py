@@ -4,35 +4,83 @@ WebSocket 客户端封装：管理 WebSocket 连接和消息传输
 import asyncio
 import json
 import time
+import random
+import itertools
+import logging
 from typing import Optional, Callable, Dict, Any, List
 import websockets
 from websockets.exceptions import ConnectionClosed, WebSocketException
 from logger import Logger
 from config import Config
-from utils import get_timestamp, parse_json_message
+from run_settings import RunSettings
+from utils import parse_json_message
+from audio_pacer import get_pacer
+from downlink_audio import DownlinkAudio
+from protocol_trace import shared_writer
+from turn_timeline import (
+    TurnState, ns_to_wall_ms, monotonic_wall_ms,
+    START_LISTEN, FIRST_AUDIO_FRAME, LAST_AUDIO_FRAME, STOP_LISTEN,
+    STT, FIRST_LLM, TTS_START, SECOND_SENTENCE, TTS_STOP, SEND_END, RESPONSE_END, FIRST_TTS_AUDIO,
+)
+
+# 需要按轮次路由的响应消息类型
+_TURN_MESSAGE_TYPES = ("stt", "llm", "tts")
+
+
+def _turn_field(name: str) -> property:
+    """当前轮状态字段的只读视图（兼容直接读取客户端属性的旧代码）"""
+    return property(lambda self: getattr(self.turn, name))
+
+
+def _turn_event_time(event) -> property:
+    """当前轮某个事件的墙上时钟毫秒时间戳（仅用于显示），未发生时为 None"""
+    return property(lambda self: self.turn.timeline.wall_ms(event))
+
 
 class WebSocketClient:
     """WebSocket 客户端类"""
     
-    def __init__(self, connection_id: int, device_sn: Optional[str] = None):
+    # 当前轮的响应状态，实际存放在 self.turn（TurnState）中
+    timeline = _turn_field("timeline")
+    stt_text = _turn_field("stt_text")
+    llm_text_buffer = _turn_field("llm_text_buffer")
+    has_stt = _turn_field("has_stt")
+    has_llm = _turn_field("has_llm")
+    has_tts_start = _turn_field("has_tts_start")
+    has_tts_stop = _turn_field("has_tts_stop")
+    tts_sentence_count = property(lambda self: len(self.turn.timeline.sentence_starts))
+    send_time = _turn_event_time(FIRST_AUDIO_FRAME)
+    send_end_time = _turn_event_time(SEND_END)  # 发送语音结束的时间（发送了 stop_listen 时以其为准）
+    stt_response_time = _turn_event_time(STT)
+    llm_response_time = _turn_event_time(FIRST_LLM)
+    tts_start_time = _turn_event_time(TTS_START)
+    tts_second_sentence_time = _turn_event_time(SECOND_SENTENCE)  # 第二句TTS回复开始的时间（跳过第一句）
+    tts_stop_time = _turn_event_time(TTS_STOP)
+    
+    def __init__(self, connection_id: int, device_sn: Optional[str] = None,
+                 settings: Optional[RunSettings] = None):
         self.connection_id = connection_id
         self.device_sn = device_sn  # 设备SN，如果为None则使用Config中的默认值
+        # 本次运行的服务器地址和协议行为（未指定时取 Config 当前值），不同运行的连接互不影响
+        self.settings = settings or RunSettings.from_config()
         self.logger = Logger()
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.session_id: Optional[str] = None
         self.is_connected = False
+        # 协议轨迹（PROTOCOL_TRACE_PATH 非空时记录本连接收发的每一帧，供 trace_replay.py 重放）
+        self.trace = None
         
-        # 时间戳记录
+        # 时间戳记录（锚定到墙上时钟的单调毫秒时间戳，仅用于显示；延迟指标统一由 self.timeline 计算）
         self.connect_start_time: Optional[float] = None
         self.connect_end_time: Optional[float] = None
-        self.send_time: Optional[float] = None
-        self.send_end_time: Optional[float] = None  # 发送语音结束的时间（发送完所有音频帧后）
-        self.stt_response_time: Optional[float] = None
-        self.llm_response_time: Optional[float] = None
-        self.tts_start_time: Optional[float] = None
-        self.tts_second_sentence_time: Optional[float] = None  # 第二句TTS回复开始的时间（跳过第一句）
-        self.tts_stop_time: Optional[float] = None
-        self.tts_sentence_count: int = 0  # TTS句子计数器
+        
+        # 单轮对话状态：每轮由 begin_turn() 新建 TurnState 并分配递增的轮次 ID（从 1 开始）
+        # 轮次 0 对应连接建立后、第一次调用 begin_turn() 之前（只发送一轮的调用方可以不调用 begin_turn）
+        self._turn_ids = itertools.count(1)
+        self.turn = TurnState(0)
+        self._draining_turn: Optional[TurnState] = None  # 未收到TTS stop就被新一轮取代的上一轮
+        self.straggler_messages = 0  # 不属于当前轮的迟到消息总数
+        self.carried_over_turns = 0  # 未完成就被新一轮取代的轮次数
         
         # 消息统计
         self.sent_messages = 0
@@ -44,25 +92,132 @@ class WebSocketClient:
         self.on_message_received: Optional[Callable] = None
         self.on_error: Optional[Callable] = None
         
-        # 响应标志
-        self.has_stt = False
-        self.has_llm = False
-        self.has_tts_start = False
-        self.has_tts_stop = False
+        # 连接状态标志
         self.was_connected = False  # 记录是否曾经成功连接过（用于统计）
         self.auth_received = False  # 是否收到 auth 消息
         self.auth_failed = False  # 是否鉴权失败
         self.stt_empty = False  # STT识别结果是否为空（如果为空，禁止再发送任何消息）
         
-        # 响应文本缓冲区
-        self.llm_text_buffer = []  # LLM返回的文本内容
+        # 阶段事件：由接收任务在收到对应消息时置位，等待方用 wait_for_stage() 等待，无需轮询
+        self.auth_event = asyncio.Event()       # 收到 auth 消息（成功或失败）
+        self.stt_event = asyncio.Event()        # 收到本轮第一个 STT 结果
+        self.llm_event = asyncio.Event()        # 收到本轮第一个 LLM 回复
+        self.tts_start_event = asyncio.Event()  # TTS 开始
+        self.tts_stop_event = asyncio.Event()   # TTS 结束（本轮完成）
+        self.disconnect_event = asyncio.Event() # 连接断开（任何等待都会被唤醒）
+        
+        # 是否输出完整消息体/横幅日志（按轮次采样，见 LOG_PAYLOAD_SAMPLE_RATE）
+        self.log_payloads = False
+        self._sample_turn_logging()
+    
+    def _sample_turn_logging(self):
+        """决定本轮是否输出完整的消息体和横幅日志：DEBUG级别始终输出，INFO级别按采样率输出"""
+        if self.logger.is_enabled_for(logging.DEBUG):
+            self.log_payloads = True
+        elif self.logger.is_enabled_for(logging.INFO):
+            rate = Config.LOG_PAYLOAD_SAMPLE_RATE
+            self.log_payloads = rate >= 1.0 or random.random() < rate
+        else:
+            self.log_payloads = False
+    
+    def begin_turn(self) -> TurnState:
+        """开始新一轮对话：分配新的 TurnState（轮次 ID 递增）并重置阶段事件（每轮发送前调用）"""
+        previous = self.turn
+        if previous.started and not previous.has_tts_stop and self.is_connected:
+            # 上一轮还没收到TTS stop：之后到达的响应仍归上一轮，直到它的TTS stop或新一轮的STT
+            self._draining_turn = previous
+            self.carried_over_turns += 1
+        self.turn = TurnState(next(self._turn_ids))
+        self.turn.downlink = DownlinkAudio(Config.DOWNLINK_OPUS_DECODE, Config.AUDIO_SAMPLE_RATE, Config.AUDIO_CHANNELS)
+        self.stt_event.clear()
+        self.llm_event.clear()
+        self.tts_start_event.clear()
+        self.tts_stop_event.clear()
+        self._sample_turn_logging()
+        return self.turn
+    
+    def _route_turn(self, msg_type: str, state: str) -> Optional[TurnState]:
+        """
+        确定 stt/llm/tts 消息属于哪一轮
+        
+        返回当前轮；属于其它轮次的迟到消息只计数，返回 None
+        """
+        turn = self.turn
+        draining = self._draining_turn
+        if draining is not None:
+            if msg_type == "stt" and turn.timeline.has(FIRST_AUDIO_FRAME):
+                # 新一轮的STT已到达，上一轮不会再有响应
+                self._draining_turn = None
+            else:
+                if msg_type == "tts" and state == "stop":
+                    self._draining_turn = None
+                self._count_straggler(msg_type, draining.turn_id)
+                return None
+        if not turn.started:
+            # 当前轮还没发送 start_listen：上一轮结束后多出来的消息
+            self._count_straggler(msg_type, turn.turn_id - 1)
+            return None
+        return turn
+    
+    def _record_downlink_audio(self, frame: bytes):
+        """
+        记录本轮下行 TTS 音频帧的到达时间和时长
+
+        音频帧不带轮次信息：上一轮还在接收迟到响应时、以及本轮发送 start_listen 之前收到的帧不计入
+        """
+        turn = self.turn
+        if turn.downlink is None or self._draining_turn is not None or not turn.started:
+            return
+        ns = time.perf_counter_ns()
+        if not turn.downlink.frames:
+            turn.timeline.mark(FIRST_TTS_AUDIO, ns)
+        turn.downlink.add(frame, ns)
+    
+    def _count_straggler(self, msg_type: str, owner_turn_id: int):
+        self.straggler_messages += 1
+        self.turn.stragglers += 1
+        self.logger.debug(
+            "Connection #%s: Straggler %s message for turn #%s (active turn #%s)",
+            self.connection_id, msg_type, owner_turn_id, self.turn.turn_id
+        )
+    
+    async def wait_for_stage(self, *events: asyncio.Event, timeout: float) -> bool:
+        """
+        等待任一阶段事件置位，连接断开或超时时提前返回
+        
+        返回：是否有传入的事件已置位
+        """
+        if any(event.is_set() for event in events):
+            return True
+        if self.disconnect_event.is_set() or timeout <= 0:
+            return False
+        
+        waiters = [asyncio.ensure_future(event.wait()) for event in events]
+        waiters.append(asyncio.ensure_future(self.disconnect_event.wait()))
+        try:
+            await asyncio.wait_for(
+                asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return any(event.is_set() for event in events)
+    
+    async def wait_for_auth(self, timeout: float) -> bool:
+        """等待服务器的 auth 消息（或 session_id），返回是否收到"""
+        if self.session_id:
+            return True
+        return await self.wait_for_stage(self.auth_event, timeout=timeout) or bool(self.session_id)
     
     async def connect(self) -> bool:
         """建立 WebSocket 连接"""
-        self.connect_start_time = get_timestamp()
+        self.connect_start_time = monotonic_wall_ms()
         
         try:
-            url = Config.get_websocket_url(self.device_sn)
+            url = self.settings.websocket_url(self.device_sn)
             headers = Config.get_headers(self.device_sn)
             
             # 打印鉴权请求信息
@@ -114,9 +269,10 @@ class WebSocketClient:
                 else:
                     raise
             
-            self.connect_end_time = get_timestamp()
+            self.connect_end_time = monotonic_wall_ms()
             self.is_connected = True
             self.was_connected = True  # 标记为曾经成功连接
+            self.disconnect_event.clear()
             
             connect_duration = self.connect_end_time - self.connect_start_time
             self.logger.connection(
@@ -126,13 +282,18 @@ class WebSocketClient:
                 url
             )
             
+            if Config.PROTOCOL_TRACE_PATH:
+                self.trace = shared_writer(
+                    Config.PROTOCOL_TRACE_PATH, Config.PROTOCOL_TRACE_DOWNLINK_AUDIO
+                ).open_session(url, headers, device_sn=self.device_sn, connection_id=self.connection_id)
+            
             # 启动消息接收任务
             asyncio.create_task(self._receive_messages())
             
             return True
             
         except asyncio.TimeoutError:
-            self.connect_end_time = get_timestamp()
+            self.connect_end_time = monotonic_wall_ms()
             connect_duration = self.connect_end_time - self.connect_start_time
             self.logger.connection(
                 self.connection_id,
@@ -144,7 +305,7 @@ class WebSocketClient:
             return False
             
         except Exception as e:
-            self.connect_end_time = get_timestamp()
+            self.connect_end_time = monotonic_wall_ms()
             connect_duration = self.connect_end_time - self.connect_start_time
             self.logger.connection(
                 self.connection_id,
@@ -163,10 +324,13 @@ class WebSocketClient:
             async for message in self.websocket:
                 self.received_messages += 1
                 self.logger.debug(f"Connection #{self.connection_id}: Received message #{self.received_messages}")
+                if self.trace is not None:
+                    self.trace.received(message)
                 
                 if isinstance(message, bytes):
                     # 二进制消息（音频数据）
                     self.total_received_bytes += len(message)
+                    self._record_downlink_audio(message)
                     # 只记录音频接收摘要（避免日志过多）
                     self.logger.debug(
                         f"Connection #{self.connection_id}: Received audio | "
@@ -205,29 +369,26 @@ class WebSocketClient:
             if self.on_error:
                 self.on_error(f"Receive error: {str(e)}")
         finally:
+            self._close_trace()
+            self.disconnect_event.set()
             self.logger.debug(f"Connection #{self.connection_id}: Receive task ended")
     
     async def _handle_json_message(self, data: Dict[str, Any]):
         """处理接收到的 JSON 消息"""
         msg_type = data.get("type", "unknown")
-        current_time = get_timestamp()
+        now_ns = time.perf_counter_ns()
+        current_time = ns_to_wall_ms(now_ns)  # 仅用于显示
         
-        # 诊断日志：记录每个消息的接收
-        stt_time_str = f"{self.stt_response_time:.2f}ms" if self.stt_response_time else "None"
-        llm_time_str = f"{self.llm_response_time:.2f}ms" if self.llm_response_time else "None"
-        tts_start_time_str = f"{self.tts_start_time:.2f}ms" if self.tts_start_time else "None"
-        self.logger.debug(
-            f"Connection #{self.connection_id}: [DIAGNOSTIC] Received message | "
-            f"Type: {msg_type} | "
-            f"Time: {current_time:.2f}ms | "
-            f"Has_STT: {self.has_stt} | "
-            f"Has_LLM: {self.has_llm} | "
-            f"Has_TTS_Start: {self.has_tts_start} | "
-            f"Has_TTS_Stop: {self.has_tts_stop} | "
-            f"STT_Time: {stt_time_str} | "
-            f"LLM_Time: {llm_time_str} | "
-            f"TTS_Start_Time: {tts_start_time_str}"
-        )
+        # 诊断日志：记录每个消息的接收（只在DEBUG级别开启时格式化）
+        if self.logger.is_enabled_for(logging.DEBUG):
+            self.logger.debug(
+                "Connection #%s: [DIAGNOSTIC] Received message | Type: %s | Time: %.2fms | "
+                "Has_STT: %s | Has_LLM: %s | Has_TTS_Start: %s | Has_TTS_Stop: %s | "
+                "STT_Time: %s | LLM_Time: %s | TTS_Start_Time: %s",
+                self.connection_id, msg_type, current_time,
+                self.has_stt, self.has_llm, self.has_tts_start, self.has_tts_stop,
+                self.stt_response_time, self.llm_response_time, self.tts_start_time
+            )
         
         # 提取 session_id - 尝试多种可能的位置
         session_id_found = False
@@ -244,22 +405,33 @@ class WebSocketClient:
                 self.session_id = data_obj["session_id"]
                 session_id_found = True
         
+        # 下发 session_id 也视为鉴权完成（唤醒 wait_for_auth）
+        if session_id_found:
+            self.auth_event.set()
+        
+        # 响应消息按轮次路由，迟到消息不写入当前轮
+        if msg_type in _TURN_MESSAGE_TYPES:
+            turn = self._route_turn(msg_type, data.get("state", ""))
+            if turn is None:
+                return
+            timeline = turn.timeline
+        
         if msg_type == "auth":
             # 认证响应
             self.auth_received = True
             code = data.get("code", 0)
             msg = data.get("msg", "")
             
-            # 打印鉴权响应信息
-            import json
-            self.logger.info(f"Connection #{self.connection_id}: ========== AUTH RESPONSE ==========")
-            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-            self.logger.info(f"Connection #{self.connection_id}: Response Code: {code}")
-            self.logger.info(f"Connection #{self.connection_id}: Response Message: {msg}")
-            self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
-            self.logger.info(f"Connection #{self.connection_id}: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            self.logger.info(f"Connection #{self.connection_id}: Session ID: {self.session_id}")
-            self.logger.info(f"Connection #{self.connection_id}: ====================================")
+            # 打印鉴权响应信息（完整消息体只在采样轮次输出）
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: ========== AUTH RESPONSE ==========")
+                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                self.logger.info(f"Connection #{self.connection_id}: Response Code: {code}")
+                self.logger.info(f"Connection #{self.connection_id}: Response Message: {msg}")
+                self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
+                self.logger.info(f"Connection #{self.connection_id}: {json.dumps(data, ensure_ascii=False, indent=2)}")
+                self.logger.info(f"Connection #{self.connection_id}: Session ID: {self.session_id}")
+                self.logger.info(f"Connection #{self.connection_id}: ====================================")
             
             if code == -1 or msg == "auth_failed":
                 # 鉴权失败
@@ -274,35 +446,38 @@ class WebSocketClient:
                     f"Connection #{self.connection_id}: ✅ Auth SUCCESS | "
                     f"Code: {code}, Message: {msg}, Session ID: {self.session_id}"
                 )
+            self.auth_event.set()
             
         elif msg_type == "stt":
             # STT 响应 - 显示识别的文本内容
             text = data.get("text", "")
             # 保存STT识别结果
-            self.stt_text = text
+            turn.stt_text = text
             
             # 记录STT识别结果是否为空（用于统计）
             if not text or text.strip() == "":
                 self.stt_empty = True
             
-            # 打印STT响应的详细信息
-            import json as json_module
-            self.logger.info(f"Connection #{self.connection_id}: ========== STT RESPONSE ==========")
-            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-            self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
-            self.logger.info(f"Connection #{self.connection_id}: {json_module.dumps(data, ensure_ascii=False, indent=2)}")
+            # 打印STT响应的详细信息（完整消息体只在采样轮次输出）
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: ========== STT RESPONSE ==========")
+                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
+                self.logger.info(f"Connection #{self.connection_id}: {json.dumps(data, ensure_ascii=False, indent=2)}")
             
-            if not self.has_stt and self.send_time:
-                self.stt_response_time = current_time
-                self.has_stt = True
-                stt_duration = self.stt_response_time - self.send_time
-                self.logger.info(f"Connection #{self.connection_id}: Response Time: {stt_duration:.2f}ms (from send_start)")
+            if not turn.has_stt and timeline.has(FIRST_AUDIO_FRAME):
+                timeline.mark(STT, now_ns)
+                turn.has_stt = True
+                self.stt_event.set()
+                stt_duration = timeline.elapsed_ms(FIRST_AUDIO_FRAME, STT)
+                self.logger.info(f"Connection #{self.connection_id}: Turn #{turn.turn_id} Response Time: {stt_duration:.2f}ms (from send_start)")
                 self.logger.info(f"Connection #{self.connection_id}: Recognized Text: {text}")
-            else:
+            elif self.log_payloads:
                 # 如果已经记录过，也显示文本内容
                 self.logger.info(f"Connection #{self.connection_id}: Update | Recognized Text: {text}")
             
-            self.logger.info(f"Connection #{self.connection_id}: =================================")
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: =================================")
             
             # 触发STT回调，用于实时更新
             if hasattr(self, '_tts_sentence_callback') and self._tts_sentence_callback:
@@ -316,118 +491,120 @@ class WebSocketClient:
             
             # 保存LLM返回的文本内容
             if text and text.strip():
-                if not hasattr(self, 'llm_text_buffer'):
-                    self.llm_text_buffer = []
-                self.llm_text_buffer.append(text.strip())
+                turn.llm_text_buffer.append(text.strip())
+                timeline.mark_sentence("llm", text.strip(), now_ns)
             
-            # 打印LLM响应的详细信息
-            import json as json_module
-            self.logger.info(f"Connection #{self.connection_id}: ========== LLM RESPONSE ==========")
-            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-            self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
-            self.logger.info(f"Connection #{self.connection_id}: {json_module.dumps(data, ensure_ascii=False, indent=2)}")
+            # 打印LLM响应的详细信息（完整消息体只在采样轮次输出）
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: ========== LLM RESPONSE ==========")
+                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
+                self.logger.info(f"Connection #{self.connection_id}: {json.dumps(data, ensure_ascii=False, indent=2)}")
             
-            if not self.has_llm:
-                self.llm_response_time = current_time
-                self.has_llm = True
+            if not turn.has_llm:
+                timeline.mark(FIRST_LLM, now_ns)
+                turn.has_llm = True
+                self.llm_event.set()
                 llm_duration = ""
-                if self.stt_response_time:
-                    llm_duration = f" | Duration: {self.llm_response_time - self.stt_response_time:.2f}ms"
+                if timeline.has(STT):
+                    llm_duration = f" | Duration: {timeline.elapsed_ms(STT, FIRST_LLM):.2f}ms"
                 self.logger.info(f"Connection #{self.connection_id}: Response Time{llm_duration}")
                 self.logger.info(f"Connection #{self.connection_id}: Emotion: {emotion}")
                 self.logger.info(f"Connection #{self.connection_id}: Text: {text}")
-            else:
+            elif self.log_payloads:
                 self.logger.info(f"Connection #{self.connection_id}: Update | Emotion: {emotion} | Text: {text}")
             
-            self.logger.info(f"Connection #{self.connection_id}: =================================")
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: =================================")
             
         elif msg_type == "tts":
             # TTS 响应 - 显示状态和文本内容（完全按照项目代码的处理逻辑）
             state = data.get("state", "")
             text = data.get("text", "")
             
-            # 打印TTS响应的详细信息
-            import json as json_module
-            self.logger.info(f"Connection #{self.connection_id}: ========== TTS RESPONSE ==========")
-            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-            self.logger.info(f"Connection #{self.connection_id}: State: {state}")
-            self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
-            self.logger.info(f"Connection #{self.connection_id}: {json_module.dumps(data, ensure_ascii=False, indent=2)}")
+            # 打印TTS响应的详细信息（完整消息体只在采样轮次输出）
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: ========== TTS RESPONSE ==========")
+                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                self.logger.info(f"Connection #{self.connection_id}: State: {state}")
+                self.logger.info(f"Connection #{self.connection_id}: Full Response Data:")
+                self.logger.info(f"Connection #{self.connection_id}: {json.dumps(data, ensure_ascii=False, indent=2)}")
             
             # 如果服务器没有发送单独的LLM消息，TTS的sentence_start中的text就是LLM返回的内容
             # 将TTS的文本内容也保存到llm_text_buffer中
             if state == "sentence_start" and text and text.strip():
-                # 确保llm_text_buffer已初始化（在__init__中已初始化，这里作为双重保险）
-                if not hasattr(self, 'llm_text_buffer'):
-                    self.llm_text_buffer = []
-                
                 text_stripped = text.strip()
+                timeline.mark_sentence("tts", text_stripped, now_ns)
                 # 避免重复添加相同的文本
-                if not self.llm_text_buffer or self.llm_text_buffer[-1] != text_stripped:
-                    self.llm_text_buffer.append(text_stripped)
+                if not turn.llm_text_buffer or turn.llm_text_buffer[-1] != text_stripped:
+                    turn.llm_text_buffer.append(text_stripped)
                 
                 # 如果这是第一个LLM响应，设置has_llm标志（用于快速进入下一个问题）
-                if not self.has_llm:
-                    self.has_llm = True
-                    self.llm_response_time = current_time
+                if not turn.has_llm:
+                    turn.has_llm = True
+                    timeline.mark(FIRST_LLM, now_ns)
+                    self.llm_event.set()
                 
                 # 触发TTS句子回调，用于实时更新
                 if hasattr(self, '_tts_sentence_callback') and self._tts_sentence_callback:
-                    self._tts_sentence_callback(text_stripped, getattr(self, 'stt_text', ''))
+                    self._tts_sentence_callback(text_stripped, turn.stt_text)
             
-            if state == "start" and not self.has_tts_start:
-                self.tts_start_time = current_time
-                self.has_tts_start = True
+            if state == "start" and not turn.has_tts_start:
+                timeline.mark(TTS_START, now_ns)
+                turn.has_tts_start = True
+                self.tts_start_event.set()
                 tts_start_duration = ""
-                if self.llm_response_time:
-                    tts_start_duration = f" | Duration: {self.tts_start_time - self.llm_response_time:.2f}ms"
-                elif self.stt_response_time:
-                    tts_start_duration = f" | Duration from STT: {self.tts_start_time - self.stt_response_time:.2f}ms"
+                if timeline.has(FIRST_LLM):
+                    tts_start_duration = f" | Duration: {timeline.elapsed_ms(FIRST_LLM, TTS_START):.2f}ms"
+                elif timeline.has(STT):
+                    tts_start_duration = f" | Duration from STT: {timeline.elapsed_ms(STT, TTS_START):.2f}ms"
                 self.logger.info(f"Connection #{self.connection_id}: TTS Start Time{tts_start_duration}")
                 # 诊断日志：检查是否有LLM响应
-                if not self.has_llm:
+                if not turn.has_llm:
                     self.logger.warning(
-                        f"Connection #{self.connection_id}: [DIAGNOSTIC] TTS start received but no LLM response yet! "
-                        f"STT_Time: {self.stt_response_time:.2f}ms" if self.stt_response_time else "STT_Time: None"
+                        "Connection #%s: [DIAGNOSTIC] TTS start received but no LLM response yet! STT_Time: %s",
+                        self.connection_id, self.stt_response_time
                     )
-            elif state == "stop" and not self.has_tts_stop:
-                self.tts_stop_time = current_time
-                self.has_tts_stop = True
+            elif state == "stop" and not turn.has_tts_stop:
+                timeline.mark(TTS_STOP, now_ns)
+                turn.has_tts_stop = True
+                self.tts_stop_event.set()
                 tts_duration = ""
-                if self.tts_start_time:
-                    tts_duration = f" | Duration: {self.tts_stop_time - self.tts_start_time:.2f}ms"
-                self.logger.info(f"Connection #{self.connection_id}: TTS Stop Time{tts_duration}")
+                if timeline.has(TTS_START):
+                    tts_duration = f" | Duration: {timeline.elapsed_ms(TTS_START, TTS_STOP):.2f}ms"
+                self.logger.info(f"Connection #{self.connection_id}: Turn #{turn.turn_id} TTS Stop Time{tts_duration}")
             elif state == "sentence_start":
                 # sentence_start 状态包含要显示的文本内容
-                # 如果还没有记录tts_start_time，则用sentence_start的时间作为TTS开始时间
+                # 如果还没有TTS start，则用sentence_start的时间作为TTS开始时间
                 # 因为这是用户真正听到回复的开始
-                if not self.tts_start_time:
-                    self.tts_start_time = current_time
-                    self.has_tts_start = True
+                if not timeline.has(TTS_START):
+                    timeline.mark(TTS_START, now_ns)
+                    turn.has_tts_start = True
+                    self.tts_start_event.set()
                 
-                # 记录第二句TTS回复开始的时间（跳过第一句"好嘞，请稍等，正在处理中"）
-                self.tts_sentence_count += 1
-                if self.tts_sentence_count == 2 and not self.tts_second_sentence_time:
-                    self.tts_second_sentence_time = current_time
+                # 记录每句的开始时间（第二句跳过第一句"好嘞，请稍等，正在处理中"）
+                sentence_index = timeline.mark_sentence_start(now_ns)
+                if sentence_index == 2:
                     self.logger.debug(
                         f"Connection #{self.connection_id}: Second TTS sentence started at {current_time:.2f}ms"
                     )
                 
-                self.logger.info(f"Connection #{self.connection_id}: TTS Sentence Start | Text: {text}")
-                # 诊断日志：记录sentence_start的详细信息
-                self.logger.info(
-                    f"Connection #{self.connection_id}: [DIAGNOSTIC] TTS sentence_start | "
-                    f"Sentence #{self.tts_sentence_count} | "
-                    f"Has_LLM: {self.has_llm} | "
-                    f"LLM_Time: {self.llm_response_time:.2f}ms" if self.llm_response_time else "LLM_Time: None"
-                )
+                if self.log_payloads:
+                    self.logger.info(f"Connection #{self.connection_id}: TTS Sentence Start | Text: {text}")
+                    # 诊断日志：记录sentence_start的详细信息
+                    self.logger.info(
+                        "Connection #%s: [DIAGNOSTIC] TTS sentence_start | Sentence #%s | Has_LLM: %s | LLM_Time: %s",
+                        self.connection_id, sentence_index, turn.has_llm, self.llm_response_time
+                    )
             elif state == "sentence_end":
-                self.logger.info(f"Connection #{self.connection_id}: TTS Sentence End")
+                if self.log_payloads:
+                    self.logger.info(f"Connection #{self.connection_id}: TTS Sentence End")
             else:
                 # 其他 TTS 状态
                 self.logger.info(f"Connection #{self.connection_id}: TTS Update | State: {state}" + (f" | Text: {text}" if text else ""))
             
-            self.logger.info(f"Connection #{self.connection_id}: =================================")
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: =================================")
         
         elif msg_type == "hello":
             # 服务器 hello 消息（项目代码中有 ParseServerHello，但通常不等待）
@@ -476,6 +653,8 @@ class WebSocketClient:
         try:
             message_bytes = message.encode('utf-8')
             await self.websocket.send(message)
+            if self.trace is not None:
+                self.trace.sent(message)
             
             self.sent_messages += 1
             self.total_sent_bytes += len(message_bytes)
@@ -484,18 +663,18 @@ class WebSocketClient:
             # 这里不再自动记录，避免记录 start_listen 的发送时间
             # send_time 现在只在开始发送音频数据时记录
             
-            # 只记录关键消息类型，避免日志过多
-            try:
-                import json
-                msg_data = json.loads(message)
-                msg_type = msg_data.get("type", "unknown")
-                if msg_type in ["start_listen", "stop_listen"]:
-                    self.logger.debug(
-                        f"Connection #{self.connection_id}: Sent {msg_type} | "
-                        f"Size: {len(message_bytes)} bytes"
-                    )
-            except:
-                pass  # 如果不是 JSON，忽略
+            # 只记录关键消息类型，避免日志过多（DEBUG未开启时不解析消息）
+            if self.logger.is_enabled_for(logging.DEBUG):
+                try:
+                    msg_data = json.loads(message)
+                    msg_type = msg_data.get("type", "unknown")
+                    if msg_type in ["start_listen", "stop_listen"]:
+                        self.logger.debug(
+                            f"Connection #{self.connection_id}: Sent {msg_type} | "
+                            f"Size: {len(message_bytes)} bytes"
+                        )
+                except:
+                    pass  # 如果不是 JSON，忽略
             
             return True
             
@@ -530,7 +709,7 @@ class WebSocketClient:
         }
         """
         if mode is None:
-            mode = Config.LISTENING_MODE
+            mode = self.settings.listening_mode
         
         # 生产环境模式：根据 mode 决定 state
         # realtime 模式使用 detect（服务端VAD），其他使用 asr
@@ -565,19 +744,22 @@ class WebSocketClient:
         
         message_str = json.dumps(message, ensure_ascii=False)
         
-        # 打印发送start_listen的详细信息
-        import json as json_module
-        self.logger.info(f"Connection #{self.connection_id}: ========== SEND START_LISTEN ==========")
-        self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-        self.logger.info(f"Connection #{self.connection_id}: WebSocket URL: {Config.get_websocket_url(self.device_sn)}")
-        self.logger.info(f"Connection #{self.connection_id}: Session ID: {self.session_id}")
-        self.logger.info(f"Connection #{self.connection_id}: Message Content:")
-        self.logger.info(f"Connection #{self.connection_id}: {json_module.dumps(message, ensure_ascii=False, indent=2)}")
-        self.logger.info(f"Connection #{self.connection_id}: Message Size: {len(message_str)} bytes")
-        self.logger.info(f"Connection #{self.connection_id}: =======================================")
+        # 打印发送start_listen的详细信息（完整消息体只在采样轮次输出）
+        if self.log_payloads:
+            self.logger.info(f"Connection #{self.connection_id}: ========== SEND START_LISTEN ==========")
+            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+            self.logger.info(f"Connection #{self.connection_id}: WebSocket URL: {self.settings.websocket_url(self.device_sn)}")
+            self.logger.info(f"Connection #{self.connection_id}: Session ID: {self.session_id}")
+            self.logger.info(f"Connection #{self.connection_id}: Message Content:")
+            self.logger.info(f"Connection #{self.connection_id}: {json.dumps(message, ensure_ascii=False, indent=2)}")
+            self.logger.info(f"Connection #{self.connection_id}: Message Size: {len(message_str)} bytes")
+            self.logger.info(f"Connection #{self.connection_id}: =======================================")
         
         self.logger.debug(f"Connection #{self.connection_id}: Sending start_listen with mode={mode}")
-        return await self.send_text(message_str)
+        sent = await self.send_text(message_str)
+        if sent:
+            self.timeline.mark(START_LISTEN)
+        return sent
     
     async def send_stop_listen(self) -> bool:
         """
@@ -710,6 +892,8 @@ class WebSocketClient:
         try:
             # 发送二进制数据（Opus 数据包）
             await self.websocket.send(audio_data)
+            if self.trace is not None:
+                self.trace.sent(audio_data)
             
             self.sent_messages += 1
             self.total_sent_bytes += len(audio_data)
@@ -756,57 +940,54 @@ class WebSocketClient:
             frame_count = len(audio_frames)
             
             # 记录发送开始
-            total_bytes = sum(len(f) for f in audio_frames)
-            self.logger.info(f"Connection #{self.connection_id}: ========== SEND AUDIO DATA ==========")
-            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-            self.logger.info(f"Connection #{self.connection_id}: WebSocket URL: {Config.get_websocket_url(self.device_sn)}")
-            self.logger.info(f"Connection #{self.connection_id}: Session ID: {self.session_id}")
-            self.logger.info(f"Connection #{self.connection_id}: Frame Count: {frame_count}")
-            self.logger.info(f"Connection #{self.connection_id}: Total Size: {total_bytes} bytes")
-            self.logger.info(f"Connection #{self.connection_id}: Average Frame Size: {total_bytes // frame_count if frame_count > 0 else 0} bytes")
-            self.logger.info(f"Connection #{self.connection_id}: Send Mode: Batch (no interval)")
-            self.logger.info(f"Connection #{self.connection_id}: =====================================")
-            
-            self.logger.debug(
-                f"Connection #{self.connection_id}: Starting to send {frame_count} audio frames "
-                f"(total {total_bytes} bytes) - batch mode (no interval)"
-            )
+            if self.log_payloads:
+                total_bytes = sum(len(f) for f in audio_frames)
+                self.logger.info(f"Connection #{self.connection_id}: ========== SEND AUDIO DATA ==========")
+                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                self.logger.info(f"Connection #{self.connection_id}: WebSocket URL: {self.settings.websocket_url(self.device_sn)}")
+                self.logger.info(f"Connection #{self.connection_id}: Session ID: {self.session_id}")
+                self.logger.info(f"Connection #{self.connection_id}: Frame Count: {frame_count}")
+                self.logger.info(f"Connection #{self.connection_id}: Total Size: {total_bytes} bytes")
+                self.logger.info(f"Connection #{self.connection_id}: Average Frame Size: {total_bytes // frame_count if frame_count > 0 else 0} bytes")
+                self.logger.info(f"Connection #{self.connection_id}: Send Mode: Batch (no interval)")
+                self.logger.info(f"Connection #{self.connection_id}: =====================================")
             
             # 批量连续发送所有帧（模拟 MainLoop 的行为）
             # 项目代码：for (auto& opus : packets) { protocol_->SendAudio(std::move(opus)); }
+            # 有帧间隔时由共享节拍器按绝对截止时间释放每一帧
+            pacing = get_pacer().stream(frame_interval_ms) if frame_interval_ms > 0 else None
             for frame in audio_frames:
+                if pacing is not None:
+                    await pacing.next_frame()
                 if not self.is_connected:
                     self.logger.warning(f"Connection #{self.connection_id}: Connection lost during audio sending")
                     break
                 
                 # 发送单个 Opus 帧（二进制数据包）
                 # 项目代码：websocket_->Send(data.data(), data.size(), true) - 二进制发送
-                # Python websockets: await websocket.send(frame) - frame 是 bytes，自动识别为二进制
+                # Python websockets: await websocket.send(frame) - frame 是 bytes/memoryview（语料归档），自动识别为二进制
                 await self.websocket.send(frame)
+                if self.trace is not None:
+                    self.trace.sent(frame)
                 
                 self.sent_messages += 1
                 self.total_sent_bytes += len(frame)
                 total_size += len(frame)
                 
-                # 注意：项目代码在 MainLoop 中是批量连续发送，没有间隔
-                # 所以这里也不应该有任何延迟
-                # 只有在需要模拟真实采集节奏时才使用间隔（但当前应该是批量发送）
-                if frame_interval_ms > 0 and frame != audio_frames[-1]:  # 最后一帧不需要等待
-                    await asyncio.sleep(frame_interval_ms / 1000.0)
             
             # 发送完成
-            self.logger.info(f"Connection #{self.connection_id}: ========== AUDIO SEND COMPLETE ==========")
-            self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-            self.logger.info(f"Connection #{self.connection_id}: Frames Sent: {frame_count}")
-            self.logger.info(f"Connection #{self.connection_id}: Total Bytes Sent: {total_size} bytes")
-            self.logger.info(f"Connection #{self.connection_id}: Messages Sent (cumulative): {self.messages_sent}")
-            self.logger.info(f"Connection #{self.connection_id}: Total Bytes Sent (cumulative): {self.bytes_sent} bytes")
-            self.logger.info(f"Connection #{self.connection_id}: =========================================")
-            
-            self.logger.debug(
-                f"Connection #{self.connection_id}: Sent {frame_count} audio frames, "
-                f"total {total_size} bytes (batch mode, no interval)"
-            )
+            if self.log_payloads:
+                self.logger.info(f"Connection #{self.connection_id}: ========== AUDIO SEND COMPLETE ==========")
+                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                self.logger.info(f"Connection #{self.connection_id}: Frames Sent: {frame_count}")
+                self.logger.info(f"Connection #{self.connection_id}: Total Bytes Sent: {total_size} bytes")
+                self.logger.info(f"Connection #{self.connection_id}: Messages Sent (cumulative): {self.sent_messages}")
+                self.logger.info(f"Connection #{self.connection_id}: Total Bytes Sent (cumulative): {self.total_sent_bytes} bytes")
+                self.logger.info(f"Connection #{self.connection_id}: =========================================")
+            else:
+                self.logger.info(
+                    "Connection #%s: Sent %d audio frames, %d bytes", self.connection_id, frame_count, total_size
+                )
             
             return True
             
@@ -816,7 +997,8 @@ class WebSocketClient:
                 self.on_error(f"Send audio frames error: {str(e)}")
             return False
     
-    async def send_user_message(self, text: str, audio_frames: Optional[List[bytes]] = None) -> bool:
+    async def send_user_message(self, text: str, audio_frames: Optional[List[bytes]] = None,
+                                send_stop: Optional[bool] = None) -> bool:
         """
         发送用户消息（完全模拟设备发送流程）
         
@@ -830,6 +1012,9 @@ class WebSocketClient:
            - auto: 可选发送（服务器可能自动检测VAD）
            - manual: 必须发送
            - realtime: 不发送（持续监听）
+        
+        Args:
+            send_stop: 是否发送 stop_listen，None 时按本连接的 settings.send_stop_listen
         """
         # 1. 先发送 start_listen 消息
         if not await self.send_start_listen():
@@ -848,8 +1033,7 @@ class WebSocketClient:
             self.logger.info(f"Connection #{self.connection_id}: Preparing to send {len(audio_frames)} audio frames")
             # 在发送第一帧音频之前记录 send_time
             if self.send_time is None:
-                from utils import get_timestamp
-                self.send_time = get_timestamp()
+                self.timeline.mark(FIRST_AUDIO_FRAME)
                 self.logger.debug(f"Connection #{self.connection_id}: Recorded send_time for audio data")
             # 关键发现（通过查看ws_server代码）：
             # 1. 服务器每个WebSocket消息的二进制数据会被当作一个Opus包解码
@@ -865,38 +1049,44 @@ class WebSocketClient:
                 #   - 硬件编码：每30ms读取一次Opus数据
                 #   - 软件编码：每60ms生成一个Opus包
                 # 这里按照配置的间隔发送，模拟持续采集
-                interval_sec = Config.AUDIO_SEND_INTERVAL_MS / 1000.0
+                # 由共享节拍器按绝对截止时间（第一帧时刻 + i * 间隔）释放每一帧，发送耗时不会累积成漂移
+                pacing = get_pacer().stream(Config.AUDIO_SEND_INTERVAL_MS)
                 self.logger.debug(
                     f"Connection #{self.connection_id}: Sending {len(audio_frames)} audio frames "
                     f"in continuous mode (interval: {Config.AUDIO_SEND_INTERVAL_MS}ms)"
                 )
                 
-                for i, frame in enumerate(audio_frames):
+                for frame in audio_frames:
+                    # 等待本帧的截止时间（第一帧立即发送）
+                    await pacing.next_frame()
                     if not self.is_connected:
                         self.logger.warning(f"Connection #{self.connection_id}: Connection lost during audio sending")
                         break
                     
                     # 发送单个 Opus 包（二进制数据包）
                     await self.websocket.send(frame)
+                    if self.trace is not None:
+                        self.trace.sent(frame)
                     
                     self.sent_messages += 1
                     self.total_sent_bytes += len(frame)
-                    
-                    # 如果不是最后一帧，等待间隔时间（模拟持续采集）
-                    if i < len(audio_frames) - 1:
-                        await asyncio.sleep(interval_sec)
+                
+                self.turn.pacing = pacing.get_stats()
+                if self.logger.is_enabled_for(logging.DEBUG):
+                    self.logger.debug("Connection #%s: Pacing stats %s", self.connection_id, self.turn.pacing)
             else:
                 # 批量发送模式：连续发送所有帧，没有间隔（模拟 MainLoop 批量发送）
                 # 项目代码：for (auto& opus : packets) { protocol_->SendAudio(std::move(opus)); }
                 # 每个 SendAudio() 调用对应一个 WebSocket 二进制消息
                 frame_count = len(audio_frames)
-                total_bytes = sum(len(f) for f in audio_frames)
-                self.logger.info(f"Connection #{self.connection_id}: ========== SEND AUDIO DATA ==========")
-                self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
-                self.logger.info(f"Connection #{self.connection_id}: Frame Count: {frame_count}")
-                self.logger.info(f"Connection #{self.connection_id}: Total Size: {total_bytes} bytes")
-                self.logger.info(f"Connection #{self.connection_id}: Send Mode: Batch (no interval)")
-                self.logger.info(f"Connection #{self.connection_id}: =====================================")
+                if self.log_payloads:
+                    total_bytes = sum(len(f) for f in audio_frames)
+                    self.logger.info(f"Connection #{self.connection_id}: ========== SEND AUDIO DATA ==========")
+                    self.logger.info(f"Connection #{self.connection_id}: Device SN: {self.device_sn}")
+                    self.logger.info(f"Connection #{self.connection_id}: Frame Count: {frame_count}")
+                    self.logger.info(f"Connection #{self.connection_id}: Total Size: {total_bytes} bytes")
+                    self.logger.info(f"Connection #{self.connection_id}: Send Mode: Batch (no interval)")
+                    self.logger.info(f"Connection #{self.connection_id}: =====================================")
                 
                 sent_count = 0
                 sent_bytes = 0
@@ -910,6 +1100,8 @@ class WebSocketClient:
                     # Python websockets: await websocket.send(frame) - frame 是 bytes，自动识别为二进制
                     # 每个 WebSocket 消息对应一个独立的 Opus 包
                     await self.websocket.send(frame)
+                    if self.trace is not None:
+                        self.trace.sent(frame)
                     
                     self.sent_messages += 1
                     self.total_sent_bytes += len(frame)
@@ -917,37 +1109,43 @@ class WebSocketClient:
                     sent_bytes += len(frame)
                 
                 # 记录发送完成
-                self.logger.info(f"Connection #{self.connection_id}: ========== AUDIO SEND COMPLETE ==========")
-                self.logger.info(f"Connection #{self.connection_id}: Frames Sent: {sent_count}/{frame_count}")
-                self.logger.info(f"Connection #{self.connection_id}: Bytes Sent: {sent_bytes} bytes")
-                self.logger.info(f"Connection #{self.connection_id}: =========================================")
+                if self.log_payloads:
+                    self.logger.info(f"Connection #{self.connection_id}: ========== AUDIO SEND COMPLETE ==========")
+                    self.logger.info(f"Connection #{self.connection_id}: Frames Sent: {sent_count}/{frame_count}")
+                    self.logger.info(f"Connection #{self.connection_id}: Bytes Sent: {sent_bytes} bytes")
+                    self.logger.info(f"Connection #{self.connection_id}: =========================================")
+                else:
+                    self.logger.info(
+                        "Connection #%s: Sent %d/%d audio frames, %d bytes",
+                        self.connection_id, sent_count, frame_count, sent_bytes
+                    )
             
             # 记录发送完成
             # 记录发送语音结束的时间（发送完所有音频帧后）
-            from utils import get_timestamp
-            self.send_end_time = get_timestamp()
+            self.timeline.mark(LAST_AUDIO_FRAME)
             self.logger.debug(
                 f"Connection #{self.connection_id}: Finished sending {len(audio_frames)} audio frames, "
                 f"total {self.total_sent_bytes} bytes, send_time={self.send_time}, send_end_time={self.send_end_time}"
             )
             
             # 3. 根据监听模式和配置决定是否发送 stop_listen
-            should_send_stop = Config.SEND_STOP_LISTEN
-            if Config.LISTENING_MODE == "realtime":
+            should_send_stop = self.settings.send_stop_listen if send_stop is None else send_stop
+            if self.settings.listening_mode == "realtime":
                 should_send_stop = False  # realtime 模式不发送 stop_listen
             
             if should_send_stop:
                 # 等待一小段时间，确保最后一帧音频数据已发送
                 await asyncio.sleep(0.1)
                 await self.send_stop_listen()
-                # 如果发送了stop_listen，更新send_end_time为stop_listen发送时间
-                self.send_end_time = get_timestamp()
+                # 如果发送了stop_listen，send_end_time 以stop_listen发送时间为准
+                self.timeline.mark(STOP_LISTEN)
             
             return True
         else:
             # 如果没有提供音频数据，只发送文本消息（用于快速测试）
             self.logger.warning(f"Connection #{self.connection_id}: No audio frames provided, only sending start_listen")
-            if Config.SEND_STOP_LISTEN and Config.LISTENING_MODE != "realtime":
+            should_send_stop = self.settings.send_stop_listen if send_stop is None else send_stop
+            if should_send_stop and self.settings.listening_mode != "realtime":
                 await asyncio.sleep(0.1)
                 await self.send_stop_listen()
             return True
@@ -976,8 +1174,16 @@ class WebSocketClient:
             finally:
                 self.is_connected = False
                 self.websocket = None
+                self._close_trace()
+                self.disconnect_event.set()
                 self.logger.debug(f"Connection #{self.connection_id}: Connection closed")
     
+    def _close_trace(self):
+        """结束本连接的协议轨迹会话"""
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+    
     def get_metrics(self) -> Dict[str, Any]:
         """获取连接指标"""
         metrics = {
@@ -994,6 +1200,9 @@ class WebSocketClient:
             "audio_to_tts_delay": None,  # 从发送语音结束到TTS开始的延迟
             "message_size": None,
             "response_size": None,
+            "turn_id": self.turn.turn_id,
+            "straggler_messages": self.straggler_messages,
+            "pacing": self.turn.pacing,  # 持续输入模式下的帧节拍统计（节拍延迟、累积漂移）
             "sent_messages": self.sent_messages,
             "received_messages": self.received_messages,
             "total_sent_bytes": self.total_sent_bytes,
@@ -1023,63 +1232,39 @@ class WebSocketClient:
             if base_time:
                 metrics["send_end_time"] = self.send_end_time - base_time
         
-        # 所有时间差计算都使用绝对时间戳（毫秒）
-        # 调试信息：记录时间戳值
-        if self.send_time:
-            stt_str = f"{self.stt_response_time:.2f}" if self.stt_response_time else "None"
-            llm_str = f"{self.llm_response_time:.2f}" if self.llm_response_time else "None"
-            tts_start_str = f"{self.tts_start_time:.2f}" if self.tts_start_time else "None"
-            tts_stop_str = f"{self.tts_stop_time:.2f}" if self.tts_stop_time else "None"
-            self.logger.debug(
-                f"Connection #{self.connection_id}: Time metrics - "
-                f"send_time={self.send_time:.2f}, "
-                f"stt_time={stt_str}, "
-                f"llm_time={llm_str}, "
-                f"tts_start={tts_start_str}, "
-                f"tts_stop={tts_stop_str}"
-            )
+        # 所有时间差都由本轮时间线（单调时钟）计算，不再对墙上时钟时间戳相减
+        timeline = self.timeline
+        if self.logger.is_enabled_for(logging.DEBUG):
+            self.logger.debug("Connection #%s: Turn timeline - %s", self.connection_id, timeline.to_dict())
         
         # 性能指标设计（专业测试角度）：
         # 1. STT服务延迟：从发送音频到收到STT结果（包含网络传输+STT处理时间）
-        if self.stt_response_time and self.send_time:
-            metrics["stt_latency"] = self.stt_response_time - self.send_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated stt_latency = {metrics['stt_latency']:.2f}ms")
+        metrics["stt_latency"] = timeline.elapsed_ms(FIRST_AUDIO_FRAME, STT)
         
         # 2. LLM服务延迟：从STT完成到LLM响应（LLM处理时间）
-        if self.llm_response_time and self.stt_response_time:
-            metrics["llm_latency"] = self.llm_response_time - self.stt_response_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated llm_latency = {metrics['llm_latency']:.2f}ms")
+        metrics["llm_latency"] = timeline.elapsed_ms(STT, FIRST_LLM)
         
         # 3. TTS服务延迟：从LLM完成到TTS开始（TTS启动延迟，包含TTS服务启动时间）
-        if self.tts_start_time and self.llm_response_time:
-            metrics["tts_latency"] = self.tts_start_time - self.llm_response_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated tts_latency = {metrics['tts_latency']:.2f}ms")
+        metrics["tts_latency"] = timeline.elapsed_ms(FIRST_LLM, TTS_START)
         
         # 注意：不记录TTS持续时间，因为这是内容长度决定的，不是性能指标
         
         # 计算从发送语音结束到TTS开始的延迟（这是客户端可以准确测量的指标）
-        if self.send_end_time and self.tts_start_time:
-            metrics["audio_to_tts_delay"] = self.tts_start_time - self.send_end_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated audio_to_tts_delay = {metrics['audio_to_tts_delay']:.2f}ms")
+        metrics["audio_to_tts_delay"] = timeline.elapsed_ms(SEND_END, TTS_START)
         
         # 计算从发送语音结束到第二句TTS开始的延迟（跳过第一句"好嘞，请稍等，正在处理中"）
-        if self.send_end_time and self.tts_second_sentence_time:
-            metrics["audio_to_second_tts_delay"] = self.tts_second_sentence_time - self.send_end_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated audio_to_second_tts_delay = {metrics['audio_to_second_tts_delay']:.2f}ms")
+        audio_to_second = timeline.elapsed_ms(SEND_END, SECOND_SENTENCE)
+        if audio_to_second is not None:
+            metrics["audio_to_second_tts_delay"] = audio_to_second
         
-        # 记录第二句TTS时间（用于CSV导出）
+        # 记录第二句TTS时间（相对连接完成，用于CSV导出）
         if self.tts_second_sentence_time:
             base_time = self.connect_end_time or self.connect_start_time
             if base_time:
                 metrics["tts_second_sentence_time"] = self.tts_second_sentence_time - base_time
         
-        # 4. 端到端响应时间：从发送音频到TTS结束（完整对话流程的总时间）
-        if self.send_time and self.tts_stop_time:
-            metrics["e2e_response_time"] = self.tts_stop_time - self.send_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated e2e_response_time = {metrics['e2e_response_time']:.2f}ms")
-        elif self.send_time and self.tts_start_time:
-            metrics["e2e_response_time"] = self.tts_start_time - self.send_time
-            self.logger.debug(f"Connection #{self.connection_id}: Calculated e2e_response_time (from tts_start) = {metrics['e2e_response_time']:.2f}ms")
+        # 4. 端到端响应时间：从发送音频到TTS结束（完整对话流程的总时间，没有TTS stop时到TTS开始）
+        metrics["e2e_response_time"] = timeline.elapsed_ms(FIRST_AUDIO_FRAME, RESPONSE_END)
         
         metrics["message_size"] = self.total_sent_bytes
         metrics["response_size"] = self.total_received_bytes